@@ -0,0 +1,189 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: cardano_cli.py
+Author: SuperKK
+
+The cardano-cli commands used by the minter, served from the simulated chain
+in $SIMULATOR_CHAIN.  Run through the benchmarks/simulator/cardano-cli shim.
+"""
+
+from typing import Dict, List
+import json
+import os
+import shutil
+import sys
+
+from tcr import cbor
+
+from benchmarks.chain import Chain, PROTOCOL_PARAMETERS_FILE, get_min_fee, get_slot, get_txid, parse_assets, parse_tx_out
+
+REPEATED_OPTIONS = ['--tx-in', '--tx-out', '--signing-key-file', '--address']
+
+def parse_options(args: List[str]) -> Dict:
+    """
+    --name value and --name=value options.  Options in REPEATED_OPTIONS are
+    lists, an option not followed by a value is True.
+    """
+
+    options = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if not arg.startswith('--'):
+            continue
+
+        if '=' in arg:
+            (name, value) = arg.split('=', 1)
+        elif i < len(args) and not args[i].startswith('--'):
+            (name, value) = (arg, args[i])
+            i += 1
+        else:
+            (name, value) = (arg, True)
+
+        if name in REPEATED_OPTIONS:
+            options.setdefault(name, []).append(value)
+        else:
+            options[name] = value
+    return options
+
+def read_body(filename: str) -> Dict:
+    """
+    The body of a body file, or the first item of a signed transaction.
+    """
+
+    with open(filename, 'r') as file:
+        value = cbor.loads(bytes.fromhex(json.load(file)['cborHex']))
+    if isinstance(value, list):
+        return value[0]
+    return value
+
+def read_witness_count(filename: str) -> int:
+    """
+    The number of vkey witnesses of a signed transaction, signed here or in
+    process by the Signer.
+    """
+
+    with open(filename, 'r') as file:
+        witness_set = cbor.loads(bytes.fromhex(json.load(file)['cborHex']))[1]
+    witnesses = witness_set.get(0, [])
+    if isinstance(witnesses, cbor.Tag):
+        witnesses = witnesses.value
+    return len(witnesses)
+
+def read_body_cbor(filename: str) -> bytes:
+    with open(filename, 'r') as file:
+        data = bytes.fromhex(json.load(file)['cborHex'])
+    if data[0] >> 5 == cbor.MAJOR_ARRAY:
+        return cbor.split_array(data)[0]
+    return data
+
+def write_envelope(filename: str, type: str, data: bytes) -> None:
+    """
+    The bodies are CBOR like cardano-cli writes, but of the simulator's own
+    {'inputs', 'outputs', 'fee', ...} structure rather than the ledger's.
+    """
+
+    with open(filename, 'w') as file:
+        file.write(json.dumps({'type': type, 'description': 'Simulator', 'cborHex': data.hex()}, indent=4))
+
+def build_raw(options: Dict) -> None:
+    body = {'inputs': options.get('--tx-in', []),
+            'outputs': [parse_tx_out(tx_out) for tx_out in options.get('--tx-out', [])],
+            'fee': int(options.get('--fee', 0))}
+    if '--mint' in options:
+        body['mint'] = parse_assets(options['--mint'].split('+'))
+    if '--invalid-hereafter' in options:
+        body['invalid-hereafter'] = int(options['--invalid-hereafter'])
+    if '--metadata-json-file' in options:
+        with open(options['--metadata-json-file'], 'r') as file:
+            body['metadata'] = json.load(file)
+    # an unwitnessed transaction like cardano-cli 8 writes
+    write_envelope(options['--out-file'], 'Unwitnessed Tx BabbageEra', cbor.dumps([body, {}, True, None]))
+
+def run(args: List[str], chain_file: str) -> str:
+    command = ' '.join(args[0:2])
+    options = parse_options(args[2:])
+
+    if command == 'query tip':
+        return json.dumps(Chain(chain_file).get_tip(), indent=4)
+    elif command == 'query utxo':
+        if '--out-file' in options:
+            chain = Chain(chain_file)
+            if '--tx-in' in options:
+                outputs = chain.format_utxo_json_tx_in(options['--tx-in'])
+            else:
+                outputs = chain.format_utxo_json(options['--address'])
+            with open(options['--out-file'], 'w') as file:
+                file.write(json.dumps(outputs, indent=4))
+            return ''
+        return Chain(chain_file).format_utxo_table(options['--address'][0])
+    elif command == 'query tx-mempool':
+        # transactions are added to a block as they are submitted so the
+        # mempool is always empty
+        return json.dumps({'exists': False, 'slot': get_slot(), 'txId': args[3]}, indent=4)
+    elif command == 'query protocol-parameters':
+        shutil.copyfile(PROTOCOL_PARAMETERS_FILE, options['--out-file'])
+        return ''
+    elif command == 'transaction build-raw':
+        build_raw(options)
+        return ''
+    elif command == 'transaction calculate-min-fee':
+        with open(options['--protocol-params-file'], 'r') as file:
+            protocol_parameters = json.load(file)
+        fee = get_min_fee(read_body(options['--tx-body-file']), int(options['--witness-count']), protocol_parameters)
+        return '{} Lovelace'.format(fee)
+    elif command == 'transaction calculate-min-required-utxo':
+        tx_out = parse_tx_out(options['--tx-out'][0])
+        return 'Lovelace {}'.format(1000000 + 300000 * len(tx_out['assets']))
+    elif command == 'transaction sign':
+        # [body, witness set, valid, auxiliary data] with the body as built
+        witnesses = {0: options.get('--signing-key-file', [])}
+        write_envelope(options['--out-file'], 'Tx BabbageEra',
+                       cbor.dumps([cbor.Raw(read_body_cbor(options['--tx-body-file'])), witnesses, True, None]))
+        return ''
+    elif command == 'transaction txid':
+        return get_txid(read_body(options.get('--tx-file', options.get('--tx-body-file'))))
+    elif command == 'transaction submit':
+        Chain(chain_file).submit(read_body(options['--tx-file']), read_witness_count(options['--tx-file']))
+        return 'Transaction successfully submitted.'
+
+    raise Exception('Simulator, unsupported command: {}'.format(' '.join(args)))
+
+def main(args: List[str]) -> int:
+    chain_file = os.environ.get('SIMULATOR_CHAIN')
+    if chain_file == None:
+        print('SIMULATOR_CHAIN is not set', file=sys.stderr)
+        return 1
+
+    try:
+        output = run(args, chain_file)
+    except Exception as e:
+        print('Command failed: {}  Error: {}'.format(' '.join(args[0:2]), e), file=sys.stderr)
+        return 1
+
+    if output != '':
+        print(output)
+    return 0
@@ -0,0 +1,414 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: chain.py
+Author: SuperKK
+
+A small chain model for load testing without a node.  The chain is kept in
+SQLite using the subset of the db-sync tables that Database queries, so the
+cardano-cli shim, the payment generator and Database all share one ledger:
+
+    block        id, hash, epoch_no, slot_no, block_no, time
+    tx           id, hash, block_id, fee
+    tx_out       id, tx_id, index, address, address_raw, payment_cred,
+                 stake_address_id, value, data_hash, address_has_script
+    tx_in        id, tx_in_id, tx_out_id, tx_out_index
+    multi_asset  id, policy, name, fingerprint
+    ma_tx_mint   id, quantity, tx_id, ident
+    ma_tx_out    id, quantity, tx_out_id, ident
+    tx_metadata  id, key, json, bytes, tx_id
+
+Transactions are JSON bodies rather than CBOR.  Submitting one checks that
+its inputs are unspent, that it balances, and that it is before its
+invalid-hereafter slot.
+"""
+
+from typing import Dict, List, Tuple
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from tcr import cbor
+
+# slot 0 of the simulated chain, one slot per second
+SYSTEM_START = 1655683200
+EPOCH_LENGTH = 432000
+
+PROTOCOL_PARAMETERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'cardano-cli', 'protocol_parameters.json')
+
+SCHEMA = [
+    'create table if not exists block (id integer primary key, hash blob, epoch_no integer, slot_no integer, block_no integer, time timestamp)',
+    'create table if not exists tx (id integer primary key, hash blob unique, block_id integer, fee integer)',
+    ('create table if not exists tx_out (id integer primary key, tx_id integer, "index" integer, address text, address_raw blob, '
+     'payment_cred blob, stake_address_id integer, value integer, data_hash blob, address_has_script boolean)'),
+    'create index if not exists tx_out_address on tx_out (address)',
+    'create index if not exists tx_out_tx_id on tx_out (tx_id)',
+    'create table if not exists tx_in (id integer primary key, tx_in_id integer, tx_out_id integer, tx_out_index integer)',
+    'create index if not exists tx_in_tx_in_id on tx_in (tx_in_id)',
+    'create unique index if not exists tx_in_spent on tx_in (tx_out_id, tx_out_index)',
+    'create table if not exists multi_asset (id integer primary key, policy blob, name blob, fingerprint text)',
+    'create unique index if not exists multi_asset_ident on multi_asset (policy, name)',
+    'create table if not exists ma_tx_mint (id integer primary key, quantity integer, tx_id integer, ident integer)',
+    'create table if not exists ma_tx_out (id integer primary key, quantity integer, tx_out_id integer, ident integer)',
+    'create table if not exists tx_metadata (id integer primary key, key integer, json text, bytes blob, tx_id integer)',
+    'create table if not exists stake_address (id integer primary key, hash_raw blob, view text)',
+]
+
+sqlite3.register_converter('timestamp', lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+def get_slot() -> int:
+    return int(time.time()) - SYSTEM_START
+
+def get_block_time(slot: int) -> datetime.datetime:
+    """
+    UTC without a timezone, like db-sync
+    """
+
+    return datetime.datetime.fromtimestamp(SYSTEM_START + slot, datetime.timezone.utc).replace(tzinfo=None)
+
+def get_txid(body: Dict) -> str:
+    """
+    The Blake2b-256 of the CBOR body, as cardano-cli and tcr compute it from
+    the envelope's cborHex.
+    """
+
+    return hashlib.blake2b(cbor.dumps(body), digest_size=32).hexdigest()
+
+def parse_assets(values: List[str]) -> Dict[str, int]:
+    """
+    ['1 policy.name', ...] as used by --tx-out and --mint, to {'policy.name': 1}
+    """
+
+    assets = {}
+    for value in values:
+        (quantity, asset) = value.strip().split(' ')
+        assets[asset] = assets.get(asset, 0) + int(quantity)
+    return assets
+
+def format_asset(policy: bytes, name: bytes) -> str:
+    """
+    'policy.name' in hex, just 'policy' for an empty name as cardano-cli prints it
+    """
+
+    if len(name) == 0:
+        return policy.hex()
+    return '{}.{}'.format(policy.hex(), name.hex())
+
+def parse_tx_out(tx_out: str) -> Dict:
+    values = tx_out.split('+')
+    return {'address': values[0], 'amount': int(values[1]), 'assets': parse_assets(values[2:])}
+
+def get_min_fee(body: Dict, witness_count: int, protocol_parameters: Dict) -> int:
+    # sized as drafted, with a zero fee and placeholder amounts, so the fee
+    # of a final body can be checked against the fee of its draft
+    draft = dict(body, fee=0, outputs=[dict(output, amount=1) for output in body['outputs']])
+    size = len(json.dumps(draft, sort_keys=True)) // 2 + 100 * witness_count
+    return protocol_parameters['txFeeFixed'] + protocol_parameters['txFeePerByte'] * size
+
+class Chain:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=60, detect_types=sqlite3.PARSE_DECLTYPES,
+                                          isolation_level=None, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock:
+            self.connection.execute('pragma journal_mode=wal')
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_tip(self) -> Dict:
+        with self.lock:
+            row = self.connection.execute('select hash, slot_no, block_no from block order by id desc limit 1').fetchone()
+        slot = get_slot()
+        (block_hash, block_no) = (row[0].hex(), row[2]) if row != None else ('00' * 32, 0)
+        return {'epoch': slot // EPOCH_LENGTH,
+                'hash': block_hash,
+                'slot': slot,
+                'block': block_no,
+                'era': 'Babbage',
+                'syncProgress': '100.00'}
+
+    def get_utxos(self, address: str) -> List[Dict]:
+        with self.lock:
+            rows = self.connection.execute('select tx.hash, tx_out."index", tx_out.value, tx_out.id from tx_out '
+                                           'inner join tx on tx_out.tx_id = tx.id '
+                                           'left join tx_in on tx_in.tx_out_id = tx_out.tx_id and tx_in.tx_out_index = tx_out."index" '
+                                           'where tx_out.address = ? and tx_in.id is null '
+                                           'order by tx_out.id', (address,)).fetchall()
+            utxos = []
+            for row in rows:
+                assets = {}
+                for (policy, name, quantity) in self.connection.execute('select multi_asset.policy, multi_asset.name, ma_tx_out.quantity from ma_tx_out '
+                                                                        'inner join multi_asset on ma_tx_out.ident = multi_asset.id '
+                                                                        'where ma_tx_out.tx_out_id = ?', (row[3],)):
+                    assets[format_asset(policy, name)] = quantity
+                utxos.append({'tx-hash': row[0].hex(), 'tx-ix': row[1], 'amount': row[2], 'assets': assets})
+        return utxos
+
+    def format_utxo_table(self, address: str) -> str:
+        """
+        The output of cardano-cli query utxo.
+        """
+
+        lines = ['                           TxHash                                 TxIx        Amount',
+                 '--------------------------------------------------------------------------------------']
+        for utxo in self.get_utxos(address):
+            assets = ''.join([' + {} {}'.format(quantity, asset) for (asset, quantity) in utxo['assets'].items()])
+            lines.append('{}     {}        {} lovelace{} + TxOutDatumNone'.format(utxo['tx-hash'], utxo['tx-ix'], utxo['amount'], assets))
+        return '\n'.join(lines)
+
+    def format_utxo_json(self, addresses: List[str]) -> Dict:
+        """
+        The --out-file of cardano-cli query utxo for one or more addresses.
+        """
+
+        outputs = {}
+        for address in addresses:
+            for utxo in self.get_utxos(address):
+                value = {'lovelace': utxo['amount']}
+                for (asset, quantity) in utxo['assets'].items():
+                    (policy, name) = (asset.split('.') + [''])[0:2]
+                    value.setdefault(policy, {})[name] = quantity
+                outputs['{}#{}'.format(utxo['tx-hash'], utxo['tx-ix'])] = {'address': address, 'datum': None, 'value': value}
+        return outputs
+
+    def format_utxo_json_tx_in(self, tx_ins: List[str]) -> Dict:
+        """
+        The --out-file of cardano-cli query utxo --tx-in, only the outputs
+        that are unspent.
+        """
+
+        with self.lock:
+            rows = []
+            for tx_in in tx_ins:
+                (tx_hash, tx_ix) = tx_in.split('#')
+                row = self.connection.execute('select tx_out.address from tx_out '
+                                              'inner join tx on tx_out.tx_id = tx.id '
+                                              'left join tx_in on tx_in.tx_out_id = tx_out.tx_id and tx_in.tx_out_index = tx_out."index" '
+                                              'where tx.hash = ? and tx_out."index" = ? and tx_in.id is null',
+                                              (bytes.fromhex(tx_hash), int(tx_ix))).fetchone()
+                if row != None:
+                    rows.append((tx_in, row[0]))
+
+        outputs = {}
+        for (tx_in, address) in rows:
+            utxo = self.format_utxo_json([address])
+            outputs[tx_in] = utxo[tx_in]
+        return outputs
+
+    def get_output(self, tx_hash: str, tx_ix: int) -> Tuple[int, int, Dict]:
+        """
+        (tx id, value, assets) of an unspent output
+        """
+
+        row = self.connection.execute('select tx_out.tx_id, tx_out.value, tx_out.id from tx_out '
+                                      'inner join tx on tx_out.tx_id = tx.id '
+                                      'where tx.hash = ? and tx_out."index" = ?', (bytes.fromhex(tx_hash), tx_ix)).fetchone()
+        if row == None:
+            raise Exception('BadInputsUTxO, {}#{} does not exist'.format(tx_hash, tx_ix))
+
+        spent = self.connection.execute('select id from tx_in where tx_out_id = ? and tx_out_index = ?', (row[0], tx_ix)).fetchone()
+        if spent != None:
+            raise Exception('BadInputsUTxO, {}#{} is spent'.format(tx_hash, tx_ix))
+
+        assets = {}
+        for (policy, name, quantity) in self.connection.execute('select multi_asset.policy, multi_asset.name, ma_tx_out.quantity from ma_tx_out '
+                                                                'inner join multi_asset on ma_tx_out.ident = multi_asset.id '
+                                                                'where ma_tx_out.tx_out_id = ?', (row[2],)):
+            assets[format_asset(policy, name)] = quantity
+        return (row[0], row[1], assets)
+
+    def get_asset_ident(self, asset: str) -> int:
+        # an empty token name is just the policy id
+        (policy, name) = [bytes.fromhex(value) for value in (asset.split('.') + [''])[0:2]]
+        row = self.connection.execute('select id from multi_asset where policy = ? and name = ?', (policy, name)).fetchone()
+        if row != None:
+            return row[0]
+
+        # db-sync stores the CIP-14 fingerprint, a stand-in is enough here
+        fingerprint = 'asset' + hashlib.blake2b(policy + name, digest_size=20).hexdigest()
+        return self.connection.execute('insert into multi_asset (policy, name, fingerprint) values (?, ?, ?)',
+                                       (policy, name, fingerprint)).lastrowid
+
+    def add_block(self) -> int:
+        slot = get_slot()
+        block_no = self.connection.execute('select count(*) from block').fetchone()[0] + 1
+        block_hash = hashlib.blake2b('block {} {}'.format(block_no, time.time()).encode(), digest_size=32).digest()
+        return self.connection.execute('insert into block (hash, epoch_no, slot_no, block_no, time) values (?, ?, ?, ?, ?)',
+                                       (block_hash, slot // EPOCH_LENGTH, slot, block_no,
+                                        get_block_time(slot).isoformat(' '))).lastrowid
+
+    def add_tx(self, block_id: int, body: Dict) -> str:
+        """
+        Validate and add a transaction body to a block.  Must be called in a
+        transaction on the connection.
+        """
+
+        tx_hash = get_txid(body)
+        if body.get('invalid-hereafter') != None and get_slot() >= body['invalid-hereafter']:
+            raise Exception('OutsideValidityIntervalUTxO, slot {} >= {}'.format(get_slot(), body['invalid-hereafter']))
+
+        inputs = []
+        input_value = 0
+        input_assets = {}
+        for tx_in in body['inputs']:
+            (tx_hash_in, tx_ix_in) = tx_in.split('#')
+            (tx_id, value, assets) = self.get_output(tx_hash_in, int(tx_ix_in))
+            inputs.append((tx_id, int(tx_ix_in)))
+            input_value += value
+            for (asset, quantity) in assets.items():
+                input_assets[asset] = input_assets.get(asset, 0) + quantity
+
+        output_value = body['fee'] + sum([output['amount'] for output in body['outputs']])
+        if input_value != output_value:
+            raise Exception('ValueNotConservedUTxO, inputs {} != outputs + fee {}'.format(input_value, output_value))
+
+        balance = dict(input_assets)
+        for (asset, quantity) in body.get('mint', {}).items():
+            balance[asset] = balance.get(asset, 0) + quantity
+        for output in body['outputs']:
+            for (asset, quantity) in output['assets'].items():
+                balance[asset] = balance.get(asset, 0) - quantity
+        if any([quantity != 0 for quantity in balance.values()]):
+            raise Exception('ValueNotConservedUTxO, assets {}'.format({k: v for (k, v) in balance.items() if v != 0}))
+
+        tx_id = self.connection.execute('insert into tx (hash, block_id, fee) values (?, ?, ?)',
+                                        (bytes.fromhex(tx_hash), block_id, body['fee'])).lastrowid
+        for (tx_out_id, tx_out_index) in inputs:
+            self.connection.execute('insert into tx_in (tx_in_id, tx_out_id, tx_out_index) values (?, ?, ?)', (tx_id, tx_out_id, tx_out_index))
+        for (index, output) in enumerate(body['outputs']):
+            out_id = self.connection.execute('insert into tx_out (tx_id, "index", address, value, address_has_script) values (?, ?, ?, ?, 0)',
+                                             (tx_id, index, output['address'], output['amount'])).lastrowid
+            for (asset, quantity) in output['assets'].items():
+                self.connection.execute('insert into ma_tx_out (quantity, tx_out_id, ident) values (?, ?, ?)',
+                                        (quantity, out_id, self.get_asset_ident(asset)))
+        for (asset, quantity) in body.get('mint', {}).items():
+            self.connection.execute('insert into ma_tx_mint (quantity, tx_id, ident) values (?, ?, ?)',
+                                    (quantity, tx_id, self.get_asset_ident(asset)))
+        for (key, value) in body.get('metadata', {}).items():
+            self.connection.execute('insert into tx_metadata (key, json, tx_id) values (?, ?, ?)',
+                                    (int(key), json.dumps(value), tx_id))
+        return tx_hash
+
+    def submit(self, body: Dict, witness_count: int) -> str:
+        with open(PROTOCOL_PARAMETERS_FILE, 'r') as file:
+            min_fee = get_min_fee(body, witness_count, json.load(file))
+        if body['fee'] < min_fee:
+            raise Exception('FeeTooSmallUTxO, fee {} < min fee {}'.format(body['fee'], min_fee))
+
+        with self.lock:
+            try:
+                self.connection.execute('begin immediate')
+                block_id = self.add_block()
+                tx_hash = self.add_tx(block_id, body)
+                self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                raise e
+        return tx_hash
+
+    def add_payment(self, buyer_address: str, address: str, amount: int) -> str:
+        """
+        Fund a buyer from nowhere and pay amount from the buyer to address in
+        one block, like a payment from a wallet with a single UTXO.
+
+        @return The hash of the payment transaction
+        """
+
+        with self.lock:
+            try:
+                self.connection.execute('begin immediate')
+                block_id = self.add_block()
+                funding = {'inputs': [], 'outputs': [{'address': buyer_address, 'amount': amount + 200000, 'assets': {}}],
+                           'fee': 0, 'nonce': os.urandom(8).hex()}
+                funding_hash = self.add_tx_unchecked(block_id, funding)
+                payment = {'inputs': ['{}#0'.format(funding_hash)],
+                           'outputs': [{'address': address, 'amount': amount, 'assets': {}}],
+                           'fee': 200000}
+                payment_hash = self.add_tx(block_id, payment)
+                self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                raise e
+        return payment_hash
+
+    def add_tx_unchecked(self, block_id: int, body: Dict) -> str:
+        tx_hash = get_txid(body)
+        tx_id = self.connection.execute('insert into tx (hash, block_id, fee) values (?, ?, ?)',
+                                        (bytes.fromhex(tx_hash), block_id, body['fee'])).lastrowid
+        for (index, output) in enumerate(body['outputs']):
+            self.connection.execute('insert into tx_out (tx_id, "index", address, value, address_has_script) values (?, ?, ?, ?, 0)',
+                                    (tx_id, index, output['address'], output['amount']))
+        return tx_hash
+
+class SqliteCursor:
+    def __init__(self, connection: 'SqliteConnection'):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql: str, parameters=None) -> None:
+        self.rows = self.connection.execute(sql)
+
+    def fetchone(self):
+        if len(self.rows) == 0:
+            return None
+        return self.rows[0]
+
+    def fetchall(self) -> List:
+        return list(self.rows)
+
+    def close(self) -> None:
+        pass
+
+class SqliteConnection:
+    """
+    Lets Database run its PostgreSQL queries on the chain.  Only the bytea
+    literals and the index column, a keyword in SQLite, need translating.
+    """
+
+    BYTEA = re.compile(r"'\\x([0-9a-fA-F]*)'")
+    INDEX = re.compile(r'\.index\b')
+
+    def __init__(self, chain: Chain):
+        self.chain = chain
+
+    def execute(self, sql: str) -> List:
+        sql = SqliteConnection.BYTEA.sub(r"X'\1'", sql)
+        sql = SqliteConnection.INDEX.sub('."index"', sql)
+        with self.chain.lock:
+            return self.chain.connection.execute(sql).fetchall()
+
+    def cursor(self) -> SqliteCursor:
+        return SqliteCursor(self)
+
+    def close(self) -> None:
+        pass
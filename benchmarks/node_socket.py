@@ -0,0 +1,134 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: node_socket.py
+Author: SuperKK
+
+A stand-in for the cardano-node socket that answers node-to-client messages
+from a fixture.  Each request from the client is looked up by its
+mini-protocol and exact CBOR bytes and the fixture's response, if any, is
+sent back.  A request not in the fixture closes the connection, like a node
+does on a protocol error.
+
+The fixture is a JSON file:
+
+    {"exchanges": [{"protocol": 7, "request": "<cbor hex>", "response": "<cbor hex>" | null}, ...]}
+"""
+
+from typing import Dict, List
+import json
+import logging
+import os
+import socketserver
+import threading
+
+from tcr.node_client import decode_header, encode_message, get_item_end, HEADER_SIZE
+
+logger = logging.getLogger('node-socket')
+
+def load_exchanges(filename: str) -> Dict:
+    with open(filename, 'r') as file:
+        fixture = json.load(file)
+
+    exchanges = {}
+    for exchange in fixture['exchanges']:
+        response = exchange['response']
+        exchanges[(exchange['protocol'], bytes.fromhex(exchange['request']))] = None if response == None else bytes.fromhex(response)
+    return exchanges
+
+class ReplayHandler(socketserver.BaseRequestHandler):
+    def receive_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if len(chunk) == 0:
+                return None
+            data += chunk
+        return bytes(data)
+
+    def handle(self):
+        buffers = {}
+        while True:
+            header = self.receive_exactly(HEADER_SIZE)
+            if header == None:
+                return
+            (protocol, length) = decode_header(header)
+            payload = self.receive_exactly(length)
+            if payload == None:
+                return
+
+            buffer = buffers.get(protocol, b'') + payload
+            end = get_item_end(buffer)
+            while end != None:
+                (message, buffer) = (buffer[:end], buffer[end:])
+                self.server.requests.append((protocol, message))
+                if not (protocol, message) in self.server.exchanges:
+                    logger.error('Not in the fixture, protocol {}: {}'.format(protocol, message.hex()))
+                    return
+
+                response = self.server.exchanges[(protocol, message)]
+                if response != None:
+                    self.request.sendall(encode_message(protocol, response, responder=True))
+                end = get_item_end(buffer)
+            buffers[protocol] = buffer
+
+class ReplayServer:
+    """
+    Serve a fixture on a unix socket from a background thread.
+    """
+
+    def __init__(self, socket_path: str, exchanges_file: str):
+        self.socket_path = socket_path
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, ReplayHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.exchanges = load_exchanges(exchanges_file)
+        self.server.requests = []
+        self.thread = None
+
+    def get_requests(self) -> List:
+        """
+        @return (protocol, message) of each request received, in order
+        """
+
+        return list(self.server.requests)
+
+    def start(self) -> None:
+        self.server.server_bind()
+        self.server.server_activate()
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.1,), daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,334 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: run.py
+Author: SuperKK
+
+Benchmarks of the mint hot path.  cardano-cli is replaced by a stub that
+prints fixed output and db-sync by a connection that returns fixed rows,
+so the numbers cover the minter's own work plus one process start per
+cardano-cli call.
+
+    python3 -m benchmarks.run --output=benchmark_results.json
+
+Each run is appended to the output file and compared to the previous run.
+"""
+
+from typing import Callable, Dict, List
+import argparse
+import datetime
+import logging
+import os
+import platform
+import json
+import statistics
+import subprocess
+import time
+import traceback
+
+from tcr.metadata_list import MetadataAllocator, MetadataList
+from tcr.mint_control import MintController
+from tcr.node_client import NodeClient
+from tcr.sales import Sales
+from tcr.wallet import Wallet
+import tcr.tcr
+
+from benchmarks.node_socket import ReplayServer
+from benchmarks.workspace import Workspace, BENCHMARKS_DIRECTORY, DROP_NAME, NETWORK, PAYMENT_AMOUNT, POLICY_NAME
+
+logger = logging.getLogger('benchmarks')
+
+def measure(name: str, function: Callable, iterations: int = 1, operations: int = 1, setup: Callable = None) -> Dict:
+    """
+    Time function over a number of iterations.
+
+    @param operations The number of operations done by one call of function,
+                      used for the throughput.
+    @param setup Called before each iteration, not timed.
+    """
+
+    times = []
+    for i in range(iterations):
+        if setup != None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    mean = statistics.mean(times)
+    result = {'name': name,
+              'iterations': iterations,
+              'operations': operations,
+              'mean-seconds': mean,
+              'median-seconds': statistics.median(times),
+              'min-seconds': min(times),
+              'max-seconds': max(times),
+              'operations-per-second': operations / mean if mean > 0 else None}
+    logger.info('{}: {:.6f}s'.format(name, mean))
+    return result
+
+def bench_query_utxos(payments: int, iterations: int) -> Dict:
+    with Workspace(payments=payments) as workspace:
+        cardano = workspace.get_cardano()
+        wallet = workspace.get_wallet()
+        address = wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT)
+
+        def query():
+            (utxos, lovelace) = cardano.query_utxos(wallet, [address])
+            if len(utxos) != payments:
+                raise Exception('query_utxos, expected {} UTXOs got {}'.format(payments, len(utxos)))
+
+        return measure('query_utxos[{}]'.format(payments), query, iterations, payments)
+
+def bench_node_client_query_utxos(iterations: int) -> Dict:
+    """
+    query_utxos over one node socket connection, answered from a fixture,
+    to compare with a cardano-cli process per query.
+    """
+
+    with Workspace() as workspace:
+        session_file = os.path.join(BENCHMARKS_DIRECTORY, 'fixtures', 'node', 'session.json')
+        with ReplayServer(workspace.get_path('node.socket'), session_file):
+            node_client = NodeClient(NETWORK, workspace.get_path('node.socket'))
+            cardano = workspace.get_cardano()
+            cardano.set_node_client(node_client)
+            address = 'addr_test1vzsm9s75uhmqwxpf8f94cmt737g2rvkr6njlvpcc9yaykhqec8tru'
+
+            def query():
+                (utxos, lovelace) = cardano.query_utxos(None, [address])
+                if len(utxos) != 2:
+                    raise Exception('query_utxos, expected 2 UTXOs got {}'.format(len(utxos)))
+
+            try:
+                return measure('NodeClient.query_utxos[2]', query, iterations, 2)
+            finally:
+                node_client.close()
+
+def bench_mint_nft(iterations: int) -> Dict:
+    with Workspace(payments=1, nfts=1) as workspace:
+        cardano = workspace.get_cardano()
+        database = workspace.get_database()
+        wallet = workspace.get_wallet()
+        sales = Sales(NETWORK, DROP_NAME)
+        (utxos, lovelace) = cardano.query_utxos(wallet, [wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT)])
+        utxos = cardano.query_utxos_time(database, utxos)
+        metadata_file = MetadataList(workspace.get_metadata_set_file()).get_next_files(1)[0]
+
+        def mint():
+            tx_id = tcr.tcr.mint_nft(cardano, database, wallet,
+                                     Wallet.ADDRESS_INDEX_MINT,
+                                     POLICY_NAME,
+                                     {'utxo': utxos[0], 'count': 1, 'refund': 0},
+                                     metadata_file,
+                                     sales)
+            if tx_id == None:
+                raise Exception('mint_nft, no transaction id')
+
+        def reset():
+            sales.remove_utxo(utxos[0]['tx-hash'], utxos[0]['tx-ix'])
+            sales.add_utxo(utxos[0]['tx-hash'], utxos[0]['tx-ix'], utxos[0]['amount'], 1)
+
+        return measure('mint_nft', mint, iterations, 1, reset)
+
+class DrainingController(MintController):
+    """
+    Drains process_incoming_payments once every payment has a result.
+    """
+
+    def __init__(self, payments: int):
+        super().__init__()
+        self.payments = payments
+        self.results = 0
+
+    def add_result(self, utxo: Dict, result: str, tokens: List[str] = [], txid: str = None) -> None:
+        super().add_result(utxo, result, tokens, txid)
+        if result != 'minted':
+            raise Exception('process_incoming_payments, payment {}#{} {}'.format(utxo['tx-hash'], utxo['tx-ix'], result))
+
+        self.results += 1
+        if self.results == self.payments:
+            self.drain()
+
+def bench_process_incoming_payments(payments: int, workers: int) -> Dict:
+    with Workspace(payments=payments, nfts=payments) as workspace:
+        cardano = workspace.get_cardano()
+        database = workspace.get_database()
+        wallet = workspace.get_wallet()
+
+        def process():
+            tcr.tcr.process_incoming_payments(cardano, database, wallet,
+                                              POLICY_NAME,
+                                              DROP_NAME,
+                                              workspace.get_metadata_set_file(),
+                                              {PAYMENT_AMOUNT: 1},
+                                              workers,
+                                              DrainingController(payments))
+
+        return measure('process_incoming_payments[{},workers={}]'.format(payments, workers), process, 1, payments)
+
+def bench_sales(entries: int, iterations: int) -> List[Dict]:
+    with Workspace() as workspace:
+        hashes = [('{:064x}'.format(i), 0) for i in range(entries)]
+        sales = Sales(NETWORK, DROP_NAME)
+
+        def add():
+            for (hash, ix) in hashes:
+                sales.add_utxo(hash, ix, PAYMENT_AMOUNT, 1)
+
+        def contains():
+            # the last entries are the slowest to find
+            for (hash, ix) in hashes[-100:]:
+                if not sales.contains(hash, ix):
+                    raise Exception('Sales, missing {}'.format(hash))
+
+        def set_output_txid():
+            for (hash, ix) in hashes[-100:]:
+                sales.set_output_txid(hash, ix, hash)
+
+        results = [measure('Sales.add_utxo[{}]'.format(entries), add, 1, entries),
+                   measure('Sales.contains[{}]'.format(entries), contains, iterations, 100),
+                   measure('Sales.set_output_txid[{}]'.format(entries), set_output_txid, iterations, 100),
+                   measure('Sales.commit[{}]'.format(entries), sales.commit, iterations)]
+        return results
+
+def bench_metadata_list(files: int, iterations: int) -> List[Dict]:
+    with Workspace(nfts=files) as workspace:
+        metadata_list = MetadataList(workspace.get_metadata_set_file())
+
+        def commit():
+            metadata_list.peek_next_file()
+            metadata_list.commit()
+
+        results = [measure('MetadataList.commit[{}]'.format(files), commit, iterations)]
+
+        allocator = MetadataAllocator(MetadataList(workspace.get_metadata_set_file()))
+
+        def allocate_commit():
+            allocator.commit(allocator.allocate(1))
+
+        results.append(measure('MetadataAllocator.commit[{}]'.format(files), allocate_commit, iterations))
+        return results
+
+def run(payments: List[int], workers: int, iterations: int) -> Dict:
+    results = []
+    results.append(bench_query_utxos(1, iterations))
+    results.append(bench_query_utxos(1000, iterations))
+    results.append(bench_node_client_query_utxos(iterations))
+    results.append(bench_mint_nft(iterations))
+    for count in payments:
+        results.append(bench_process_incoming_payments(count, workers))
+    results.extend(bench_sales(10000, iterations))
+    results.extend(bench_metadata_list(10000, iterations))
+
+    return {'date-time': datetime.datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
+            'git-commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'workers': workers,
+            'results': results}
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        return None
+
+def load_history(filename: str) -> List[Dict]:
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError as e:
+        return []
+
+def format_comparison(current: Dict, previous: Dict) -> List[str]:
+    previous_results = {}
+    if previous != None:
+        previous_results = {result['name']: result for result in previous['results']}
+
+    lines = ['{:<48} {:>12} {:>14} {:>9}'.format('Benchmark', 'Mean (s)', 'Ops/s', 'Change')]
+    for result in current['results']:
+        change = ''
+        if result['name'] in previous_results:
+            before = previous_results[result['name']]['mean-seconds']
+            if before > 0:
+                change = '{:+.1f}%'.format(100 * (result['mean-seconds'] - before) / before)
+        lines.append('{:<48} {:>12.6f} {:>14.1f} {:>9}'.format(result['name'],
+                                                                result['mean-seconds'],
+                                                                result['operations-per-second'] or 0,
+                                                                change))
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--output', required=False,
+                                    action='store',
+                                    metavar='FILENAME',
+                                    default='benchmark_results.json',
+                                    help='Append the results to this file, default = benchmark_results.json')
+    parser.add_argument('--payments', required=False,
+                                      action='store',
+                                      metavar='COUNT',
+                                      type=int,
+                                      nargs='+',
+                                      default=[10, 100, 1000],
+                                      help='Queued payments for process_incoming_payments, default = 10 100 1000')
+    parser.add_argument('--workers', required=False,
+                                     action='store',
+                                     metavar='VALUE',
+                                     type=int,
+                                     default=4,
+                                     help='Mint workers for process_incoming_payments, default = 4')
+    parser.add_argument('--iterations', required=False,
+                                        action='store',
+                                        metavar='VALUE',
+                                        type=int,
+                                        default=20,
+                                        help='Iterations of each benchmark, default = 20')
+
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    history = load_history(output)
+    current = run(args.payments, args.workers, args.iterations)
+    for line in format_comparison(current, history[-1] if len(history) > 0 else None):
+        print(line)
+
+    history.append(current)
+    with open(output, 'w') as file:
+        file.write(json.dumps(history, indent=4))
+    print('Results: {}'.format(output))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
@@ -0,0 +1,263 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: simulator.py
+Author: SuperKK
+
+Load test of process_incoming_payments against a simulated chain.  The
+cardano-cli shim in benchmarks/shim and Database both use a SQLite chain with
+the db-sync tables, so every payment is minted, submitted and checked end to
+end without a node.  Buyer payments arrive at a configurable rate:
+
+    python3 -m benchmarks.simulator --payments=500 --rate=20 --workers=4
+
+Arrivals are a Poisson process, --burst sends that many payments at each
+arrival.  With --address-pool each buyer opens a checkout session and pays
+its own derived address.
+"""
+
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+import traceback
+
+from tcr.address_pool import AddressPool
+from tcr.database import Database
+from tcr.sales import Sales
+from tcr.wallet import Wallet
+import tcr.tcr
+
+from benchmarks.chain import Chain, SqliteConnection, get_slot
+from benchmarks.run import DrainingController
+from benchmarks.workspace import Workspace, BENCHMARKS_DIRECTORY, DROP_NAME, NETWORK, PAYMENT_AMOUNT, POLICY_ID, POLICY_NAME
+
+logger = logging.getLogger('simulator')
+
+SHIM_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'shim')
+
+class PaymentStorm:
+    """
+    Sends buyer payments to an address from a background thread, or to the
+    address of a new checkout session per buyer if given an AddressPool.
+    """
+
+    def __init__(self, chain: Chain, address: str, payments: int, rate: float, burst: int = 1, amount: int = PAYMENT_AMOUNT, seed: int = None,
+                 address_pool: AddressPool = None):
+        self.chain = chain
+        self.address = address
+        self.address_pool = address_pool
+        self.payments = payments
+        self.rate = rate
+        self.burst = burst
+        self.amount = amount
+        self.random = random.Random(seed)
+        self.sent = []
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='payment-storm', daemon=True)
+
+    def get_buyer_address(self, i: int) -> str:
+        return 'addr_test1qbuyer{:08d}'.format(i)
+
+    def run(self) -> None:
+        try:
+            while len(self.sent) < self.payments and not self.stopped.is_set():
+                for i in range(min(self.burst, self.payments - len(self.sent))):
+                    buyer = self.get_buyer_address(len(self.sent))
+                    address = self.address
+                    if self.address_pool != None:
+                        address = self.address_pool.open_session('checkout-{}'.format(len(self.sent)), buyer)['address']
+                    tx_hash = self.chain.add_payment(buyer, address, self.amount)
+                    self.sent.append({'buyer': buyer, 'tx-hash': tx_hash, 'time': time.time()})
+
+                if self.rate > 0:
+                    self.stopped.wait(self.random.expovariate(self.rate / self.burst))
+        except Exception as e:
+            logger.exception('PaymentStorm')
+            self.error = e
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+class Simulator(Workspace):
+    """
+    A workspace with the cardano-cli shim and a simulated chain in place of
+    the fixtures.
+    """
+
+    def __enter__(self):
+        super().__enter__()
+        self.chain_file = self.get_path('chain.db')
+        self.chain = Chain(self.chain_file)
+        os.environ['PATH'] = SHIM_DIRECTORY + os.pathsep + os.environ['PATH']
+        os.environ['SIMULATOR_CHAIN'] = self.chain_file
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.chain.close()
+        return super().__exit__(exc_type, exc_value, exc_traceback)
+
+    def get_policy_slot(self) -> int:
+        return get_slot() + 365 * 24 * 3600
+
+    def get_database(self) -> Database:
+        database = Database(self.get_path('db_sync.ini'))
+        database.connection = SqliteConnection(self.chain)
+        return database
+
+def check_deliveries(chain: Chain, sent: List[Dict]) -> int:
+    """
+    The number of buyers holding exactly one NFT from the policy.
+    """
+
+    delivered = 0
+    for payment in sent:
+        tokens = 0
+        for utxo in chain.get_utxos(payment['buyer']):
+            tokens += sum([quantity for (asset, quantity) in utxo['assets'].items() if asset.startswith(POLICY_ID)])
+        if tokens == 1:
+            delivered += 1
+    return delivered
+
+def run_load_test(payments: int, rate: float, workers: int, burst: int = 1, seed: int = None, use_address_pool: bool = False) -> Dict:
+    with Simulator(payments=0, nfts=payments) as simulator:
+        cardano = simulator.get_cardano()
+        database = simulator.get_database()
+        wallet = simulator.get_wallet()
+        controller = DrainingController(payments)
+        address_pool = None
+        if use_address_pool:
+            address_pool = AddressPool(wallet, simulator.get_path('address_pool.json'))
+
+        storm = PaymentStorm(simulator.chain,
+                             wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT),
+                             payments, rate, burst, seed=seed, address_pool=address_pool)
+        start = time.time()
+        storm.start()
+        try:
+            tcr.tcr.process_incoming_payments(cardano, database, wallet,
+                                              POLICY_NAME,
+                                              DROP_NAME,
+                                              simulator.get_metadata_set_file(),
+                                              {PAYMENT_AMOUNT: 1},
+                                              workers,
+                                              controller,
+                                              address_pool)
+        finally:
+            storm.stop()
+        elapsed = time.time() - start
+
+        if storm.error != None:
+            raise storm.error
+
+        sales = Sales(NETWORK, DROP_NAME)
+        latencies = []
+        sent = {payment['tx-hash']: payment for payment in storm.sent}
+        for item in sales.sales['transactions']:
+            if item['input-hash'] in sent and 'out-txid' in item:
+                latencies.append(item['time']['epoch'] - sent[item['input-hash']]['time'])
+        latencies.sort()
+
+        return {'payments': payments,
+                'rate': rate,
+                'burst': burst,
+                'workers': workers,
+                'address-pool': use_address_pool,
+                'elapsed-seconds': elapsed,
+                'payments-per-second': payments / elapsed,
+                'minted': len(latencies),
+                'delivered': check_deliveries(simulator.chain, storm.sent),
+                'latency-median-seconds': latencies[len(latencies) // 2] if len(latencies) > 0 else None,
+                'latency-max-seconds': latencies[-1] if len(latencies) > 0 else None}
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--payments', required=False,
+                                      action='store',
+                                      metavar='COUNT',
+                                      type=int,
+                                      default=100,
+                                      help='Number of buyer payments, default = 100')
+    parser.add_argument('--rate', required=False,
+                                  action='store',
+                                  metavar='VALUE',
+                                  type=float,
+                                  default=10,
+                                  help='Payments per second, 0 sends them all at once, default = 10')
+    parser.add_argument('--burst', required=False,
+                                   action='store',
+                                   metavar='COUNT',
+                                   type=int,
+                                   default=1,
+                                   help='Payments sent together at each arrival, default = 1')
+    parser.add_argument('--workers', required=False,
+                                     action='store',
+                                     metavar='VALUE',
+                                     type=int,
+                                     default=4,
+                                     help='Mint workers, default = 4')
+    parser.add_argument('--address-pool', required=False,
+                                          action='store_true',
+                                          default=False,
+                                          help='Pay a derived address per buyer')
+    parser.add_argument('--seed', required=False,
+                                  action='store',
+                                  metavar='VALUE',
+                                  type=int,
+                                  default=None,
+                                  help='Seed for the payment arrivals')
+    parser.add_argument('--output', required=False,
+                                    action='store',
+                                    metavar='FILENAME',
+                                    default=None,
+                                    help='Also write the results to a JSON file')
+
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output != None else None
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run_load_test(args.payments, args.rate, args.workers, args.burst, args.seed, args.address_pool)
+    print(json.dumps(result, indent=4))
+    if output != None:
+        with open(output, 'w') as file:
+            file.write(json.dumps(result, indent=4))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
@@ -0,0 +1,91 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: stub_database.py
+Author: SuperKK
+
+A stand-in for a psycopg2 connection to db-sync that returns fixed rows.
+Each set of rows is matched by a fragment of the SQL so Database runs its real
+queries and parses the rows exactly as it would from db-sync.
+"""
+
+from typing import Dict, List
+import datetime
+import json
+import threading
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        if 'bytes' in value:
+            return memoryview(bytes.fromhex(value['bytes']))
+    return value
+
+class StubCursor:
+    def __init__(self, connection: 'StubConnection'):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql: str, parameters=None) -> None:
+        self.rows = self.connection.find_rows(sql)
+
+    def fetchone(self):
+        if len(self.rows) == 0:
+            return None
+        return self.rows[0]
+
+    def fetchall(self) -> List:
+        return list(self.rows)
+
+    def close(self) -> None:
+        pass
+
+class StubConnection:
+    def __init__(self, fixtures: List[Dict]):
+        self.fixtures = [(fixture['match'], [tuple([decode_value(value) for value in row]) for row in fixture['rows']])
+                         for fixture in fixtures]
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_file(filename: str) -> 'StubConnection':
+        with open(filename, 'r') as file:
+            return StubConnection(json.load(file)['queries'])
+
+    def find_rows(self, sql: str) -> List:
+        with self.lock:
+            self.queries += 1
+
+        for (match, rows) in self.fixtures:
+            if match in sql:
+                return rows
+
+        raise Exception('StubConnection, no rows for: {}'.format(sql))
+
+    def cursor(self) -> StubCursor:
+        return StubCursor(self)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,189 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: workspace.py
+Author: SuperKK
+
+A throwaway working directory laid out the way the minter expects: a policy,
+a wallet, a drop with metadata files, a db-sync config and the cardano-cli
+fixtures.  The cardano-cli stub is put first on the PATH while the
+workspace is entered.
+"""
+
+from typing import Dict, List
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from tcr.cardano import Cardano
+from tcr.database import Database
+from tcr.hdkey import ExtendedPrivateKey, format_text_envelope
+from tcr.wallet import Wallet
+
+from benchmarks.stub_database import StubConnection
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'fixtures')
+STUB_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'stub')
+
+NETWORK = 'testnet'
+POLICY_NAME = 'bench_policy'
+POLICY_ID = '4c7e0e1ad5f5a1c8d6b1d9e4b2f0a6c3e8d7f1b2a3c4d5e6f7a8b9c0'
+WALLET_NAME = 'bench'
+DROP_NAME = 'bench_drop'
+PAYMENT_AMOUNT = 10000000
+MINT_ADDRESS = 'addr_test1vpg6q8d9q7z3rw5rd8f0x4m2k9t7y6u5h4j3g2f1d0s9a8q7w6e5r'
+
+class Workspace:
+    def __init__(self, payments: int = 1, nfts: int = 1):
+        """
+        @param payments The number of payments in the mint address UTXOs
+        @param nfts The number of metadata files in the drop
+        """
+
+        self.payments = payments
+        self.nfts = nfts
+        self.directory = None
+        self.cwd = None
+        self.environ = None
+
+    def get_path(self, *names) -> str:
+        return os.path.join(self.directory, *names)
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix='tcr_bench_')
+        self.cwd = os.getcwd()
+        self.environ = dict(os.environ)
+
+        os.chdir(self.directory)
+        self.create_policy()
+        self.create_wallet()
+        self.create_drop()
+        self.create_cardano_cli_fixtures()
+        os.makedirs('transaction')
+        with open('db_sync.ini', 'w') as file:
+            file.write('[postgresql]\nhost=localhost\ndatabase=cexplorer\nuser=bench\n')
+
+        os.environ['PATH'] = STUB_DIRECTORY + os.pathsep + os.environ.get('PATH', '')
+        os.environ['CARDANO_CLI_FIXTURES'] = self.get_path('cardano-cli')
+        os.environ['TESTNET_CARDANO_NODE_SOCKET_PATH'] = self.get_path('node.socket')
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        os.chdir(self.cwd)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.directory)
+        return False
+
+    def get_policy_slot(self) -> int:
+        """
+        The slot the policy locks at, after the tip in the fixtures.
+        """
+
+        return 64000000
+
+    def create_policy(self) -> None:
+        os.makedirs('policy/{}'.format(NETWORK))
+        with open('policy/{}/{}.script'.format(NETWORK, POLICY_NAME), 'w') as file:
+            file.write(json.dumps({'type': 'all',
+                                   'scripts': [{'type': 'before', 'slot': self.get_policy_slot()},
+                                               {'type': 'sig', 'keyHash': POLICY_ID[0:56]}]}, indent=4))
+        with open('policy/{}/{}.id'.format(NETWORK, POLICY_NAME), 'w') as file:
+            file.write(POLICY_ID)
+        # a fixed key as written by cardano-cli address key-gen
+        with open('policy/{}/{}.skey'.format(NETWORK, POLICY_NAME), 'w') as file:
+            file.write(format_text_envelope('PaymentSigningKeyShelley_ed25519',
+                                            '5820' + hashlib.sha256(POLICY_NAME.encode()).hexdigest()))
+
+    def create_wallet(self) -> None:
+        os.makedirs('wallet/{}'.format(NETWORK))
+        wallet = Wallet(WALLET_NAME, NETWORK)
+
+        # a fixed root key so derived addresses (AddressPool) are repeatable
+        root_key = ExtendedPrivateKey(bytes(31) + b'\x40', bytes(32), bytes(32))
+        with open(wallet.root_private_key_file, 'w') as file:
+            file.write(root_key.to_bech32('root_xsk'))
+
+        for idx in [Wallet.ADDRESS_INDEX_ROOT, Wallet.ADDRESS_INDEX_MINT]:
+            for filename in [wallet.payment_address_file_base.format(idx),
+                             wallet.delegated_payment_address_file_base.format(idx)]:
+                with open(filename, 'w') as file:
+                    file.write(MINT_ADDRESS)
+            payment_key = root_key.derive_path('{}/0/{}'.format(Wallet.ACCOUNT_PATH, idx))
+            with open(wallet.signing_key_file_base.format(idx), 'w') as file:
+                file.write(payment_key.to_signing_key_file())
+            with open(wallet.verification_key_file_base.format(idx), 'w') as file:
+                file.write(payment_key.get_public().to_verification_key_file())
+
+    def get_metadata_directory(self) -> str:
+        return 'nft/{}/{}/nft_metadata'.format(NETWORK, DROP_NAME)
+
+    def get_metadata_set_file(self) -> str:
+        return self.get_path('nft', NETWORK, DROP_NAME, 'metadata_set.json')
+
+    def create_drop(self) -> None:
+        os.makedirs(self.get_metadata_directory())
+        files = []
+        for i in range(self.nfts):
+            token_name = 'BENCH{:05d}'.format(i)
+            filename = self.get_path(self.get_metadata_directory(), '{}.json'.format(token_name))
+            with open(filename, 'w') as file:
+                file.write(json.dumps({'721': {POLICY_ID: {token_name: {'name': 'Bench #{}'.format(i),
+                                                                        'image': 'ipfs://QmbQDvKJeo2NgGcGdnUiUFibTzuKNK5Uij8jPsSd4kFo3s',
+                                                                        'mediaType': 'image/png',
+                                                                        'properties': {'Rarity': 'Common', 'Set': 'Bench'}}}}}, indent=4))
+            files.append(filename)
+
+        with open(self.get_metadata_set_file(), 'w') as file:
+            file.write(json.dumps({'files': files}, indent=4))
+
+    def get_payment_hashes(self) -> List[str]:
+        return [hashlib.sha256('payment {}'.format(i).encode()).hexdigest() for i in range(self.payments)]
+
+    def create_cardano_cli_fixtures(self) -> None:
+        shutil.copytree(os.path.join(FIXTURES_DIRECTORY, 'cardano-cli'), 'cardano-cli')
+
+        # the fixture's table with a row for each payment
+        with open(os.path.join(FIXTURES_DIRECTORY, 'cardano-cli', 'query_utxo.txt'), 'r') as file:
+            lines = file.read().splitlines()
+        with open('cardano-cli/query_utxo.txt', 'w') as file:
+            file.write('\n'.join(lines[0:2]) + '\n')
+            for tx_hash in self.get_payment_hashes():
+                file.write('{}     0        {} lovelace + TxOutDatumNone\n'.format(tx_hash, PAYMENT_AMOUNT))
+
+    def get_cardano(self) -> Cardano:
+        cardano = Cardano(NETWORK, self.get_path('protocol.json'))
+        cardano.query_protocol_parameters()
+        return cardano
+
+    def get_database(self) -> Database:
+        database = Database(self.get_path('db_sync.ini'))
+        database.connection = StubConnection.from_file(os.path.join(FIXTURES_DIRECTORY, 'db_sync.json'))
+        return database
+
+    def get_wallet(self) -> Wallet:
+        return Wallet(WALLET_NAME, NETWORK)
@@ -0,0 +1,88 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: address.py
+Author: SuperKK
+
+Shelley addresses (CIP-19) built from key hashes, as cardano-address does.
+Networks use the names the rest of the code uses, 'testnet' and 'mainnet'.
+"""
+
+import hashlib
+
+from tcr import bech32
+
+NETWORK_TAGS = {
+    'mainnet': 1,
+    'testnet': 0
+}
+
+HEADER_BASE = 0x00
+HEADER_ENTERPRISE = 0x60
+HEADER_REWARD = 0xe0
+
+def get_network_tag(network: str) -> int:
+    if not network in NETWORK_TAGS:
+        raise Exception('Unknown network: {}'.format(network))
+    return NETWORK_TAGS[network]
+
+def get_key_hash(public_key: bytes) -> bytes:
+    return hashlib.blake2b(public_key, digest_size=28).digest()
+
+def get_address_hrp(network: str) -> str:
+    return 'addr' if get_network_tag(network) == 1 else 'addr_test'
+
+def get_stake_hrp(network: str) -> str:
+    return 'stake' if get_network_tag(network) == 1 else 'stake_test'
+
+def enterprise_address(network: str, payment_key_hash: bytes) -> str:
+    header = HEADER_ENTERPRISE | get_network_tag(network)
+    return bech32.encode(get_address_hrp(network), bytes([header]) + payment_key_hash)
+
+def base_address(network: str, payment_key_hash: bytes, stake_key_hash: bytes) -> str:
+    header = HEADER_BASE | get_network_tag(network)
+    return bech32.encode(get_address_hrp(network), bytes([header]) + payment_key_hash + stake_key_hash)
+
+def reward_address(network: str, stake_key_hash: bytes) -> str:
+    header = HEADER_REWARD | get_network_tag(network)
+    return bech32.encode(get_stake_hrp(network), bytes([header]) + stake_key_hash)
+
+def delegate_address(payment_address: str, stake_key_hash: bytes) -> str:
+    """
+    Add a stake key to an enterprise address, as cardano-address address
+    delegation does.
+    """
+
+    (hrp, data) = bech32.decode(payment_address)
+    if data[0] & 0xf0 != HEADER_ENTERPRISE or len(data) != 29:
+        raise Exception('Not a key enterprise address: {}'.format(payment_address))
+
+    header = HEADER_BASE | (data[0] & 0x0f)
+    return bech32.encode(hrp, bytes([header]) + data[1:29] + stake_key_hash)
+
+def get_payment_key_hash(address: str) -> bytes:
+    (hrp, data) = bech32.decode(address)
+    if data[0] & 0xf0 not in [HEADER_BASE, HEADER_ENTERPRISE]:
+        raise Exception('Not a key payment address: {}'.format(address))
+    return data[1:29]
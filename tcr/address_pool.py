@@ -0,0 +1,220 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+File: address_pool.py
+Author: SuperKK
+
+A pool of derived payment addresses, one per checkout session.  Each
+session is given its own address of the minting wallet so a payment is
+attributed by the address it arrives at, without looking up the inputs of
+the payment transaction in db-sync.
+"""
+
+from typing import Dict, List
+import json
+import logging
+import os
+import threading
+import time
+
+from tcr.wallet import Wallet
+
+logger = logging.getLogger('address-pool')
+
+class AddressPool:
+    """
+    Sessions are saved to a JSON file.  In memory the pool keeps an index of
+    address -> session so attributing a payment is a dictionary lookup.
+
+    A session is closed once it is paid, or when it expires without a
+    payment.  Its addresses are still polled for a grace period after that
+    so a second or late payment is found and refunded.
+    """
+
+    # indexes below this are the wallet's fixed addresses
+    FIRST_INDEX = 1000
+
+    def __init__(self,
+                 wallet: Wallet,
+                 filename: str,
+                 block_size: int = 100,
+                 expiry: int = 24 * 3600,
+                 grace: int = 7 * 24 * 3600):
+        """
+        @param block_size Addresses are derived ahead of use in blocks of
+                          this many indexes.
+        @param expiry Seconds an unpaid session stays open.
+        @param grace Seconds a closed session's addresses are still polled.
+        """
+
+        self.wallet = wallet
+        self.filename = filename
+        self.block_size = block_size
+        self.expiry = expiry
+        self.grace = grace
+        self.next_index = AddressPool.FIRST_INDEX
+        self.derived_index = AddressPool.FIRST_INDEX
+        self.sessions = {}
+        self.addresses = {}
+        self.lock = threading.Lock()
+
+        if os.path.isfile(filename):
+            with open(filename, 'r') as file:
+                data = json.load(file)
+
+            self.next_index = data['next-index']
+            self.derived_index = data['derived-index']
+            for session in data['sessions']:
+                self.add(session)
+
+    def add(self, session: Dict) -> None:
+        self.sessions[session['session']] = session
+        for payment_address in session['addresses']:
+            self.addresses[payment_address] = session
+
+    def save(self) -> None:
+        data = {'next-index': self.next_index,
+                'derived-index': self.derived_index,
+                'sessions': list(self.sessions.values())}
+
+        temp_file = '{}.{}'.format(self.filename, os.getpid())
+        with open(temp_file, 'w') as file:
+            json.dump(data, file, indent=4)
+        os.replace(temp_file, self.filename)
+
+    def derive(self, count: int) -> None:
+        """
+        Derive the next count addresses ahead of use.
+        """
+
+        indexes = list(range(self.derived_index, self.derived_index + count))
+        logger.debug('Derive addresses: {} - {}'.format(indexes[0], indexes[-1]))
+        if not self.wallet.setup_addresses(indexes):
+            logger.error('Failed to derive addresses: {} - {}'.format(indexes[0], indexes[-1]))
+            raise Exception('Failed to derive addresses: {} - {}'.format(indexes[0], indexes[-1]))
+        self.derived_index += count
+
+    def open_session(self, session_id: str, destination: str) -> Dict:
+        """
+        Give a checkout session its own payment address.  Opening a session
+        that is already open returns it again.
+
+        @param destination Where the NFTs or a refund for the session are sent.
+        """
+
+        with self.lock:
+            if session_id in self.sessions:
+                return self.sessions[session_id]
+
+            if self.next_index >= self.derived_index:
+                self.derive(self.block_size)
+
+            idx = self.next_index
+            session = {'session': session_id,
+                       'index': idx,
+                       'destination': destination,
+                       'address': self.wallet.get_payment_address(idx, delegated=True),
+                       'addresses': [self.wallet.get_payment_address(idx, delegated=True),
+                                     self.wallet.get_payment_address(idx, delegated=False)],
+                       'opened': round(time.time()),
+                       'closed': None}
+            self.next_index += 1
+            self.add(session)
+            self.save()
+
+        logger.info('Open session: {}, index: {}, address: {}'.format(session_id, idx, session['address']))
+        return session
+
+    def close_session(self, session_id: str) -> None:
+        """
+        Close a paid session.  Its addresses are polled for the grace period
+        and a payment to them is refunded.
+        """
+
+        with self.lock:
+            if self.sessions[session_id]['closed'] == None:
+                self.sessions[session_id]['closed'] = round(time.time())
+                self.save()
+
+    def is_closed(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions[session_id]['closed'] != None
+
+    def expire_sessions(self) -> int:
+        """
+        Close the sessions that were not paid within the expiry.
+
+        @return The number of sessions expired
+        """
+
+        now = round(time.time())
+        expired = 0
+        with self.lock:
+            for session in self.sessions.values():
+                if session['closed'] == None and session['opened'] + self.expiry <= now:
+                    session['closed'] = now
+                    session['expired'] = True
+                    expired += 1
+                    logger.info('Session expired: {}, address: {}'.format(session['session'], session['address']))
+            if expired > 0:
+                self.save()
+        return expired
+
+    def get_session(self, payment_address: str) -> Dict:
+        """
+        @return The session for a payment address or None
+        """
+
+        return self.addresses.get(payment_address)
+
+    def get_addresses(self) -> List[str]:
+        """
+        The addresses to poll, those of the open sessions and of the sessions
+        closed within the grace period.  Unpaid sessions past the expiry are
+        closed first.
+        """
+
+        self.expire_sessions()
+        now = round(time.time())
+        with self.lock:
+            return [payment_address for session in self.sessions.values()
+                                    if session['closed'] == None or session['closed'] + self.grace > now
+                                    for payment_address in session['addresses']]
+
+    def attribute(self, utxo: Dict) -> bool:
+        """
+        Tag a UTXO from Cardano.query_utxos_batch with the session it was paid
+        to: 'from-address' is where the NFTs are sent and 'signing-index' the
+        key that spends it.
+
+        @return True if the UTXO belongs to a session
+        """
+
+        session = self.get_session(utxo.get('address'))
+        if session == None:
+            return False
+
+        utxo['session'] = session['session']
+        utxo['from-address'] = session['destination']
+        utxo['signing-index'] = session['index']
+        return True
@@ -0,0 +1,106 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: bech32.py
+Author: SuperKK
+
+Bech32 (BIP-173) encoding as used for Cardano addresses and keys.  Cardano
+strings are longer than the 90 characters BIP-173 allows so there is no
+length limit.
+"""
+
+from typing import List, Tuple
+
+CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+GENERATOR = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+
+def polymod(values: List[int]) -> int:
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= GENERATOR[i] if ((top >> i) & 1) else 0
+    return chk
+
+def hrp_expand(hrp: str) -> List[int]:
+    return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+
+def create_checksum(hrp: str, data: List[int]) -> List[int]:
+    values = hrp_expand(hrp) + data
+    value = polymod(values + [0, 0, 0, 0, 0, 0]) ^ 1
+    return [(value >> 5 * (5 - i)) & 31 for i in range(6)]
+
+def convert_bits(data: bytes, from_bits: int, to_bits: int, pad: bool = True) -> List[int]:
+    accumulator = 0
+    bits = 0
+    result = []
+    maxv = (1 << to_bits) - 1
+    for value in data:
+        if value < 0 or (value >> from_bits):
+            raise Exception('Bech32, invalid value: {}'.format(value))
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & maxv)
+
+    if pad:
+        if bits > 0:
+            result.append((accumulator << (to_bits - bits)) & maxv)
+    elif bits >= from_bits or ((accumulator << (to_bits - bits)) & maxv):
+        raise Exception('Bech32, invalid padding')
+
+    return result
+
+def encode(hrp: str, data: bytes) -> str:
+    values = convert_bits(data, 8, 5)
+    return hrp + '1' + ''.join([CHARSET[value] for value in values + create_checksum(hrp, values)])
+
+def decode(bech: str) -> Tuple[str, bytes]:
+    """
+    @return (human readable part, data)
+    """
+
+    if bech.lower() != bech and bech.upper() != bech:
+        raise Exception('Bech32, mixed case: {}'.format(bech))
+
+    bech = bech.lower()
+    position = bech.rfind('1')
+    if position < 1 or position + 7 > len(bech):
+        raise Exception('Bech32, invalid separator: {}'.format(bech))
+
+    hrp = bech[:position]
+    if any([ord(x) < 33 or ord(x) > 126 for x in hrp]):
+        raise Exception('Bech32, invalid human readable part: {}'.format(bech))
+
+    try:
+        values = [CHARSET.index(x) for x in bech[position + 1:]]
+    except ValueError as e:
+        raise Exception('Bech32, invalid character: {}'.format(bech))
+
+    if polymod(hrp_expand(hrp) + values) != 1:
+        raise Exception('Bech32, invalid checksum: {}'.format(bech))
+
+    return (hrp, bytes(convert_bits(values[:-6], 5, 8, False)))
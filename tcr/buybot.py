@@ -33,6 +33,7 @@ import os
 import logging
 import argparse
 import tcr.nftmint
+import tcr.preflight
 import tcr.command
 import time
 
@@ -86,8 +87,13 @@ def main():
                                    action='store_true',
                                    default=False,
                                    help='Create wallet addresses')
+    parser.add_argument('--verbose', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Also log the db-sync database size (slow)')
     args = parser.parse_args()
     network = args.network
+    verbose = args.verbose
     src_name = args.src
     dst_name = args.dst
     amount = args.amount
@@ -108,21 +114,9 @@ def main():
     logger.info('Copyright 2021-2022 The Card Room')
     logger.info('Network: {}'.format(network))
 
-    tip = cardano.query_tip()
-    cardano.query_protocol_parameters()
-    tip_slot = tip['slot']
-
     database = Database('{}.ini'.format(network))
-    database.open()
-    meta = database.query_chain_metadata()
-    db_size = database.query_database_size()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    logger.info('Database Chain Metadata: {} / {}'.format(meta[1], meta[2]))
-    logger.info('Database Size: {}'.format(db_size))
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, verbose=verbose)
+    tcr.preflight.log_results(logger, preflight)
 
     src_wallet = Wallet(src_name, cardano.get_network())
 
@@ -187,22 +181,20 @@ def main():
             send_payment = repeat
     elif nft != None:
         if '.' not in nft:
-            # send all the NFTs matching the policy ID with minimum ADA
+            # send all the NFTs matching the policy ID with minimum ADA, split
+            # into as many transactions as needed
             (utxos, total_lovelace) = cardano.query_utxos(src_wallet)
             tx_nfts = {}
             for utxo in utxos:
                 for asset in utxo['assets']:
-                    # TODO: figure out how to calculat the current size of a transaction
-                    # and if it would be too big or not.  For now, 300 assets seems
-                    # near the maximum.
-                    if len(tx_nfts) > 300:
-                        break
-
                     if asset.startswith(nft):
-                        tx_nfts[asset] = utxo['assets'][asset]
+                        tx_nfts[asset] = tx_nfts.get(asset, 0) + utxo['assets'][asset]
 
             if len(tx_nfts) > 0:
-                tx_id = tcr.tcr.transfer_nft(cardano, src_wallet, tx_nfts, dst_wallet)
+                tx_ids = tcr.tcr.transfer_nfts(cardano, src_wallet, tx_nfts, dst_wallet)
+                logger.info('Transfer NFTs, {} transactions: {}'.format(len(tx_ids), tx_ids))
+                # the last transaction spends the ones before it
+                tx_id = tx_ids[-1]
             else:
                 tx_id = None
                 logger.error('No matching NFT assets found')
@@ -28,14 +28,19 @@ Author: SuperKK
 from typing import Dict, List, Tuple
 
 import json
+import os
 from tcr.command import Command
-import copy
 from tcr.nft import Nft
+from tcr.node_client import NodeClient
+from tcr.signer import Signer
 from tcr.wallet import Wallet
 import logging
 from tcr.database import Database
 import time
 import binascii
+import hashlib
+import tempfile
+from tcr import cbor
 
 logger = logging.getLogger('cardano')
 
@@ -46,26 +51,108 @@ class Cardano:
         self.network = network
         self.protocol_parameters_file = protocol_parameters_file
         self.protocol_parameters = {}
+        self.protocol_parameters_epoch = None
+        self.policy_invalid_hereafter = {}
+        self.signer = Signer()
+        self.node_client = None
 
     def get_network(self) -> str:
         return self.network
 
+    def set_node_client(self, node_client: NodeClient) -> None:
+        """
+        Query and submit over a connection to the node socket held by
+        node_client rather than with cardano-cli.
+        """
+
+        self.node_client = node_client
+
     def query_tip(self) -> Dict:
+        if self.node_client != None:
+            return self.node_client.query_tip()
+
         command = ['cardano-cli', 'query', 'tip']
         output = Command.run(command, self.network)
         tip = json.loads(output)
         return tip
 
-    def query_protocol_parameters(self) -> Dict:
-        self.protocol_parameters = {}
-
-        command = ['cardano-cli', 'query', 'protocol-parameters', '--out-file', self.protocol_parameters_file]
-        Command.run(command, self.network)
+    def query_protocol_parameters_node(self) -> Dict:
+        """
+        Query the protocol parameters from the node.  The file is written
+        aside and moved into place so transactions being built from it never
+        see a partial file.
+        """
+
+        query_file = '{}.{}'.format(self.protocol_parameters_file, os.getpid())
+        if self.node_client != None:
+            with open(query_file, 'w') as file:
+                json.dump(self.node_client.query_protocol_parameters(), file, indent=4)
+        else:
+            command = ['cardano-cli', 'query', 'protocol-parameters', '--out-file', query_file]
+            Command.run(command, self.network)
+        os.replace(query_file, self.protocol_parameters_file)
 
         with open(self.protocol_parameters_file, "r") as file:
             self.protocol_parameters = json.loads(file.read())
         return self.protocol_parameters
 
+    def get_protocol_parameters_epoch_file(self) -> str:
+        return '{}.epoch'.format(self.protocol_parameters_file)
+
+    def query_protocol_parameters(self, epoch: int = None) -> Dict:
+        """
+        Protocol parameters only change at an epoch boundary.  Reuse the
+        parameters file from an earlier query in the same epoch, otherwise
+        query the node.
+
+        @param epoch The current epoch, queried from the tip if not given
+        """
+
+        if epoch == None:
+            epoch = self.query_tip().get('epoch')
+            if epoch == None:
+                # older nodes do not report the epoch, nothing to cache by
+                return self.query_protocol_parameters_node()
+
+        try:
+            with open(self.get_protocol_parameters_epoch_file(), 'r') as file:
+                cached_epoch = int(file.read())
+
+            if cached_epoch == epoch:
+                with open(self.protocol_parameters_file, 'r') as file:
+                    self.protocol_parameters = json.loads(file.read())
+                self.protocol_parameters_epoch = epoch
+                logger.debug('Protocol parameters cached for epoch {}'.format(epoch))
+                return self.protocol_parameters
+        except (FileNotFoundError, ValueError) as e:
+            pass
+
+        self.query_protocol_parameters_node()
+        with open(self.get_protocol_parameters_epoch_file(), 'w') as file:
+            file.write(str(epoch))
+        self.protocol_parameters_epoch = epoch
+        logger.info('Protocol parameters updated for epoch {}'.format(epoch))
+        return self.protocol_parameters
+
+    def refresh_protocol_parameters(self, epoch: int = None) -> bool:
+        """
+        Reload the protocol parameters if the epoch changed since they were
+        loaded.  Long running processes call this so fees are not calculated
+        from the previous epoch's parameters.
+
+        @return True if the parameters were reloaded
+        """
+
+        if epoch == None:
+            epoch = self.query_tip().get('epoch')
+
+        if epoch == None or epoch == self.protocol_parameters_epoch:
+            return False
+
+        logger.info('Epoch changed: {} -> {}'.format(self.protocol_parameters_epoch, epoch))
+        self.query_protocol_parameters(epoch)
+        return True
+
     def get_protocol_parameters_file(self) -> str:
         return self.protocol_parameters_file
 
@@ -97,6 +184,13 @@ class Cardano:
                                  wallet.get_payment_address(Wallet.ADDRESS_INDEX_MUTATE_REQUEST, delegated=True)])
 
             addresses = list(addresses_set)
+
+        if self.node_client != None:
+            utxos = self.node_client.query_utxos([address for address in addresses if address != None])
+            for utxo in utxos:
+                del utxo['address']
+            return (utxos, sum([utxo['amount'] for utxo in utxos]))
+
         total_lovelace = 0
         utxos = []
 
@@ -119,7 +213,11 @@ class Cardano:
                             asset_amount = int(cells[x+1])
                             asset = cells[x+2].split('.')
                             asset_policy = asset[0]
-                            asset_name = asset_policy + '.' + binascii.unhexlify(asset[1]).decode('utf-8')
+                            if len(asset) == 1 or asset[1] == '':
+                                # royalty tokens have an empty name
+                                asset_name = asset_policy
+                            else:
+                                asset_name = asset_policy + '.' + binascii.unhexlify(asset[1]).decode('utf-8')
                             assets[asset_name] = asset_amount
 
                 tx_out_datum_hash = cells[len(cells) - 1]
@@ -128,6 +226,89 @@ class Cardano:
 
         return (utxos, total_lovelace)
 
+    def query_utxos_batch(self,
+                          addresses: List[str],
+                          batch_size: int = 100) -> List[Dict]:
+        """
+        Query the UTXOs at many addresses with one cardano-cli call per batch.
+        Unlike query_utxos each UTXO includes the 'address' it is held at.
+
+        @param batch_size The number of addresses to query per call
+        """
+
+        if self.node_client != None:
+            return self.node_client.query_utxos(addresses)
+
+        utxos = []
+        (handle, query_file) = tempfile.mkstemp(suffix='.json', prefix='utxo_')
+        os.close(handle)
+        try:
+            for start in range(0, len(addresses), batch_size):
+                command = ['cardano-cli', 'query', 'utxo', '--out-file', query_file]
+                for payment_address in addresses[start:start + batch_size]:
+                    command.extend(['--address', payment_address])
+                Command.run(command, self.network)
+
+                with open(query_file, 'r') as file:
+                    outputs = json.load(file)
+
+                for (utxo, output) in outputs.items():
+                    (tx_hash, tx_ix) = utxo.split('#')
+                    assets = {}
+                    for (policy, tokens) in output['value'].items():
+                        if policy == 'lovelace':
+                            continue
+                        for (name, amount) in tokens.items():
+                            if name == '':
+                                assets[policy] = amount
+                            else:
+                                assets[policy + '.' + binascii.unhexlify(name).decode('utf-8')] = amount
+
+                    datum_hash = output.get('datumhash')
+                    utxos.append({'tx-hash': tx_hash,
+                                  'tx-ix': int(tx_ix),
+                                  'amount': output['value']['lovelace'],
+                                  'assets': assets,
+                                  'tx-out-datum-hash': 'TxOutDatumNone' if datum_hash == None else datum_hash,
+                                  'address': output['address']})
+        finally:
+            os.remove(query_file)
+
+        return utxos
+
+    def query_utxo_unspent(self, tx_hash: str, tx_ix: int) -> bool:
+        """
+        @return True if the output is unspent at the tip
+        """
+
+        if self.node_client != None:
+            return len(self.node_client.query_utxos_by_tx_in([(tx_hash, tx_ix)])) > 0
+
+        (handle, query_file) = tempfile.mkstemp(suffix='.json', prefix='utxo_')
+        os.close(handle)
+        try:
+            command = ['cardano-cli', 'query', 'utxo', '--tx-in', '{}#{}'.format(tx_hash, tx_ix), '--out-file', query_file]
+            Command.run(command, self.network)
+
+            with open(query_file, 'r') as file:
+                outputs = json.load(file)
+        finally:
+            os.remove(query_file)
+
+        return '{}#{}'.format(tx_hash, tx_ix) in outputs
+
+    def query_mempool_contains(self, tx_id: str) -> bool:
+        """
+        @return True if the transaction is waiting in the node's mempool
+        """
+
+        if self.node_client != None:
+            return self.node_client.query_mempool_contains(tx_id)
+
+        command = ['cardano-cli', 'query', 'tx-mempool', 'tx-exists', tx_id]
+        output = Command.run(command, self.network)
+        return json.loads(output)['exists']
+
     def query_utxos_time(self, database: Database, utxos: List):
         for utxo in utxos:
             (txtime, txslotno) = (None, None)
@@ -223,10 +404,24 @@ class Cardano:
         return None
 
     def get_transaction_id(self, transaction_signed_file: str) -> str:
-        command = ['cardano-cli', 'transaction', 'txid', '--tx-file', transaction_signed_file]
-        # TODO, error checking.  missing file?  unsigned file?
-        output = Command.run(command, None)
-        return output
+        """
+        The Blake2b-256 hash of the transaction body, the same as cardano-cli
+        transaction txid.  The body is the first item of a signed
+        transaction or the whole of a body file.
+        """
+
+        with open(transaction_signed_file, 'r') as file:
+            envelope = json.load(file)
+        if not 'cborHex' in envelope:
+            logger.error('Transaction ID, not a transaction file: {}'.format(transaction_signed_file))
+            raise Exception('Transaction ID, not a transaction file: {}'.format(transaction_signed_file))
+
+        data = bytes.fromhex(envelope['cborHex'])
+        body = data
+        if data[0] >> 5 == cbor.MAJOR_ARRAY:
+            body = cbor.split_array(data)[0]
+
+        return hashlib.blake2b(body, digest_size=32).hexdigest()
 
     def calculate_min_required_utxo(self, address, amount, assets):
         minimum = 1000000
@@ -430,40 +625,44 @@ class Cardano:
 
         return True
 
-    # burning is just like minting except the value is negative
-    def create_burn_nft_transaction_file(self,
-                                         utxo_inputs: List,
-                                         address_outputs: List[Dict],
-                                         fee_amount: int,
-                                         policy_name: str,
-                                         token_names: str,
-                                         nft_token_amount: int,
-                                         transaction_file: str) -> str:
-        # copy some stuff so it doesn't get modified to the caller
-        address_outputs_cp = copy.deepcopy(address_outputs)
-
-        policy_id = self.get_policy_id(policy_name)
-        burn = ''
-        for token_name in token_names:
-            if len(burn) == 0:
-                burn += '{} {}.{}'.format(-1*nft_token_amount, policy_id, token_name.encode().hex())
+    def get_policy_invalid_hereafter(self, policy_name: str) -> int:
+        """
+        The 'before' slot of a policy script, read once.
+        """
+
+        if not policy_name in self.policy_invalid_hereafter:
+            invalid_hereafter = 0
+            with open('policy/{}/{}.script'.format(self.network, policy_name), "r") as file:
+                script = json.loads(file.read())
+                for s in script['scripts']:
+                    if s['type'] == 'before':
+                        invalid_hereafter = s['slot']
+            self.policy_invalid_hereafter[policy_name] = invalid_hereafter
+
+        return self.policy_invalid_hereafter[policy_name]
+
+    def create_burn_transaction_file(self,
+                                     utxo_inputs: List,
+                                     address_outputs: List[Dict],
+                                     fee_amount: int,
+                                     policy_name: str,
+                                     burn_assets: Dict[str, int],
+                                     transaction_file: str) -> str:
+        """
+        Build a transaction that burns any number of tokens of one policy.
+
+        @param address_outputs The outputs without the burned tokens
+        @param burn_assets The quantity to burn of each asset, 'policy.name'
+                           or just 'policy' for an empty token name.
+        """
+
+        burn = []
+        for (asset, quantity) in burn_assets.items():
+            components = asset.split('.', 1)
+            if len(components) == 1:
+                burn.append('{} {}'.format(-1 * quantity, components[0]))
             else:
-                burn += '+{} {}.{}'.format(-1*nft_token_amount, policy_id, token_name.encode().hex())
-            # remove the nft being burned from the output
-            if token_name == '':
-                # special case for royalty tokens
-                full_name = policy_id
-            else:
-                full_name = '{}.{}'.format(policy_id, token_name)
-            index = len(address_outputs_cp)-1
-            address_outputs_cp[index]['assets'][full_name] -= nft_token_amount
-
-        invalid_hereafter = 0
-        with open('policy/{}/{}.script'.format(self.network, policy_name), "r") as file:
-            script = json.loads(file.read())
-            for s in script['scripts']:
-                if s['type'] == 'before':
-                    invalid_hereafter = s['slot']
+                burn.append('{} {}.{}'.format(-1 * quantity, components[0], components[1].encode().hex()))
 
         command = ['cardano-cli', 'transaction', 'build-raw', '--fee', '{}'.format(fee_amount)]
 
@@ -471,14 +670,15 @@ class Cardano:
             command.append('--tx-in')
             command.append('{}#{}'.format(utxo['tx-hash'], utxo['tx-ix']))
 
-        for address in address_outputs_cp:
+        for address in address_outputs:
             assets_string = ''
             for asset in address['assets']:
                 if address['assets'][asset] != 0:
-                    components = asset.split('.')
-                    policy_id = components[0]
-                    token_name = components[1].encode().hex()
-                    assets_string += '+{} {}.{}'.format(address['assets'][asset], policy_id, token_name)
+                    components = asset.split('.', 1)
+                    if len(components) == 1:
+                        assets_string += '+{} {}'.format(address['assets'][asset], components[0])
+                    else:
+                        assets_string += '+{} {}.{}'.format(address['assets'][asset], components[0], components[1].encode().hex())
 
             # Note that if the amount is zero (or just too small) but there is a
             # valid asset in the output then this transaction will fail when
@@ -487,9 +687,9 @@ class Cardano:
                 command.append('--tx-out')
                 command.append('{}+{}{}'.format(address['address'], address['amount'], assets_string))
 
-        command.extend(['--mint={}'.format(burn),
+        command.extend(['--mint={}'.format('+'.join(burn)),
                         '--mint-script-file', 'policy/{}/{}.script'.format(self.network, policy_name),
-                        '--invalid-hereafter', '{}'.format(invalid_hereafter),
+                        '--invalid-hereafter', '{}'.format(self.get_policy_invalid_hereafter(policy_name)),
                         '--out-file', transaction_file])
 
         output = Command.run(command, None)
@@ -513,6 +713,16 @@ class Cardano:
                          unsigned_transaction_file: str,
                          signing_key_file: List[str],
                          signed_transaction_file: str) -> str:
+        """
+        Sign in process when build-raw wrote an unwitnessed transaction,
+        otherwise, e.g. a body file from an older cardano-cli, with
+        cardano-cli.
+        """
+
+        if self.signer.can_sign(unsigned_transaction_file):
+            self.signer.sign_transaction(unsigned_transaction_file, signing_key_file, signed_transaction_file)
+            return ''
+
         command = ['cardano-cli', 'transaction', 'sign', '--tx-body-file', unsigned_transaction_file]
         for file in signing_key_file:
             command.extend(['--signing-key-file', file])
@@ -523,9 +733,30 @@ class Cardano:
 
     def submit_transaction(self,
                            transaction_file: str) -> str:
+        """
+        @return The txid or None if the transaction was rejected.  Raises if
+                the outcome is unknown.
+        """
 
         tx_id = self.get_transaction_id(transaction_file)
 
+        if self.node_client != None:
+            with open(transaction_file, 'r') as file:
+                transaction = bytes.fromhex(json.load(file)['cborHex'])
+            (accepted, reason) = self.node_client.submit_transaction(transaction)
+            if accepted == None:
+                # never submitted again, it may be accepted and a second
+                # submit would be rejected as spent
+                output_count = len(cbor.loads(cbor.split_array(transaction)[0])[1])
+                if not self.node_client.contains_transaction(tx_id, output_count):
+                    logger.error('Submit, outcome unknown, {} not found: {}'.format(tx_id, reason))
+                    raise Exception('Submit, outcome unknown, {} not found: {}'.format(tx_id, reason))
+                logger.warning('Submit, {} found after: {}'.format(tx_id, reason))
+            elif not accepted:
+                logger.error('Error submitting transaction: {}'.format(reason))
+                tx_id = None
+            return tx_id
+
         command = ['cardano-cli', 'transaction', 'submit', '--tx-file', transaction_file]
         output = Command.run(command, self.network)
         if output != 'Transaction successfully submitted.':
@@ -0,0 +1,289 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: cbor.py
+Author: SuperKK
+
+CBOR (RFC 8949) encoding and decoding for the structures Cardano uses:
+integers, byte and text strings, arrays, maps, tags and simple values.  A
+hash such as a transaction id is taken over the exact bytes of an item, so
+items can also be split out of an encoding without re-encoding them.
+"""
+
+from typing import Any, List, Tuple
+import logging
+import struct
+
+logger = logging.getLogger('cbor')
+
+MAJOR_UNSIGNED = 0
+MAJOR_NEGATIVE = 1
+MAJOR_BYTES = 2
+MAJOR_TEXT = 3
+MAJOR_ARRAY = 4
+MAJOR_MAP = 5
+MAJOR_TAG = 6
+MAJOR_SIMPLE = 7
+
+INDEFINITE_INFO = 31
+BREAK = 0xff
+
+TAG_POSITIVE_BIGNUM = 2
+TAG_NEGATIVE_BIGNUM = 3
+
+class Tag:
+    """
+    A tagged item, e.g. 24 for embedded CBOR or 258 for a set.
+    """
+
+    def __init__(self, tag: int, value: Any):
+        self.tag = tag
+        self.value = value
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Tag) and self.tag == other.tag and self.value == other.value
+
+    def __hash__(self) -> int:
+        return hash((self.tag, freeze(self.value)))
+
+    def __repr__(self) -> str:
+        return 'Tag({}, {!r})'.format(self.tag, self.value)
+
+class Raw:
+    """
+    An item that is already encoded and is written as is.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+def freeze(value: Any) -> Any:
+    """
+    Arrays used as map keys are decoded as tuples so they can be hashed.
+    """
+
+    if isinstance(value, list):
+        return tuple([freeze(item) for item in value])
+    return value
+
+def encode_head(major: int, argument: int) -> bytes:
+    if argument < 24:
+        return bytes([(major << 5) | argument])
+    elif argument < 0x100:
+        return bytes([(major << 5) | 24, argument])
+    elif argument < 0x10000:
+        return bytes([(major << 5) | 25]) + argument.to_bytes(2, 'big')
+    elif argument < 0x100000000:
+        return bytes([(major << 5) | 26]) + argument.to_bytes(4, 'big')
+    return bytes([(major << 5) | 27]) + argument.to_bytes(8, 'big')
+
+def encode(value: Any, output: bytearray) -> None:
+    if isinstance(value, Raw):
+        output += value.data
+    elif isinstance(value, bool):
+        output.append(0xf5 if value else 0xf4)
+    elif value == None:
+        output.append(0xf6)
+    elif isinstance(value, int):
+        if value >= 0x10000000000000000:
+            encode(Tag(TAG_POSITIVE_BIGNUM, value.to_bytes((value.bit_length() + 7) // 8, 'big')), output)
+        elif value >= 0:
+            output += encode_head(MAJOR_UNSIGNED, value)
+        elif value < -0x10000000000000000:
+            magnitude = -1 - value
+            encode(Tag(TAG_NEGATIVE_BIGNUM, magnitude.to_bytes((magnitude.bit_length() + 7) // 8, 'big')), output)
+        else:
+            output += encode_head(MAJOR_NEGATIVE, -1 - value)
+    elif isinstance(value, float):
+        output.append(0xfb)
+        output += struct.pack('>d', value)
+    elif isinstance(value, (bytes, bytearray)):
+        output += encode_head(MAJOR_BYTES, len(value))
+        output += value
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        output += encode_head(MAJOR_TEXT, len(data))
+        output += data
+    elif isinstance(value, (list, tuple)):
+        output += encode_head(MAJOR_ARRAY, len(value))
+        for item in value:
+            encode(item, output)
+    elif isinstance(value, dict):
+        output += encode_head(MAJOR_MAP, len(value))
+        for (key, item) in value.items():
+            encode(key, output)
+            encode(item, output)
+    elif isinstance(value, Tag):
+        output += encode_head(MAJOR_TAG, value.tag)
+        encode(value.value, output)
+    else:
+        logger.error('CBOR, unable to encode: {}'.format(type(value)))
+        raise Exception('CBOR, unable to encode: {}'.format(type(value)))
+
+def dumps(value: Any) -> bytes:
+    output = bytearray()
+    encode(value, output)
+    return bytes(output)
+
+def decode_head(data: bytes, offset: int) -> Tuple[int, int, int]:
+    """
+    @return (major type, argument or None if indefinite, offset after the head)
+    """
+
+    if offset >= len(data):
+        logger.error('CBOR, unexpected end of data at: {}'.format(offset))
+        raise Exception('CBOR, unexpected end of data at: {}'.format(offset))
+
+    major = data[offset] >> 5
+    info = data[offset] & 0x1f
+    offset += 1
+    if info < 24:
+        return (major, info, offset)
+    elif info == INDEFINITE_INFO:
+        return (major, None, offset)
+    elif info > 27:
+        logger.error('CBOR, invalid additional information: {}'.format(info))
+        raise Exception('CBOR, invalid additional information: {}'.format(info))
+
+    size = 1 << (info - 24)
+    if offset + size > len(data):
+        logger.error('CBOR, unexpected end of data at: {}'.format(offset))
+        raise Exception('CBOR, unexpected end of data at: {}'.format(offset))
+    return (major, int.from_bytes(data[offset:offset + size], 'big'), offset + size)
+
+def decode_item(data: bytes, offset: int = 0) -> Tuple[Any, int]:
+    """
+    @return (The item at offset, the offset after it)
+    """
+
+    start = offset
+    (major, argument, offset) = decode_head(data, offset)
+    if major == MAJOR_UNSIGNED:
+        return (argument, offset)
+    elif major == MAJOR_NEGATIVE:
+        return (-1 - argument, offset)
+    elif major in [MAJOR_BYTES, MAJOR_TEXT]:
+        if argument == None:
+            chunks = []
+            while data[offset] != BREAK:
+                (chunk, offset) = decode_item(data, offset)
+                chunks.append(chunk)
+            offset += 1
+            if major == MAJOR_BYTES:
+                return (b''.join(chunks), offset)
+            return (''.join(chunks), offset)
+
+        value = bytes(data[offset:offset + argument])
+        if len(value) != argument:
+            logger.error('CBOR, unexpected end of data at: {}'.format(offset))
+            raise Exception('CBOR, unexpected end of data at: {}'.format(offset))
+        if major == MAJOR_TEXT:
+            return (value.decode('utf-8'), offset + argument)
+        return (value, offset + argument)
+    elif major == MAJOR_ARRAY:
+        items = []
+        while (argument == None and data[offset] != BREAK) or (argument != None and len(items) < argument):
+            (item, offset) = decode_item(data, offset)
+            items.append(item)
+        if argument == None:
+            offset += 1
+        return (items, offset)
+    elif major == MAJOR_MAP:
+        items = {}
+        count = 0
+        while (argument == None and data[offset] != BREAK) or (argument != None and count < argument):
+            (key, offset) = decode_item(data, offset)
+            (item, offset) = decode_item(data, offset)
+            items[freeze(key)] = item
+            count += 1
+        if argument == None:
+            offset += 1
+        return (items, offset)
+    elif major == MAJOR_TAG:
+        (value, offset) = decode_item(data, offset)
+        if argument == TAG_POSITIVE_BIGNUM:
+            return (int.from_bytes(value, 'big'), offset)
+        elif argument == TAG_NEGATIVE_BIGNUM:
+            return (-1 - int.from_bytes(value, 'big'), offset)
+        return (Tag(argument, value), offset)
+
+    # simple values and floats
+    info = data[start] & 0x1f
+    if info == 20:
+        return (False, offset)
+    elif info == 21:
+        return (True, offset)
+    elif info in [22, 23]:
+        return (None, offset)
+    elif info == 25:
+        return (struct.unpack('>e', data[start + 1:offset])[0], offset)
+    elif info == 26:
+        return (struct.unpack('>f', data[start + 1:offset])[0], offset)
+    elif info == 27:
+        return (struct.unpack('>d', data[start + 1:offset])[0], offset)
+
+    logger.error('CBOR, unsupported simple value: {}'.format(info))
+    raise Exception('CBOR, unsupported simple value: {}'.format(info))
+
+def loads(data: bytes) -> Any:
+    (value, offset) = decode_item(data, 0)
+    if offset != len(data):
+        logger.error('CBOR, {} bytes after the item'.format(len(data) - offset))
+        raise Exception('CBOR, {} bytes after the item'.format(len(data) - offset))
+    return value
+
+def split_array(data: bytes, offset: int = 0) -> List[bytes]:
+    """
+    The encoded items of the array at offset, as they appear in data.
+    """
+
+    (major, argument, offset) = decode_head(data, offset)
+    if major != MAJOR_ARRAY:
+        logger.error('CBOR, expected an array, major type: {}'.format(major))
+        raise Exception('CBOR, expected an array, major type: {}'.format(major))
+
+    items = []
+    while (argument == None and data[offset] != BREAK) or (argument != None and len(items) < argument):
+        (item, end) = decode_item(data, offset)
+        items.append(bytes(data[offset:end]))
+        offset = end
+    return items
+
+def split_map(data: bytes, offset: int = 0) -> List[Tuple[bytes, bytes]]:
+    """
+    The encoded keys and values of the map at offset, as they appear in data.
+    """
+
+    (major, argument, offset) = decode_head(data, offset)
+    if major != MAJOR_MAP:
+        logger.error('CBOR, expected a map, major type: {}'.format(major))
+        raise Exception('CBOR, expected a map, major type: {}'.format(major))
+
+    items = []
+    while (argument == None and data[offset] != BREAK) or (argument != None and len(items) < argument):
+        (key, key_end) = decode_item(data, offset)
+        (value, value_end) = decode_item(data, key_end)
+        items.append((bytes(data[offset:key_end]), bytes(data[key_end:value_end])))
+        offset = value_end
+    return items
@@ -0,0 +1,198 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: cid.py
+Author: SuperKK
+
+Compute IPFS content identifiers locally, the same way 'ipfs add' does with
+the default settings: fixed size 256 KiB chunks arranged in a balanced
+UnixFS / DAG-PB tree with at most 174 links per node.
+
+  - CIDv0 (Qm...) uses UnixFS file leaves, this is what infura returns for
+    /api/v0/add by default.
+  - CIDv1 (bafy... / bafk...) uses raw leaves, as 'ipfs add --cid-version=1'.
+"""
+
+from typing import List, Tuple
+import hashlib
+
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+MULTIHASH_SHA2_256 = 0x12
+
+UNIXFS_TYPE_FILE = 2
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BASE32_ALPHABET = 'abcdefghijklmnopqrstuvwxyz234567'
+
+def encode_varint(value: int) -> bytes:
+    data = bytearray()
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+def encode_field_varint(field: int, value: int) -> bytes:
+    return encode_varint(field << 3) + encode_varint(value)
+
+def encode_field_bytes(field: int, value: bytes) -> bytes:
+    return encode_varint((field << 3) | 2) + encode_varint(len(value)) + value
+
+def base58_encode(data: bytes) -> str:
+    value = int.from_bytes(data, 'big')
+    encoded = ''
+    while value > 0:
+        (value, remainder) = divmod(value, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+
+    for byte in data:
+        if byte != 0:
+            break
+        encoded = BASE58_ALPHABET[0] + encoded
+
+    return encoded
+
+def base32_encode(data: bytes) -> str:
+    # RFC 4648 lower case without padding, as used by multibase 'b'
+    bits = 0
+    value = 0
+    encoded = ''
+    for byte in data:
+        value = (value << 8) | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            encoded += BASE32_ALPHABET[(value >> bits) & 0x1F]
+
+    if bits > 0:
+        encoded += BASE32_ALPHABET[(value << (5 - bits)) & 0x1F]
+
+    return encoded
+
+def unixfs_data(file_data: bytes = None, filesize: int = 0, blocksizes: List[int] = []) -> bytes:
+    data = encode_field_varint(1, UNIXFS_TYPE_FILE)
+    if file_data != None and len(file_data) > 0:
+        data += encode_field_bytes(2, file_data)
+    data += encode_field_varint(3, filesize)
+    for blocksize in blocksizes:
+        data += encode_field_varint(4, blocksize)
+    return data
+
+def dag_pb_node(links: List[Tuple[bytes, int]], data: bytes) -> bytes:
+    """
+    Serialize a DAG-PB node.  Links are (cid bytes, cumulative size) and are
+    written before the data as required by the canonical encoding.
+    """
+
+    node = b''
+    for (cid, tsize) in links:
+        link = encode_field_bytes(1, cid) + encode_field_bytes(2, b'') + encode_field_varint(3, tsize)
+        node += encode_field_bytes(2, link)
+    node += encode_field_bytes(1, data)
+    return node
+
+def multihash(block: bytes) -> bytes:
+    return bytes([MULTIHASH_SHA2_256, 32]) + hashlib.sha256(block).digest()
+
+def cid_bytes(block: bytes, codec: int, version: int) -> bytes:
+    if version == 0:
+        return multihash(block)
+
+    return encode_varint(1) + encode_varint(codec) + multihash(block)
+
+def cid_to_string(cid: bytes, version: int) -> str:
+    if version == 0:
+        return base58_encode(cid)
+
+    return 'b' + base32_encode(cid)
+
+def read_chunks(filename: str):
+    with open(filename, 'rb') as file:
+        chunk = file.read(CHUNK_SIZE)
+        yield chunk
+        while len(chunk) == CHUNK_SIZE:
+            chunk = file.read(CHUNK_SIZE)
+            if len(chunk) > 0:
+                yield chunk
+
+def compute_chunks_cid(chunks, version: int = 0) -> str:
+    # Each entry in a level is (cid bytes, cumulative size, file size)
+    level = []
+    for chunk in chunks:
+        if version == 0:
+            block = dag_pb_node([], unixfs_data(chunk, len(chunk)))
+            level.append((cid_bytes(block, CODEC_DAG_PB, version), len(block), len(chunk)))
+        else:
+            level.append((cid_bytes(chunk, CODEC_RAW, version), len(chunk), len(chunk)))
+
+    if len(level) == 0:
+        # empty input, read_chunks always yields at least one chunk
+        level.append((cid_bytes(dag_pb_node([], unixfs_data()), CODEC_DAG_PB, version), 0, 0))
+
+    # A single chunk is its own root.  Otherwise group nodes into parents of
+    # up to MAX_LINKS children until one root is left, which gives the same
+    # tree as the balanced layout since only the last node per level is
+    # partially filled.
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level), MAX_LINKS):
+            children = level[i:i+MAX_LINKS]
+            filesize = sum([child[2] for child in children])
+            data = unixfs_data(filesize=filesize, blocksizes=[child[2] for child in children])
+            block = dag_pb_node([(child[0], child[1]) for child in children], data)
+            tsize = len(block) + sum([child[1] for child in children])
+            parents.append((cid_bytes(block, CODEC_DAG_PB, version), tsize, filesize))
+        level = parents
+
+    return cid_to_string(level[0][0], version)
+
+def compute_bytes_cid(data: bytes, version: int = 0) -> str:
+    chunks = [data[i:i+CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+    if len(chunks) == 0:
+        chunks = [b'']
+    return compute_chunks_cid(chunks, version)
+
+def compute_file_cid(filename: str, version: int = 0) -> str:
+    """
+    Return the CID 'ipfs add' would give filename.
+    """
+
+    return compute_chunks_cid(read_chunks(filename), version)
+
+def cid_version(cid: str) -> int:
+    if cid.startswith('Qm') and len(cid) == 46:
+        return 0
+
+    return 1
+
+def verify_file_cid(filename: str, cid: str) -> bool:
+    """
+    Check filename hashes to cid, computed with the same CID version.
+    """
+
+    return compute_file_cid(filename, cid_version(cid)) == cid
@@ -0,0 +1,471 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+File: coin_selection.py
+Author: SuperKK
+
+Choose the UTXOs that pay for a transaction's outputs.  Three selectors:
+
+    largest-first   the UTXOs holding the most of each asset, then the most ADA
+    random-improve  CIP-2, random UTXOs improved toward twice the target
+    multi-asset     the fewest UTXOs with the fewest extra assets, ADA-only
+                    UTXOs first so the change output stays small
+
+Every selection pays the outputs, the fee and the minimum ADA of the change
+output and is kept under maxTxSize.  Transaction sizes are estimated from
+the CBOR encoding of the inputs, outputs and witnesses.
+"""
+
+from typing import Dict, List, Tuple
+import logging
+import random
+
+logger = logging.getLogger('coin-selection')
+
+LARGEST_FIRST = 'largest-first'
+RANDOM_IMPROVE = 'random-improve'
+MULTI_ASSET = 'multi-asset'
+
+# Estimated CBOR sizes in bytes
+TX_OVERHEAD_SIZE = 60       # body, witness set and validity interval
+INPUT_SIZE = 40             # [tx hash, index]
+WITNESS_SIZE = 101          # [vkey, signature]
+ADDRESS_SIZE = 57           # base address, enterprise addresses are smaller
+OUTPUT_OVERHEAD_SIZE = 14   # array or map header, lovelace
+POLICY_SIZE = 31            # policy id and its asset map header
+ASSET_OVERHEAD_SIZE = 11    # asset name header and quantity
+
+# Babbage minimum UTXO, coinsPerUTxOByte * (160 + output size)
+MIN_UTXO_OVERHEAD = 160
+
+def split_asset(asset: str) -> Tuple[str, str]:
+    """
+    'policy.name' to (policy, name).  A token with an empty name, like the
+    royalty token, is just 'policy'.
+    """
+
+    if not '.' in asset:
+        return (asset, '')
+    return tuple(asset.split('.', 1))
+
+def get_policies(assets: Dict[str, int]) -> Dict[str, List[str]]:
+    policies = {}
+    for asset in assets:
+        (policy, name) = split_asset(asset)
+        policies.setdefault(policy, []).append(name)
+    return policies
+
+def estimate_value_size(assets: Dict[str, int]) -> int:
+    """
+    Size of the multi-asset part of a value.  Asset names are the utf-8
+    names used throughout, e.g. 'policy.name'.
+    """
+
+    size = 0
+    for (policy, names) in get_policies(assets).items():
+        size += POLICY_SIZE
+        for name in names:
+            size += ASSET_OVERHEAD_SIZE + len(name.encode())
+    return size
+
+def estimate_output_size(assets: Dict[str, int]) -> int:
+    return ADDRESS_SIZE + OUTPUT_OVERHEAD_SIZE + estimate_value_size(assets)
+
+def estimate_tx_size(inputs: int, outputs: List[Dict], witnesses: int) -> int:
+    return (TX_OVERHEAD_SIZE + inputs * INPUT_SIZE + witnesses * WITNESS_SIZE +
+            sum([estimate_output_size(output['assets']) for output in outputs]))
+
+class ValueSize:
+    """
+    The multi-asset size of a value kept up to date as assets are added and
+    removed, same as estimate_value_size.
+    """
+
+    def __init__(self):
+        self.assets = set()
+        self.policies = {}
+        self.size = 0
+
+    def get_added_size(self, asset: str) -> int:
+        if asset in self.assets:
+            return 0
+
+        (policy, name) = split_asset(asset)
+        size = ASSET_OVERHEAD_SIZE + len(name.encode())
+        if not policy in self.policies:
+            size += POLICY_SIZE
+        return size
+
+    def copy(self) -> 'ValueSize':
+        value_size = ValueSize()
+        value_size.assets = set(self.assets)
+        value_size.policies = dict(self.policies)
+        value_size.size = self.size
+        return value_size
+
+    def add(self, asset: str) -> None:
+        self.size += self.get_added_size(asset)
+        if not asset in self.assets:
+            self.assets.add(asset)
+            policy = split_asset(asset)[0]
+            self.policies[policy] = self.policies.get(policy, 0) + 1
+
+    def discard(self, asset: str) -> None:
+        if not asset in self.assets:
+            return
+
+        self.assets.discard(asset)
+        (policy, name) = split_asset(asset)
+        self.size -= ASSET_OVERHEAD_SIZE + len(name.encode())
+        self.policies[policy] -= 1
+        if self.policies[policy] == 0:
+            del self.policies[policy]
+            self.size -= POLICY_SIZE
+
+def add_assets(total: Dict[str, int], assets: Dict[str, int]) -> None:
+    for (asset, quantity) in assets.items():
+        total[asset] = total.get(asset, 0) + quantity
+
+class UtxoIndex:
+    """
+    The UTXOs of a wallet indexed by asset, built once per selection.
+    """
+
+    def __init__(self, utxos: List[Dict]):
+        self.utxos = sorted(utxos, key=lambda utxo: utxo['amount'], reverse=True)
+        self.ada_only = [utxo for utxo in self.utxos if len(utxo['assets']) == 0]
+        self.by_asset = {}
+        for utxo in self.utxos:
+            for asset in utxo['assets']:
+                self.by_asset.setdefault(asset, []).append(utxo)
+        for (asset, utxos) in self.by_asset.items():
+            utxos.sort(key=lambda utxo: utxo['assets'][asset], reverse=True)
+
+    def get_utxos(self, asset: str = None) -> List[Dict]:
+        """
+        UTXOs holding an asset, most first.  All UTXOs by lovelace if no asset.
+        """
+
+        if asset == None:
+            return self.utxos
+        return self.by_asset.get(asset, [])
+
+    def get_ada_only(self) -> List[Dict]:
+        return self.ada_only
+
+class Selection:
+    def __init__(self):
+        self.inputs = []
+        self.keys = set()
+        self.lovelace = 0
+        self.assets = {}
+
+    def contains(self, utxo: Dict) -> bool:
+        return (utxo['tx-hash'], utxo['tx-ix']) in self.keys
+
+    def add(self, utxo: Dict) -> None:
+        self.inputs.append(utxo)
+        self.keys.add((utxo['tx-hash'], utxo['tx-ix']))
+        self.lovelace += utxo['amount']
+        add_assets(self.assets, utxo['assets'])
+
+    def remove(self, utxo: Dict) -> None:
+        self.inputs.remove(utxo)
+        self.keys.discard((utxo['tx-hash'], utxo['tx-ix']))
+        self.lovelace -= utxo['amount']
+        add_assets(self.assets, {asset: -quantity for (asset, quantity) in utxo['assets'].items()})
+
+class CoinSelector:
+    def __init__(self, utxos: List[Dict], protocol_parameters: Dict, witnesses: int = 2):
+        """
+        @param protocol_parameters maxTxSize, fees and the minimum UTXO cost
+                                   are read from them.
+        @param witnesses The number of keys that will sign
+        """
+
+        self.index = UtxoIndex(utxos)
+        self.witnesses = witnesses
+        self.max_tx_size = protocol_parameters.get('maxTxSize') or 16384
+        self.max_value_size = protocol_parameters.get('maxValueSize') or 5000
+        self.fee_per_byte = protocol_parameters.get('txFeePerByte') or 44
+        self.fee_fixed = protocol_parameters.get('txFeeFixed') or 155381
+        self.coins_per_byte = protocol_parameters.get('utxoCostPerByte') or 4310
+        if protocol_parameters.get('utxoCostPerWord') != None:
+            self.coins_per_byte = protocol_parameters['utxoCostPerWord'] // 8
+
+    def get_min_ada(self, assets: Dict[str, int]) -> int:
+        return max(1000000, self.coins_per_byte * (MIN_UTXO_OVERHEAD + estimate_output_size(assets)))
+
+    def get_fee(self, size: int) -> int:
+        return self.fee_fixed + self.fee_per_byte * size
+
+    def get_change(self, selection: Selection, outputs: List[Dict]) -> Dict[str, int]:
+        """
+        The assets left over for the change output.  Negative quantities are
+        still needed.
+        """
+
+        change = dict(selection.assets)
+        for output in outputs:
+            for (asset, quantity) in output['assets'].items():
+                change[asset] = change.get(asset, 0) - quantity
+        return {asset: quantity for (asset, quantity) in change.items() if quantity != 0}
+
+    def get_size(self, selection: Selection, outputs: List[Dict]) -> int:
+        change = {'assets': self.get_change(selection, outputs)}
+        return estimate_tx_size(len(selection.inputs), outputs + [change], self.witnesses)
+
+    def get_deficit(self, selection: Selection, outputs: List[Dict]) -> int:
+        """
+        Lovelace still needed for the outputs, the fee and the change.
+        """
+
+        change = self.get_change(selection, outputs)
+        size = estimate_tx_size(len(selection.inputs), outputs + [{'assets': change}], self.witnesses)
+        change_lovelace = selection.lovelace - sum([output['amount'] for output in outputs]) - self.get_fee(size)
+        return self.get_min_ada(change) - change_lovelace
+
+    def get_asset_deficits(self, selection: Selection, outputs: List[Dict]) -> Dict[str, int]:
+        return {asset: -quantity for (asset, quantity) in self.get_change(selection, outputs).items() if quantity < 0}
+
+    def add(self, selection: Selection, utxo: Dict, outputs: List[Dict]) -> None:
+        selection.add(utxo)
+        if self.get_size(selection, outputs) > self.max_tx_size:
+            logger.error('Coin selection, {} inputs exceed the maximum transaction size: {}'.format(len(selection.inputs), self.max_tx_size))
+            raise Exception('Coin selection, {} inputs exceed the maximum transaction size: {}'.format(len(selection.inputs), self.max_tx_size))
+
+    def pay_lovelace(self, selection: Selection, outputs: List[Dict], candidates: List[Dict]) -> None:
+        for utxo in candidates:
+            if self.get_deficit(selection, outputs) <= 0:
+                return
+            if not selection.contains(utxo):
+                self.add(selection, utxo, outputs)
+
+    def finish(self, selection: Selection, outputs: List[Dict]) -> List[Dict]:
+        # ADA-only UTXOs first so the change does not carry more assets
+        self.pay_lovelace(selection, outputs, self.index.get_ada_only())
+        self.pay_lovelace(selection, outputs, self.index.get_utxos())
+
+        missing = self.get_asset_deficits(selection, outputs)
+        if len(missing) > 0:
+            logger.error('Coin selection, not enough assets: {}'.format(missing))
+            raise Exception('Coin selection, not enough assets: {}'.format(missing))
+
+        deficit = self.get_deficit(selection, outputs)
+        if deficit > 0:
+            logger.error('Coin selection, not enough lovelace, short by: {}'.format(deficit))
+            raise Exception('Coin selection, not enough lovelace, short by: {}'.format(deficit))
+
+        logger.debug('Coin selection, {} inputs, estimated size: {}'.format(len(selection.inputs), self.get_size(selection, outputs)))
+        return selection.inputs
+
+    def largest_first(self, outputs: List[Dict]) -> List[Dict]:
+        selection = Selection()
+        for asset in self.get_asset_deficits(selection, outputs):
+            for utxo in self.index.get_utxos(asset):
+                if self.get_asset_deficits(selection, outputs).get(asset, 0) <= 0:
+                    break
+                if not selection.contains(utxo):
+                    self.add(selection, utxo, outputs)
+
+        self.pay_lovelace(selection, outputs, self.index.get_utxos())
+        return self.finish(selection, outputs)
+
+    def random_improve(self, outputs: List[Dict], rng: random.Random = None) -> List[Dict]:
+        """
+        CIP-2 random-improve over the total of the outputs.  Each asset, then
+        lovelace, is selected at random until covered and then improved
+        toward twice its target without going over three times.
+        """
+
+        if rng == None:
+            rng = random.Random()
+
+        selection = Selection()
+        targets = {}
+        for output in outputs:
+            add_assets(targets, output['assets'])
+        targets[None] = sum([output['amount'] for output in outputs])
+
+        def get_total(asset: str) -> int:
+            if asset == None:
+                return selection.lovelace
+            return selection.assets.get(asset, 0)
+
+        def get_quantity(utxo: Dict, asset: str) -> int:
+            if asset == None:
+                return utxo['amount']
+            return utxo['assets'][asset]
+
+        for (asset, target) in targets.items():
+            # lovelace from ADA-only UTXOs, finish() falls back to the rest
+            pool = self.index.get_ada_only() if asset == None else self.index.get_utxos(asset)
+            candidates = [utxo for utxo in pool if not selection.contains(utxo)]
+            rng.shuffle(candidates)
+
+            # random selection
+            while get_total(asset) < target and len(candidates) > 0:
+                self.add(selection, candidates.pop(), outputs)
+
+            # improvement
+            while len(candidates) > 0:
+                utxo = candidates.pop()
+                total = get_total(asset) + get_quantity(utxo, asset)
+                if abs(2 * target - total) >= abs(2 * target - get_total(asset)) or total > 3 * target:
+                    break
+
+                selection.add(utxo)
+                if self.get_size(selection, outputs) > self.max_tx_size:
+                    # improving is optional
+                    selection.remove(utxo)
+                    break
+
+        return self.finish(selection, outputs)
+
+    def multi_asset(self, outputs: List[Dict]) -> List[Dict]:
+        """
+        For each asset take the UTXO that covers what is still needed with the
+        fewest other assets, or the one holding the most if none does.
+        """
+
+        selection = Selection()
+        deficits = self.get_asset_deficits(selection, outputs)
+        # the rarest asset first, its UTXOs often cover other assets too
+        for asset in sorted(deficits, key=lambda asset: len(self.index.get_utxos(asset))):
+            while self.get_asset_deficits(selection, outputs).get(asset, 0) > 0:
+                needed = self.get_asset_deficits(selection, outputs)[asset]
+                candidates = [utxo for utxo in self.index.get_utxos(asset) if not selection.contains(utxo)]
+                if len(candidates) == 0:
+                    break
+
+                covering = [utxo for utxo in candidates if utxo['assets'][asset] >= needed]
+                if len(covering) > 0:
+                    utxo = min(covering, key=lambda utxo: (len(utxo['assets']), utxo['assets'][asset]))
+                else:
+                    utxo = candidates[0]
+                self.add(selection, utxo, outputs)
+
+        # one ADA-only UTXO that covers the rest if there is one
+        deficit = self.get_deficit(selection, outputs)
+        if deficit > 0:
+            covering = [utxo for utxo in self.index.get_ada_only()
+                        if not selection.contains(utxo) and utxo['amount'] >= deficit + self.fee_per_byte * INPUT_SIZE]
+            if len(covering) > 0:
+                self.add(selection, covering[-1], outputs)
+
+        return self.finish(selection, outputs)
+
+    def get_chunk(self, assets: Dict[str, int], max_output_size: int = None, reserved: int = 0) -> Dict[str, int]:
+        """
+        The largest part of assets one transaction can send to one output.
+        The output and change values are sized as assets are added, taking
+        the UTXOs holding the most of the assets first, skipping any that
+        would leave more in the change than maxValueSize.  Room is kept for
+        one more input to pay the fee and min ADA.
+
+        @param max_output_size Limit of the output value, maxValueSize if not
+                               given.  A burn's mint field is only limited by
+                               the transaction size.
+        @param reserved Bytes used by anything else, e.g. a policy script
+        """
+
+        if max_output_size == None:
+            max_output_size = self.max_value_size
+        budget = (self.max_tx_size - TX_OVERHEAD_SIZE - self.witnesses * WITNESS_SIZE -
+                  2 * (ADDRESS_SIZE + OUTPUT_OVERHEAD_SIZE) - INPUT_SIZE - reserved)
+        output = ValueSize()
+        change = ValueSize()
+        input_assets = {}
+        inputs = 0
+        chunk = {}
+
+        def get_needed(asset: str) -> int:
+            return assets.get(asset, 0) - chunk.get(asset, 0)
+
+        candidates = [utxo for utxo in self.index.get_utxos() if any([asset in assets for asset in utxo['assets']])]
+        candidates.sort(key=lambda utxo: len([asset for asset in utxo['assets'] if asset in assets]), reverse=True)
+        for utxo in candidates:
+            wanted = [asset for asset in utxo['assets'] if get_needed(asset) > 0]
+            if len(wanted) == 0:
+                continue
+
+            # the whole UTXO goes to the change until its assets are taken
+            added_size = INPUT_SIZE + sum([change.get_added_size(asset) for asset in set(utxo['assets'])])
+            if inputs * INPUT_SIZE + output.size + change.size + added_size > budget:
+                break
+
+            # take the UTXO on copies, it is only kept if what it leaves in
+            # the change still fits in one output
+            utxo_output = output.copy()
+            utxo_change = change.copy()
+            utxo_input_assets = dict(input_assets)
+            utxo_chunk = dict(chunk)
+            add_assets(utxo_input_assets, utxo['assets'])
+            for asset in utxo['assets']:
+                utxo_change.add(asset)
+
+            full = False
+            for asset in wanted:
+                if utxo_output.size + utxo_output.get_added_size(asset) > max_output_size:
+                    full = True
+                    break
+                if (inputs + 1) * INPUT_SIZE + utxo_output.size + utxo_output.get_added_size(asset) + utxo_change.size > budget:
+                    full = True
+                    break
+
+                utxo_chunk[asset] = utxo_chunk.get(asset, 0) + min(get_needed(asset), utxo['assets'][asset])
+                utxo_output.add(asset)
+                if utxo_chunk[asset] == utxo_input_assets[asset]:
+                    utxo_change.discard(asset)
+
+            if utxo_change.size > self.max_value_size:
+                # its leftovers would make the change too big, another UTXO
+                # may still fit
+                continue
+
+            inputs += 1
+            (output, change, input_assets, chunk) = (utxo_output, utxo_change, utxo_input_assets, utxo_chunk)
+            if full:
+                break
+
+        if len(chunk) == 0:
+            logger.error('Coin selection, no UTXO holds the assets: {}'.format(list(assets.keys())[0:5]))
+            raise Exception('Coin selection, no UTXO holds the assets')
+
+        logger.debug('Coin selection, chunk of {} assets from {} inputs, estimated value size: {}'.format(len(chunk), inputs, output.size))
+        return chunk
+
+    def select(self, outputs: List[Dict], algorithm: str = MULTI_ASSET) -> List[Dict]:
+        """
+        @param outputs [{'address', 'amount', 'assets'}], without the change
+        @return The UTXOs to spend
+        """
+
+        selectors = {LARGEST_FIRST: self.largest_first,
+                     RANDOM_IMPROVE: self.random_improve,
+                     MULTI_ASSET: self.multi_asset}
+        if not algorithm in selectors:
+            logger.error('Coin selection, unknown algorithm: {}'.format(algorithm))
+            raise Exception('Coin selection, unknown algorithm: {}'.format(algorithm))
+
+        return selectors[algorithm](outputs)
@@ -30,6 +30,8 @@ import subprocess
 import os
 import logging
 
+from tcr.metrics import COMMAND_SECONDS, get_command_label
+
 networks = {
     'testnet': ['--testnet-magic', '1097911063'],
     'mainnet': ['--mainnet']
@@ -81,7 +83,8 @@ class Command:
         Command.print_command(command)
 
         try:
-            completed = subprocess.run(command, check=True, capture_output=True, text=True)
+            with COMMAND_SECONDS.time(command=get_command_label(command)):
+                completed = subprocess.run(command, check=True, capture_output=True, text=True)
         except subprocess.CalledProcessError as e:
             logger.error('{}, return code: {}'.format(command[0], e.returncode))
             logger.error('output: {}'.format(e.output))
@@ -114,7 +117,8 @@ class Command:
         else:
             logger.debug('\tinput: None')
         try:
-            completed = subprocess.run(command, check=True, capture_output=True, text=True, input=input, env=envvars)
+            with COMMAND_SECONDS.time(command=get_command_label(command)):
+                completed = subprocess.run(command, check=True, capture_output=True, text=True, input=input, env=envvars)
         except subprocess.CalledProcessError as e:
             logger.error('{}, return code: {}'.format(command[0], e.returncode))
             logger.error('output: {}'.format(e.output))
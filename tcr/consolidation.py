@@ -0,0 +1,260 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: consolidation.py
+Author: SuperKK
+
+Merge the many small ADA-only UTXOs left at a wallet's root address after a
+drop into a few evenly sized ones.  Every query_utxos of the wallet returns
+all of them, and transactions that spend them grow with each one.
+
+A number of UTXOs of a fixed size can be kept aside, ready for transactions
+that run in parallel and each need an input of their own.
+"""
+
+from typing import Dict, List, Tuple
+import logging
+import threading
+
+from tcr.cardano import Cardano
+from tcr.coin_selection import CoinSelector, INPUT_SIZE, estimate_tx_size
+from tcr.tcr import get_transaction_file, set_transaction_namespace
+from tcr.wallet import Wallet
+
+logger = logging.getLogger('consolidation')
+
+class Consolidator:
+    """
+    Plans a consolidation.  Inputs are split into transactions under the
+    maximum transaction size.  Each transaction spends the output of the one
+    before so only the last creates the new UTXOs.
+    """
+
+    def __init__(self,
+                 protocol_parameters: Dict,
+                 outputs: int = 4,
+                 reserve_count: int = 0,
+                 reserve_amount: int = 5000000,
+                 max_amount: int = None,
+                 min_fragments: int = None):
+        """
+        @param outputs The number of evenly sized UTXOs to merge into
+        @param reserve_count The number of UTXOs of reserve_amount to keep
+        @param max_amount UTXOs larger than this are left alone, all if None
+        @param min_fragments Only consolidate when there are more UTXOs to
+                             merge than this, twice outputs if None
+        """
+
+        self.set_protocol_parameters(protocol_parameters)
+        self.outputs = outputs
+        self.reserve_count = reserve_count
+        self.reserve_amount = reserve_amount
+        self.max_amount = max_amount
+        self.min_fragments = min_fragments
+        if min_fragments == None:
+            self.min_fragments = 2 * outputs
+
+    def set_protocol_parameters(self, protocol_parameters: Dict) -> None:
+        """
+        The maximum transaction size, fees and minimum UTXO value change with
+        the epoch.
+        """
+
+        # one signature, the root address key
+        self.selector = CoinSelector([], protocol_parameters, witnesses=1)
+
+    def split(self, utxos: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        @return (The UTXOs to merge, the reserved UTXOs to keep)
+        """
+
+        fragments = []
+        reserves = []
+        for utxo in utxos:
+            if len(utxo['assets']) > 0:
+                continue
+            if utxo['amount'] == self.reserve_amount and len(reserves) < self.reserve_count:
+                reserves.append(utxo)
+            elif self.max_amount == None or utxo['amount'] <= self.max_amount:
+                fragments.append(utxo)
+
+        return (fragments, reserves)
+
+    def is_needed(self, utxos: List[Dict]) -> bool:
+        (fragments, reserves) = self.split(utxos)
+        if len(fragments) > self.min_fragments:
+            return True
+
+        # refill the reserve if the UTXOs to merge can pay for it
+        lovelace = sum([utxo['amount'] for utxo in fragments])
+        return len(reserves) < self.reserve_count and lovelace >= self.reserve_amount + self.selector.get_min_ada({})
+
+    def get_max_inputs(self, outputs: int) -> int:
+        size = estimate_tx_size(0, [{'assets': {}}] * outputs, self.selector.witnesses)
+        return (self.selector.max_tx_size - size) // INPUT_SIZE
+
+    def get_batches(self, fragments: List[Dict], outputs: int) -> List[List[Dict]]:
+        """
+        The inputs of each transaction.  Every transaction after the first
+        also spends the output of the one before.
+
+        @param outputs The number of outputs of the last transaction
+        """
+
+        max_inputs = self.get_max_inputs(1)
+        max_last_inputs = self.get_max_inputs(outputs)
+        if max_last_inputs < 2:
+            logger.error('Consolidation, {} outputs exceed the maximum transaction size'.format(outputs))
+            raise Exception('Consolidation, {} outputs exceed the maximum transaction size'.format(outputs))
+
+        batches = []
+        remaining = list(fragments)
+        while True:
+            chained = 0 if len(batches) == 0 else 1
+            if len(remaining) + chained <= max_last_inputs:
+                batches.append(remaining)
+                return batches
+
+            batches.append(remaining[0:max_inputs - chained])
+            remaining = remaining[max_inputs - chained:]
+
+    def get_amounts(self, lovelace: int, reserves: int) -> List[int]:
+        """
+        Split lovelace into reserves UTXOs of reserve_amount and up to outputs
+        evenly sized UTXOs.  Each is at least the minimum UTXO value.
+        """
+
+        min_ada = self.selector.get_min_ada({})
+        reserves = max(0, min(reserves, (lovelace - min_ada) // self.reserve_amount))
+        rest = lovelace - reserves * self.reserve_amount
+        if rest < min_ada:
+            logger.error('Consolidation, {} lovelace is less than the minimum UTXO value'.format(lovelace))
+            raise Exception('Consolidation, {} lovelace is less than the minimum UTXO value'.format(lovelace))
+
+        count = max(1, min(self.outputs, rest // min_ada))
+        amounts = [rest // count] * count
+        amounts[0] += rest - sum(amounts)
+        return [self.reserve_amount] * reserves + amounts
+
+def consolidate_utxos(cardano: Cardano,
+                      wallet: Wallet,
+                      consolidator: Consolidator,
+                      force: bool = False) -> List[str]:
+    """
+    Consolidate the ADA-only UTXOs at the wallet's root address.  The
+    transactions are submitted back to back without waiting for
+    confirmations.  The consolidator is planned with the current protocol
+    parameters of cardano.
+
+    @param force Consolidate even if there are only a few UTXOs
+    @return The transaction ids in the order submitted, empty if there was
+            nothing to do
+    """
+
+    address = wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT)
+    addresses = list(set([wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT, delegated=True),
+                          wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT, delegated=False)]))
+    (utxos, total_lovelace) = cardano.query_utxos(wallet, addresses)
+    consolidator.set_protocol_parameters(cardano.get_protocol_parameters())
+    (fragments, reserves) = consolidator.split(utxos)
+    missing_reserves = consolidator.reserve_count - len(reserves)
+    if not (force or consolidator.is_needed(utxos)) or len(fragments) == 0:
+        logger.debug('Consolidation, {} UTXOs, {} reserved, nothing to do'.format(len(fragments), len(reserves)))
+        return []
+
+    logger.info('Consolidation, {} UTXOs into {} and {} reserved'.format(len(fragments), consolidator.outputs, missing_reserves))
+    batches = consolidator.get_batches(fragments, consolidator.outputs + max(0, missing_reserves))
+    tx_ids = []
+    chained = None
+    for (i, batch) in enumerate(batches):
+        inputs = list(batch)
+        if chained != None:
+            inputs.append(chained)
+        lovelace = sum([utxo['amount'] for utxo in inputs])
+
+        def get_outputs(lovelace: int) -> List[Dict]:
+            if i < len(batches) - 1:
+                return [{'address': address, 'amount': lovelace, 'assets': {}}]
+            return [{'address': address, 'amount': amount, 'assets': {}}
+                    for amount in consolidator.get_amounts(lovelace, missing_reserves)]
+
+        outputs = get_outputs(lovelace)
+        cardano.create_transfer_transaction_file(inputs,
+                                                 outputs,
+                                                 0,
+                                                 get_transaction_file('consolidate_draft'))
+        fee = cardano.calculate_min_fee(get_transaction_file('consolidate_draft'),
+                                        len(inputs),
+                                        len(outputs),
+                                        1)
+        outputs = get_outputs(lovelace - fee)
+        cardano.create_transfer_transaction_file(inputs,
+                                                 outputs,
+                                                 fee,
+                                                 get_transaction_file('consolidate_unsigned'))
+        cardano.sign_transaction(get_transaction_file('consolidate_unsigned'),
+                                 [wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_ROOT)],
+                                 get_transaction_file('consolidate_signed'))
+        tx_id = cardano.submit_transaction(get_transaction_file('consolidate_signed'))
+        if tx_id == None:
+            logger.error('Consolidation, failed after: {}'.format(tx_ids))
+            raise Exception('Consolidation, failed after: {}'.format(tx_ids))
+        logger.debug('Consolidation, {} inputs, fee: {}, tx id: {}'.format(len(inputs), fee, tx_id))
+        tx_ids.append(tx_id)
+
+        # the next transaction spends the output of this one
+        chained = {'tx-hash': tx_id, 'tx-ix': 0, 'amount': outputs[0]['amount'], 'assets': {}}
+
+    return tx_ids
+
+class ConsolidationTask:
+    """
+    Consolidates from a background thread while minting.  Only the root
+    address is touched, payments to the mint address are never spent.
+    """
+
+    def __init__(self, cardano: Cardano, wallet: Wallet, consolidator: Consolidator, interval: float = 600):
+        self.cardano = cardano
+        self.wallet = wallet
+        self.consolidator = consolidator
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='consolidation', daemon=True)
+
+    def run(self) -> None:
+        # transaction files of its own, mint workers build at the same time
+        set_transaction_namespace('consolidation')
+        while not self.stopped.wait(self.interval):
+            try:
+                consolidate_utxos(self.cardano, self.wallet, self.consolidator)
+            except Exception as e:
+                logger.warning('Consolidation, failed: {}'.format(e))
+
+    def start(self) -> None:
+        self.thread.start()
+        logger.info('Consolidation, every {} seconds'.format(self.interval))
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
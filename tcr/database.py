@@ -31,6 +31,8 @@ import psycopg2
 import logging
 import binascii
 
+from tcr.metrics import time_query
+
 logger = logging.getLogger('database')
 
 # https://github.com/input-output-hk/cardano-db-sync/blob/master/doc/schema.md
@@ -69,6 +71,7 @@ class Database:
 
         return config_params
 
+    @time_query
     def query_chain_metadata(self):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -83,6 +86,7 @@ class Database:
         cursor.close()
         return row
 
+    @time_query
     def query_total_supply(self):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -102,6 +106,7 @@ class Database:
         cursor.close()
         return row[0]
 
+    @time_query
     def query_database_size(self):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -116,6 +121,7 @@ class Database:
         cursor.close()
         return row[0]
 
+    @time_query
     def query_latest_slot(self):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -132,6 +138,7 @@ class Database:
         cursor.close()
         return int(row[0])
 
+    @time_query
     def query_sync_progress(self):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -149,6 +156,7 @@ class Database:
         cursor.close()
         return float(row[0])
 
+    @time_query
     def query_tx_fee(self, txid: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -163,6 +171,7 @@ class Database:
         cursor.close()
         return (row[0], int(row[1]))
 
+    @time_query
     def query_stake_address(self, address: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -184,6 +193,7 @@ class Database:
 
         return row[2]
 
+    @time_query
     def query_utxo_outputs(self, txid: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -203,6 +213,7 @@ class Database:
         cursor.close()
         return outputs
 
+    @time_query
     def query_utxo_inputs(self, txid: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -226,6 +237,7 @@ class Database:
         cursor.close()
         return inputs
 
+    @time_query
     def query_txhash_time(self, txhash: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -262,6 +274,7 @@ class Database:
     #   json	jsonb	        The JSON payload if it can be decoded as JSON.
     #   bytes   bytea	        The raw bytes of the payload.
     #   tx_id   integer (64)    The Tx table index of the transaction where this metadata was included.
+    @time_query
     def query_nft_metadata(self, fingerprint: str) -> str:
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -287,6 +300,7 @@ class Database:
 
         return (token_policy, token_name, {key: metadata})
 
+    @time_query
     def query_mint_transactions(self, policy_id: str) -> Dict:
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -318,6 +332,7 @@ class Database:
 
         return tokens
 
+    @time_query
     def query_current_owner(self, policy_id: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -346,6 +361,7 @@ class Database:
 
         return tokens
 
+    @time_query
     def query_owner_by_fingerprint(self, fingerprint: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -0,0 +1,203 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: ed25519.py
+Author: SuperKK
+
+Ed25519 (RFC 8032) in pure Python, including signing with BIP32-Ed25519
+extended keys where the scalar and nonce prefix are given directly rather
+than hashed from a seed.  Points are kept in extended coordinates and
+multiples of the base point use a precomputed table.
+"""
+
+from typing import List, Tuple
+import hashlib
+
+P = 2 ** 255 - 19
+L = 2 ** 252 + 27742317777372353535851937790883648493
+D = -121665 * pow(121666, P - 2, P) % P
+SQRT_M1 = pow(2, (P - 1) // 4, P)
+
+# (X, Y, Z, T) with x = X/Z, y = Y/Z and x * y = T/Z
+Point = Tuple[int, int, int, int]
+IDENTITY = (0, 1, 1, 0)
+
+def inverse(x: int) -> int:
+    return pow(x, P - 2, P)
+
+def point_add(p: Point, q: Point) -> Point:
+    a = (p[1] - p[0]) * (q[1] - q[0]) % P
+    b = (p[1] + p[0]) * (q[1] + q[0]) % P
+    c = 2 * p[3] * q[3] * D % P
+    d = 2 * p[2] * q[2] % P
+    (e, f, g, h) = (b - a, d - c, d + c, b + a)
+    return (e * f % P, g * h % P, f * g % P, e * h % P)
+
+def point_double(p: Point) -> Point:
+    a = p[0] * p[0] % P
+    b = p[1] * p[1] % P
+    c = 2 * p[2] * p[2] % P
+    h = a + b
+    e = h - (p[0] + p[1]) * (p[0] + p[1])
+    g = a - b
+    f = c + g
+    return (e * f % P, g * h % P, f * g % P, e * h % P)
+
+def point_multiply(s: int, p: Point) -> Point:
+    result = IDENTITY
+    while s > 0:
+        if s & 1:
+            result = point_add(result, p)
+        p = point_double(p)
+        s >>= 1
+    return result
+
+def point_equal(p: Point, q: Point) -> bool:
+    return (p[0] * q[2] - q[0] * p[2]) % P == 0 and (p[1] * q[2] - q[1] * p[2]) % P == 0
+
+def recover_x(y: int, sign: int) -> int:
+    if y >= P:
+        return None
+    x2 = (y * y - 1) * inverse(D * y * y + 1) % P
+    if x2 == 0:
+        return None if sign else 0
+
+    x = pow(x2, (P + 3) // 8, P)
+    if (x * x - x2) % P != 0:
+        x = x * SQRT_M1 % P
+    if (x * x - x2) % P != 0:
+        return None
+
+    if (x & 1) != sign:
+        x = P - x
+    return x
+
+def point_encode(p: Point) -> bytes:
+    zinv = inverse(p[2])
+    x = p[0] * zinv % P
+    y = p[1] * zinv % P
+    return (y | ((x & 1) << 255)).to_bytes(32, 'little')
+
+def point_decode(data: bytes) -> Point:
+    if len(data) != 32:
+        raise Exception('Ed25519, invalid point length: {}'.format(len(data)))
+
+    y = int.from_bytes(data, 'little')
+    sign = y >> 255
+    y &= (1 << 255) - 1
+    x = recover_x(y, sign)
+    if x == None:
+        raise Exception('Ed25519, invalid point: {}'.format(data.hex()))
+    return (x, y, 1, x * y % P)
+
+BASE_Y = 4 * inverse(5) % P
+BASE = (recover_x(BASE_Y, 0), BASE_Y, 1, recover_x(BASE_Y, 0) * BASE_Y % P)
+
+# BASE_TABLE[i][j] = j * 16^i * BASE
+BASE_TABLE = None
+
+def get_base_table() -> List[List[Point]]:
+    global BASE_TABLE
+    if BASE_TABLE == None:
+        table = []
+        p = BASE
+        for i in range(64):
+            row = [IDENTITY]
+            for j in range(15):
+                row.append(point_add(row[-1], p))
+            table.append(row)
+            p = point_add(row[15], p)
+        BASE_TABLE = table
+    return BASE_TABLE
+
+def base_multiply(s: int) -> Point:
+    table = get_base_table()
+    s %= L
+    result = IDENTITY
+    for i in range(64):
+        nibble = (s >> (4 * i)) & 15
+        if nibble:
+            result = point_add(result, table[i][nibble])
+    return result
+
+def hash_int(*values: bytes) -> int:
+    return int.from_bytes(hashlib.sha512(b''.join(values)).digest(), 'little')
+
+def clamp(data: bytes) -> int:
+    a = bytearray(data[0:32])
+    a[0] &= 248
+    a[31] &= 127
+    a[31] |= 64
+    return int.from_bytes(a, 'little')
+
+def public_key_from_scalar(scalar: bytes) -> bytes:
+    """
+    The public key for a 32 byte little endian scalar, the left half of an
+    extended private key.
+    """
+
+    return point_encode(base_multiply(int.from_bytes(scalar, 'little')))
+
+def expand_seed(seed: bytes) -> Tuple[bytes, bytes]:
+    digest = hashlib.sha512(seed).digest()
+    return (clamp(digest).to_bytes(32, 'little'), digest[32:])
+
+def public_key(seed: bytes) -> bytes:
+    return public_key_from_scalar(expand_seed(seed)[0])
+
+def sign_extended(scalar: bytes, prefix: bytes, message: bytes, public: bytes = None) -> bytes:
+    """
+    Sign with an extended private key, scalar || prefix.
+    """
+
+    a = int.from_bytes(scalar, 'little')
+    if public == None:
+        public = public_key_from_scalar(scalar)
+
+    r = hash_int(prefix, message) % L
+    encoded_r = point_encode(base_multiply(r))
+    k = hash_int(encoded_r, public, message) % L
+    s = (r + k * a) % L
+    return encoded_r + s.to_bytes(32, 'little')
+
+def sign(seed: bytes, message: bytes) -> bytes:
+    (scalar, prefix) = expand_seed(seed)
+    return sign_extended(scalar, prefix, message)
+
+def verify(public: bytes, message: bytes, signature: bytes) -> bool:
+    if len(signature) != 64:
+        return False
+
+    try:
+        a = point_decode(public)
+        r = point_decode(signature[0:32])
+    except Exception as e:
+        return False
+
+    s = int.from_bytes(signature[32:64], 'little')
+    if s >= L:
+        return False
+
+    k = hash_int(signature[0:32], public, message) % L
+    return point_equal(base_multiply(s), point_add(r, point_multiply(k, a)))
@@ -0,0 +1,195 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: hdkey.py
+Author: SuperKK
+
+BIP32-Ed25519 hierarchical keys with the derivation scheme used by Cardano
+Shelley wallets (CIP-1852), in the formats written by cardano-address and
+cardano-cli:
+
+  - root_xsk / addr_xsk / stake_xsk: kL || kR || chain code (96 bytes)
+  - addr_xvk / stake_xvk: public key || chain code (64 bytes)
+  - text envelope signing key: 5880 || kL || kR || public key || chain code
+  - text envelope verification key: 5840 || public key || chain code
+"""
+
+from typing import List
+import hashlib
+import hmac
+import json
+
+from tcr import address
+from tcr import bech32
+from tcr import ed25519
+
+HARDENED = 0x80000000
+
+ROLE_EXTERNAL = 0
+ROLE_INTERNAL = 1
+ROLE_STAKE = 2
+
+SIGNING_KEY_TYPE = 'PaymentExtendedSigningKeyShelley_ed25519_bip32'
+VERIFICATION_KEY_TYPE = 'PaymentExtendedVerificationKeyShelley_ed25519_bip32'
+
+def parse_path(path: str) -> List[int]:
+    """
+    '1852H/1815H/0H/0/5' to a list of indexes, H marks hardened indexes.
+    """
+
+    indexes = []
+    for value in path.split('/'):
+        if value.endswith('H') or value.endswith("'"):
+            indexes.append(int(value[:-1]) + HARDENED)
+        else:
+            indexes.append(int(value))
+    return indexes
+
+def get_private_hrp(path: List[int]) -> str:
+    """
+    The bech32 prefix cardano-address uses for a key at this path.
+    """
+
+    if len(path) == 0:
+        return 'root_xsk'
+    if len(path) <= 3:
+        return 'acct_xsk'
+    if path[3] == ROLE_STAKE:
+        return 'stake_xsk'
+    return 'addr_xsk'
+
+def format_text_envelope(type: str, cbor_hex: str) -> str:
+    return json.dumps({'type': type, 'description': '', 'cborHex': cbor_hex}, indent=4) + '\n'
+
+class ExtendedPublicKey:
+    def __init__(self, public_key: bytes, chain_code: bytes):
+        self.public_key = public_key
+        self.chain_code = chain_code
+
+    def to_bytes(self) -> bytes:
+        return self.public_key + self.chain_code
+
+    def to_bech32(self, hrp: str = 'addr_xvk') -> str:
+        return bech32.encode(hrp, self.to_bytes())
+
+    @staticmethod
+    def from_bech32(value: str) -> 'ExtendedPublicKey':
+        (hrp, data) = bech32.decode(value)
+        if len(data) != 64:
+            raise Exception('ExtendedPublicKey, invalid length {}: {}'.format(len(data), hrp))
+        return ExtendedPublicKey(data[0:32], data[32:64])
+
+    def get_key_hash(self) -> bytes:
+        return address.get_key_hash(self.public_key)
+
+    def derive(self, index: int) -> 'ExtendedPublicKey':
+        """
+        Derive a soft child from the public key alone.
+        """
+
+        if index >= HARDENED:
+            raise Exception('ExtendedPublicKey, cannot derive hardened index {}'.format(index))
+
+        data = self.public_key + index.to_bytes(4, 'little')
+        z = hmac.new(self.chain_code, b'\x02' + data, hashlib.sha512).digest()
+        chain_code = hmac.new(self.chain_code, b'\x03' + data, hashlib.sha512).digest()[32:]
+        point = ed25519.point_add(ed25519.point_decode(self.public_key),
+                                  ed25519.base_multiply(8 * int.from_bytes(z[0:28], 'little')))
+        return ExtendedPublicKey(ed25519.point_encode(point), chain_code)
+
+    def to_verification_key_file(self) -> str:
+        return format_text_envelope(VERIFICATION_KEY_TYPE, '5840' + self.to_bytes().hex())
+
+class ExtendedPrivateKey:
+    def __init__(self, kl: bytes, kr: bytes, chain_code: bytes):
+        self.kl = kl
+        self.kr = kr
+        self.chain_code = chain_code
+        self.public_key = None
+
+    def to_bytes(self) -> bytes:
+        return self.kl + self.kr + self.chain_code
+
+    def to_bech32(self, hrp: str = 'addr_xsk') -> str:
+        return bech32.encode(hrp, self.to_bytes())
+
+    @staticmethod
+    def from_bech32(value: str) -> 'ExtendedPrivateKey':
+        (hrp, data) = bech32.decode(value.strip())
+        if len(data) != 96:
+            raise Exception('ExtendedPrivateKey, invalid length {}: {}'.format(len(data), hrp))
+        return ExtendedPrivateKey(data[0:32], data[32:64], data[64:96])
+
+    def get_public_key(self) -> bytes:
+        if self.public_key == None:
+            self.public_key = ed25519.public_key_from_scalar(self.kl)
+        return self.public_key
+
+    def get_public(self) -> ExtendedPublicKey:
+        return ExtendedPublicKey(self.get_public_key(), self.chain_code)
+
+    def derive(self, index: int) -> 'ExtendedPrivateKey':
+        if index >= HARDENED:
+            data = self.kl + self.kr + index.to_bytes(4, 'little')
+            (z_tag, c_tag) = (b'\x00', b'\x01')
+        else:
+            data = self.get_public_key() + index.to_bytes(4, 'little')
+            (z_tag, c_tag) = (b'\x02', b'\x03')
+
+        z = hmac.new(self.chain_code, z_tag + data, hashlib.sha512).digest()
+        chain_code = hmac.new(self.chain_code, c_tag + data, hashlib.sha512).digest()[32:]
+
+        kl = (8 * int.from_bytes(z[0:28], 'little') + int.from_bytes(self.kl, 'little')) % 2 ** 256
+        kr = (int.from_bytes(z[32:64], 'little') + int.from_bytes(self.kr, 'little')) % 2 ** 256
+        return ExtendedPrivateKey(kl.to_bytes(32, 'little'), kr.to_bytes(32, 'little'), chain_code)
+
+    def derive_path(self, path: str) -> 'ExtendedPrivateKey':
+        key = self
+        for index in parse_path(path):
+            key = key.derive(index)
+        return key
+
+    def sign(self, message: bytes) -> bytes:
+        return ed25519.sign_extended(self.kl, self.kr, message, self.get_public_key())
+
+    def to_signing_key_file(self) -> str:
+        """
+        The text envelope written by cardano-cli key convert-cardano-address-key
+        --shelley-payment-key
+        """
+
+        return format_text_envelope(SIGNING_KEY_TYPE, '5880' + (self.kl + self.kr + self.get_public_key() + self.chain_code).hex())
+
+    @staticmethod
+    def from_signing_key_file(filename: str) -> 'ExtendedPrivateKey':
+        with open(filename, 'r') as file:
+            envelope = json.load(file)
+
+        data = bytes.fromhex(envelope['cborHex'])
+        if envelope['type'] != SIGNING_KEY_TYPE or data[0:2] != b'\x58\x80':
+            raise Exception('ExtendedPrivateKey, unsupported signing key: {}'.format(filename))
+
+        key = ExtendedPrivateKey(data[2:34], data[34:66], data[98:130])
+        key.public_key = data[66:98]
+        return key
@@ -0,0 +1,346 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: image_index.py
+Author: SuperKK
+
+Duplicate detection for generated NFT images.  Every image is indexed by its
+SHA-256 (byte identical files) and by a 64 bit perceptual hash stored in a
+BK-tree so near duplicates can be found without comparing against every image
+already generated.  Perceptual matches are confirmed by comparing pixels.
+"""
+
+from typing import Dict, List, Tuple
+import argparse
+import hashlib
+import logging
+import os
+import traceback
+
+import numpy
+from PIL import Image
+
+logger = logging.getLogger('nft')
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    return bin(hash1 ^ hash2).count('1')
+
+class BKTree:
+    """
+    Burkhard-Keller tree keyed by hamming distance.  A search for everything
+    within a small distance of a hash only visits the branches that can
+    possibly match which makes a lookup sub-linear in the number of hashes.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, hash: int, value) -> None:
+        # Each node is [hash, values, {distance: child}]
+        if self.root == None:
+            self.root = [hash, [value], {}]
+            self.size += 1
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(hash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                self.size += 1
+                return
+
+            child = node[2].get(distance)
+            if child == None:
+                node[2][distance] = [hash, [value], {}]
+                self.size += 1
+                return
+
+            node = child
+
+    def find(self, hash: int, max_distance: int) -> List[Tuple[int, object]]:
+        """
+        Return a list of (distance, value) for every hash within max_distance,
+        closest first.
+        """
+
+        results = []
+        if self.root == None:
+            return results
+
+        candidates = [self.root]
+        while len(candidates) > 0:
+            node = candidates.pop()
+            distance = hamming_distance(hash, node[0])
+            if distance <= max_distance:
+                for value in node[1]:
+                    results.append((distance, value))
+
+            low = distance - max_distance
+            high = distance + max_distance
+            for child_distance in node[2]:
+                if low <= child_distance <= high:
+                    candidates.append(node[2][child_distance])
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+class ImageIndex:
+    """
+    Track generated images and reject byte identical or visually identical
+    images.
+
+    @param max_distance Hamming distance between perceptual hashes for two
+                        images to be considered candidates for a duplicate.
+    @param pixel_tolerance Mean absolute difference per greyscale pixel (0-255)
+                           at or below which two candidate images are
+                           considered the same image.  Greyscale keeps jpeg
+                           chroma subsampling noise out of the comparison.
+    @param method 'dhash' or 'phash'
+    """
+
+    HASH_SIZE = 8
+
+    def __init__(self,
+                 max_distance: int = 6,
+                 pixel_tolerance: float = 2.0,
+                 method: str = 'dhash'):
+        if method not in ('dhash', 'phash'):
+            logger.error('Unknown perceptual hash method: {}'.format(method))
+            raise Exception('Unknown perceptual hash method: {}'.format(method))
+
+        self.max_distance = max_distance
+        self.pixel_tolerance = pixel_tolerance
+        self.method = method
+        self.sha256_hashes = {}
+        self.tree = BKTree()
+
+    def __len__(self) -> int:
+        return len(self.sha256_hashes)
+
+    @staticmethod
+    def calc_sha256(image_path: str) -> str:
+        BLOCKSIZE = 65536
+        hasher = hashlib.sha256()
+        with open(image_path, 'rb') as afile:
+            buf = afile.read(BLOCKSIZE)
+            while len(buf) > 0:
+                hasher.update(buf)
+                buf = afile.read(BLOCKSIZE)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def bits_to_int(bits: numpy.ndarray) -> int:
+        value = 0
+        for byte in numpy.packbits(bits.flatten()):
+            value = (value << 8) | int(byte)
+        return value
+
+    @staticmethod
+    def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+        """
+        Difference hash.  Each bit is set when a pixel is brighter than its
+        right hand neighbor on a (hash_size+1) x hash_size greyscale thumbnail.
+        """
+
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = numpy.asarray(small, dtype=numpy.int16)
+        return ImageIndex.bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+    @staticmethod
+    def phash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+        """
+        DCT hash.  Each bit is set when a low frequency DCT coefficient of a
+        32 x 32 greyscale thumbnail is above the median coefficient.
+        """
+
+        size = hash_size * 4
+        small = image.convert('L').resize((size, size), Image.LANCZOS)
+        pixels = numpy.asarray(small, dtype=numpy.float64)
+
+        # DCT-II basis, the 2D transform is then just two matrix products
+        n = numpy.arange(size)
+        basis = numpy.cos(numpy.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+        dct = basis @ pixels @ basis.T
+
+        low = dct[:hash_size, :hash_size]
+        median = numpy.median(low.flatten()[1:])
+        return ImageIndex.bits_to_int(low > median)
+
+    @staticmethod
+    def load_pixels(image_path: str) -> numpy.ndarray:
+        with Image.open(image_path) as image:
+            return numpy.asarray(image.convert('L'), dtype=numpy.int16)
+
+    def perceptual_hash(self, image: Image.Image) -> int:
+        if self.method == 'phash':
+            return ImageIndex.phash(image)
+
+        return ImageIndex.dhash(image)
+
+    def pixels_match(self, pixels: numpy.ndarray, other_path: str) -> bool:
+        other = ImageIndex.load_pixels(other_path)
+        if other.shape != pixels.shape:
+            return False
+
+        return float(numpy.abs(pixels - other).mean()) <= self.pixel_tolerance
+
+    def hash_image(self, image_path: str) -> Tuple[str, int]:
+        """
+        @return (sha256, perceptual hash)
+        """
+
+        sha256 = ImageIndex.calc_sha256(image_path)
+        with Image.open(image_path) as image:
+            phash = self.perceptual_hash(image)
+        return (sha256, phash)
+
+    def find_duplicate_hashes(self, image_path: str, hashes: Tuple[str, int]) -> Tuple[str, str]:
+        """
+        Search the index for an image matching image_path with the hashes
+        from hash_image.  The pixels are only loaded if there is a
+        perceptual hash candidate.
+
+        @return (existing_image_path, reason) or (None, None) if unique.
+        """
+
+        (sha256, phash) = hashes
+        if sha256 in self.sha256_hashes:
+            return (self.sha256_hashes[sha256], 'sha256 {}'.format(sha256))
+
+        pixels = None
+        for (distance, other_path) in self.tree.find(phash, self.max_distance):
+            if pixels is None:
+                pixels = ImageIndex.load_pixels(image_path)
+            if self.pixels_match(pixels, other_path):
+                return (other_path, '{} {:016x}, distance {}'.format(self.method, phash, distance))
+
+        return (None, None)
+
+    def find_duplicate(self, image_path: str) -> Tuple[str, str]:
+        """
+        Search the index for an image matching image_path.
+
+        @return (existing_image_path, reason) or (None, None) if unique.  The
+                reason is the matching SHA-256 or perceptual hash.
+        """
+
+        return self.find_duplicate_hashes(image_path, self.hash_image(image_path))
+
+    def add_hashes(self, image_path: str, hashes: Tuple[str, int]) -> Tuple[str, int]:
+        (sha256, phash) = hashes
+        self.sha256_hashes[sha256] = image_path
+        self.tree.add(phash, image_path)
+        return hashes
+
+    def add(self, image_path: str) -> Tuple[str, int]:
+        """
+        Add an image to the index without checking it.
+
+        @return (sha256, perceptual hash)
+        """
+
+        return self.add_hashes(image_path, self.hash_image(image_path))
+
+    def check_and_add(self, image_path: str) -> Tuple[str, str]:
+        """
+        Search the index for image_path and then add it, hashing the image
+        once.
+
+        @return (existing_image_path, reason) as find_duplicate
+        """
+
+        hashes = self.hash_image(image_path)
+        (existing, reason) = self.find_duplicate_hashes(image_path, hashes)
+        self.add_hashes(image_path, hashes)
+        return (existing, reason)
+
+    def verify_unique(self, image_path: str) -> None:
+        """
+        Raise an exception if image_path duplicates an indexed image, otherwise
+        add it to the index.
+        """
+
+        hashes = self.hash_image(image_path)
+        (existing, reason) = self.find_duplicate_hashes(image_path, hashes)
+        if existing != None:
+            logger.error('Found Duplicate NFT Image: {} exists at {} for {}'.format(existing, reason, image_path))
+            raise Exception('Found Duplicate NFT Image: {} exists at {} for {}'.format(existing, reason, image_path))
+
+        self.add_hashes(image_path, hashes)
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--directory', required=True,
+                                       action='store',
+                                       type=str,
+                                       metavar='LOCATION',
+                                       help='Directory of generated images, i.e. nft/<network>/<drop>/nft_img')
+    parser.add_argument('--distance',  required=False,
+                                       action='store',
+                                       type=int,
+                                       default=6,
+                                       metavar='BITS',
+                                       help='Max perceptual hash distance for a duplicate candidate, default = 6')
+    parser.add_argument('--method',    required=False,
+                                       action='store',
+                                       type=str,
+                                       default='dhash',
+                                       metavar='NAME',
+                                       help='Perceptual hash, [dhash | phash]')
+
+    args = parser.parse_args()
+    directory = args.directory
+
+    index = ImageIndex(max_distance=args.distance, method=args.method)
+    filenames = os.listdir(directory)
+    filenames.sort()
+    checked = 0
+    duplicates = 0
+    for filename in filenames:
+        f = os.path.join(directory, filename)
+        if not os.path.isfile(f):
+            continue
+
+        checked += 1
+        (existing, reason) = index.check_and_add(f)
+        if existing != None:
+            print('DUPLICATE: {} = {} ({})'.format(f, existing, reason))
+            duplicates += 1
+
+    print('Checked {} images, {} duplicates'.format(checked, duplicates))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
@@ -28,18 +28,24 @@ Author: SuperKK
 Utility to upload files into IPFS and update a drop metametadata
 """
 
-from asyncio.log import logger
-from typing import Dict
+from typing import Dict, List
 import argparse
+import concurrent.futures
 import json
 import logging
 import os
 import requests
+import requests.adapters
+import tcr.cid
 import tcr.command
 import tcr.nftmint
+import threading
+import time
 import traceback
 
-global logger
+INFURA_API_URL = 'https://ipfs.infura.io:5001/api/v0'
+
+logger = logging.getLogger('ipfs')
 
 def set_metametadata(network: str, drop_name: str, metametadata: Dict) -> None:
     metametadata_file = 'nft/{}/{}/{}_metametadata.json'.format(network, drop_name, drop_name)
@@ -65,44 +71,304 @@ def get_metadataset(network: str, drop_name: str) -> Dict:
         metadataset = json.load(file)
     return metadataset
 
-def ipfs_upload(projectid: str, projectsecret: str, filename: str) -> str:
-    global logger
+class IpfsClient:
+    """
+    Upload and pin files with the IPFS HTTP API (infura.io by default).
 
-    files = {'file': (os.path.basename(filename), open(filename, 'rb'))}
+    A single keep-alive requests.Session is shared by all threads using the
+    client.  Requests that fail with a connection error, a timeout or a
+    retryable status code are retried with exponential backoff.
+    """
 
-    logger.info('Uploading: {}'.format(filename))
-    # Thank you!!  https://curl.trillworks.com/#python
-    response = requests.post('https://ipfs.infura.io:5001/api/v0/add?pin=false',
-                             files=files,
-                             auth=(projectid, projectsecret))
+    RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
 
-    if response.status_code != 200:
-        logger.error('Upload Status Code: {}'.format(response.status_code))
-        raise Exception('Upload Status Code: {}'.format(response.status_code))
+    def __init__(self,
+                 projectid: str,
+                 projectsecret: str,
+                 api_url: str = INFURA_API_URL,
+                 retries: int = 5,
+                 backoff: float = 1.0,
+                 pool_size: int = 8,
+                 timeout: float = 300.0):
+        self.api_url = api_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
 
-    upload_json = response.json()
-    return upload_json['Hash']
+        self.session = requests.Session()
+        self.session.auth = (projectid, projectsecret)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-def ipfs_pin(projectid: str, projectsecret: str, ipfs_hash: str) -> str:
-    logger.info('Pinning: {}'.format(ipfs_hash))
-    # Thank you!!  https://curl.trillworks.com/#python
-    params = {('arg', ipfs_hash)}
-    response = requests.post('https://ipfs.infura.io:5001/api/v0/pin/add',
-                             params=params,
-                             auth=(projectid, projectsecret))
+    def close(self) -> None:
+        self.session.close()
+
+    def post(self, endpoint: str, description: str, filename: str = None, **kwargs) -> requests.Response:
+        url = '{}/{}'.format(self.api_url, endpoint)
+        attempt = 0
+        while True:
+            try:
+                if filename != None:
+                    with open(filename, 'rb') as file:
+                        files = {'file': (os.path.basename(filename), file)}
+                        response = self.session.post(url, files=files, timeout=self.timeout, **kwargs)
+                else:
+                    response = self.session.post(url, timeout=self.timeout, **kwargs)
+
+                if response.status_code == 200:
+                    return response
+
+                if response.status_code not in IpfsClient.RETRY_STATUS_CODES or attempt >= self.retries:
+                    logger.error('{} Status Code: {}'.format(description, response.status_code))
+                    raise Exception('{} Status Code: {}'.format(description, response.status_code))
+
+                logger.warning('{} Status Code: {}, retry'.format(description, response.status_code))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.retries:
+                    logger.error('{} Failed: {}'.format(description, e))
+                    raise e
+
+                logger.warning('{} Failed: {}, retry'.format(description, e))
+
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def upload(self, filename: str, expected_cid: str = None) -> str:
+        """
+        Upload a file.  If expected_cid is given the hash returned by the
+        remote must match it.
+        """
+
+        logger.info('Uploading: {}'.format(filename))
+        # Thank you!!  https://curl.trillworks.com/#python
+        response = self.post('add?pin=false', 'Upload', filename=filename)
+        upload_json = response.json()
+        ipfs_hash = upload_json['Hash']
+
+        if expected_cid != None and ipfs_hash != expected_cid:
+            # The remote may be configured for a different CID version
+            if tcr.cid.cid_version(ipfs_hash) == tcr.cid.cid_version(expected_cid) or not tcr.cid.verify_file_cid(filename, ipfs_hash):
+                logger.error('CID mismatch for {}: {} != {}'.format(filename, ipfs_hash, expected_cid))
+                raise Exception('CID mismatch for {}: {} != {}'.format(filename, ipfs_hash, expected_cid))
+
+        return ipfs_hash
+
+    def pin(self, ipfs_hashes: List[str]) -> bool:
+        """
+        Pin one or more hashes with a single request.
+        """
+
+        logger.info('Pinning: {}'.format(', '.join(ipfs_hashes)))
+        params = [('arg', ipfs_hash) for ipfs_hash in ipfs_hashes]
+        response = self.post('pin/add', 'Pin', params=params)
+
+        pin_json = response.json()
+        for ipfs_hash in ipfs_hashes:
+            if ipfs_hash not in pin_json['Pins']:
+                logger.error('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+                raise Exception('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+
+        return True
+
+class UploadJournal:
+    """
+    Append only record of uploaded and pinned files, one JSON object per line.
+    The journal is also the manifest of CIDs known to be on the pinning
+    service.  Files are looked up by their locally computed CID so an
+    interrupted or repeated upload only transfers files that are missing.
+    Each upload records the local CID and the hash the remote returned,
+    which can be a different CID version.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.uploaded = {}
+        self.pinned = set()
+        self.lock = threading.Lock()
+
+        if self.filename != None and os.path.isfile(self.filename):
+            with open(self.filename, 'r') as file:
+                for line in file:
+                    line = line.strip()
+                    if len(line) == 0:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn write from an interrupted run
+                        logger.warning('Journal, skip invalid entry: {}'.format(line))
+                        continue
+
+                    if 'pinned' in entry:
+                        self.pinned.add(entry['pinned'])
+                    else:
+                        # entries from before the local CID was recorded
+                        self.uploaded[entry.get('cid', entry['hash'])] = entry['hash']
+            logger.info('Journal: {}, {} uploaded, {} pinned'.format(self.filename, len(self.uploaded), len(self.pinned)))
+
+    def append(self, entry: Dict) -> None:
+        if self.filename == None:
+            return
+
+        with open(self.filename, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def is_uploaded(self, cid: str) -> bool:
+        return self.get_uploaded(cid) != None
+
+    def get_uploaded(self, cid: str) -> str:
+        """
+        @return The remote hash of the file with the local CID, None if it
+                is not uploaded
+        """
+
+        with self.lock:
+            if cid in self.uploaded:
+                return self.uploaded[cid]
+            if cid in self.pinned:
+                return cid
+            return None
+
+    def is_pinned(self, ipfs_hash: str) -> bool:
+        with self.lock:
+            return ipfs_hash in self.pinned
+
+    def set_uploaded(self, filename: str, cid: str, ipfs_hash: str) -> None:
+        """
+        @param cid The locally computed CID
+        @param ipfs_hash The hash returned by the remote
+        """
+
+        with self.lock:
+            self.uploaded[cid] = ipfs_hash
+            self.append({'file': filename, 'hash': ipfs_hash, 'cid': cid})
 
-    if response.status_code != 200:
-        logger.error('Pin Status Code: {}'.format(response.status_code))
-        raise Exception('Pin Status Code: {}'.format(response.status_code))
+    def set_pinned(self, ipfs_hashes: List[str]) -> None:
+        with self.lock:
+            for ipfs_hash in ipfs_hashes:
+                if ipfs_hash not in self.pinned:
+                    self.pinned.add(ipfs_hash)
+                    self.append({'pinned': ipfs_hash})
 
-    pin_json = response.json()
-    if ipfs_hash not in pin_json['Pins']:
-        logger.error('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
-        raise Exception('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+def upload_files(client: IpfsClient,
+                 journal: UploadJournal,
+                 filenames: List[str],
+                 workers: int = 4,
+                 pin_batch: int = 50) -> Dict[str, str]:
+    """
+    Upload and pin a list of files.  Uploads run concurrently on a pool of
+    worker threads, pins are sent in batches of pin_batch hashes.  Files with
+    a CID already in the journal are not uploaded again.
 
-    return True
+    @return Dictionary of filename to IPFS hash
+    """
+
+    def upload(filename: str) -> str:
+        cid = tcr.cid.compute_file_cid(filename)
+        ipfs_hash = journal.get_uploaded(cid)
+        if ipfs_hash != None:
+            logger.info('Already uploaded: {} = {}'.format(filename, ipfs_hash))
+            return ipfs_hash
+
+        ipfs_hash = client.upload(filename, expected_cid=cid)
+        journal.set_uploaded(filename, cid, ipfs_hash)
+        return ipfs_hash
+
+    hashes = {}
+    unpinned = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for (filename, ipfs_hash) in zip(filenames, executor.map(upload, filenames)):
+            hashes[filename] = ipfs_hash
+            if not journal.is_pinned(ipfs_hash) and ipfs_hash not in unpinned:
+                unpinned.append(ipfs_hash)
+
+            if len(unpinned) >= pin_batch:
+                client.pin(unpinned)
+                journal.set_pinned(unpinned)
+                unpinned = []
+
+    if len(unpinned) > 0:
+        client.pin(unpinned)
+        journal.set_pinned(unpinned)
+
+    return hashes
+
+def upload_metadata_images(client: IpfsClient,
+                           journal: UploadJournal,
+                           metadata_files: List[str],
+                           workers: int = 4,
+                           pin_batch: int = 50) -> int:
+    """
+    Upload the image referenced by each NFT metadata file and update the
+    metadata to point at the IPFS image.  Files already pointing at ipfs://
+    are skipped.
+
+    @return The number of metadata files updated
+    """
+
+    pending = {}
+    for filename in metadata_files:
+        logger.info("Open NFT Metadata: {}".format(filename))
+        with open(filename, 'r') as mdfile:
+            nftmetadata = json.load(mdfile)
+
+        policy_id = list(nftmetadata['721'].keys())[0]
+        token_name = list(nftmetadata['721'][policy_id].keys())[0]
+        image = nftmetadata['721'][policy_id][token_name]['image']
+        if not image.startswith('ipfs://'):
+            logger.info('Upload: {} / {}'.format(image, filename))
+            pending[filename] = image
+
+    updated = 0
+    filenames = list(pending.keys())
+    # Work through the files in chunks so each chunk of metadata is saved
+    # soon after its images are pinned
+    chunk_size = max(pin_batch, workers)
+    for i in range(0, len(filenames), chunk_size):
+        chunk = filenames[i:i+chunk_size]
+        hashes = upload_files(client,
+                              journal,
+                              [pending[filename] for filename in chunk],
+                              workers=workers,
+                              pin_batch=pin_batch)
+
+        for filename in chunk:
+            with open(filename, 'r') as mdfile:
+                nftmetadata = json.load(mdfile)
+
+            policy_id = list(nftmetadata['721'].keys())[0]
+            token_name = list(nftmetadata['721'][policy_id].keys())[0]
+            ipfs_hash = hashes[pending[filename]]
+            nftmetadata['721'][policy_id][token_name]['image'] = 'ipfs://{}'.format(ipfs_hash)
+            with open(filename, 'w') as f:
+                f.write(json.dumps(nftmetadata, indent=4))
+                logger.info('Saved MetaMetaData: {}'.format(filename))
+
+            logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
+            updated += 1
+
+    return updated
+
+def ipfs_upload(projectid: str, projectsecret: str, filename: str) -> str:
+    client = IpfsClient(projectid, projectsecret)
+    try:
+        return client.upload(filename, expected_cid=tcr.cid.compute_file_cid(filename))
+    finally:
+        client.close()
+
+def ipfs_pin(projectid: str, projectsecret: str, ipfs_hash: str) -> str:
+    client = IpfsClient(projectid, projectsecret)
+    try:
+        return client.pin([ipfs_hash])
+    finally:
+        client.close()
 
 def main():
+    global logger
+
     # Set parameters for the transactions
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('--projectid', required=True,
@@ -128,6 +394,28 @@ def main():
                                      default=None,
                                      metavar='NAME',
                                      help='Filename to upload and pin')
+    parser.add_argument('--workers', required=False,
+                                     action='store',
+                                     type=int,
+                                     default=4,
+                                     metavar='COUNT',
+                                     help='Number of concurrent uploads, default = 4')
+    parser.add_argument('--pin-batch', required=False,
+                                       action='store',
+                                       type=int,
+                                       default=50,
+                                       metavar='COUNT',
+                                       help='Number of hashes to pin per request, default = 50')
+    parser.add_argument('--api',     required=False,
+                                     action='store',
+                                     default=INFURA_API_URL,
+                                     metavar='URL',
+                                     help='IPFS HTTP API, default = {}'.format(INFURA_API_URL))
+    parser.add_argument('--manifest', required=False,
+                                      action='store',
+                                      default=None,
+                                      metavar='NAME',
+                                      help='Journal of uploaded / pinned CIDs, default = nft/<network>/<drop>/ipfs_journal.jsonl')
 
     args = parser.parse_args()
 
@@ -136,6 +424,9 @@ def main():
     network = args.network
     drop_name = args.drop
     filename = args.file
+    workers = args.workers
+    pin_batch = args.pin_batch
+    manifest = args.manifest
 
     tcr.nftmint.setup_logging(network, 'ipfs')
     logger = logging.getLogger(network)
@@ -151,6 +442,12 @@ def main():
         logger.error('Invalid parameters.  With --file, Do not set --network and --drop')
         raise Exception('Invalid parameters.  With --file, Do not set --network and --drop')
 
+    if workers < 1 or pin_batch < 1:
+        logger.error('Invalid parameters.  --workers and --pin-batch must be at least 1')
+        raise Exception('Invalid parameters.  --workers and --pin-batch must be at least 1')
+
+    client = IpfsClient(projectid, projectsecret, api_url=args.api, pool_size=workers)
+
     if filename == None:
         # Upload and update content in a drop metametadata file
         if not network in tcr.command.networks:
@@ -159,50 +456,39 @@ def main():
 
         logger.info('Network: {}'.format(network))
         logger.info('Drop: {}'.format(drop_name))
+        logger.info('Workers: {}, Pin Batch: {}'.format(workers, pin_batch))
 
+        if manifest == None:
+            manifest = 'nft/{}/{}/ipfs_journal.jsonl'.format(network, drop_name)
+        journal = UploadJournal(manifest)
         metametadata = get_metametadata(network, drop_name)
         if 'cards' in metametadata and len(metametadata['cards']) > 0:
-            for card in metametadata['cards']:
-                nftfilename = './nft/{}/{}/{}'.format(network, drop_name, card['local_source'])
-                ipfs_hash = ipfs_upload(projectid, projectsecret, nftfilename)
-                pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
-                logger.info('PIN State: {}'.format(pin_state))
+            nftfilenames = ['./nft/{}/{}/{}'.format(network, drop_name, card['local_source']) for card in metametadata['cards']]
+            hashes = upload_files(client, journal, nftfilenames, workers=workers, pin_batch=pin_batch)
+            for (card, nftfilename) in zip(metametadata['cards'], nftfilenames):
+                ipfs_hash = hashes[nftfilename]
                 logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
-                logger.info('')
                 card['image'] = 'ipfs://{}'.format(ipfs_hash)
             set_metametadata(network, drop_name, metametadata)
         elif 'layer-sets' in metametadata and len(metametadata['layer-sets']) > 0:
             metadataset = get_metadataset(network, drop_name)
-            for filename in metadataset['files']:
-                nftmetadata = {}
-                logger.info("Open NFT Metadata: {}".format(filename))
-                with open(filename, 'r') as mdfile:
-                    nftmetadata = json.load(mdfile)
-
-                policy_id = list(nftmetadata['721'].keys())[0]
-                token_name = list(nftmetadata['721'][policy_id].keys())[0]
-                if not nftmetadata['721'][policy_id][token_name]['image'].startswith('ipfs://'):
-                    logger.info('Upload: {} / {}'.format(nftmetadata['721'][policy_id][token_name]['image'], filename))
-                    ipfs_hash = ipfs_upload(projectid, projectsecret, nftmetadata['721'][policy_id][token_name]['image'])
-                    pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
-                    logger.info('PIN State: {}'.format(pin_state))
-
-                    nftmetadata['721'][policy_id][token_name]['image'] = 'ipfs://{}'.format(ipfs_hash)
-                    with open(filename, 'w') as f:
-                        f.write(json.dumps(nftmetadata, indent=4))
-                        logger.info('Saved MetaMetaData: {}'.format(filename))
-
-                    logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
-                    logger.info('')
+            updated = upload_metadata_images(client,
+                                             journal,
+                                             metadataset['files'],
+                                             workers=workers,
+                                             pin_batch=pin_batch)
+            logger.info('Updated {} NFT Metadata Files'.format(updated))
     else:
         # Just upload and pin the specified file
         logger.info('File: {}'.format(filename))
-        ipfs_hash = ipfs_upload(projectid, projectsecret, filename)
-        pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
+        ipfs_hash = client.upload(filename, expected_cid=tcr.cid.compute_file_cid(filename))
+        pin_state = client.pin([ipfs_hash])
         logger.info('PIN State: {}'.format(pin_state))
         logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
         logger.info('')
 
+    client.close()
+
 if __name__ == '__main__':
     try:
         main()
@@ -21,14 +21,18 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from typing import Dict
+from typing import Callable, Dict, List, Tuple
 import argparse
+import concurrent.futures
 import json
 import logging
 import os
 import requests
+import requests.adapters
+import tcr.cid
 import tcr.command
 import tcr.nftmint
+import threading
 import traceback
 import hashlib
 
@@ -38,10 +42,18 @@ Author: SuperKK
 
 After files have been uploaded to IPFS with ipfs.py, this utility checks to make
 sure each metadata file has been correctly updated as well as the file on IPFS
-is able to be downloaded and matches the original
+is able to be downloaded and matches the original.
+
+With --offline the IPFS CID of each image is computed locally and compared to
+the metadata, nothing is downloaded.  Otherwise the images are streamed from
+a gateway in parallel.  Verified files are recorded in a journal so a check
+that is interrupted picks up where it left off.
 """
 
-logger = None
+IPFS_GATEWAY = 'http://ipfs.io/ipfs'
+DOWNLOAD_BLOCKSIZE = 65536
+
+logger = logging.getLogger('ipfs_check')
 
 def calc_sha256(filepath: str) :
     BLOCKSIZE = 65536
@@ -57,6 +69,135 @@ def sort_filename(value: str) -> int:
     number = value.split('x')[2]
     return int(number)
 
+def get_image_cid(metadata_file: str) -> str:
+    """
+    Read the IPFS CID of the image from NFT metadata.
+    """
+
+    with open(metadata_file, 'r') as file:
+        md = json.load(file)
+
+    erc721 = md['721']
+    policy = erc721[list(erc721.keys())[0]]
+    token = policy[list(policy.keys())[0]]
+
+    image = token['image']
+    if not image.startswith('ipfs://'):
+        logger.error('Image not on IPFS: {} = {}'.format(metadata_file, image))
+        raise Exception('Image not on IPFS: {} = {}'.format(metadata_file, image))
+
+    return image[7:]
+
+class CheckJournal:
+    """
+    Append only record of verified metadata files and the CID each was
+    verified against, one JSON object per line.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.verified = {}
+        self.lock = threading.Lock()
+
+        if self.filename != None and os.path.isfile(self.filename):
+            with open(self.filename, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.verified[entry['file']] = entry['cid']
+            logger.info('Journal: {}, {} verified'.format(self.filename, len(self.verified)))
+
+    def is_verified(self, metadata_file: str, cid: str) -> bool:
+        with self.lock:
+            return self.verified.get(metadata_file) == cid
+
+    def set_verified(self, metadata_file: str, cid: str) -> None:
+        with self.lock:
+            self.verified[metadata_file] = cid
+            if self.filename == None:
+                return
+
+            with open(self.filename, 'a') as file:
+                file.write(json.dumps({'file': metadata_file, 'cid': cid}) + '\n')
+
+class GatewayChecker:
+    """
+    Stream files from an IPFS gateway and compare them with the local copy.
+    The SHA-256 is updated as each block arrives so a file is never held in
+    memory.
+    """
+
+    def __init__(self, gateway: str = IPFS_GATEWAY, pool_size: int = 8, timeout: int = 300):
+        self.gateway = gateway.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def check(self, cid: str, image_file: str) -> bool:
+        download_url = '{}/{}'.format(self.gateway, cid)
+        logger.info('Download: {}'.format(download_url))
+        hasher = hashlib.sha256()
+        with self.session.get(download_url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for block in response.iter_content(DOWNLOAD_BLOCKSIZE):
+                hasher.update(block)
+
+        return hasher.hexdigest() == calc_sha256(image_file)
+
+def check_offline(cid: str, image_file: str) -> bool:
+    """
+    Compare the CID in the metadata with the CID computed from the local file.
+    """
+
+    return tcr.cid.verify_file_cid(image_file, cid)
+
+def check_files(pairs: List[Tuple[str, str]],
+                check: Callable[[str, str], bool],
+                journal: CheckJournal,
+                workers: int = 8) -> List[str]:
+    """
+    Verify each (metadata file, image file) pair with check, running on a pool
+    of worker threads.  Pairs already in the journal are skipped.  A pair that
+    cannot be checked, e.g. a gateway error, is reported as failed and the
+    rest are still checked.
+
+    @return List of metadata files that failed
+    """
+
+    def verify(pair: Tuple[str, str]) -> bool:
+        (metadata_file, image_file) = pair
+        try:
+            cid = get_image_cid(metadata_file)
+            if journal.is_verified(metadata_file, cid):
+                logger.debug('Already verified: {}'.format(metadata_file))
+                return True
+
+            logger.info('Verify: {} / {}'.format(metadata_file, image_file))
+            if not check(cid, image_file):
+                logger.error('HASH Not Equal!! {} / {}'.format(metadata_file, image_file))
+                return False
+        except Exception as e:
+            logger.error('Unable to verify {} / {}: {}'.format(metadata_file, image_file, e))
+            return False
+
+        journal.set_verified(metadata_file, cid)
+        return True
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for (pair, ok) in zip(pairs, executor.map(verify, pairs)):
+            if not ok:
+                failed.append(pair[0])
+
+    return failed
+
 def main():
     global logger
 
@@ -70,17 +211,27 @@ def main():
                                        action='store',
                                        metavar='LOCATION',
                                        help='Directory containing metadata and images')
-    parser.add_argument('--start', required=False,
+    parser.add_argument('--offline',   required=False,
+                                       action='store_true',
+                                       help='Compute the CID locally, do not download')
+    parser.add_argument('--gateway',   required=False,
                                        action='store',
-                                       metavar='index',
+                                       metavar='URL',
+                                       default=IPFS_GATEWAY,
+                                       help='IPFS gateway, default = {}'.format(IPFS_GATEWAY))
+    parser.add_argument('--workers',   required=False,
+                                       action='store',
+                                       metavar='N',
                                        type=int,
-                                       default=0,
-                                       help='Start index, default = 0')
+                                       default=8,
+                                       help='Parallel checks, default = 8')
 
     args = parser.parse_args()
     directory = args.directory
     network = args.network
-    start = args.start
+    offline = args.offline
+    gateway = args.gateway
+    workers = args.workers
 
     tcr.nftmint.setup_logging(network, 'ipfs_check')
     logger = logging.getLogger(network)
@@ -97,30 +248,22 @@ def main():
     if len(image_files) != len(metadata_files):
         logger.error('Length not equal, {} != {}'.format(len(image_files), len(metadata_files)))
 
-    logger.info('Start at index = {}'.format(start))
-    for i in range(start, len(image_files)):
-        with open(os.path.join(md_dir, metadata_files[i]), 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
-
-                image = token['image']
-                cid = image[7:]
-
-                logger.info('Verify: {}'.format(metadata_files[i]))
-                download_url = 'http://ipfs.io/ipfs/{}'.format(cid)
-                logger.info('Download: {}'.format(download_url))
-                r = requests.get(download_url)
-                hasher = hashlib.sha256()
-                hasher.update(r.content)
-                ipfs_hash = hasher.hexdigest()
-                logger.info('Compare: {}'.format(image_files[i]))
-                local_hash = calc_sha256(os.path.join(img_dir, image_files[i]))
-
-                if local_hash != ipfs_hash:
-                    logger.error('HASH Not Equal!!')
-                    raise Exception('HASH Not Equal!!')
+    pairs = [(os.path.join(md_dir, m), os.path.join(img_dir, i)) for (m, i) in zip(metadata_files, image_files)]
+
+    if offline:
+        journal = CheckJournal(None)
+        failed = check_files(pairs, check_offline, journal, workers)
+    else:
+        journal = CheckJournal(os.path.join(directory, 'ipfs_check_journal.jsonl'))
+        checker = GatewayChecker(gateway, pool_size=workers)
+        try:
+            failed = check_files(pairs, checker.check, journal, workers)
+        finally:
+            checker.close()
+
+    logger.info('Checked: {}, Failed: {}'.format(len(pairs), len(failed)))
+    if len(failed) > 0:
+        raise Exception('HASH Not Equal!! {}'.format(', '.join(failed)))
 
 if __name__ == '__main__':
     try:
@@ -26,8 +26,11 @@ File: metadata_list.py
 Author: SuperKK
 """
 
+from typing import List
+
 import logging
 import json
+import threading
 
 logger = logging.getLogger('metadata-list')
 
@@ -65,5 +68,80 @@ class MetadataList:
             self.metadata_list['files'].pop(0)
             self.peek_index -= 1
 
+        self.save()
+
+    def get_next_files(self, count: int, exclude: List[str] = []) -> List[str]:
+        """
+        The next count files in order without taking them, skipping any in
+        exclude.  May return fewer than count.
+        """
+
+        files = []
+        for filename in self.metadata_list['files']:
+            if len(files) == count:
+                break
+            if not filename in exclude:
+                files.append(filename)
+        return files
+
+    def remove_files(self, files: List[str]) -> None:
+        """
+        Take the given files out of the list wherever they are.
+        """
+
+        files = set(files)
+        self.metadata_list['files'] = [filename for filename in self.metadata_list['files'] if not filename in files]
+        self.save()
+
+    def save(self) -> None:
         with open(self.metadata_set_file, 'w') as file:
             file.write(json.dumps(self.metadata_list, indent=4))
+
+class MetadataAllocator:
+    """
+    Hands out files from a MetadataList to mints running concurrently.  Files
+    allocated to a mint are reserved until the mint is committed, which takes
+    them out of the list, or released, which makes them available again.
+    """
+
+    def __init__(self, metadata_list: MetadataList):
+        self.metadata_list = metadata_list
+        self.reserved = []
+        self.lock = threading.Lock()
+
+    def get_remaining(self) -> int:
+        with self.lock:
+            return self.metadata_list.get_remaining() - len(self.reserved)
+
+    def get_reserved(self) -> int:
+        with self.lock:
+            return len(self.reserved)
+
+    def allocate(self, count: int) -> List[str]:
+        with self.lock:
+            files = self.metadata_list.get_next_files(count, set(self.reserved))
+            if len(files) < count:
+                logger.error('MetadataAllocator, {} files available, {} requested'.format(len(files), count))
+                raise Exception('MetadataAllocator, {} files available, {} requested'.format(len(files), count))
+
+            self.reserved.extend(files)
+            return files
+
+    def reserve(self, files: List[str]) -> None:
+        """
+        Reserve files taken by a mint before a restart.  Files no longer in
+        the list are ignored.
+        """
+
+        with self.lock:
+            self.reserved.extend([filename for filename in self.metadata_list.metadata_list['files']
+                                  if filename in files and not filename in self.reserved])
+
+    def commit(self, files: List[str]) -> None:
+        with self.lock:
+            self.metadata_list.remove_files(files)
+            self.reserved = [filename for filename in self.reserved if not filename in files]
+
+    def release(self, files: List[str]) -> None:
+        with self.lock:
+            self.reserved = [filename for filename in self.reserved if not filename in files]
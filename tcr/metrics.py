@@ -0,0 +1,277 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: metrics.py
+Author: SuperKK
+
+Counters, gauges and histograms for the mint pipeline in the Prometheus text
+format.  They are served on /metrics by the mint control API or written
+periodically to a textfile for the node_exporter textfile collector.
+"""
+
+from typing import Dict, List
+import bisect
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('metrics')
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+def escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labelnames: List[str], labelvalues: tuple, extra: str = None) -> str:
+    labels = ['{}="{}"'.format(name, escape_label(value)) for (name, value) in zip(labelnames, labelvalues)]
+    if extra != None:
+        labels.append(extra)
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(labels) + '}'
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    def __init__(self, name: str, help: str, kind: str, labelnames: List[str] = []):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = list(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, labels: Dict) -> tuple:
+        if set(labels.keys()) != set(self.labelnames):
+            raise Exception('Metric {}, expected labels {} got {}'.format(self.name, self.labelnames, list(labels.keys())))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            return ['{}{} {}'.format(self.name, format_labels(self.labelnames, key), format_value(value)) for (key, value) in sorted(self.values.items())]
+
+    def render(self) -> str:
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.kind)]
+        lines.extend(self.render_samples())
+        return '\n'.join(lines) + '\n'
+
+class Counter(Metric):
+    def __init__(self, name: str, help: str, labelnames: List[str] = []):
+        super().__init__(name, help, 'counter', labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self.get_key(labels), 0)
+
+class Gauge(Metric):
+    def __init__(self, name: str, help: str, labelnames: List[str] = []):
+        super().__init__(name, help, 'gauge', labelnames)
+
+    def set(self, value: float, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self.get_key(labels), 0)
+
+class Timer:
+    def __init__(self, histogram: 'Histogram', labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Histogram(Metric):
+    def __init__(self, name: str, help: str, labelnames: List[str] = [], buckets: List[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, 'histogram', labelnames)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            if not key in self.values:
+                self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            data = self.values[key]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                data['buckets'][index] += 1
+            data['sum'] += value
+            data['count'] += 1
+
+    def time(self, **labels) -> Timer:
+        """
+        Context manager observing the time spent in the block.
+        """
+
+        return Timer(self, labels)
+
+    def get_count(self, **labels) -> int:
+        with self.lock:
+            data = self.values.get(self.get_key(labels))
+            return 0 if data == None else data['count']
+
+    def render_samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for (key, data) in sorted(self.values.items()):
+                cumulative = 0
+                for (bound, count) in zip(self.buckets, data['buckets']):
+                    cumulative += count
+                    le = 'le="{}"'.format(format_value(bound))
+                    lines.append('{}_bucket{} {}'.format(self.name, format_labels(self.labelnames, key, le), cumulative))
+                lines.append('{}_bucket{} {}'.format(self.name, format_labels(self.labelnames, key, 'le="+Inf"'), data['count']))
+                lines.append('{}_sum{} {}'.format(self.name, format_labels(self.labelnames, key), format_value(data['sum'])))
+                lines.append('{}_count{} {}'.format(self.name, format_labels(self.labelnames, key), data['count']))
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics)
+        return ''.join([metric.render() for metric in metrics])
+
+    def write_textfile(self, filename: str) -> None:
+        """
+        Write all metrics for the node_exporter textfile collector.  The file
+        is replaced in one step so a scrape never reads a partial file.
+        """
+
+        temp_file = '{}.{}'.format(filename, os.getpid())
+        with open(temp_file, 'w') as file:
+            file.write(self.render())
+        os.replace(temp_file, filename)
+
+class TextfileWriter:
+    """
+    Writes a registry to a textfile from a background thread.
+    """
+
+    def __init__(self, registry: Registry, filename: str, interval: float = 15):
+        self.registry = registry
+        self.filename = filename
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='metrics-textfile', daemon=True)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                self.registry.write_textfile(self.filename)
+            except OSError as e:
+                logger.warning('Metrics, unable to write {}: {}'.format(self.filename, e))
+
+    def start(self) -> None:
+        self.thread.start()
+        logger.info('Metrics textfile: {}'.format(self.filename))
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.registry.write_textfile(self.filename)
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.register(Histogram('tcr_command_seconds',
+                                              'Time running external commands by subcommand',
+                                              ['command']))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram('tcr_db_query_seconds',
+                                               'Latency of db-sync queries',
+                                               ['query']))
+PAYMENTS = REGISTRY.register(Counter('tcr_payments_total',
+                                     'Payments by event: seen, minted, refunded or failed',
+                                     ['event']))
+QUEUE_DEPTH = REGISTRY.register(Gauge('tcr_mint_queue_depth',
+                                      'Mints and refunds in flight'))
+NFTS_REMAINING = REGISTRY.register(Gauge('tcr_nfts_remaining',
+                                         'NFTs remaining in the metadata set'))
+PAYMENT_TO_SUBMIT_SECONDS = REGISTRY.register(Histogram('tcr_payment_to_submit_seconds',
+                                                        'Time from the block of the payment to submitting its mint',
+                                                        buckets=[5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600]))
+
+def get_command_label(command: List[str]) -> str:
+    """
+    The program and its subcommand, e.g. 'cardano-cli query utxo'
+    """
+
+    words = [os.path.basename(command[0])]
+    for word in command[1:]:
+        if word.startswith('-') or len(words) == 3:
+            break
+        words.append(word)
+    return ' '.join(words)
+
+def time_query(function):
+    """
+    Decorator for Database.query_* methods.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with DB_QUERY_SECONDS.time(query=function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+def observe_payment_to_submit(block_time: datetime.datetime) -> None:
+    """
+    Observe the time from the block containing a payment to submitting its
+    mint.  db-sync block times are UTC without a timezone.  The time is 0 when
+    the payment was not found in db-sync.
+    """
+
+    if not isinstance(block_time, datetime.datetime):
+        return
+
+    if block_time.tzinfo == None:
+        block_time = block_time.replace(tzinfo=datetime.timezone.utc)
+    PAYMENT_TO_SUBMIT_SECONDS.observe(max(0, time.time() - block_time.timestamp()))
@@ -0,0 +1,261 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: mint_control.py
+Author: SuperKK
+
+Control of a running minter.  process_incoming_payments reports its
+progress to a MintController and checks it before taking new payments.
+The controller can be served on a local HTTP port:
+
+    GET  /status   state, queue depth, NFTs remaining and the last mints
+    GET  /metrics  tcr.metrics in the Prometheus text format
+    POST /pause    stop taking new payments, mints in flight complete
+    POST /resume   take new payments again
+    POST /drain    finish the mints in flight and exit
+    POST /session  {"session": ID, "destination": ADDRESS}, open a checkout
+                   session on its own payment address (with an AddressPool)
+
+The same commands are available from the command line:
+
+    python3 -m tcr.mint_control --port=8700 status
+"""
+
+from typing import Dict, List
+import argparse
+import collections
+import http.server
+import json
+import logging
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+
+import tcr.metrics
+
+CONTROL_HOST = '127.0.0.1'
+DEFAULT_CONTROL_PORT = 8700
+
+logger = logging.getLogger('mint-control')
+
+class MintController:
+    STATE_RUNNING = 'running'
+    STATE_PAUSED = 'paused'
+    STATE_DRAINING = 'draining'
+    STATE_STOPPED = 'stopped'
+
+    def __init__(self, recent: int = 20):
+        self.state = MintController.STATE_RUNNING
+        self.queue_depth = 0
+        self.nfts_remaining = None
+        self.recent = collections.deque(maxlen=recent)
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def set_state(self, state: str) -> Dict:
+        with self.lock:
+            if self.state == MintController.STATE_STOPPED:
+                raise Exception('MintController, already stopped')
+            if self.state == MintController.STATE_DRAINING and state != MintController.STATE_STOPPED:
+                raise Exception('MintController, draining')
+
+            logger.info('MintController, {} -> {}'.format(self.state, state))
+            self.state = state
+
+        self.wakeup.set()
+        return self.get_status()
+
+    def pause(self) -> Dict:
+        return self.set_state(MintController.STATE_PAUSED)
+
+    def resume(self) -> Dict:
+        return self.set_state(MintController.STATE_RUNNING)
+
+    def drain(self) -> Dict:
+        return self.set_state(MintController.STATE_DRAINING)
+
+    def stop(self) -> None:
+        with self.lock:
+            self.state = MintController.STATE_STOPPED
+
+    def is_accepting(self) -> bool:
+        """
+        @return True if new payments may be taken
+        """
+
+        with self.lock:
+            return self.state == MintController.STATE_RUNNING
+
+    def is_draining(self) -> bool:
+        with self.lock:
+            return self.state == MintController.STATE_DRAINING
+
+    def set_progress(self, queue_depth: int, nfts_remaining: int) -> None:
+        with self.lock:
+            self.queue_depth = queue_depth
+            self.nfts_remaining = nfts_remaining
+
+    def add_result(self, utxo: Dict, result: str, tokens: List[str] = [], txid: str = None) -> None:
+        """
+        Record a completed mint or refund.
+
+        @param result 'minted', 'refunded' or 'failed'
+        """
+
+        with self.lock:
+            self.recent.appendleft({'utxo': '{}#{}'.format(utxo['tx-hash'], utxo['tx-ix']),
+                                    'result': result,
+                                    'tokens': tokens,
+                                    'txid': txid,
+                                    'time': round(time.time())})
+
+    def wait(self, timeout: float) -> None:
+        """
+        Sleep until the timeout or a control command.
+        """
+
+        self.wakeup.wait(timeout)
+        self.wakeup.clear()
+
+    def get_status(self) -> Dict:
+        with self.lock:
+            return {'state': self.state,
+                    'queue-depth': self.queue_depth,
+                    'nfts-remaining': self.nfts_remaining,
+                    'uptime': round(time.time() - self.started),
+                    'recent': list(self.recent)}
+
+class ControlHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug('Control: {}'.format(format % args))
+
+    def send_json(self, status: int, data: Dict) -> None:
+        body = json.dumps(data, indent=4).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/status':
+            self.send_json(200, self.server.controller.get_status())
+        elif self.path == '/metrics':
+            body = tcr.metrics.REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+
+    def open_session(self) -> None:
+        if self.server.address_pool == None:
+            self.send_json(404, {'error': 'No address pool'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            session = self.server.address_pool.open_session(str(request['session']), request['destination'])
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {'error': 'Invalid session request: {}'.format(e)})
+            return
+
+        self.send_json(200, {'session': session['session'], 'address': session['address']})
+
+    def do_POST(self):
+        if self.path == '/session':
+            self.open_session()
+            return
+
+        commands = {'/pause': self.server.controller.pause,
+                    '/resume': self.server.controller.resume,
+                    '/drain': self.server.controller.drain}
+        if not self.path in commands:
+            self.send_json(404, {'error': 'Not found: {}'.format(self.path)})
+            return
+
+        try:
+            self.send_json(200, commands[self.path]())
+        except Exception as e:
+            self.send_json(409, {'error': str(e)})
+
+class ControlServer:
+    """
+    Serves a MintController on a local port from a background thread.
+    """
+
+    def __init__(self, controller: MintController, port: int = DEFAULT_CONTROL_PORT, host: str = CONTROL_HOST, address_pool = None):
+        self.server = http.server.ThreadingHTTPServer((host, port), ControlHandler)
+        self.server.controller = controller
+        self.server.address_pool = address_pool
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mint-control', daemon=True)
+
+    def get_port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> None:
+        self.thread.start()
+        logger.info('Control API: http://{}:{}/status'.format(self.server.server_address[0], self.get_port()))
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+def send_command(command: str, port: int = DEFAULT_CONTROL_PORT, host: str = CONTROL_HOST) -> Dict:
+    url = 'http://{}:{}/{}'.format(host, port, command)
+    request = urllib.request.Request(url, method='GET' if command == 'status' else 'POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--port', required=False,
+                                  action='store',
+                                  type=int,
+                                  metavar='PORT',
+                                  default=DEFAULT_CONTROL_PORT,
+                                  help='Control port of the minter, default = {}'.format(DEFAULT_CONTROL_PORT))
+    parser.add_argument('command', choices=['status', 'pause', 'resume', 'drain'])
+
+    args = parser.parse_args()
+    print(json.dumps(send_command(args.command, args.port), indent=4))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
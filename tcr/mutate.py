@@ -29,6 +29,7 @@ import logging
 import argparse
 import tcr.command
 import tcr.nftmint
+import tcr.preflight
 import tcr.ipfs
 import tcr.tcr
 import traceback
@@ -184,17 +185,9 @@ def process_requests(network: str, wallet_name: str) -> None:
     if wallet.get_payment_address(addr_index) == None:
         wallet.setup_address(addr_index)
 
-    tip = cardano.query_tip()
-    cardano.query_protocol_parameters()
-    tip_slot = tip['slot']
-
     database = Database('{}.ini'.format(network))
-    database.open()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('        Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, chain_metadata=False)
+    tcr.preflight.log_results(logger, preflight)
     logger.info('')
     logger.info('Payment address: {}'.format(wallet.get_payment_address(Wallet.ADDRESS_INDEX_MUTATE_REQUEST)))
 
@@ -374,16 +367,9 @@ def mint_mutants(network: str, policy_name: str, mutants_file: str) -> None:
     # General setup
     logger = logging.getLogger(network)
     cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
-    cardano.query_protocol_parameters()
     database = Database('{}.ini'.format(network))
-    database.open()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    tip = cardano.query_tip()
-    tip_slot = tip['slot']
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('        Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, chain_metadata=False)
+    tcr.preflight.log_results(logger, preflight)
     logger.info('')
     logger.info('  Mutants File: {}'.format(mutants_file))
     logger.info('   Policy Name: {}'.format(policy_name))
@@ -31,7 +31,9 @@ import json
 import os
 import time
 import random
+import tempfile
 from tcr.command import Command
+from tcr.image_index import ImageIndex
 import logging
 import hashlib
 import numpy
@@ -80,7 +82,12 @@ class Nft:
     @staticmethod
     def merge_metadata_files(policy_id: str, nft_metadata_files: List[str]) -> str:
         directory = os.path.dirname(nft_metadata_files[0])
-        merged_file = os.path.join(directory, 'nft_merged_metadata_{}.json'.format(round(time.time())))
+        # Concurrent mints can merge within the same second so the name must
+        # be unique, not just a timestamp
+        (handle, merged_file) = tempfile.mkstemp(prefix='nft_merged_metadata_{}_'.format(round(time.time())),
+                                                 suffix='.json',
+                                                 dir=directory)
+        os.close(handle)
 
         nft_merged_metadata = {}
         nft_merged_metadata['721'] = {}
@@ -354,13 +361,9 @@ class Nft:
             raise Exception('File is missing: {}'.format(result_name))
 
     @staticmethod
-    def verify_image_unique(image_hashes: Dict, image_path: str):
+    def verify_image_unique(image_index: ImageIndex, image_path: str):
         logger.info('Verify Unique: {}'.format(image_path))
-        hash = Nft.calc_sha256(image_path)
-        if hash in image_hashes:
-            logger.error('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
-            raise Exception('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
-        image_hashes[hash] = image_path
+        image_index.verify_unique(image_path)
 
     @staticmethod
     def create_random_drop_set(network: str,
@@ -373,7 +376,10 @@ class Nft:
         base_token_name = metametadata['token-name']
         base_nft_name = metametadata['nft-name']
 
-        image_hashes = {}
+        # Optional metametadata settings for near duplicate detection
+        image_index = ImageIndex(max_distance=metametadata.get('duplicate-distance', 6),
+                                 pixel_tolerance=metametadata.get('duplicate-tolerance', 2.0),
+                                 method=metametadata.get('duplicate-hash', 'dhash'))
         image_names = {}
 
         total_combinations = Nft.calculate_total_combinations(metametadata)
@@ -425,7 +431,7 @@ class Nft:
             result_name = 'nft/{}/{}/nft_img/{:05}_'.format(network, drop_name, card_number)
             nft_image_path = result_name + image_name + '.jpg'
             Nft.create_image(network, drop_name, nft_image_path, images, output_size)
-            Nft.verify_image_unique(image_hashes, nft_image_path)
+            Nft.verify_image_unique(image_index, nft_image_path)
             image_names[image_name] = True
 
             # Create the nft metadata
@@ -36,8 +36,15 @@ from tcr.nft import Nft
 from tcr.wallet import Wallet
 from tcr.wallet import WalletExternal
 from tcr.metadata_list import MetadataList
+import tcr.address_pool
 import tcr.command
+import tcr.consolidation
+import tcr.metrics
+import tcr.mint_control
+import tcr.node_client
+import tcr.preflight
 import tcr.tcr
+import tcr.tracing
 import numpy
 
 logger = None
@@ -58,7 +65,7 @@ def setup_logging(network: str, application: str) -> None:
     file_format = logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s')
     file_handler.setFormatter(file_format)
 
-    logger_names = [network, 'tcr', 'nft', 'cardano', 'wallet', 'command', 'database', 'metadata-list']
+    logger_names = [network, 'tcr', 'nft', 'cardano', 'wallet', 'command', 'database', 'metadata-list', 'mint-control', 'metrics', 'tracing', 'consolidation', 'signer', 'node-client', 'utxo-lock', 'address-pool', 'coin-selection', 'cbor']
     for logger_name in logger_names:
         other_logger = logging.getLogger(logger_name)
         other_logger.setLevel(logging.DEBUG)
@@ -204,6 +211,68 @@ def main():
                                     metavar='NAME',
                                     default=None,
                                     help='The token to burn or empty to burn all in the policy')
+    parser.add_argument('--verbose', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Also log the db-sync database size (slow)')
+    parser.add_argument('--workers', required=False,
+                                    action='store',
+                                    metavar='VALUE',
+                                    type=int,
+                                    default=1,
+                                    help='Number of payments to mint concurrently, default = 1')
+    parser.add_argument('--control-port', required=False,
+                                    action='store',
+                                    metavar='PORT',
+                                    type=int,
+                                    default=None,
+                                    help='Serve the control API (status, pause, resume, drain) on a local port while minting')
+    parser.add_argument('--metrics-file', required=False,
+                                    action='store',
+                                    metavar='FILENAME',
+                                    default=None,
+                                    help='Write metrics while minting for the node_exporter textfile collector')
+    parser.add_argument('--trace-file', required=False,
+                                    action='store',
+                                    metavar='FILENAME',
+                                    default=None,
+                                    help='Append a trace of the mint stages of each payment to a file (OTLP JSON)')
+    parser.add_argument('--address-pool', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Give each checkout session its own payment address, opened with POST /session on the control API')
+    parser.add_argument('--consolidate', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Merge the ADA-only UTXOs at the root address of the wallet.  Requires --wallet')
+    parser.add_argument('--consolidate-interval', required=False,
+                                    action='store',
+                                    metavar='SECONDS',
+                                    type=int,
+                                    default=None,
+                                    help='Also consolidate the root address of the minting wallet in the background while minting')
+    parser.add_argument('--consolidate-outputs', required=False,
+                                    action='store',
+                                    metavar='VALUE',
+                                    type=int,
+                                    default=4,
+                                    help='The number of evenly sized UTXOs to merge into, default = 4')
+    parser.add_argument('--reserve-utxos', required=False,
+                                    action='store',
+                                    metavar='VALUE',
+                                    type=int,
+                                    default=0,
+                                    help='The number of UTXOs of --reserve-lovelace kept for transactions run in parallel, default = 0')
+    parser.add_argument('--reserve-lovelace', required=False,
+                                    action='store',
+                                    metavar='VALUE',
+                                    type=int,
+                                    default=5000000,
+                                    help='The size of each reserved UTXO, default = 5000000')
+    parser.add_argument('--node-client', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Query and submit over one connection to the node socket instead of running cardano-cli')
 
     args = parser.parse_args()
     network = args.network
@@ -212,6 +281,18 @@ def main():
     create_drop = args.create_drop
     create_drop_template = args.create_drop_template
     mint = args.mint
+    workers = args.workers
+    control_port = args.control_port
+    metrics_file = args.metrics_file
+    trace_file = args.trace_file
+    use_address_pool = args.address_pool
+    consolidate = args.consolidate
+    consolidate_interval = args.consolidate_interval
+    consolidate_outputs = args.consolidate_outputs
+    reserve_utxos = args.reserve_utxos
+    reserve_lovelace = args.reserve_lovelace
+    use_node_client = args.node_client
+    verbose = args.verbose
     burn = args.burn
     wallet_name = args.wallet
     policy_name = args.policy
@@ -234,26 +315,19 @@ def main():
     # Setup connection to cardano node, cardano wallet, and cardano db sync
     cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
     database = Database('{}.ini'.format(network))
+    node_client = None
+    if use_node_client:
+        node_client = tcr.node_client.NodeClient(network)
+        cardano.set_node_client(node_client)
 
     logger.info('{} Payment Processor / NFT Minter'.format(network.upper()))
     logger.info('Copyright 2021-2022 The Card Room')
     logger.info('Network: {}'.format(network))
 
-    if create_wallet != None or create_policy != None or mint or burn or set_royalty:
-        tip = cardano.query_tip()
-        cardano.query_protocol_parameters()
-        database.open()
-        tip_slot = tip['slot']
-
-        meta = database.query_chain_metadata()
-        db_size = database.query_database_size()
-        latest_slot = database.query_latest_slot()
-        sync_progress = database.query_sync_progress()
-        logger.info('Database Chain Metadata: {} / {}'.format(meta[1], meta[2]))
-        logger.info('Database Size: {}'.format(db_size))
-        logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-        logger.info(' Database Latest Slot: {}'.format(latest_slot))
-        logger.info('Sync Progress: {}'.format(sync_progress))
+    if create_wallet != None or create_policy != None or mint or burn or set_royalty or consolidate:
+        preflight = tcr.preflight.run(cardano, database, verbose=verbose)
+        tip_slot = preflight['tip']['slot']
+        tcr.preflight.log_results(logger, preflight)
 
     if create_wallet != None:
         #
@@ -420,6 +494,29 @@ def main():
         else:
             logger.info('Whitelist Not Given')
 
+        controller = tcr.mint_control.MintController()
+        address_pool = None
+        if use_address_pool:
+            address_pool = tcr.address_pool.AddressPool(mint_wallet, 'nft/{}/{}/address_pool.json'.format(network, drop_name))
+        control_server = None
+        if control_port != None:
+            control_server = tcr.mint_control.ControlServer(controller, control_port, address_pool=address_pool)
+            control_server.start()
+        metrics_writer = None
+        if metrics_file != None:
+            metrics_writer = tcr.metrics.TextfileWriter(tcr.metrics.REGISTRY, metrics_file)
+            metrics_writer.start()
+        if trace_file != None:
+            tcr.tracing.configure(trace_file)
+        consolidation_task = None
+        if consolidate_interval != None:
+            consolidator = tcr.consolidation.Consolidator(cardano.get_protocol_parameters(),
+                                                          consolidate_outputs,
+                                                          reserve_utxos,
+                                                          reserve_lovelace)
+            consolidation_task = tcr.consolidation.ConsolidationTask(cardano, mint_wallet, consolidator, consolidate_interval)
+            consolidation_task.start()
+
         try:
             logger.info('Process General Sale Payments:')
             tcr.tcr.process_incoming_payments(cardano,
@@ -428,9 +525,20 @@ def main():
                                               policy_name,
                                               drop_name,
                                               metadata_set_file,
-                                              prices)
+                                              prices,
+                                              workers,
+                                              controller,
+                                              address_pool)
         except Exception as e:
             logger.exception("Caught Exception")
+        finally:
+            if control_server != None:
+                control_server.stop()
+            if metrics_writer != None:
+                metrics_writer.stop()
+            if consolidation_task != None:
+                consolidation_task.stop()
+            tcr.tracing.shutdown()
     elif set_royalty != 0.0:
         # https://cips.cardano.org/cips/cip27/
         if set_royalty < 0.0:
@@ -492,71 +600,50 @@ def main():
             raise Exception('Wallet: {}, does not exist'.format(wallet_name))
 
         if token_name == None and confirm:
-            has_tokens = True
-
+            # burn all
             logger.info('Search for tokens: {}'.format(policy_id))
-            while has_tokens:
-                #burn all
-                token_names = []
-                (utxos, lovelace) = cardano.query_utxos(burn_wallet)
-                utxos = cardano.query_utxos_time(database, utxos)
-                utxos.sort(key=lambda item : item['slot-no'])
-
-                utxo_in = None
-                input_utxos = []
-                for utxo in utxos:
-                    for a in utxo['assets']:
-                        if a == policy_id:
-                            # special case for royalty tokens
-                            if len(token_names) < 200:
-                                utxo_in = utxo
-                                token_names.append('')
-                                if not utxo in input_utxos:
-                                    input_utxos.append(utxo)
-                        elif a.startswith('{}.'.format(policy_id)):
-                            if len(token_names) < 200:
-                                utxo_in = utxo
-                                token_name = a.split('.')[1]
-                                token_names.append(token_name)
-                                if not utxo in input_utxos:
-                                    input_utxos.append(utxo)
-
-                if len(token_names) > 0:
-                    tcr.tcr.burn_nft_internal(cardano, burn_wallet, policy_name, input_utxos, token_names, token_amount=1)
-                    while cardano.contains_txhash(burn_wallet, utxo_in['tx-hash']):
-                        logger.info('wait')
-                        time.sleep(10)
-                else:
-                    has_tokens = False
-                    logger.error('No tokens found for policy')
-        elif token_name != None:
-            logger.info('token name = {}'.format(token_name))
-            # burn just the specified token in the specified policy
             token_names = []
             (utxos, lovelace) = cardano.query_utxos(burn_wallet)
-            utxos = cardano.query_utxos_time(database, utxos)
-            utxos.sort(key=lambda item : item['slot-no'])
-
-            utxo_in = None
-            input_utxos = []
             for utxo in utxos:
                 for a in utxo['assets']:
-                    logger.info('Checking asset: {}'.format(a))
                     if a == policy_id:
                         # special case for royalty tokens
-                        if len(token_names) < 200:
-                            utxo_in = utxo
-                            token_names.append('')
-                            if not utxo in input_utxos:
-                                input_utxos.append(utxo)
-                    elif a == '{}.{}'.format(policy_id, token_name.encode().hex()):
-                        token_names.append(token_name.encode().hex())
-                        if not utxo in input_utxos:
-                            input_utxos.append(utxo)
-
-            tcr.tcr.burn_nft_internal(cardano, burn_wallet, policy_name, input_utxos, token_names, token_amount=1)
+                        token_names.extend([''] * utxo['assets'][a])
+                    elif a.startswith('{}.'.format(policy_id)):
+                        token_names.extend([a.split('.', 1)[1]] * utxo['assets'][a])
+
+            if len(token_names) > 0:
+                tx_ids = tcr.tcr.burn_nfts(cardano, burn_wallet, policy_name, token_names, token_amount=1)
+                logger.info('Burned {} tokens in {} transactions'.format(len(token_names), len(tx_ids)))
+            else:
+                logger.error('No tokens found for policy')
+        elif token_name != None:
+            logger.info('token name = {}'.format(token_name))
+            # burn just the specified token in the specified policy
+            tx_ids = tcr.tcr.burn_nfts(cardano, burn_wallet, policy_name, [token_name], token_amount=1)
+            logger.info('tx id = {}'.format(tx_ids[0]))
         else:
             logger.error('Nothing to do')
+    elif consolidate == True:
+        #
+        # Merge the small UTXOs at the root address
+        #
+
+        if wallet_name == None:
+            logger.error('--consolidate, Requires --wallet')
+            raise Exception('--consolidate, Requires --wallet')
+
+        consolidate_wallet = Wallet(wallet_name, cardano.get_network())
+        if not consolidate_wallet.exists():
+            logger.error('Wallet: {}, does not exist'.format(wallet_name))
+            raise Exception('Wallet: {}, does not exist'.format(wallet_name))
+
+        consolidator = tcr.consolidation.Consolidator(cardano.get_protocol_parameters(),
+                                                      consolidate_outputs,
+                                                      reserve_utxos,
+                                                      reserve_lovelace)
+        tx_ids = tcr.consolidation.consolidate_utxos(cardano, consolidate_wallet, consolidator, force=True)
+        logger.info('Consolidated in {} transactions: {}'.format(len(tx_ids), tx_ids))
     else:
         logger.info('')
         logger.info('Help:')
@@ -567,7 +654,10 @@ def main():
         logger.info('\t$ nftmint --network=<testnet | mainnet> --mint --drop=<name>')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --presale --drop=<name> --whitelist=<file>')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --burn --wallet=<name> --policy=<name> [--confirm | --token=<name>]')
+        logger.info('\t$ nftmint --network=<testnet | mainnet> --consolidate --wallet=<name> [--consolidate-outputs=<n>] [--reserve-utxos=<n>]')
 
+    if node_client != None:
+        node_client.close()
     database.close()
 
 if __name__ == '__main__':
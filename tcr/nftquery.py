@@ -29,6 +29,7 @@ import logging
 import argparse
 import tcr.command
 import tcr.nftmint
+import tcr.preflight
 import traceback
 import json
 
@@ -68,17 +69,9 @@ def main():
 
     cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
 
-    tip = cardano.query_tip()
-    cardano.query_protocol_parameters()
-    tip_slot = tip['slot']
-
     database = Database('{}.ini'.format(network))
-    database.open()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, chain_metadata=False)
+    tcr.preflight.log_results(logger, preflight)
 
     if fingerprint != None:
         (policy, metadata) = database.query_nft_metadata(fingerprint)
@@ -0,0 +1,568 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: node_client.py
+Author: SuperKK
+
+A node-to-client connection to the local cardano-node socket.  Every
+cardano-cli query and submit opens its own connection and handshake; this
+holds one connection open and runs the local-state-query,
+local-tx-submission and local-tx-monitor mini-protocols over it.  Results
+are converted to the same structures cardano-cli gives.
+
+Messages are CBOR, multiplexed in segments with an 8 byte header:
+
+    transmission time (32 bits) | mode (1 bit) | protocol id (15 bits) | length (16 bits)
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+
+from tcr import bech32, cbor
+from tcr.cbor import Tag
+from tcr.command import networks, node_socket_env
+
+logger = logging.getLogger('node-client')
+
+network_magic = {
+    'testnet': int(networks['testnet'][1]),
+    'mainnet': 764824073
+}
+
+PROTOCOL_HANDSHAKE = 0
+PROTOCOL_LOCAL_TX_SUBMISSION = 6
+PROTOCOL_LOCAL_STATE_QUERY = 7
+PROTOCOL_LOCAL_TX_MONITOR = 9
+
+MODE_RESPONDER = 0x8000
+HEADER_SIZE = 8
+MAX_SEGMENT_SIZE = 12288
+
+# NodeToClientV_9 to V_16, V_15 added the query flag to the version data
+VERSIONS = list(range(32777, 32785))
+VERSION_QUERY_FLAG = 32783
+VERSION_TX_MONITOR = 32780
+
+HANDSHAKE_PROPOSE = 0
+HANDSHAKE_ACCEPT = 1
+HANDSHAKE_REFUSE = 2
+
+STATE_QUERY_ACQUIRED = 1
+STATE_QUERY_FAILURE = 2
+STATE_QUERY_QUERY = 3
+STATE_QUERY_RESULT = 4
+STATE_QUERY_RELEASE = 5
+STATE_QUERY_DONE = 7
+STATE_QUERY_ACQUIRE_TIP = 8
+
+TX_SUBMISSION_SUBMIT = 0
+TX_SUBMISSION_ACCEPT = 1
+TX_SUBMISSION_REJECT = 2
+TX_SUBMISSION_DONE = 3
+
+TX_MONITOR_ACQUIRE = 1
+TX_MONITOR_ACQUIRED = 2
+TX_MONITOR_RELEASE = 3
+TX_MONITOR_HAS_TX = 7
+TX_MONITOR_REPLY_HAS_TX = 8
+
+ERAS = ['Byron', 'Shelley', 'Allegra', 'Mary', 'Alonzo', 'Babbage', 'Conway']
+
+QUERY_CHAIN_BLOCK_NO = [2]
+QUERY_CHAIN_POINT = [3]
+QUERY_CURRENT_ERA = [0, [2, [1]]]
+QUERY_EPOCH_NO = [1]
+QUERY_CURRENT_PROTOCOL_PARAMETERS = [3]
+QUERY_UTXO_BY_ADDRESS = 6
+QUERY_UTXO_BY_TX_IN = 15
+
+TAG_RATIONAL = 30
+TAG_EMBEDDED_CBOR = 24
+TAG_SET = 258
+
+# The Babbage protocol parameters in order, Conway appends CONWAY_PARAMETERS
+BABBAGE_PARAMETERS = ['txFeePerByte', 'txFeeFixed', 'maxBlockBodySize', 'maxTxSize', 'maxBlockHeaderSize',
+                      'stakeAddressDeposit', 'stakePoolDeposit', 'poolRetireMaxEpoch', 'stakePoolTargetNum',
+                      'poolPledgeInfluence', 'monetaryExpansion', 'treasuryCut', 'protocolVersion',
+                      'minPoolCost', 'utxoCostPerByte', 'costModels', 'executionUnitPrices',
+                      'maxTxExecutionUnits', 'maxBlockExecutionUnits', 'maxValueSize',
+                      'collateralPercentage', 'maxCollateralInputs']
+CONWAY_PARAMETERS = ['poolVotingThresholds', 'dRepVotingThresholds', 'committeeMinSize',
+                     'committeeMaxTermLength', 'govActionLifetime', 'govActionDeposit', 'dRepDeposit',
+                     'dRepActivity', 'minFeeRefScriptCostPerByte']
+POOL_VOTING_THRESHOLDS = ['motionNoConfidence', 'committeeNormal', 'committeeNoConfidence',
+                          'hardForkInitiation', 'ppSecurityGroup']
+DREP_VOTING_THRESHOLDS = ['motionNoConfidence', 'committeeNormal', 'committeeNoConfidence',
+                          'updateToConstitution', 'hardForkInitiation', 'ppNetworkGroup',
+                          'ppEconomicGroup', 'ppTechnicalGroup', 'ppGovGroup', 'treasuryWithdrawal']
+COST_MODELS = ['PlutusV1', 'PlutusV2', 'PlutusV3']
+
+def encode_segment(protocol: int, payload: bytes, responder: bool = False) -> bytes:
+    timestamp = int(time.monotonic() * 1000000) & 0xffffffff
+    if responder:
+        protocol |= MODE_RESPONDER
+    return struct.pack('>IHH', timestamp, protocol, len(payload)) + payload
+
+def encode_message(protocol: int, payload: bytes, responder: bool = False) -> bytes:
+    """
+    Split a message into segments of at most MAX_SEGMENT_SIZE bytes.
+    """
+
+    segments = bytearray()
+    for start in range(0, len(payload), MAX_SEGMENT_SIZE):
+        segments += encode_segment(protocol, payload[start:start + MAX_SEGMENT_SIZE], responder)
+    return bytes(segments)
+
+def decode_header(header: bytes) -> Tuple[int, int]:
+    """
+    @return (protocol id without the mode bit, payload length)
+    """
+
+    (timestamp, protocol, length) = struct.unpack('>IHH', header)
+    return (protocol & ~MODE_RESPONDER, length)
+
+def get_item_end(data: bytes, offset: int = 0) -> int:
+    """
+    The offset after the CBOR item at offset, or None if data ends before
+    the item does.  A message can span several segments.
+    """
+
+    if offset >= len(data):
+        return None
+    info = data[offset] & 0x1f
+    if info >= 24 and info <= 27 and offset + 1 + (1 << (info - 24)) > len(data):
+        return None
+
+    (major, argument, offset) = cbor.decode_head(data, offset)
+    if major in [cbor.MAJOR_BYTES, cbor.MAJOR_TEXT, cbor.MAJOR_ARRAY, cbor.MAJOR_MAP] and argument == None:
+        while offset < len(data) and data[offset] != cbor.BREAK:
+            offset = get_item_end(data, offset)
+            if offset == None:
+                return None
+        if offset >= len(data):
+            return None
+        return offset + 1
+    elif major in [cbor.MAJOR_BYTES, cbor.MAJOR_TEXT]:
+        if offset + argument > len(data):
+            return None
+        return offset + argument
+    elif major in [cbor.MAJOR_ARRAY, cbor.MAJOR_MAP, cbor.MAJOR_TAG]:
+        count = argument
+        if major == cbor.MAJOR_MAP:
+            count = 2 * argument
+        elif major == cbor.MAJOR_TAG:
+            count = 1
+        for i in range(0, count):
+            offset = get_item_end(data, offset)
+            if offset == None:
+                return None
+        return offset
+
+    return offset
+
+def get_rational(value: Any) -> float:
+    if isinstance(value, Tag) and value.tag == TAG_RATIONAL:
+        return value.value[0] / value.value[1]
+    return value
+
+def get_execution_units(value: List) -> Dict:
+    return {'memory': value[0], 'steps': value[1]}
+
+def convert_protocol_parameters(values: List) -> Dict:
+    """
+    The protocol parameters array from the ledger as the cardano-cli
+    query protocol-parameters JSON.
+    """
+
+    if len(values) < len(BABBAGE_PARAMETERS):
+        logger.error('Protocol parameters, unsupported era, {} values'.format(len(values)))
+        raise Exception('Protocol parameters, unsupported era, {} values'.format(len(values)))
+
+    names = BABBAGE_PARAMETERS
+    if len(values) >= len(BABBAGE_PARAMETERS) + len(CONWAY_PARAMETERS):
+        names = BABBAGE_PARAMETERS + CONWAY_PARAMETERS
+
+    parameters = {}
+    for (name, value) in zip(names, values):
+        if name in ['poolPledgeInfluence', 'monetaryExpansion', 'treasuryCut', 'minFeeRefScriptCostPerByte']:
+            value = get_rational(value)
+        elif name == 'protocolVersion':
+            value = {'major': value[0], 'minor': value[1]}
+        elif name == 'costModels':
+            value = {COST_MODELS[language]: model for (language, model) in value.items() if language < len(COST_MODELS)}
+        elif name == 'executionUnitPrices':
+            value = {'priceMemory': get_rational(value[0]), 'priceSteps': get_rational(value[1])}
+        elif name in ['maxTxExecutionUnits', 'maxBlockExecutionUnits']:
+            value = get_execution_units(value)
+        elif name == 'poolVotingThresholds':
+            value = {threshold: get_rational(v) for (threshold, v) in zip(POOL_VOTING_THRESHOLDS, value)}
+        elif name == 'dRepVotingThresholds':
+            value = {threshold: get_rational(v) for (threshold, v) in zip(DREP_VOTING_THRESHOLDS, value)}
+        parameters[name] = value
+
+    # removed in Babbage, cardano-cli still writes them
+    parameters['decentralization'] = None
+    parameters['extraPraosEntropy'] = None
+    parameters['minUTxOValue'] = None
+    parameters['utxoCostPerWord'] = None
+    return parameters
+
+def convert_utxo(utxo: Tuple, output: Any, address: str) -> Dict:
+    """
+    A UTXO from the ledger in the structure of Cardano.query_utxos_batch.
+    Outputs are either the legacy [address, value, datum hash] array or
+    the Babbage map.
+    """
+
+    (tx_hash, tx_ix) = utxo
+    datum_hash = 'TxOutDatumNone'
+    if isinstance(output, dict):
+        value = output[1]
+        datum = output.get(2)
+        if datum != None:
+            if datum[0] == 0:
+                datum_hash = datum[1].hex()
+            else:
+                datum_hash = 'TxOutDatumInline'
+    else:
+        value = output[1]
+        if len(output) > 2:
+            datum_hash = output[2].hex()
+
+    amount = value
+    assets = {}
+    if isinstance(value, list):
+        amount = value[0]
+        for (policy, tokens) in value[1].items():
+            for (name, token_amount) in tokens.items():
+                if name == b'':
+                    # royalty tokens have an empty name
+                    assets[policy.hex()] = token_amount
+                else:
+                    assets[policy.hex() + '.' + name.decode('utf-8')] = token_amount
+
+    return {'tx-hash': tx_hash.hex(),
+            'tx-ix': tx_ix,
+            'amount': amount,
+            'assets': assets,
+            'tx-out-datum-hash': datum_hash,
+            'address': address}
+
+class NodeClient:
+    """
+    One connection to the node shared by the threads of the process, the
+    requests are made one at a time.  If the node restarts the connection
+    is opened again on the next request.
+    """
+
+    def __init__(self,
+                 network: str,
+                 socket_path: str = None,
+                 timeout: float = 30):
+        if socket_path == None:
+            socket_path = os.environ[node_socket_env[network]]
+
+        self.network = network
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.socket = None
+        self.version = None
+        self.era = None
+        self.buffers = {}
+        self.lock = threading.RLock()
+
+    def connect(self) -> None:
+        with self.lock:
+            if self.socket != None:
+                return
+
+            logger.info('Connect: {}'.format(self.socket_path))
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(self.timeout)
+            self.buffers = {}
+            try:
+                self.socket.connect(self.socket_path)
+                self.handshake()
+            except Exception as e:
+                self.close()
+                raise e
+
+    def close(self) -> None:
+        with self.lock:
+            if self.socket == None:
+                return
+
+            try:
+                if self.version != None:
+                    self.send(PROTOCOL_LOCAL_STATE_QUERY, [STATE_QUERY_DONE])
+                    self.send(PROTOCOL_LOCAL_TX_SUBMISSION, [TX_SUBMISSION_DONE])
+            except OSError as e:
+                pass
+            finally:
+                self.socket.close()
+                self.socket = None
+                self.version = None
+
+    def send(self, protocol: int, message: Any) -> None:
+        self.socket.sendall(encode_message(protocol, cbor.dumps(message)))
+
+    def receive_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if len(chunk) == 0:
+                raise ConnectionError('Node closed the connection')
+            data += chunk
+        return bytes(data)
+
+    def receive(self, protocol: int) -> Any:
+        """
+        Read segments until a whole message of the protocol has arrived.
+        """
+
+        while True:
+            buffer = self.buffers.get(protocol, b'')
+            end = get_item_end(buffer)
+            if end != None:
+                self.buffers[protocol] = buffer[end:]
+                return cbor.loads(buffer[:end])
+
+            (segment_protocol, length) = decode_header(self.receive_exactly(HEADER_SIZE))
+            payload = self.receive_exactly(length)
+            self.buffers[segment_protocol] = self.buffers.get(segment_protocol, b'') + payload
+
+    def handshake(self) -> None:
+        magic = network_magic[self.network]
+        versions = {}
+        for version in VERSIONS:
+            if version >= VERSION_QUERY_FLAG:
+                versions[version] = [magic, False]
+            else:
+                versions[version] = magic
+
+        self.send(PROTOCOL_HANDSHAKE, [HANDSHAKE_PROPOSE, versions])
+        reply = self.receive(PROTOCOL_HANDSHAKE)
+        if reply[0] != HANDSHAKE_ACCEPT:
+            logger.error('Handshake refused: {}'.format(reply[1:]))
+            raise Exception('Handshake refused: {}'.format(reply[1:]))
+
+        self.version = reply[1]
+        logger.debug('Handshake, version: {}'.format(self.version))
+
+    def request(self, function: Callable, *args) -> Any:
+        """
+        Run a request on the connection, connecting again once if the
+        connection was lost since the last request.
+        """
+
+        with self.lock:
+            for attempt in range(0, 2):
+                try:
+                    self.connect()
+                    return function(*args)
+                except OSError as e:
+                    self.close()
+                    if attempt == 1:
+                        logger.error('Node connection, {}'.format(e))
+                        raise Exception('Node connection, {}'.format(e))
+                    logger.warning('Node connection, {}, connect again'.format(e))
+
+    def acquire(self) -> None:
+        self.send(PROTOCOL_LOCAL_STATE_QUERY, [STATE_QUERY_ACQUIRE_TIP])
+        reply = self.receive(PROTOCOL_LOCAL_STATE_QUERY)
+        if reply[0] != STATE_QUERY_ACQUIRED:
+            logger.error('Acquire failed: {}'.format(reply[1:]))
+            raise Exception('Acquire failed: {}'.format(reply[1:]))
+
+    def release(self) -> None:
+        self.send(PROTOCOL_LOCAL_STATE_QUERY, [STATE_QUERY_RELEASE])
+
+    def query(self, query: List) -> Any:
+        self.send(PROTOCOL_LOCAL_STATE_QUERY, [STATE_QUERY_QUERY, query])
+        reply = self.receive(PROTOCOL_LOCAL_STATE_QUERY)
+        if reply[0] != STATE_QUERY_RESULT:
+            logger.error('Query {}, unexpected reply: {}'.format(query, reply))
+            raise Exception('Query {}, unexpected reply: {}'.format(query, reply))
+        return reply[1]
+
+    def query_era(self, query: List) -> Any:
+        """
+        Run a query of the current era.  A mismatch means the era changed
+        since it was last queried.
+        """
+
+        for attempt in range(0, 2):
+            if self.era == None or attempt == 1:
+                self.era = self.query(QUERY_CURRENT_ERA)
+            result = self.query([0, [0, [self.era, query]]])
+            if len(result) == 1:
+                return result[0]
+            logger.warning('Era mismatch: {}'.format(result))
+
+        logger.error('Query {}, era mismatch'.format(query))
+        raise Exception('Query {}, era mismatch'.format(query))
+
+    def run_queries(self, function: Callable) -> Any:
+        def run():
+            self.acquire()
+            try:
+                return function()
+            finally:
+                self.release()
+        return self.request(run)
+
+    def query_tip(self) -> Dict:
+        """
+        The tip like cardano-cli query tip, without the sync progress.
+        """
+
+        def run():
+            point = self.query(QUERY_CHAIN_POINT)
+            block = self.query(QUERY_CHAIN_BLOCK_NO)
+            epoch = self.query_era(QUERY_EPOCH_NO)
+            tip = {'era': ERAS[self.era], 'epoch': epoch}
+            if len(point) == 2:
+                tip['slot'] = point[0]
+                tip['hash'] = point[1].hex()
+            if block[0] == 1:
+                tip['block'] = block[1]
+            return tip
+        return self.run_queries(run)
+
+    def query_protocol_parameters(self) -> Dict:
+        return self.run_queries(lambda: convert_protocol_parameters(self.query_era(QUERY_CURRENT_PROTOCOL_PARAMETERS)))
+
+    def query_utxos(self, addresses: List[str]) -> List[Dict]:
+        """
+        The UTXOs at all the addresses in one query, with the 'address' of
+        each, sorted by transaction.
+        """
+
+        address_names = {}
+        for address in addresses:
+            (hrp, data) = bech32.decode(address)
+            address_names[data] = address
+
+        def run():
+            return self.query_era([QUERY_UTXO_BY_ADDRESS, Tag(TAG_SET, list(address_names.keys()))])
+        outputs = self.run_queries(run)
+
+        utxos = []
+        for (utxo, output) in outputs.items():
+            address = output[0]
+            if not address in address_names:
+                address_names[address] = bech32.encode('addr' if self.network == 'mainnet' else 'addr_test', address)
+            utxos.append(convert_utxo(utxo, output, address_names[address]))
+
+        return sorted(utxos, key=lambda utxo: (utxo['tx-hash'], utxo['tx-ix']))
+
+    def query_utxos_by_tx_in(self, tx_ins: List[Tuple[str, int]]) -> List[Dict]:
+        """
+        The outputs of tx_ins that are unspent, with the 'address' of each.
+        """
+
+        def run():
+            return self.query_era([QUERY_UTXO_BY_TX_IN, Tag(TAG_SET, [[bytes.fromhex(tx_hash), tx_ix] for (tx_hash, tx_ix) in tx_ins])])
+        outputs = self.run_queries(run)
+
+        utxos = []
+        for (utxo, output) in outputs.items():
+            address = bech32.encode('addr' if self.network == 'mainnet' else 'addr_test', output[0])
+            utxos.append(convert_utxo(utxo, output, address))
+
+        return sorted(utxos, key=lambda utxo: (utxo['tx-hash'], utxo['tx-ix']))
+
+    def query_mempool_contains(self, tx_id: str) -> bool:
+        """
+        @return True if the transaction is in the node's mempool
+        """
+
+        def run():
+            if self.version < VERSION_TX_MONITOR:
+                logger.error('Mempool, not supported by version {}'.format(self.version))
+                raise Exception('Mempool, not supported by version {}'.format(self.version))
+
+            self.send(PROTOCOL_LOCAL_TX_MONITOR, [TX_MONITOR_ACQUIRE])
+            reply = self.receive(PROTOCOL_LOCAL_TX_MONITOR)
+            if reply[0] != TX_MONITOR_ACQUIRED:
+                logger.error('Mempool, acquire failed: {}'.format(reply))
+                raise Exception('Mempool, acquire failed: {}'.format(reply))
+            try:
+                self.send(PROTOCOL_LOCAL_TX_MONITOR, [TX_MONITOR_HAS_TX, [self.era, bytes.fromhex(tx_id)]])
+                reply = self.receive(PROTOCOL_LOCAL_TX_MONITOR)
+                if reply[0] != TX_MONITOR_REPLY_HAS_TX:
+                    logger.error('Mempool, unexpected reply: {}'.format(reply))
+                    raise Exception('Mempool, unexpected reply: {}'.format(reply))
+                return reply[1]
+            finally:
+                self.send(PROTOCOL_LOCAL_TX_MONITOR, [TX_MONITOR_RELEASE])
+
+        with self.lock:
+            if self.era == None:
+                self.era = self.run_queries(lambda: self.query(QUERY_CURRENT_ERA))
+            return self.request(run)
+
+    def contains_transaction(self, tx_id: str, output_count: int) -> bool:
+        """
+        @return True if the transaction is in the mempool or on chain with an
+                unspent output
+        """
+
+        if self.query_mempool_contains(tx_id):
+            return True
+        return len(self.query_utxos_by_tx_in([(tx_id, tx_ix) for tx_ix in range(0, output_count)])) > 0
+
+    def submit_transaction(self, transaction: bytes) -> Tuple[bool, Any]:
+        """
+        Submit a signed transaction in the current era.  Connecting is tried
+        again but the submit is never sent twice: if the connection is lost
+        after it was sent the node may have accepted it.
+
+        @return (True if the node accepted it, the reason if it was rejected)
+                or (None, the error) if the outcome is unknown
+        """
+
+        with self.lock:
+            # only connecting is tried again, nothing has been sent yet
+            if self.era == None:
+                self.era = self.run_queries(lambda: self.query(QUERY_CURRENT_ERA))
+            else:
+                self.request(lambda: None)
+
+            try:
+                self.send(PROTOCOL_LOCAL_TX_SUBMISSION, [TX_SUBMISSION_SUBMIT, [self.era, Tag(TAG_EMBEDDED_CBOR, transaction)]])
+                reply = self.receive(PROTOCOL_LOCAL_TX_SUBMISSION)
+            except OSError as e:
+                self.close()
+                logger.error('Submit, node connection lost, outcome unknown: {}'.format(e))
+                return (None, 'Node connection, {}'.format(e))
+
+            if reply[0] == TX_SUBMISSION_ACCEPT:
+                return (True, None)
+            return (False, reply[1])
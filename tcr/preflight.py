@@ -0,0 +1,108 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: preflight.py
+Author: SuperKK
+
+Startup checks of the cardano node and db-sync shared by every tool.  The
+checks are independent so they run concurrently, each database query on a
+connection of its own, and startup takes as long as the slowest check.
+"""
+
+from typing import Callable, Dict
+import concurrent.futures
+import logging
+
+from tcr.cardano import Cardano
+from tcr.database import Database
+
+def query_node(cardano: Cardano) -> Dict:
+    """
+    Query the tip, then the protocol parameters for the tip's epoch.
+    """
+
+    tip = cardano.query_tip()
+    if 'epoch' in tip:
+        cardano.query_protocol_parameters(tip['epoch'])
+    else:
+        cardano.query_protocol_parameters_node()
+    return tip
+
+def query_database(config_file: str, query: Callable[[Database], object]):
+    """
+    Run a single query on a database connection of its own.
+    """
+
+    database = Database(config_file)
+    database.open()
+    try:
+        return query(database)
+    finally:
+        database.close()
+
+def run(cardano: Cardano,
+        database: Database,
+        chain_metadata: bool = True,
+        verbose: bool = False) -> Dict:
+    """
+    Query the node tip and protocol parameters, open database and run the
+    db-sync status queries.  The database size query is slow on a large
+    db-sync so it only runs when verbose.
+
+    @return Dictionary with 'tip', 'chain-metadata', 'database-size',
+            'latest-slot' and 'sync-progress'.  Checks that were not run are
+            None.
+    """
+
+    checks = {
+        'tip': lambda: query_node(cardano),
+        'database': database.open,
+        'latest-slot': lambda: query_database(database.config_file, Database.query_latest_slot),
+        'sync-progress': lambda: query_database(database.config_file, Database.query_sync_progress)
+    }
+    if chain_metadata:
+        checks['chain-metadata'] = lambda: query_database(database.config_file, Database.query_chain_metadata)
+    if verbose:
+        checks['database-size'] = lambda: query_database(database.config_file, Database.query_database_size)
+
+    results = {'tip': None, 'chain-metadata': None, 'database-size': None, 'latest-slot': None, 'sync-progress': None}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix='preflight') as executor:
+        futures = {name: executor.submit(checks[name]) for name in checks}
+
+    # report the first failure in a fixed order
+    for name in futures:
+        results[name] = futures[name].result()
+    del results['database']
+
+    return results
+
+def log_results(logger: logging.Logger, results: Dict) -> None:
+    if results['chain-metadata'] != None:
+        meta = results['chain-metadata']
+        logger.info('Database Chain Metadata: {} / {}'.format(meta[1], meta[2]))
+    if results['database-size'] != None:
+        logger.info('Database Size: {}'.format(results['database-size']))
+    logger.info('Cardano Node Tip Slot: {}'.format(results['tip']['slot']))
+    logger.info(' Database Latest Slot: {}'.format(results['latest-slot']))
+    logger.info('Sync Progress: {}'.format(results['sync-progress']))
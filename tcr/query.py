@@ -0,0 +1,340 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: query.py
+Author: SuperKK
+
+Boolean query language over the traits of a collection, evaluated with one
+NumPy bool array (bitmap) per (trait, value).
+
+    query      := or
+    or         := and ('OR' and)*
+    and        := not (('AND' | ',') not)*
+    not        := 'NOT' not | '(' query ')' | comparison
+    comparison := trait ('=' | '!=' | '<' | '<=' | '>' | '>=') value
+                | trait 'IN' '(' value (',' value)* ')'
+
+Values are bare words or quoted with ' or ".  Consecutive bare words are
+one value, name=King Charles, unless a word is a keyword.  Quote values that
+contain a keyword.  On list traits '=' matches if the list contains the
+value.  '<', '<=', '>' and '>=' compare numerically.  The old search syntax,
+color=red,hat=cap, is a valid query and is still answered by the trait index
+in SQL.
+
+    color=red AND NOT hat IN (cap, crown)
+    (id >= 100 AND id < 200) OR tags=legendary
+"""
+
+from typing import Dict, List
+import re
+import numpy
+import tcr.trait_index
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\(|\)|,|!=|<=|>=|=|<|>)|"([^"]*)"|\'([^\']*)\'|([^\s(),=!<>"\']+))')
+
+KEYWORDS = ['AND', 'OR', 'NOT', 'IN']
+COMPARISONS = ['=', '!=', '<', '<=', '>', '>=']
+
+def tokenize(text: str, spans: List[tuple] = None) -> List[tuple]:
+    """
+    @param spans If given the (start, end) of each token in text is appended
+    @return List of (kind, text), kind is 'op', 'word', 'string' or a keyword
+    """
+
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match == None:
+            raise Exception('Query, invalid character at {}: {}'.format(position, text[position:]))
+
+        (op, double_quoted, single_quoted, word) = match.groups()
+        if op != None:
+            tokens.append(('op', op))
+        elif double_quoted != None:
+            tokens.append(('string', double_quoted))
+        elif single_quoted != None:
+            tokens.append(('string', single_quoted))
+        elif word.upper() in KEYWORDS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(('word', word))
+        if spans != None:
+            spans.append((match.start(match.lastindex), match.end(match.lastindex)))
+        position = match.end()
+
+    return tokens
+
+class Query:
+    """
+    A parsed query.  Nodes are tuples:
+
+        ('or', [nodes]), ('and', [nodes]), ('not', node),
+        ('compare', trait, op, value), ('in', trait, [values])
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.spans = []
+        self.tokens = tokenize(text, self.spans)
+        self.position = 0
+
+        if len(self.tokens) == 0:
+            raise Exception('Query, empty')
+
+        self.root = self.parse_or()
+        if self.position != len(self.tokens):
+            raise Exception('Query, unexpected: {}'.format(self.tokens[self.position][1]))
+
+    def peek(self) -> tuple:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def next(self) -> tuple:
+        token = self.peek()
+        if token[0] == None:
+            raise Exception('Query, unexpected end: {}'.format(self.text))
+        self.position += 1
+        return token
+
+    def expect(self, kind: str, text: str = None) -> tuple:
+        token = self.next()
+        if token[0] != kind or (text != None and token[1] != text):
+            raise Exception('Query, expected {} got: {}'.format(text if text != None else kind, token[1]))
+        return token
+
+    def parse_or(self) -> tuple:
+        nodes = [self.parse_and()]
+        while self.peek()[0] == 'OR':
+            self.next()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self) -> tuple:
+        nodes = [self.parse_not()]
+        while self.peek()[0] == 'AND' or self.peek() == ('op', ','):
+            self.next()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_not(self) -> tuple:
+        if self.peek()[0] == 'NOT':
+            self.next()
+            return ('not', self.parse_not())
+
+        if self.peek() == ('op', '('):
+            self.next()
+            node = self.parse_or()
+            self.expect('op', ')')
+            return node
+
+        return self.parse_comparison()
+
+    def parse_value(self) -> str:
+        start = self.position
+        token = self.next()
+        if token[0] != 'word' and token[0] != 'string':
+            raise Exception('Query, expected value got: {}'.format(token[1]))
+        if token[0] == 'string':
+            return token[1]
+
+        # bare words up to the next operator or keyword, with the spacing
+        # between them as written
+        while self.peek()[0] == 'word':
+            self.next()
+        return self.text[self.spans[start][0]:self.spans[self.position - 1][1]]
+
+    def parse_comparison(self) -> tuple:
+        trait = self.parse_value()
+
+        token = self.next()
+        if token[0] == 'IN':
+            self.expect('op', '(')
+            values = [self.parse_value()]
+            while self.peek() == ('op', ','):
+                self.next()
+                values.append(self.parse_value())
+            self.expect('op', ')')
+            return ('in', trait, values)
+
+        if token[0] != 'op' or not token[1] in COMPARISONS:
+            raise Exception('Query, expected comparison got: {}'.format(token[1]))
+
+        value = self.parse_value()
+        if token[1] in ['<', '<=', '>', '>=']:
+            try:
+                value = float(value)
+            except ValueError:
+                raise Exception('Query, expected number got: {}'.format(value))
+
+        return ('compare', trait, token[1], value)
+
+    def evaluate(self, bitmaps: 'BitmapIndex') -> numpy.ndarray:
+        return bitmaps.evaluate(self.root)
+
+    def get_equalities(self) -> Dict[str, str]:
+        """
+        @return Dictionary of trait to value if the query only ANDs
+                trait = value for different traits, otherwise None
+        """
+
+        nodes = self.root[1] if self.root[0] == 'and' else [self.root]
+        equalities = {}
+        for node in nodes:
+            if node[0] != 'compare' or node[2] != '=' or node[1] in equalities:
+                return None
+            equalities[node[1]] = node[3]
+        return equalities
+
+class BitmapIndex:
+    """
+    Per (trait, value) bitmaps over a collection of tokens.  Bitmaps and
+    numeric columns are built the first time a trait is queried.
+    """
+
+    def __init__(self, filenames: List[str], properties: List[Dict[str, List[str]]]):
+        """
+        @param filenames Metadata file of each token
+        @param properties For each token a dictionary of trait to list of values
+        """
+
+        self.filenames = filenames
+        self.size = len(filenames)
+        self.positions = {}
+        self.bitmaps = {}
+        self.numbers = {}
+
+        for (i, token) in enumerate(properties):
+            for trait in token:
+                if not trait in self.positions:
+                    self.positions[trait] = {}
+                values = token[trait] if type(token[trait]) is list else [token[trait]]
+                for value in values:
+                    value = str(value)
+                    if not value in self.positions[trait]:
+                        self.positions[trait][value] = []
+                    self.positions[trait][value].append(i)
+
+    @staticmethod
+    def from_trait_index(index: tcr.trait_index.TraitIndex):
+        filenames = index.get_filenames()
+        (tokens, properties) = index.get_properties()
+        return BitmapIndex(filenames, properties)
+
+    def get_empty(self) -> numpy.ndarray:
+        return numpy.zeros(self.size, dtype=bool)
+
+    def get_bitmap(self, trait: str, value: str) -> numpy.ndarray:
+        key = (trait, value)
+        if not key in self.bitmaps:
+            bitmap = self.get_empty()
+            positions = self.positions.get(trait, {}).get(value)
+            if positions != None:
+                bitmap[positions] = True
+            self.bitmaps[key] = bitmap
+        return self.bitmaps[key]
+
+    def get_numbers(self, trait: str) -> numpy.ndarray:
+        """
+        @return The numeric value of trait for each token, NaN if missing or
+                not a number.  For list traits the largest number is used.
+        """
+
+        if not trait in self.numbers:
+            numbers = numpy.full(self.size, numpy.nan)
+            for (value, positions) in self.positions.get(trait, {}).items():
+                try:
+                    number = float(value)
+                except ValueError:
+                    continue
+                positions = numpy.array(positions)
+                numbers[positions] = numpy.fmax(numbers[positions], number)
+            self.numbers[trait] = numbers
+        return self.numbers[trait]
+
+    def evaluate(self, node: tuple) -> numpy.ndarray:
+        kind = node[0]
+        if kind == 'or':
+            result = self.get_empty()
+            for child in node[1]:
+                result = result | self.evaluate(child)
+            return result
+
+        if kind == 'and':
+            result = ~self.get_empty()
+            for child in node[1]:
+                result = result & self.evaluate(child)
+            return result
+
+        if kind == 'not':
+            return ~self.evaluate(node[1])
+
+        if kind == 'in':
+            result = self.get_empty()
+            for value in node[2]:
+                result = result | self.get_bitmap(node[1], value)
+            return result
+
+        (kind, trait, op, value) = node
+        if op == '=':
+            return self.get_bitmap(trait, value)
+        if op == '!=':
+            return ~self.get_bitmap(trait, value)
+
+        # NaN compares False so tokens without a number never match
+        numbers = self.get_numbers(trait)
+        with numpy.errstate(invalid='ignore'):
+            if op == '<':
+                return numbers < value
+            if op == '<=':
+                return numbers <= value
+            if op == '>':
+                return numbers > value
+            return numbers >= value
+
+    def search(self, query: str) -> List[str]:
+        """
+        @return Sorted list of metadata filenames matching the query
+        """
+
+        matches = Query(query).evaluate(self)
+        return [self.filenames[i] for i in numpy.flatnonzero(matches)]
+
+def search_index(index: tcr.trait_index.TraitIndex, query: str) -> List[str]:
+    """
+    Search a trait index.  Plain trait = value queries run in SQL, anything
+    else builds the bitmaps from every row of the index.
+
+    @return Sorted list of metadata filenames matching the query
+    """
+
+    parsed = Query(query)
+    equalities = parsed.get_equalities()
+    if equalities != None:
+        return index.search(equalities)
+
+    bitmaps = BitmapIndex.from_trait_index(index)
+    return [bitmaps.filenames[i] for i in numpy.flatnonzero(parsed.evaluate(bitmaps))]
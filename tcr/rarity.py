@@ -21,9 +21,186 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import os
+"""
+File: rarity.py
+Author: SuperKK
+
+Rarity tables and per token rarity scores for a directory of NFT metadata.
+
+The engine builds a token x trait matrix of value codes with NumPy.  Every
+token gets scored from the frequency of each of its trait values:
+
+    rarity_score: sum of 1 / frequency, including the trait count
+    information:  sum of -log2(frequency), information content in bits
+    statistical:  product of the frequencies, the chance of the token
+
+A token without a trait has the value '<none>' so missing traits count
+towards rarity.  Combinations of traits, e.g. saliva+teeth, can be scored as
+traits of their own.
+"""
+
+from typing import Dict, List
 import argparse
+import csv
 import json
+import numpy
+import tcr.trait_index
+
+# Traits that are unique per token or the same for all, never scored
+IGNORED_TRAITS = ['name', 'image', 'publisher', 'description', 'artist', 'id']
+
+MISSING = '<none>'
+TRAIT_COUNT = 'trait_count'
+
+SCORES = ['rarity_score', 'information', 'statistical']
+
+class RarityEngine:
+    def __init__(self,
+                 tokens: List[str],
+                 properties: List[Dict],
+                 combinations: List[List[str]] = [],
+                 ignore: List[str] = IGNORED_TRAITS):
+        """
+        @param tokens Token names
+        @param properties For each token a dictionary of trait to value, list
+                          values are treated as one combined value
+        @param combinations Lists of traits to also score combined
+        @param ignore Traits not to score
+        """
+
+        self.tokens = tokens
+        self.traits = []
+        self.values = []
+        self.counts = []
+
+        base_traits = set()
+        for token in properties:
+            base_traits.update(token.keys())
+        base_traits = sorted([trait for trait in base_traits if not trait in ignore])
+
+        columns = []
+        for trait in base_traits:
+            column = numpy.array([self.get_value(token.get(trait)) for token in properties], dtype=object)
+            columns.append(self.add_trait(trait, column))
+
+        # how many real traits each token has is a trait of its own
+        if len(columns) > 0:
+            present = numpy.zeros(len(tokens), dtype=numpy.int64)
+            for i in range(0, len(columns)):
+                present += self.values[i][columns[i]] != MISSING
+            columns.append(self.add_trait(TRAIT_COUNT, present.astype(str).astype(object)))
+
+        for combination in combinations:
+            for trait in combination:
+                if not trait in base_traits:
+                    raise Exception('Combination trait not found: {}'.format(trait))
+
+            combined = numpy.full(len(tokens), '', dtype=object)
+            for trait in combination:
+                if trait != combination[0]:
+                    combined = combined + '+'
+                combined = combined + self.values[self.traits.index(trait)][columns[self.traits.index(trait)]]
+            columns.append(self.add_trait('+'.join(combination), combined))
+
+        if len(columns) > 0:
+            self.codes = numpy.stack(columns, axis=1)
+        else:
+            self.codes = numpy.zeros((len(tokens), 0), dtype=numpy.int64)
+
+    @staticmethod
+    def get_value(value) -> str:
+        if value == None:
+            return MISSING
+
+        if type(value) is list:
+            if len(value) == 0:
+                return MISSING
+            return ', '.join(sorted([str(v) for v in value]))
+
+        return str(value)
+
+    @staticmethod
+    def from_index(index: tcr.trait_index.TraitIndex,
+                   combinations: List[List[str]] = [],
+                   ignore: List[str] = IGNORED_TRAITS):
+        (tokens, properties) = index.get_properties()
+        return RarityEngine(tokens, properties, combinations, ignore)
+
+    def add_trait(self, trait: str, column: numpy.ndarray) -> numpy.ndarray:
+        (values, codes, counts) = numpy.unique(column, return_inverse=True, return_counts=True)
+        self.traits.append(trait)
+        self.values.append(values)
+        self.counts.append(counts)
+        return codes.reshape(-1)
+
+    def get_counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        @return Dictionary of trait to dictionary of value to number of tokens
+        """
+
+        return {self.traits[i]: dict(zip(self.values[i].tolist(), self.counts[i].tolist())) for i in range(0, len(self.traits))}
+
+    def get_frequencies(self) -> numpy.ndarray:
+        """
+        @return token x trait matrix of the frequency of each token's value
+        """
+
+        if len(self.traits) == 0:
+            return numpy.ones((len(self.tokens), 0))
+
+        offsets = numpy.cumsum([0] + [len(counts) for counts in self.counts[:-1]])
+        frequencies = numpy.concatenate(self.counts) / len(self.tokens)
+        return frequencies[self.codes + offsets]
+
+    def score(self) -> Dict[str, numpy.ndarray]:
+        """
+        @return Dictionary of score name to an array with a score per token
+        """
+
+        frequencies = self.get_frequencies()
+        return {
+            'rarity_score': numpy.sum(1 / frequencies, axis=1),
+            'information': numpy.sum(-numpy.log2(frequencies), axis=1),
+            'statistical': numpy.prod(frequencies, axis=1)
+        }
+
+    def rank(self, by: str = 'information') -> List[Dict]:
+        """
+        Rank the tokens, rarest first.
+
+        @return List of dictionaries with rank, token, scores and traits
+        """
+
+        if not by in SCORES:
+            raise Exception('Unknown score: {}'.format(by))
+
+        scores = self.score()
+        if by == 'statistical':
+            order = numpy.argsort(scores[by], kind='stable')
+        else:
+            order = numpy.argsort(-scores[by], kind='stable')
+
+        ranking = []
+        for (rank, i) in enumerate(order.tolist(), start=1):
+            entry = {'rank': rank, 'token': self.tokens[i]}
+            for name in SCORES:
+                entry[name] = float(scores[name][i])
+            entry['traits'] = {self.traits[t]: self.values[t][self.codes[i][t]] for t in range(0, len(self.traits))}
+            ranking.append(entry)
+
+        return ranking
+
+def write_json(ranking: List[Dict], filename: str) -> None:
+    with open(filename, 'w') as file:
+        file.write(json.dumps(ranking, indent=4))
+
+def write_csv(ranking: List[Dict], filename: str) -> None:
+    traits = list(ranking[0]['traits'].keys()) if len(ranking) > 0 else []
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['rank', 'token'] + SCORES + traits)
+        for entry in ranking:
+            writer.writerow([entry['rank'], entry['token']] + [entry[name] for name in SCORES] + [entry['traits'][trait] for trait in traits])
 
 def main():
     parser = argparse.ArgumentParser(add_help=False)
@@ -32,50 +209,39 @@ def main():
                                     type=str,
                                     metavar='NAME',
                                     help='')
+    parser.add_argument('--index', required=False,
+                                    action='store',
+                                    type=str,
+                                    metavar='NAME',
+                                    default=None,
+                                    help='Trait index file, default = <directory>_index.db')
+    parser.add_argument('--combination', required=False,
+                                    action='append',
+                                    type=str,
+                                    metavar='TRAITS',
+                                    default=[],
+                                    help='Traits to score combined, e.g. saliva+teeth, may be repeated')
+    parser.add_argument('--rank-by', required=False,
+                                    action='store',
+                                    type=str,
+                                    choices=SCORES,
+                                    default='information',
+                                    help='Score to rank by, default = information')
+    parser.add_argument('--output', required=False,
+                                    action='store',
+                                    type=str,
+                                    metavar='FILE',
+                                    default=None,
+                                    help='Write the ranking to a .json or .csv file')
     args = parser.parse_args()
     directory = args.directory
+    combinations = [combination.split('+') for combination in args.combination]
 
-    properties = {}
-
-    filenames= os.listdir(directory)
-    filenames.sort()
-    for filename in filenames:
-        f = os.path.join(directory, filename)
-        if os.path.isfile(f) and f.endswith('.json'):
-            with open(f, 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
-
-                # TODO, search feature would be nice
-                #character = 'x'
-                #mutation = 'x'
-                #if token['character'] == character and token['mutation'] == mutation:
-                #    print('{} {}: {}'.format(character, mutation, filename))
-
-                token['saliva+teeth'] = token['saliva'] + '+' + token['teeth']
-                token['saliva+scene'] = token['saliva'] + '+' + token['scene']
-                token['teeth+scene'] = token['teeth'] + '+' + token['scene']
-                token['saliva+teeth+scene'] = token['saliva'] + '+' + token['teeth'] + '+' + token['scene']
-                token['flavor+potency'] = token['flavor'] + '+' + token['potency']
-
-                for key in token:
-                    if not key in properties:
-                        properties[key] = {}
-
-                    value = token[key]
-                    if type(value) is list:
-                        for subvalue in value:
-                            if not subvalue in properties[key]:
-                                properties[key][subvalue] = 1
-                            else:
-                                properties[key][subvalue] += 1
-                    else:
-                        if not value in properties[key]:
-                            properties[key][value] = 1
-                        else:
-                            properties[key][value] += 1
+    index = tcr.trait_index.TraitIndex(directory, args.index)
+    index.update()
+    properties = index.get_counts()
+    engine = RarityEngine.from_index(index, combinations)
+    index.close()
 
     for name in properties['name']:
         if properties['name'][name] != 1:
@@ -89,22 +255,32 @@ def main():
         if properties['id'][id] != 1:
             print("ERROR, invalid id count: {}".format(properties['id'][id]))
 
-    total = len(properties['name'])
+    total = len(engine.tokens)
+    counts = engine.get_counts()
 
-    for key in properties:
-        if key == 'name' or key == 'image' or key == 'publisher' or key == 'description' or key == 'artist' or key == 'id':
-            continue
-
-        values = list(properties[key].keys())
-        values.sort(reverse=True, key=lambda item: properties[key][item])
+    for key in counts:
+        values = list(counts[key].keys())
+        values.sort(reverse=True, key=lambda item: counts[key][item])
         print('{}'.format(key))
         i = 1
         for value in values:
-            print('\t{}. {:30} = {:5}/{} = {}%'.format(i, value, properties[key][value], total, (properties[key][value]*100)/total))
+            print('\t{}. {:30} = {:5}/{} = {}%'.format(i, value, counts[key][value], total, (counts[key][value]*100)/total))
             i += 1
 
         print('')
 
+    ranking = engine.rank(args.rank_by)
+    if args.output != None:
+        if args.output.endswith('.csv'):
+            write_csv(ranking, args.output)
+        else:
+            write_json(ranking, args.output)
+        print('Saved ranking: {}'.format(args.output))
+    else:
+        print('Rarest by {}'.format(args.rank_by))
+        for entry in ranking[0:10]:
+            print('\t{}. {:30} = {}'.format(entry['rank'], entry['token'], entry[args.rank_by]))
+        print('')
 
 if __name__ == '__main__':
     try:
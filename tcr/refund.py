@@ -33,6 +33,7 @@ import os
 import logging
 import argparse
 import tcr.nftmint
+import tcr.preflight
 import tcr.command
 import time
 
@@ -58,9 +59,14 @@ def main():
                                   metavar='UTXO',
                                   default=None,
                                   help='UTXO to refund')
+    parser.add_argument('--verbose', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Also log the db-sync database size (slow)')
 
     args = parser.parse_args()
     network = args.network
+    verbose = args.verbose
     src_name = args.src
     utxo_string = args.utxo
 
@@ -76,21 +82,9 @@ def main():
     logger.info('Copyright 2021-2022 The Card Room')
     logger.info('Network: {}'.format(network))
 
-    tip = cardano.query_tip()
-    cardano.query_protocol_parameters()
-    tip_slot = tip['slot']
-
     database = Database('{}.ini'.format(network))
-    database.open()
-    meta = database.query_chain_metadata()
-    db_size = database.query_database_size()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    logger.info('Database Chain Metadata: {} / {}'.format(meta[1], meta[2]))
-    logger.info('Database Size: {}'.format(db_size))
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, verbose=verbose)
+    tcr.preflight.log_results(logger, preflight)
 
     src_wallet = Wallet(src_name, cardano.get_network())
 
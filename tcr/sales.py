@@ -26,19 +26,23 @@ File: sales.py
 Author: SuperKK
 """
 
-from typing import List
+from typing import Dict, List
 
 import json
+import os
+import threading
 import time
 from datetime import datetime
 
 class Sales:
     """
-    Simple class to track each sale as JSON file
+    Simple class to track each sale as JSON file.  Safe to share between
+    mint worker threads.
     """
     def __init__(self, network: str, drop: str):
         self.filename = 'nft/{}/{}/sales.json'.format(network, drop)
         self.sales = {'transactions': []}
+        self.lock = threading.RLock()
         try:
             with open(self.filename, 'r') as file:
                 self.sales = json.load(file)
@@ -46,76 +50,141 @@ class Sales:
             pass
 
     def contains(self, hash: str, ix: str) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    return True
 
-        return False
-
-    def add_utxo(self, hash: str, ix: str, amount: int, count: int) -> bool:
-        if self.contains(hash, ix):
             return False
 
-        self.sales['transactions'].append({'input-hash': hash,
-                                           'input-ix': ix,
-                                           'input-amount': amount,
-                                           'count': count,
-                                           'time': {'epoch': round(time.time()),
-                                                    'date-time': datetime.now().strftime("%Y/%m/%d %H:%M:%S")}
-                                          })
-        return True
+    def add_utxo(self, hash: str, ix: str, amount: int, count: int) -> bool:
+        with self.lock:
+            if self.contains(hash, ix):
+                return False
+
+            self.sales['transactions'].append({'input-hash': hash,
+                                               'input-ix': ix,
+                                               'input-amount': amount,
+                                               'count': count,
+                                               'time': {'epoch': round(time.time()),
+                                                        'date-time': datetime.now().strftime("%Y/%m/%d %H:%M:%S")}
+                                              })
+            return True
 
     def remove_utxo(self, hash: str, ix: str) -> bool:
-        if not self.contains(hash, ix):
-            return False
+        with self.lock:
+            if not self.contains(hash, ix):
+                return False
 
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                self.sales['transactions'].remove(item)
-                return True
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    self.sales['transactions'].remove(item)
+                    return True
 
-        return False
+            return False
 
     def set_input_address(self, hash: str, ix: str, address: str) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                item['input-address'] = address
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['input-address'] = address
+                    return True
 
-        return False
+            return False
 
     def set_tx_ada(self, hash: str, ix: str, out_min_ada: int) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                item['out-ada'] = out_min_ada
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['out-ada'] = out_min_ada
+                    return True
 
-        return False
+            return False
 
     def set_refund(self, hash: str, ix: str, fee: int, amount: int) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                item['refund'] = {'amount': amount, 'fee': fee}
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['refund'] = {'amount': amount, 'fee': fee}
+                    return True
 
-        return False
+            return False
 
     def set_output_txid(self, hash: str, ix: str, txid: str) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                item['out-txid'] = txid
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['out-txid'] = txid
+                    return True
+
+            return False
+
+    def set_submit_txid(self, hash: str, ix: str, txid: str) -> bool:
+        """
+        The txid of a transaction about to be submitted.  If the process
+        stops before out-txid is set the chain can be checked for it.
+        """
+
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['submit-txid'] = txid
+                    return True
 
-        return False
+            return False
+
+    def get_submit_txid(self, hash: str, ix: str) -> str:
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    return item.get('submit-txid')
+
+            return None
+
+    def set_metadata_files(self, hash: str, ix: str, files: List[str]) -> bool:
+        """
+        The metadata files a mint takes, so they stay reserved if the process
+        stops while its outcome is unknown.
+        """
+
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['metadata-files'] = files
+                    return True
+
+            return False
+
+    def get_pending(self) -> List[Dict]:
+        """
+        The mints that were submitted, or were about to be, without an
+        out-txid.  Their outcome is unknown until checked on chain.
+        """
+
+        with self.lock:
+            return [dict(item) for item in self.sales['transactions'] if 'submit-txid' in item and not 'out-txid' in item]
+
+    def get_output_txid(self, hash: str, ix: str) -> str:
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    return item.get('out-txid')
+
+            return None
 
     def set_tokens_minted(self, hash: str, ix: str, tokens: List) -> bool:
-        for item in self.sales['transactions']:
-            if item['input-hash'] == hash and item['input-ix'] == ix:
-                item['tokens-minted'] = tokens
-                return True
+        with self.lock:
+            for item in self.sales['transactions']:
+                if item['input-hash'] == hash and item['input-ix'] == ix:
+                    item['tokens-minted'] = tokens
+                    return True
 
-        return False
+            return False
 
     def commit(self) -> None:
-        with open(self.filename, 'w') as file:
-            file.write(json.dumps(self.sales, indent=4))
+        with self.lock:
+            # replaced whole so a crash never leaves a partial file
+            temp_file = '{}.{}'.format(self.filename, os.getpid())
+            with open(temp_file, 'w') as file:
+                file.write(json.dumps(self.sales, indent=4))
+            os.replace(temp_file, self.filename)
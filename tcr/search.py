@@ -23,7 +23,8 @@
 
 import os
 import argparse
-import json
+import tcr.query
+import tcr.trait_index
 
 def main():
     parser = argparse.ArgumentParser(add_help=False)
@@ -35,46 +36,28 @@ def main():
     parser.add_argument('--filter', required=True,
                                     action='store',
                                     type=str,
-                                    metavar='PATTERN',
-                                    help='')
+                                    metavar='QUERY',
+                                    help='e.g. "color=red AND NOT hat IN (cap, crown) AND id < 100", see query.py')
+    parser.add_argument('--index', required=False,
+                                   action='store',
+                                   type=str,
+                                   metavar='NAME',
+                                   default=None,
+                                   help='Trait index file, default = <directory>_index.db')
     args = parser.parse_args()
     directory = args.directory
     filter = args.filter
 
-    properties = {}
-    for pair in filter.split(','):
-        properties[pair.split('=')[0]] = pair.split('=')[1]
+    index = tcr.trait_index.TraitIndex(directory, args.index)
+    index.update()
 
-    filenames= os.listdir(directory)
-    filenames.sort()
     count = 1
-    print('Search: {}'.format(properties))
-    for filename in filenames:
-        f = os.path.join(directory, filename)
-        if os.path.isfile(f) and f.endswith('.json'):
-            with open(f, 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
-
-
-                match = True
-                for key in properties:
-
-                    if type(token[key]) is list:
-                        if properties[key] not in token[key]:
-                            match = False
-                            break
-                    else:
-                        if properties[key] != token[key]:
-                            match = False
-                            break
-
-                if match:
-                    print('\t{}. {}'.format(count, f))
-                    count += 1
+    print('Search: {}'.format(filter))
+    for filename in tcr.query.search_index(index, filter):
+        print('\t{}. {}'.format(count, os.path.join(directory, filename)))
+        count += 1
 
+    index.close()
     print('')
 
 
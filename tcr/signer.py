@@ -0,0 +1,176 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: signer.py
+Author: SuperKK
+
+Sign transactions without cardano-cli.  Signing keys are read from their
+text envelopes once and kept in memory.  Each key adds a vkey witness, its
+public key and the Ed25519 signature of the transaction id, to the witness
+set of the unwitnessed transaction written by build-raw.
+"""
+
+from typing import Dict, List
+import hashlib
+import json
+import logging
+import threading
+
+from tcr import cbor
+from tcr import ed25519
+from tcr.hdkey import ExtendedPrivateKey, SIGNING_KEY_TYPE
+
+logger = logging.getLogger('signer')
+
+# witness set key of the vkey witnesses
+VKEY_WITNESSES = 0
+
+class SigningKey:
+    """
+    A normal Ed25519 key from its 32 byte seed, as written by cardano-cli
+    address key-gen, e.g. a policy key.
+    """
+
+    def __init__(self, seed: bytes):
+        self.seed = seed
+        (self.scalar, self.prefix) = ed25519.expand_seed(seed)
+        self.public_key = ed25519.public_key_from_scalar(self.scalar)
+
+    def get_public_key(self) -> bytes:
+        return self.public_key
+
+    def sign(self, message: bytes) -> bytes:
+        return ed25519.sign_extended(self.scalar, self.prefix, message, self.public_key)
+
+def load_signing_key(filename: str):
+    """
+    @return A SigningKey or an ExtendedPrivateKey, both have get_public_key()
+            and sign()
+    """
+
+    with open(filename, 'r') as file:
+        envelope = json.load(file)
+
+    data = bytes.fromhex(envelope.get('cborHex', ''))
+    if envelope.get('type') == SIGNING_KEY_TYPE:
+        return ExtendedPrivateKey.from_signing_key_file(filename)
+    elif len(data) == 34 and data[0:2] == b'\x58\x20':
+        return SigningKey(data[2:34])
+
+    logger.error('Signer, unsupported signing key: {}'.format(filename))
+    raise Exception('Signer, unsupported signing key: {}'.format(filename))
+
+def is_transaction(data: bytes) -> bool:
+    """
+    True for a whole transaction, [body, witness set, valid, auxiliary data],
+    rather than a body on its own.
+    """
+
+    if len(data) == 0 or data[0] != 0x84:
+        return False
+    return cbor.split_array(data)[2] in [cbor.dumps(True), cbor.dumps(False)]
+
+def get_signed_type(type: str) -> str:
+    """
+    'Unwitnessed Tx BabbageEra' or 'TxBodyBabbage' to 'Tx BabbageEra'
+    """
+
+    if type.startswith('Unwitnessed '):
+        return type[len('Unwitnessed '):]
+    if type.startswith('TxBody'):
+        return 'Tx {}Era'.format(type[len('TxBody'):])
+    return type
+
+class Signer:
+    """
+    Keys are cached by filename.  Safe to share between mint worker threads.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, filename: str):
+        with self.lock:
+            if not filename in self.keys:
+                self.keys[filename] = load_signing_key(filename)
+                logger.debug('Signer, loaded key: {}'.format(filename))
+            return self.keys[filename]
+
+    def can_sign(self, transaction_file: str) -> bool:
+        with open(transaction_file, 'r') as file:
+            envelope = json.load(file)
+        return is_transaction(bytes.fromhex(envelope.get('cborHex', '')))
+
+    def sign_transaction(self,
+                         unsigned_transaction_file: str,
+                         signing_key_files: List[str],
+                         signed_transaction_file: str) -> str:
+        """
+        @return The transaction id
+        """
+
+        with open(unsigned_transaction_file, 'r') as file:
+            envelope = json.load(file)
+
+        data = bytes.fromhex(envelope['cborHex'])
+        if not is_transaction(data):
+            logger.error('Signer, not an unwitnessed transaction: {}'.format(unsigned_transaction_file))
+            raise Exception('Signer, not an unwitnessed transaction: {}'.format(unsigned_transaction_file))
+
+        # the body and auxiliary data are kept byte for byte, the txid and
+        # the auxiliary data hash are over them
+        (body, witness_set, valid, auxiliary_data) = cbor.split_array(data)
+        tx_id = hashlib.blake2b(body, digest_size=32).digest()
+
+        # other witnesses, e.g. the policy script, are kept as they are
+        entries = cbor.split_map(witness_set)
+        witnesses = []
+        for (key, value) in entries:
+            if cbor.loads(key) == VKEY_WITNESSES:
+                witnesses = cbor.loads(value)
+                if isinstance(witnesses, cbor.Tag):
+                    # a set, tag 258
+                    witnesses = witnesses.value
+        entries = [(key, value) for (key, value) in entries if cbor.loads(key) != VKEY_WITNESSES]
+
+        public_keys = [witness[0] for witness in witnesses]
+        for signing_key_file in signing_key_files:
+            key = self.get_key(signing_key_file)
+            if key.get_public_key() in public_keys:
+                continue
+            witnesses.append([key.get_public_key(), key.sign(tx_id)])
+            public_keys.append(key.get_public_key())
+
+        witness_set = {cbor.Raw(cbor.dumps(VKEY_WITNESSES)): witnesses}
+        for (key, value) in entries:
+            witness_set[cbor.Raw(key)] = cbor.Raw(value)
+
+        signed = cbor.dumps([cbor.Raw(body), witness_set, cbor.Raw(valid), cbor.Raw(auxiliary_data)])
+        with open(signed_transaction_file, 'w') as file:
+            file.write(json.dumps({'type': get_signed_type(envelope['type']),
+                                   'description': '',
+                                   'cborHex': signed.hex()}, indent=4) + '\n')
+
+        return tx_id.hex()
@@ -29,6 +29,7 @@ import logging
 import argparse
 import tcr.command
 import tcr.nftmint
+import tcr.preflight
 import traceback
 
 def main():
@@ -44,9 +45,14 @@ def main():
                                     default=None,
                                     metavar='NAME',
                                     help='Dump UTXOs from wallet')
+    parser.add_argument('--verbose', required=False,
+                                    action='store_true',
+                                    default=False,
+                                    help='Also log the db-sync database size (slow)')
 
     args = parser.parse_args()
     network = args.network
+    verbose = args.verbose
     wallet_name = args.wallet
 
     if not network in tcr.command.networks:
@@ -57,21 +63,9 @@ def main():
 
     cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
 
-    tip = cardano.query_tip()
-    cardano.query_protocol_parameters()
-    tip_slot = tip['slot']
-
     database = Database('{}.ini'.format(network))
-    database.open()
-    meta = database.query_chain_metadata()
-    db_size = database.query_database_size()
-    latest_slot = database.query_latest_slot()
-    sync_progress = database.query_sync_progress()
-    logger.info('Database Chain Metadata: {} / {}'.format(meta[1], meta[2]))
-    logger.info('Database Size: {}'.format(db_size))
-    logger.info('Cardano Node Tip Slot: {}'.format(tip_slot))
-    logger.info(' Database Latest Slot: {}'.format(latest_slot))
-    logger.info('Sync Progress: {}'.format(sync_progress))
+    preflight = tcr.preflight.run(cardano, database, verbose=verbose)
+    tcr.preflight.log_results(logger, preflight)
 
     wallet = None
     if wallet_name != None:
@@ -28,6 +28,7 @@ Author: SuperKK
 
 from typing import Dict
 from typing import List
+from typing import Tuple
 
 from tcr.nft import Nft
 from tcr.cardano import Cardano
@@ -35,8 +36,17 @@ from tcr.wallet import Wallet
 from tcr.wallet import WalletExternal
 from tcr.database import Database
 from tcr.metadata_list import MetadataList
-
+from tcr.metadata_list import MetadataAllocator
+from tcr.utxo_lock import UtxoLockManager
+from tcr.mint_control import MintController
+from tcr.address_pool import AddressPool
+from tcr.coin_selection import CoinSelector
+from tcr import tracing
+from tcr.metrics import NFTS_REMAINING, PAYMENTS, QUEUE_DEPTH, observe_payment_to_submit
+
+import concurrent.futures
 import os
+import threading
 import time
 import logging
 from tcr.sales import Sales
@@ -52,8 +62,30 @@ SECONDS_PER_DAY = int(HOURS_PER_DAY * SECONDS_PER_HOUR)
 SECONDS_PER_MONTH = int((DAYS_PER_YEAR / MONTHS_PER_YEAR) * SECONDS_PER_DAY)
 SECONDS_PER_YEAR = int(MONTHS_PER_YEAR * SECONDS_PER_MONTH)
 
+# Result of a mint or refund that is waiting for db-sync to see the payment.
+# Nothing was submitted and the payment is tried again later.
+RETRY = 'retry'
+
 logger = logging.getLogger('tcr')
 
+transaction_namespace = threading.local()
+
+def set_transaction_namespace(namespace: str) -> None:
+    """
+    Transaction files are named after the process.  Threads building
+    transactions concurrently each set a namespace so their files do not
+    collide.
+    """
+
+    transaction_namespace.name = namespace
+
+def get_transaction_file(name: str) -> str:
+    namespace = getattr(transaction_namespace, 'name', None)
+    if namespace == None:
+        namespace = os.getpid()
+
+    return 'transaction/{}_tx_{}'.format(name, namespace)
+
 def transfer_all_assets(cardano: Cardano,
                         from_wallet: Wallet,
                         to_wallet: Wallet) -> None:
@@ -88,11 +120,11 @@ def transfer_all_assets(cardano: Cardano,
     cardano.create_transfer_transaction_file(from_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_all_assets_draft_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_all_assets_draft'))
 
 
     # Calculate fee & update values
-    fee = cardano.calculate_min_fee('transaction/transfer_all_assets_draft_tx_{}'.format(os.getpid()),
+    fee = cardano.calculate_min_fee(get_transaction_file('transfer_all_assets_draft'),
                                     len(from_utxos),
                                     len(outputs),
                                     len(from_wallet.get_available_signing_keys()))
@@ -103,15 +135,15 @@ def transfer_all_assets(cardano: Cardano,
     cardano.create_transfer_transaction_file(from_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_all_assets_unsigned_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_all_assets_unsigned'))
 
     # Sign the transaction
-    cardano.sign_transaction('transaction/transfer_all_assets_unsigned_tx_{}'.format(os.getpid()),
+    cardano.sign_transaction(get_transaction_file('transfer_all_assets_unsigned'),
                               from_wallet.get_available_signing_keys(),
-                             'transaction/transfer_all_assets_signed_tx_{}'.format(os.getpid()))
+                             get_transaction_file('transfer_all_assets_signed'))
 
     #submit
-    tx_id = cardano.submit_transaction('transaction/transfer_all_assets_signed_tx_{}'.format(os.getpid()))
+    tx_id = cardano.submit_transaction(get_transaction_file('transfer_all_assets_signed'))
 
     return tx_id
 
@@ -129,6 +161,13 @@ def transfer_utxo_ada(cardano: Cardano,
         return
     logger.debug('Transfer UTXO ADA, UTXO: {}, lovelace: {}'.format(utxo['tx-hash'], utxo['amount']))
 
+    # Only the key owning the input signs, the session key for a UTXO
+    # attributed by an AddressPool
+    if 'signing-index' in utxo:
+        signing_key_files = [from_wallet.get_signing_key_file(utxo['signing-index'])]
+    else:
+        signing_key_files = [from_wallet.get_signing_key_file(0), from_wallet.get_signing_key_file(1)]
+
     # Draft transaction for fee calculation
     outputs = [{'address': to_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT),
                 'amount': 1,
@@ -137,11 +176,11 @@ def transfer_utxo_ada(cardano: Cardano,
     cardano.create_transfer_transaction_file([utxo],
                                              outputs,
                                              fee,
-                                             'transaction/transfer_utxo_ada_draft_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_utxo_ada_draft'))
 
     # Calculate fee & update values
-    fee = cardano.calculate_min_fee('transaction/transfer_utxo_ada_draft_tx_{}'.format(os.getpid()),
-                                    1, len(outputs), 2)
+    fee = cardano.calculate_min_fee(get_transaction_file('transfer_utxo_ada_draft'),
+                                    1, len(outputs), len(signing_key_files))
     outputs[0]['amount'] = utxo['amount'] - fee
     logger.debug('Transfer UTXO ADA, Fee = {} lovelace'.format(fee))
     logger.debug('Transfer UTXO ADA, Lovelace = {} lovelace'.format(outputs[0]['amount']))
@@ -150,15 +189,15 @@ def transfer_utxo_ada(cardano: Cardano,
     cardano.create_transfer_transaction_file([utxo],
                                              outputs,
                                              fee,
-                                             'transaction/transfer_utxo_ada_unsigned_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_utxo_ada_unsigned'))
 
     # Sign the transaction
-    cardano.sign_transaction('transaction/transfer_utxo_ada_unsigned_tx_{}'.format(os.getpid()),
-                             [from_wallet.get_signing_key_file(0), from_wallet.get_signing_key_file(1)],
-                             'transaction/transfer_utxo_ada_signed_tx_{}'.format(os.getpid()))
+    cardano.sign_transaction(get_transaction_file('transfer_utxo_ada_unsigned'),
+                             signing_key_files,
+                             get_transaction_file('transfer_utxo_ada_signed'))
 
     # submit
-    tx_id = cardano.submit_transaction('transaction/transfer_utxo_ada_signed_tx_{}'.format(os.getpid()))
+    tx_id = cardano.submit_transaction(get_transaction_file('transfer_utxo_ada_signed'))
 
     return (tx_id, fee, utxo['amount'] - fee)
 
@@ -175,16 +214,12 @@ def transfer_ada(cardano: Cardano,
                                                                       to_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT)))
     (utxos, total_lovelace) = cardano.query_utxos(from_wallet)
 
-    input_utxos = []
-    input_lovelace = 0
-    for utxo in utxos:
-        # add 2000000 lovelace to make sure there is enough for fees and min
-        # ada change
-        if input_lovelace > lovelace_amount + 10000000:
-            break
-
-        input_utxos.append(utxo)
-        input_lovelace += utxo['amount']
+    # the selection also pays the fee and the min ada of the change
+    selector = CoinSelector(utxos, cardano.get_protocol_parameters())
+    input_utxos = selector.select([{'address': to_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT),
+                                    'amount': lovelace_amount,
+                                    'assets': {}}])
+    input_lovelace = sum([utxo['amount'] for utxo in input_utxos])
 
     # get all incoming assets from utxos
     incoming_assets = {}
@@ -205,10 +240,10 @@ def transfer_ada(cardano: Cardano,
     cardano.create_transfer_transaction_file(input_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_ada_draft_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_ada_draft'))
 
     # Calculate fee & update values
-    fee = cardano.calculate_min_fee('transaction/transfer_ada_draft_tx_{}'.format(os.getpid()),
+    fee = cardano.calculate_min_fee(get_transaction_file('transfer_ada_draft'),
                                     len(input_utxos),
                                     len(outputs),
                                     2)
@@ -220,15 +255,15 @@ def transfer_ada(cardano: Cardano,
     cardano.create_transfer_transaction_file(input_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_ada_unsigned_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_ada_unsigned'))
 
     # Sign the transaction
-    cardano.sign_transaction('transaction/transfer_ada_unsigned_tx_{}'.format(os.getpid()),
+    cardano.sign_transaction(get_transaction_file('transfer_ada_unsigned'),
                              [from_wallet.get_signing_key_file(0), from_wallet.get_signing_key_file(1)],
-                             'transaction/transfer_ada_signed_tx_{}'.format(os.getpid()))
+                             get_transaction_file('transfer_ada_signed'))
 
     #submit
-    tx_id = cardano.submit_transaction('transaction/transfer_ada_signed_tx_{}'.format(os.getpid()))
+    tx_id = cardano.submit_transaction(get_transaction_file('transfer_ada_signed'))
 
     return tx_id
 
@@ -246,20 +281,69 @@ def transfer_nft(cardano: Cardano,
     logger.debug('Transfer NFT, from: {}, to: {}'.format(from_wallet.get_name(), to_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT)))
 
     (from_utxos, from_total_lovelace) = cardano.query_utxos(from_wallet)
+    (tx_id, change) = transfer_nft_utxos(cardano, from_wallet, from_utxos, nft_assets, to_wallet)
+    return tx_id
+
+def transfer_nfts(cardano: Cardano,
+                  from_wallet: Wallet,
+                  nft_assets: Dict[str, int],
+                  to_wallet: Wallet) -> List[str]:
+    """
+    Transfer any number of NFTs in as few transactions as possible.  Each
+    transaction sends as many assets as fit its size limits and spends the
+    change of the one before, so they are submitted back to back without
+    waiting for confirmations.
+
+    @return The transaction ids in the order submitted
+    """
+
+    (utxos, total_lovelace) = cardano.query_utxos(from_wallet)
+    remaining = dict(nft_assets)
+    tx_ids = []
+    while len(remaining) > 0:
+        chunk = CoinSelector(utxos, cardano.get_protocol_parameters()).get_chunk(remaining)
+        logger.info('Transfer NFTs, {} of {} assets in transaction {}'.format(len(chunk), len(remaining), len(tx_ids) + 1))
+        (tx_id, change) = transfer_nft_utxos(cardano, from_wallet, utxos, chunk, to_wallet)
+        if tx_id == None:
+            logger.error('Transfer NFTs, failed after: {}'.format(tx_ids))
+            raise Exception('Transfer NFTs, failed after: {}'.format(tx_ids))
+        tx_ids.append(tx_id)
+
+        for asset in chunk:
+            remaining[asset] -= chunk[asset]
+            if remaining[asset] == 0:
+                del remaining[asset]
+
+        # the next transaction spends the change of this one
+        utxos = [utxo for utxo in utxos if not utxo in change['inputs']]
+        if change['utxo'] != None:
+            utxos.append(change['utxo'])
+
+    return tx_ids
+
+def transfer_nft_utxos(cardano: Cardano,
+                       from_wallet: Wallet,
+                       from_utxos: List[Dict],
+                       nft_assets: Dict[str, int],
+                       to_wallet: Wallet) -> Tuple[str, Dict]:
+    """
+    Transfer NFTs selecting the inputs from the given UTXOs.
+
+    @return (txid, {'inputs': spent UTXOs, 'utxo': the change output or None})
+    """
+
+    selector = CoinSelector(from_utxos, cardano.get_protocol_parameters())
+    input_utxos = selector.select([{'address': to_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT),
+                                    'amount': selector.get_min_ada(nft_assets),
+                                    'assets': nft_assets}])
+
     # get all incoming assets from utxos
     input_assets = {}
     input_lovelace = 0
-    input_utxos = []
-    for utxo in from_utxos:
-        found = False
-        for a in nft_assets:
-            if a in utxo['assets']:
-                found = True
-        if found:
-            input_lovelace += utxo['amount']
-            input_utxos.append(utxo)
-            for a in utxo['assets']:
-                input_assets[a] = utxo['assets'][a]
+    for utxo in input_utxos:
+        input_lovelace += utxo['amount']
+        for a in utxo['assets']:
+            input_assets[a] = input_assets.get(a, 0) + utxo['assets'][a]
 
     logger.debug('Transfer NFT, From Wallet({}) = {} lovelace'.format(from_wallet.get_name(), input_lovelace))
 
@@ -279,7 +363,7 @@ def transfer_nft(cardano: Cardano,
     cardano.create_transfer_transaction_file(input_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_nft_draft_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_nft_draft'))
 
     # https://github.com/input-output-hk/cardano-ledger-specs/blob/master/doc/explanations/min-utxo.rst
     # minUTxOValue is the minimum value if sending ADA only.  Since ADA plus a
@@ -289,7 +373,7 @@ def transfer_nft(cardano: Cardano,
     logger.debug('Transfer NFT, Min UTXO = {}'.format(min_utxo_value))
 
     # Calculate fee & update values
-    fee = cardano.calculate_min_fee('transaction/transfer_nft_draft_tx_{}'.format(os.getpid()),
+    fee = cardano.calculate_min_fee(get_transaction_file('transfer_nft_draft'),
                                     len(input_utxos),
                                     len(outputs),
                                     2)
@@ -307,73 +391,107 @@ def transfer_nft(cardano: Cardano,
     cardano.create_transfer_transaction_file(input_utxos,
                                              outputs,
                                              fee,
-                                             'transaction/transfer_nft_unsigned_tx_{}'.format(os.getpid()))
+                                             get_transaction_file('transfer_nft_unsigned'))
 
     # Sign the transaction
-    cardano.sign_transaction('transaction/transfer_nft_unsigned_tx_{}'.format(os.getpid()),
+    cardano.sign_transaction(get_transaction_file('transfer_nft_unsigned'),
                              [from_wallet.get_signing_key_file(0), from_wallet.get_signing_key_file(1)],
-                             'transaction/transfer_nft_signed_tx_{}'.format(os.getpid()))
+                             get_transaction_file('transfer_nft_signed'))
 
     #submit
-    tx_id = cardano.submit_transaction('transaction/transfer_nft_signed_tx_{}'.format(os.getpid()))
+    tx_id = cardano.submit_transaction(get_transaction_file('transfer_nft_signed'))
 
-    return tx_id
+    # the change is output 0 unless it was empty
+    change_assets = {asset: quantity for (asset, quantity) in outputs[0]['assets'].items() if quantity > 0}
+    change = None
+    if outputs[0]['amount'] > 0 or len(change_assets) > 0:
+        change = {'tx-hash': tx_id, 'tx-ix': 0, 'amount': outputs[0]['amount'], 'assets': change_assets}
 
-def burn_nft_internal(cardano: Cardano,
-                      burning_wallet: Wallet,
-                      policy_name: str,
-                      input_utxos: List[Dict],
-                      token_names: List[str],
-                      token_amount: int = 1) -> None:
+    return (tx_id, {'inputs': input_utxos, 'utxo': change})
+
+def burn_nfts(cardano: Cardano,
+              burning_wallet: Wallet,
+              policy_name: str,
+              token_names: List[str],
+              token_amount: int = 1) -> List[str]:
     """
-    Burn one NFT.
+    Burn any number of tokens of a policy held by the wallet.  The tokens are
+    grouped into transactions as large as the size limits allow.  Each
+    transaction spends the change of the one before so they are submitted
+    back to back without waiting for confirmations.
+
+    @param token_names An empty name is the policy's royalty token
+    @return The transaction ids in the order submitted
     """
 
-    incoming_assets = {}
-    input_total_lovelace = 0
-    for utxo in input_utxos:
-        input_total_lovelace += utxo['amount']
-        for a in utxo['assets']:
-            if a in incoming_assets:
-                incoming_assets[a] += utxo['assets'][a]
-            else:
-                incoming_assets[a] = utxo['assets'][a]
+    policy_id = cardano.get_policy_id(policy_name)
+    with open('policy/{}/{}.script'.format(cardano.get_network(), policy_name), 'r') as file:
+        script_size = len(file.read())
+
+    remaining = {}
+    for token_name in token_names:
+        asset = policy_id if token_name == '' else '{}.{}'.format(policy_id, token_name)
+        remaining[asset] = remaining.get(asset, 0) + token_amount
+
+    (utxos, total_lovelace) = cardano.query_utxos(burning_wallet)
+    tx_ids = []
+    while len(remaining) > 0:
+        # the wallet and the policy sign, the policy script is in the witnesses
+        selector = CoinSelector(utxos, cardano.get_protocol_parameters(), witnesses=2)
+        burn_assets = selector.get_chunk(remaining, max_output_size=selector.max_tx_size, reserved=script_size)
+        input_utxos = selector.select([{'address': None, 'amount': 0, 'assets': burn_assets}])
+        logger.info('Burn NFTs, {} of {} tokens in transaction {}'.format(len(burn_assets), len(remaining), len(tx_ids) + 1))
+
+        change_assets = {}
+        input_lovelace = 0
+        for utxo in input_utxos:
+            input_lovelace += utxo['amount']
+            for (asset, quantity) in utxo['assets'].items():
+                change_assets[asset] = change_assets.get(asset, 0) + quantity
+        for (asset, quantity) in burn_assets.items():
+            change_assets[asset] -= quantity
+        change_assets = {asset: quantity for (asset, quantity) in change_assets.items() if quantity > 0}
 
-    # The NFT burned will be removed from the output when the transaction is created
-    address_outputs = [{'address': burning_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT),
-                        'amount': 1, 'assets': incoming_assets}]
-    fee = 0
-    # draft
-    cardano.create_burn_nft_transaction_file(input_utxos,
-                                             address_outputs,
-                                             fee,
+        outputs = [{'address': burning_wallet.get_payment_address(Wallet.ADDRESS_INDEX_ROOT),
+                    'amount': 1,
+                    'assets': change_assets}]
+        cardano.create_burn_transaction_file(input_utxos,
+                                             outputs,
+                                             0,
                                              policy_name,
-                                             token_names,
-                                             token_amount,
-                                             'transaction/burn_nft_internal_draft_tx_{}'.format(os.getpid()))
-    #fee
-    fee = cardano.calculate_min_fee('transaction/burn_nft_internal_draft_tx_{}'.format(os.getpid()),
-                                    len(input_utxos),
-                                    1,
-                                    2)
-    address_outputs[0]['amount'] = input_total_lovelace - fee
-    #final
-    cardano.create_burn_nft_transaction_file(input_utxos,
-                                             address_outputs,
+                                             burn_assets,
+                                             get_transaction_file('burn_nfts_draft'))
+        fee = cardano.calculate_min_fee(get_transaction_file('burn_nfts_draft'),
+                                        len(input_utxos),
+                                        1,
+                                        2)
+        outputs[0]['amount'] = input_lovelace - fee
+        cardano.create_burn_transaction_file(input_utxos,
+                                             outputs,
                                              fee,
                                              policy_name,
-                                             token_names,
-                                             token_amount,
-                                             'transaction/burn_nft_internal_unsigned_tx_{}'.format(os.getpid()))
-    #sign
-    cardano.sign_transaction('transaction/burn_nft_internal_unsigned_tx_{}'.format(os.getpid()),
-                             [burning_wallet.get_signing_key_file(0),
-                              cardano.get_policy_signing_key_file(policy_name)],
-                             'transaction/burn_nft_internal_signed_tx_{}'.format(os.getpid()))
-    #submit
-    tx_id = cardano.submit_transaction('transaction/burn_nft_internal_signed_tx_{}'.format(os.getpid()))
-
-    return tx_id
+                                             burn_assets,
+                                             get_transaction_file('burn_nfts_unsigned'))
+        cardano.sign_transaction(get_transaction_file('burn_nfts_unsigned'),
+                                 [burning_wallet.get_signing_key_file(0),
+                                  cardano.get_policy_signing_key_file(policy_name)],
+                                 get_transaction_file('burn_nfts_signed'))
+        tx_id = cardano.submit_transaction(get_transaction_file('burn_nfts_signed'))
+        if tx_id == None:
+            logger.error('Burn NFTs, failed after: {}'.format(tx_ids))
+            raise Exception('Burn NFTs, failed after: {}'.format(tx_ids))
+        tx_ids.append(tx_id)
+
+        for (asset, quantity) in burn_assets.items():
+            remaining[asset] -= quantity
+            if remaining[asset] == 0:
+                del remaining[asset]
+
+        # the next transaction spends the change of this one
+        utxos = [utxo for utxo in utxos if not utxo in input_utxos]
+        utxos.append({'tx-hash': tx_id, 'tx-ix': 0, 'amount': outputs[0]['amount'], 'assets': change_assets})
+
+    return tx_ids
 
 def verify_unique_nfts(cardano: Cardano,
                        database: Database,
@@ -446,14 +564,14 @@ def mint_royalty_token(cardano: Cardano,
                                                        fee,
                                                        policy_name,
                                                        nft_metadata_file,
-                                                       'transaction/mint_royalty_token_draft_tx_{}'.format(os.getpid()))
+                                                       get_transaction_file('mint_royalty_token_draft'))
 
     total_input_lovelace = input_utxo['amount']
 
     logger.debug("Mint Royalty Token, total payment received: {} ADA".format(total_input_lovelace / 1000000))
 
     #fee
-    fee = cardano.calculate_min_fee('transaction/mint_royalty_token_draft_tx_{}'.format(os.getpid()),
+    fee = cardano.calculate_min_fee(get_transaction_file('mint_royalty_token_draft'),
                                     1, 1, 2)
 
     logger.debug('Mint Royalty Token, Fee = {} lovelace'.format(fee))
@@ -464,14 +582,14 @@ def mint_royalty_token(cardano: Cardano,
                                                                 fee,
                                                                 policy_name,
                                                                 nft_metadata_file,
-                                                                'transaction/mint_royalty_token_unsigned_tx_{}'.format(os.getpid()))
+                                                                get_transaction_file('mint_royalty_token_unsigned'))
     #sign
-    cardano.sign_transaction('transaction/mint_royalty_token_unsigned_tx_{}'.format(os.getpid()),
+    cardano.sign_transaction(get_transaction_file('mint_royalty_token_unsigned'),
                              [mint_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_ROOT),
                               cardano.get_policy_signing_key_file(policy_name)],
-                             'transaction/mint_royalty_token_signed_tx_{}'.format(os.getpid()))
+                             get_transaction_file('mint_royalty_token_signed'))
     #submit
-    tx_id = cardano.submit_transaction('transaction/mint_royalty_token_signed_tx_{}'.format(os.getpid()))
+    tx_id = cardano.submit_transaction(get_transaction_file('mint_royalty_token_signed'))
 
     logger.debug('Submit Mint Royalty Token, TXID: {}'.format(tx_id))
 
@@ -499,22 +617,37 @@ def mint_nft(cardano: Cardano,
     input is a dictionary. {"utxo": Dict, "count": N, "refund": lovelace}
     "utxo" is minting "N" NFTs.  The sum must add up to the number in
     nft_metadata_file Each utxo is assumed to contain 0 other assets.
-    The destination address will be queried for each input utxo
+    The destination address will be queried for each input utxo unless the
+    utxo was attributed by an AddressPool ('from-address', 'signing-index').
     """
 
-    inputs = database.query_utxo_inputs(input['utxo']['tx-hash'])
-    if len(inputs) == 0:
-        logger.warning('Mint NFT External, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
-        return None
+    # each stage is traced, tagged with the payment and its tokens
+    attributes = {}
+    if tracing.is_enabled():
+        attributes = {'tcr.utxo': '{}#{}'.format(input['utxo']['tx-hash'], input['utxo']['tx-ix']),
+                      'tcr.tokens': ','.join(get_tokens_from_metadata(nft_metadata_file))}
 
-    if not verify_unique_nfts(cardano, database, policy_name, nft_metadata_file):
+    input_address = input['utxo'].get('from-address')
+    if input_address == None:
+        with tracing.span('input_lookup', **attributes):
+            inputs = database.query_utxo_inputs(input['utxo']['tx-hash'])
+        if len(inputs) == 0:
+            logger.warning('Mint NFT External, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
+            return None
+
+        # There can be different addresses in the inputs.  Arbitrarily pick the
+        # first one.  These should all map to the same stake address
+        input_address = inputs[0]['address']
+    signing_index = input['utxo'].get('signing-index', signing_index)
+
+    with tracing.span('uniqueness_check', **attributes):
+        unique = verify_unique_nfts(cardano, database, policy_name, nft_metadata_file)
+    if not unique:
         logger.error("NFT Uniqueness Violation found.")
         raise Exception('NFT Uniqueness Violation')
 
     if destination == None:
-        # There can be different addresses in the inputs.  Arbitrarily pick the
-        # first one.  These should all map to the same stake address
-        destination = inputs[0]['address']
+        destination = input_address
 
     # The NFT minted will be added to the output when the transaction is created
     outputs = [{
@@ -536,25 +669,28 @@ def mint_nft(cardano: Cardano,
                     'amount': 1,
                     'assets': {}})
 
-    sales.set_input_address(input['utxo']['tx-hash'], input['utxo']['tx-ix'], inputs[0]['address'])
+    sales.set_input_address(input['utxo']['tx-hash'], input['utxo']['tx-ix'], input_address)
 
     # draft
     fee = 0
-    cardano.create_mint_nft_transaction_file(input,
-                                             outputs,
-                                             fee,
-                                             policy_name,
-                                             nft_metadata_file,
-                                             'transaction/mint_nft_draft_tx_{}'.format(os.getpid()))
+    with tracing.span('draft_build', **attributes):
+        cardano.create_mint_nft_transaction_file(input,
+                                                 outputs,
+                                                 fee,
+                                                 policy_name,
+                                                 nft_metadata_file,
+                                                 get_transaction_file('mint_nft_draft'))
 
     # https://github.com/input-output-hk/cardano-ledger-specs/blob/master/doc/explanations/min-utxo.rst
-    cardano.calculate_min_required_utxo_mint(outputs)
+    with tracing.span('min_utxo', **attributes):
+        cardano.calculate_min_required_utxo_mint(outputs)
     total_input_lovelace = input['utxo']['amount']
     logger.debug("Mint NFT External, total payment received: {} ADA".format(total_input_lovelace / 1000000))
 
     #fee
-    fee = cardano.calculate_min_fee('transaction/mint_nft_draft_tx_{}'.format(os.getpid()),
-                                    1, len(outputs), 2)
+    with tracing.span('fee', **attributes):
+        fee = cardano.calculate_min_fee(get_transaction_file('mint_nft_draft'),
+                                        1, len(outputs), 2)
 
     # update output amounts
     outputs[0]['amount'] = total_input_lovelace - fee # the project keeps
@@ -588,24 +724,35 @@ def mint_nft(cardano: Cardano,
     logger.debug('Mint NFT External, Fee = {} lovelace'.format(fee))
 
     #final
-    output = cardano.create_mint_nft_transaction_file(input,
-                                                      outputs,
-                                                      fee,
-                                                      policy_name,
-                                                      nft_metadata_file,
-                                                      'transaction/mint_nft_unsigned_tx_{}'.format(os.getpid()))
+    with tracing.span('final_build', **attributes):
+        output = cardano.create_mint_nft_transaction_file(input,
+                                                          outputs,
+                                                          fee,
+                                                          policy_name,
+                                                          nft_metadata_file,
+                                                          get_transaction_file('mint_nft_unsigned'))
     sales.set_tokens_minted(input['utxo']['tx-hash'],
                             input['utxo']['tx-ix'],
                             get_tokens_from_metadata(nft_metadata_file))
 
     #sign
-    cardano.sign_transaction('transaction/mint_nft_unsigned_tx_{}'.format(os.getpid()),
-                             [cardano.get_policy_signing_key_file(policy_name),
-                              minting_wallet.get_signing_key_file(signing_index)],
-                             'transaction/mint_nft_signed_tx_{}'.format(os.getpid()))
+    with tracing.span('sign', **attributes):
+        cardano.sign_transaction(get_transaction_file('mint_nft_unsigned'),
+                                 [cardano.get_policy_signing_key_file(policy_name),
+                                  minting_wallet.get_signing_key_file(signing_index)],
+                                 get_transaction_file('mint_nft_signed'))
+
+    # the txid is known before submitting, record it in case the process
+    # stops before the submit returns
+    sales.set_submit_txid(input['utxo']['tx-hash'],
+                          input['utxo']['tx-ix'],
+                          cardano.get_transaction_id(get_transaction_file('mint_nft_signed')))
+    sales.commit()
 
     #submit
-    tx_id = cardano.submit_transaction('transaction/mint_nft_signed_tx_{}'.format(os.getpid()))
+    with tracing.span('submit', **attributes) as span:
+        tx_id = cardano.submit_transaction(get_transaction_file('mint_nft_signed'))
+        span.set_attribute('tcr.txid', tx_id)
     return tx_id
 
 def batch_mint_next_nft_in_series(cardano: Cardano,
@@ -614,32 +761,50 @@ def batch_mint_next_nft_in_series(cardano: Cardano,
                                   policy_name: str,
                                   input: Dict,
                                   nft_metadata_file: str,
-                                  sales: Sales) -> bool:
+                                  sales: Sales,
+                                  nft_metadata_files: List[str] = None) -> bool:
     """
     Mint the NFT defined in nft_metadata_file.
 
     @param nft_metadata_file Could contain a single asset or multiple assets
+    @param nft_metadata_files The metadata files merged into
+                              nft_metadata_file, recorded with the sale.
+    @return None if the submit failed in a way that it may still have been
+            accepted.  The sale is kept for check_pending_mint.  RETRY if
+            db-sync does not have the payment yet.
     """
 
     logger.debug('Mint Next Series NFT, merged nft metadata: {}'.format(nft_metadata_file))
     logger.debug('Mint Next Series NFT, {} / {}, {} NFTs, input: {}#{}'.format(minting_wallet.get_name(), policy_name, input['count'], input['utxo']['tx-hash'], input['utxo']['tx-ix']))
     sales.add_utxo(input['utxo']['tx-hash'], input['utxo']['tx-ix'], input['utxo']['amount'], input['count'])
+    if nft_metadata_files != None:
+        sales.set_metadata_files(input['utxo']['tx-hash'], input['utxo']['tx-ix'], nft_metadata_files)
 
     nft_metadata = Nft.parse_metadata_file(nft_metadata_file)
 
     logger.info('Mint Next Series NFT, Mint NFTs: {}'.format(nft_metadata['token-names']))
-    tx_id = mint_nft(cardano, database, minting_wallet,
-                     Wallet.ADDRESS_INDEX_MINT,
-                     policy_name,
-                     input,
-                     nft_metadata_file,
-                     sales)
+    try:
+        tx_id = mint_nft(cardano, database, minting_wallet,
+                         Wallet.ADDRESS_INDEX_MINT,
+                         policy_name,
+                         input,
+                         nft_metadata_file,
+                         sales)
+    except Exception as e:
+        submit_txid = sales.get_submit_txid(input['utxo']['tx-hash'], input['utxo']['tx-ix'])
+        if submit_txid == None:
+            # nothing was submitted, the payment can be tried again
+            sales.remove_utxo(input['utxo']['tx-hash'], input['utxo']['tx-ix'])
+            raise e
+
+        logger.error('Mint NFT, Submit failed, TXID = {}, outcome unknown: {}'.format(submit_txid, e))
+        return None
 
     if tx_id == None:
         # delete the utxo so the main payment processor will try again
-        logger.info('Mint Error, TXID = None')
+        logger.info('Mint NFT, Waiting for DB SYNC, TXID = None')
         sales.remove_utxo(input['utxo']['tx-hash'], input['utxo']['tx-ix'])
-        return False
+        return RETRY
 
     logger.info('Mint NFT, TXID = {}'.format(tx_id))
     # Set the output txid to mark the transaction successful
@@ -647,6 +812,35 @@ def batch_mint_next_nft_in_series(cardano: Cardano,
 
     return True
 
+def check_pending_mint(cardano: Cardano,
+                       sales: Sales,
+                       item: Dict) -> bool:
+    """
+    Find out what happened to a mint that was submitted, or about to be,
+    when the process stopped or the submit failed.  The mint spends the
+    payment so a spent payment means it was minted.
+
+    @param item A sale from Sales.get_pending()
+    @return True if minted, False if it was not and the sale was removed so
+            the payment is tried again, None while it is in the mempool.
+    """
+
+    (hash, ix, tx_id) = (item['input-hash'], item['input-ix'], item['submit-txid'])
+    if cardano.query_mempool_contains(tx_id):
+        logger.info('Pending Mint, {}#{}, TXID = {} in the mempool'.format(hash, ix, tx_id))
+        return None
+
+    if not cardano.query_utxo_unspent(hash, ix):
+        logger.info('Pending Mint, {}#{}, TXID = {} minted'.format(hash, ix, tx_id))
+        sales.set_output_txid(hash, ix, tx_id)
+        sales.commit()
+        return True
+
+    logger.warning('Pending Mint, {}#{}, TXID = {} not found, the payment will be tried again'.format(hash, ix, tx_id))
+    sales.remove_utxo(hash, ix)
+    sales.commit()
+    return False
+
 def refund_payment(cardano: Cardano,
                    database: Database,
                    wallet: Wallet,
@@ -656,15 +850,17 @@ def refund_payment(cardano: Cardano,
     logger.debug('Refund Payment, amount: {} lovelace'.format(wallet.get_name(), utxo['amount']))
     sales.add_utxo(utxo['tx-hash'], utxo['tx-ix'], utxo['amount'], 0)
 
-    inputs = database.query_utxo_inputs(utxo['tx-hash'])
-    if len(inputs) == 0:
-        logger.warning('Refund Payment, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
-        sales.remove_utxo(utxo['tx-hash'], utxo['tx-ix'])
-        return False
-
-    # There can be different addresses in the inputs but they should be from the
-    # same wallet, Arbitrarily pick the first one.
-    input_address = inputs[0]['address']
+    input_address = utxo.get('from-address')
+    if input_address == None:
+        inputs = database.query_utxo_inputs(utxo['tx-hash'])
+        if len(inputs) == 0:
+            logger.warning('Refund Payment, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
+            sales.remove_utxo(utxo['tx-hash'], utxo['tx-ix'])
+            return RETRY
+
+        # There can be different addresses in the inputs but they should be from the
+        # same wallet, Arbitrarily pick the first one.
+        input_address = inputs[0]['address']
     sales.set_input_address(utxo['tx-hash'], utxo['tx-ix'], input_address)
     destination = WalletExternal('customer',
                                  cardano.get_network(),
@@ -694,11 +890,20 @@ def process_whitelist(cardano: Cardano,
     sales = Sales(cardano.get_network(), drop_name)
 
     nft_metadata = MetadataList(metadata_set_file)
+    for item in sales.get_pending():
+        minted = check_pending_mint(cardano, sales, item)
+        if minted == None:
+            logger.error('Presale, Mint {} still in the mempool'.format(item['submit-txid']))
+            raise Exception('Presale, Mint {} still in the mempool'.format(item['submit-txid']))
+        if minted:
+            nft_metadata.remove_files(item.get('metadata-files', []))
     logger.info('Presale, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
 
     for payment in whitelist_payments:
         # payment is a dictionary with:
         #     'utxo-txid', 'utxo-txix', 'from-stake-addr', 'nfts'
+        cardano.refresh_protocol_parameters()
+
         presale_address = minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)
         (utxos, total_lovelace) = cardano.query_utxos(minting_wallet, [presale_address])
         utxos = cardano.query_utxos_time(database, utxos)
@@ -752,13 +957,23 @@ def process_whitelist(cardano: Cardano,
         merged_metadata_file = Nft.merge_metadata_files(policy_id,
                                                         nft_metadata_files)
 
-        if not batch_mint_next_nft_in_series(cardano,
-                                             database,
-                                             minting_wallet,
-                                             policy_name,
-                                             input_utxos,
-                                             merged_metadata_file,
-                                             sales):
+        result = batch_mint_next_nft_in_series(cardano,
+                                               database,
+                                               minting_wallet,
+                                               policy_name,
+                                               input_utxos,
+                                               merged_metadata_file,
+                                               sales,
+                                               nft_metadata_files)
+        if result == None:
+            # the files cannot be used again until the mint is checked
+            sales.commit()
+            logger.error('Presale, Mint outcome unknown, run again to check it')
+            raise Exception('Presale, Mint outcome unknown, run again to check it')
+        elif result == RETRY:
+            nft_metadata.revert()
+            logger.warning('Presale, Waiting for DB SYNC, run again to mint UTXO: {}#{}'.format(payment['utxo-txid'], payment['utxo-txix']))
+        elif not result:
             nft_metadata.revert()
             logger.error('process_incoming_payments, Fail to mint')
         else:
@@ -775,19 +990,80 @@ def process_whitelist(cardano: Cardano,
     logger.info('!!! Whitelist COMPLETE !!!')
     logger.info('!!!!!!!!!!!!!!!!!!!!!!!!!!')
 
+def mint_payment(cardano: Cardano,
+                 database: Database,
+                 minting_wallet: Wallet,
+                 policy_name: str,
+                 input: Dict,
+                 nft_metadata_files: List[str],
+                 sales: Sales) -> bool:
+    """
+    Mint the NFTs for one payment.  Runs on a mint worker thread.
+    """
+
+    set_transaction_namespace('{}_{}'.format(os.getpid(), threading.current_thread().name))
+
+    policy_id = cardano.get_policy_id(policy_name)
+    merged_metadata_file = Nft.merge_metadata_files(policy_id,
+                                                    nft_metadata_files)
+    with tracing.span('mint_payment', **{'tcr.utxo': '{}#{}'.format(input['utxo']['tx-hash'], input['utxo']['tx-ix']),
+                                         'tcr.count': input['count']}) as span:
+        result = batch_mint_next_nft_in_series(cardano,
+                                               database,
+                                               minting_wallet,
+                                               policy_name,
+                                               input,
+                                               merged_metadata_file,
+                                               sales,
+                                               nft_metadata_files)
+        span.set_attribute('tcr.result', result)
+    if result == True:
+        observe_payment_to_submit(input['utxo']['time'])
+    sales.commit()
+    return result
+
+def refund_payment_worker(cardano: Cardano,
+                          database: Database,
+                          wallet: Wallet,
+                          utxo: Dict,
+                          sales: Sales) -> bool:
+    """
+    Refund a payment.  Runs on a mint worker thread.
+    """
+
+    set_transaction_namespace('{}_{}'.format(os.getpid(), threading.current_thread().name))
+    return refund_payment(cardano, database, wallet, utxo, sales)
+
 def process_incoming_payments(cardano: Cardano,
                               database: Database,
                               minting_wallet: Wallet,
                               policy_name: str,
                               drop_name: str,
                               metadata_set_file: str,
-                              prices: Dict[int, int]) -> None:
+                              prices: Dict[int, int],
+                              workers: int = 1,
+                              controller: MintController = None,
+                              address_pool: AddressPool = None) -> None:
     """
     Listing for incoming payments and mint NFT to the address the payment came
     from.  NFTs are minted in the order defined in metadata_set_file and assumes
     that all NFTs have the same price.
 
+    Each payment spends its own UTXO so payments are minted concurrently on a
+    pool of worker threads.  A UTXO is claimed while its mint is in flight
+    and the metadata files for each mint are reserved until it completes.
+    A mint whose submit has an unknown outcome, or was in flight when the
+    process stopped, keeps its files reserved until check_pending_mint
+    finds it on chain or not.
+
     @param prices A dictionary to define the price for a single item or a bundle.
+    @param workers The number of payments to mint at the same time.
+    @param controller Reports progress and pauses or drains the minter.
+                      Returns once drained.
+    @param address_pool Also take payments on the addresses of its open
+                        checkout sessions.  These are queried in batches and
+                        attributed by address.  A payment to a session that
+                        is already closed is refunded.
     """
 
     logger.info('Monitor Incoming Payments on   (delegated): {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True)))
@@ -795,70 +1071,219 @@ def process_incoming_payments(cardano: Cardano,
     sales = Sales(cardano.get_network(), drop_name)
 
     nft_metadata = MetadataList(metadata_set_file)
-    logger.info('process_incoming_payments, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
-
-    while True:
-        (utxos, total_lovelace) = cardano.query_utxos(minting_wallet,
-                                                      [minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True),
-                                                       minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=False)])
-        utxos = cardano.query_utxos_time(database, utxos)
-        utxos.sort(key=lambda item : item['slot-no'])
+    allocator = MetadataAllocator(nft_metadata)
+    utxo_locks = UtxoLockManager()
+    for item in sales.get_pending():
+        allocator.reserve(item.get('metadata-files', []))
+    if controller == None:
+        controller = MintController()
+    logger.info('process_incoming_payments, NFTs Remaining: {}, Workers: {}'.format(allocator.get_remaining(), workers))
+
+    # future -> (utxo, metadata files)
+    pending = {}
+    # (tx-hash, tx-ix) of the payments counted as seen, a payment waiting
+    # for db-sync is queued more than once
+    seen = set()
+
+    def set_progress() -> None:
+        controller.set_progress(len(pending), allocator.get_remaining())
+        QUEUE_DEPTH.set(len(pending))
+        NFTS_REMAINING.set(allocator.get_remaining())
+
+    def complete(future: concurrent.futures.Future) -> None:
+        (utxo, nft_metadata_files) = pending.pop(future)
+        utxo_locks.release(utxo)
+        try:
+            success = future.result()
+        except Exception as e:
+            allocator.release(nft_metadata_files)
+            raise e
+
+        if success == None:
+            # the files stay reserved until check_pending_mint finds out
+            logger.warning('process_incoming_payments, Mint outcome unknown')
+            return
+        if success == RETRY:
+            # not a failure, the payment is tried again on the next loop
+            allocator.release(nft_metadata_files)
+            logger.info('process_incoming_payments, Waiting for DB SYNC, UTXO: {}#{}'.format(utxo['tx-hash'], utxo['tx-ix']))
+            return
+
+        tokens = [os.path.basename(mdfile) for mdfile in nft_metadata_files]
+        txid = sales.get_output_txid(utxo['tx-hash'], utxo['tx-ix'])
+        if success and 'session' in utxo:
+            address_pool.close_session(utxo['session'])
+        if len(nft_metadata_files) == 0:
+            if success:
+                controller.add_result(utxo, 'refunded', txid=txid)
+                PAYMENTS.inc(event='refunded')
+                logger.info('processing_incoming_payments, Refund complete.')
+            else:
+                controller.add_result(utxo, 'failed')
+                PAYMENTS.inc(event='failed')
+                logger.error('processing_incoming_payments, Fail to refund')
+        elif success:
+            allocator.commit(nft_metadata_files)
+            controller.add_result(utxo, 'minted', tokens, txid)
+            PAYMENTS.inc(event='minted')
+            logger.info('Mint complete')
+            logger.info('Monitor Incoming Payments on: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT)))
+            logger.info('process_incoming_payments, NFTs Remaining: {}'.format(allocator.get_remaining()))
+        else:
+            allocator.release(nft_metadata_files)
+            controller.add_result(utxo, 'failed', tokens)
+            PAYMENTS.inc(event='failed')
+            logger.error('process_incoming_payments, Fail to mint')
 
-        if len(utxos) == 0:
-            time.sleep(30)
-            continue
+    def complete_done(wait: bool) -> None:
+        if wait:
+            concurrent.futures.wait(list(pending.keys()))
+
+        error = None
+        for future in [future for future in pending if future.done()]:
+            try:
+                complete(future)
+            except Exception as e:
+                if error == None:
+                    error = e
+
+        if error != None:
+            # Let the mints in flight finish so their metadata is committed
+            # before giving up
+            complete_done(True)
+            raise error
+
+    def check_pending() -> None:
+        for item in sales.get_pending():
+            utxo = {'tx-hash': item['input-hash'], 'tx-ix': item['input-ix']}
+            if not utxo_locks.claim(utxo):
+                # mint in flight
+                continue
 
-        utxos_processed = 0
-        for utxo in utxos:
-            if sales.contains(utxo['tx-hash'], utxo['tx-ix']):
+            try:
+                minted = check_pending_mint(cardano, sales, item)
+            finally:
+                utxo_locks.release(utxo)
+
+            nft_metadata_files = item.get('metadata-files', [])
+            if minted == True:
+                allocator.commit(nft_metadata_files)
+                controller.add_result(utxo, 'minted', [os.path.basename(mdfile) for mdfile in nft_metadata_files], item['submit-txid'])
+                PAYMENTS.inc(event='minted')
+            elif minted == False:
+                allocator.release(nft_metadata_files)
+
+    def mark_seen(utxo: Dict) -> None:
+        key = (utxo['tx-hash'], utxo['tx-ix'])
+        if not key in seen:
+            seen.add(key)
+            PAYMENTS.inc(event='seen')
+
+    def queue_refund(utxo: Dict) -> None:
+        logger.debug('Queue For Refund, UTXO {} = {} NFTs, refund: {}'.format(utxo['tx-hash'], 0, utxo['amount']))
+        mark_seen(utxo)
+        future = executor.submit(refund_payment_worker,
+                                 cardano,
+                                 database,
+                                 minting_wallet,
+                                 utxo,
+                                 sales)
+        pending[future] = (utxo, [])
+
+    def wait_for_pending(timeout: float) -> None:
+        """
+        Sleep until a mint in flight completes, a control command or the
+        timeout.
+        """
+
+        if len(pending) > 0:
+            concurrent.futures.wait(list(pending.keys()), timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+        else:
+            controller.wait(timeout)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mint') as executor:
+        while True:
+            complete_done(False)
+            check_pending()
+            set_progress()
+
+            if controller.is_draining() and len(pending) == 0:
+                controller.stop()
+                logger.info('process_incoming_payments, Drained')
+                return
+
+            if not controller.is_accepting():
+                # paused or draining, only wait for the mints in flight
+                wait_for_pending(30)
                 continue
 
-            if nft_metadata.get_remaining() > 0:
-                if utxo['amount'] in prices:
+            # fees for new transactions must use the current epoch's parameters
+            cardano.refresh_protocol_parameters()
+
+            (utxos, total_lovelace) = cardano.query_utxos(minting_wallet,
+                                                          [minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True),
+                                                           minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=False)])
+            if address_pool != None:
+                pool_utxos = cardano.query_utxos_batch(address_pool.get_addresses())
+                utxos.extend([utxo for utxo in pool_utxos if address_pool.attribute(utxo)])
+            utxos = cardano.query_utxos_time(database, utxos)
+            utxos.sort(key=lambda item : item['slot-no'])
+
+            utxos_processed = 0
+            for utxo in utxos:
+                if sales.contains(utxo['tx-hash'], utxo['tx-ix']):
+                    continue
+
+                if not utxo_locks.claim(utxo):
+                    # mint or refund in flight
+                    continue
+
+                if 'session' in utxo and address_pool.is_closed(utxo['session']):
+                    # A second payment to a paid session or a late payment
+                    # to an expired one
+                    if utxo['amount'] > 2000000:
+                        utxos_processed += 1
+                        queue_refund(utxo)
+                    else:
+                        utxo_locks.release(utxo)
+                elif allocator.get_remaining() > 0:
+                    if not utxo['amount'] in prices:
+                        utxo_locks.release(utxo)
+                        continue
+
                     nfts_requested = prices[utxo['amount']]
                     refund_price = 0
                     nfts_to_grant = nfts_requested
-                    if nfts_requested > nft_metadata.get_remaining():
+                    if nfts_requested > allocator.get_remaining():
                         price_per_nft = utxo['amount'] /prices[utxo['amount']]
-                        nfts_to_grant = nft_metadata.get_remaining()
+                        nfts_to_grant = allocator.get_remaining()
                         nfts_to_refund = nfts_requested - nfts_to_grant
                         refund_price = int(nfts_to_refund * price_per_nft)
 
-                    nft_metadata_files = []
-                    for i in range(0, nfts_to_grant):
-                        mdfile = nft_metadata.peek_next_file()
-                        nft_metadata_files.append(mdfile)
+                    nft_metadata_files = allocator.allocate(nfts_to_grant)
+                    for mdfile in nft_metadata_files:
                         logger.debug('Merging NFT metadata: {}'.format(mdfile))
 
-                    policy_id = cardano.get_policy_id(policy_name)
-                    merged_metadata_file = Nft.merge_metadata_files(policy_id,
-                                                                    nft_metadata_files)
                     utxos_processed += 1
-                    if batch_mint_next_nft_in_series(cardano,
-                                                     database,
-                                                     minting_wallet,
-                                                     policy_name,
-                                                     {'utxo': utxo, 'count': nfts_to_grant, 'refund': refund_price},
-                                                     merged_metadata_file,
-                                                     sales):
-                        nft_metadata.commit()
-                        logger.info('Mint complete')
-                        logger.info('Monitor Incoming Payments on: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT)))
-                        logger.info('process_incoming_payments, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
-                    else:
-                        nft_metadata.revert()
-                        logger.error('process_incoming_payments, Fail to mint')
-                    sales.commit()
-            else:
-                # Give a refund. Could refund as little as 1.2 ADA.
-                # Just round up to 2 ADA.
-                if utxo['amount'] > 2000000:
-                    logger.debug('Queue For Refund, UTXO {} = {} NFTs, refund: {}'.format(utxo['tx-hash'], 0, utxo['amount']))
-                    item = {'utxo': utxo, 'count': 0}
+                    mark_seen(utxo)
+                    future = executor.submit(mint_payment,
+                                             cardano,
+                                             database,
+                                             minting_wallet,
+                                             policy_name,
+                                             {'utxo': utxo, 'count': nfts_to_grant, 'refund': refund_price},
+                                             nft_metadata_files,
+                                             sales)
+                    pending[future] = (utxo, nft_metadata_files)
+                elif allocator.get_reserved() == 0 and utxo['amount'] > 2000000:
+                    # Give a refund. Could refund as little as 1.2 ADA.
+                    # Just round up to 2 ADA.  Wait while mints are in flight
+                    # in case one fails and returns its NFTs.
                     utxos_processed += 1
-                    if not refund_payment(cardano, database, minting_wallet, item['utxo'], sales):
-                        logger.error('processing_incoming_payments, Fail to refund')
-                    else:
-                        logger.info('processing_incoming_payments, Refund complete.')
-        if utxos_processed == 0:
-            time.sleep(30)
+                    queue_refund(utxo)
+                else:
+                    utxo_locks.release(utxo)
+
+            set_progress()
+            if utxos_processed == 0:
+                wait_for_pending(30)
@@ -0,0 +1,295 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: tracing.py
+Author: SuperKK
+
+Lightweight tracing of the mint stages.  Spans are written as OTLP JSON lines,
+the format read by the OpenTelemetry Collector's otlpjsonfile receiver, so a
+trace can be loaded into any OpenTelemetry backend or printed as a waterfall:
+
+    python3 -m tcr.tracing --trace-file=traces.jsonl
+
+Tracing is disabled until configure() is called.  While disabled span()
+returns a shared no-op span.
+"""
+
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+logger = logging.getLogger('tracing')
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+class NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class FileExporter:
+    """
+    Appends each finished span to a file as one OTLP JSON line.
+    """
+
+    def __init__(self, filename: str, service_name: str = 'tcr'):
+        self.filename = filename
+        self.service_name = service_name
+        self.lock = threading.Lock()
+        self.file = open(filename, 'a')
+
+    def export(self, span: 'Span') -> None:
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [format_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{'scope': {'name': 'tcr'}, 'spans': [span.to_otlp()]}]
+        }]})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+def format_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    elif isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    elif isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+def parse_attribute(attribute: Dict):
+    value = attribute['value']
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return list(value.values())[0]
+
+class Span:
+    def __init__(self, tracer: 'Tracer', name: str, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = None
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = ''
+        self.start_time = 0
+        self.end_time = 0
+        self.status = STATUS_UNSET
+        self.message = ''
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self):
+        parent = self.tracer.get_current_span()
+        if parent == None:
+            self.trace_id = os.urandom(16).hex()
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_span_id = parent.span_id
+        self.tracer.push(self)
+        self.start_time = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.end_time = time.time_ns()
+        if exc_type != None:
+            self.status = STATUS_ERROR
+            self.message = '{}: {}'.format(exc_type.__name__, exc_value)
+        else:
+            self.status = STATUS_OK
+        self.tracer.pop(self)
+        exporter = self.tracer.exporter
+        if exporter != None:
+            exporter.export(self)
+        return False
+
+    def to_otlp(self) -> Dict:
+        status = {'code': self.status}
+        if self.message != '':
+            status['message'] = self.message
+        return {'traceId': self.trace_id,
+                'spanId': self.span_id,
+                'parentSpanId': self.parent_span_id,
+                'name': self.name,
+                'kind': 1,
+                'startTimeUnixNano': str(self.start_time),
+                'endTimeUnixNano': str(self.end_time),
+                'attributes': [format_attribute(key, value) for (key, value) in self.attributes.items()],
+                'status': status}
+
+class Tracer:
+    def __init__(self):
+        self.exporter = None
+        self.local = threading.local()
+
+    def is_enabled(self) -> bool:
+        return self.exporter != None
+
+    def get_current_span(self) -> Span:
+        stack = getattr(self.local, 'stack', None)
+        if stack == None or len(stack) == 0:
+            return None
+        return stack[-1]
+
+    def push(self, span: Span) -> None:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(span)
+
+    def pop(self, span: Span) -> None:
+        self.local.stack.remove(span)
+
+    def span(self, name: str, **attributes):
+        if self.exporter == None:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+TRACER = Tracer()
+
+def configure(filename: str, service_name: str = 'tcr') -> None:
+    """
+    Enable tracing and append the spans to filename.
+    """
+
+    shutdown()
+    TRACER.exporter = FileExporter(filename, service_name)
+    logger.info('Tracing to: {}'.format(filename))
+
+def shutdown() -> None:
+    if TRACER.exporter != None:
+        exporter = TRACER.exporter
+        TRACER.exporter = None
+        exporter.close()
+
+def is_enabled() -> bool:
+    return TRACER.is_enabled()
+
+def span(name: str, **attributes):
+    """
+    Context manager wrapping a stage in a span, child of the current span on
+    this thread.  Attribute names use dots, pass them with a dict:
+
+        with tracing.span('submit', **{'tcr.utxo': utxo}):
+    """
+
+    return TRACER.span(name, **attributes)
+
+def read_spans(filename: str) -> List[Dict]:
+    spans = []
+    with open(filename, 'r') as file:
+        for line in file:
+            if line.strip() == '':
+                continue
+            for resource_spans in json.loads(line)['resourceSpans']:
+                for scope_spans in resource_spans['scopeSpans']:
+                    for otlp_span in scope_spans['spans']:
+                        spans.append({'trace-id': otlp_span['traceId'],
+                                      'span-id': otlp_span['spanId'],
+                                      'parent-span-id': otlp_span['parentSpanId'],
+                                      'name': otlp_span['name'],
+                                      'start': int(otlp_span['startTimeUnixNano']),
+                                      'end': int(otlp_span['endTimeUnixNano']),
+                                      'attributes': {attribute['key']: parse_attribute(attribute) for attribute in otlp_span['attributes']},
+                                      'status': otlp_span['status']['code']})
+    return spans
+
+def format_waterfall(spans: List[Dict], width: int = 40) -> List[str]:
+    """
+    One line per span, grouped by trace, indented by depth with a bar showing
+    when the span ran relative to its trace.
+    """
+
+    traces = {}
+    for s in spans:
+        traces.setdefault(s['trace-id'], []).append(s)
+
+    lines = []
+    for trace_spans in sorted(traces.values(), key=lambda item: min([s['start'] for s in item])):
+        start = min([s['start'] for s in trace_spans])
+        duration = max(1, max([s['end'] for s in trace_spans]) - start)
+        ids = set([s['span-id'] for s in trace_spans])
+        children = {}
+        for s in trace_spans:
+            parent = s['parent-span-id'] if s['parent-span-id'] in ids else ''
+            children.setdefault(parent, []).append(s)
+
+        roots = children.get('', [])
+        attributes = roots[0]['attributes'] if len(roots) > 0 else {}
+        lines.append('Trace {} {}'.format(trace_spans[0]['trace-id'], ' '.join(['{}={}'.format(k, v) for (k, v) in attributes.items()])))
+
+        def add(s: Dict, depth: int) -> None:
+            offset = int(width * (s['start'] - start) / duration)
+            length = max(1, int(width * (s['end'] - s['start']) / duration))
+            bar = ' ' * offset + '#' * min(length, width - offset)
+            error = ' ERROR' if s['status'] == STATUS_ERROR else ''
+            lines.append('  {:<32} {:>10.3f}s |{:<{width}}|{}'.format(('  ' * depth + s['name'])[:32],
+                                                                     (s['end'] - s['start']) / 1e9,
+                                                                     bar,
+                                                                     error,
+                                                                     width=width))
+            for child in sorted(children.get(s['span-id'], []), key=lambda item: item['start']):
+                add(child, depth + 1)
+
+        for root in sorted(roots, key=lambda item: item['start']):
+            add(root, 0)
+
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--trace-file', required=True,
+                                        action='store',
+                                        metavar='FILENAME',
+                                        help='The trace file written by nftmint --trace-file')
+
+    args = parser.parse_args()
+    for line in format_waterfall(read_spans(args.trace_file)):
+        print(line)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
@@ -0,0 +1,233 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: trait_index.py
+Author: SuperKK
+
+SQLite index of the traits in a directory of NFT metadata files.  Each
+(trait, value) pair maps to the files that have it so searches and rarity
+counts do not need to open every metadata file.  The index is brought up to
+date incrementally, only files that were added, changed or removed since the
+last update are read.
+"""
+
+from typing import Dict, List, Tuple
+import json
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger('trait-index')
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, filename TEXT UNIQUE NOT NULL, mtime INTEGER NOT NULL, token TEXT)',
+    'CREATE TABLE IF NOT EXISTS traits (file_id INTEGER NOT NULL, trait TEXT NOT NULL, value TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS traits_trait_value ON traits (trait, value)',
+    'CREATE INDEX IF NOT EXISTS traits_file_id ON traits (file_id)'
+]
+
+def get_default_index_file(directory: str) -> str:
+    """
+    The index lives next to the metadata directory, not inside it, so tools
+    that list the metadata directory do not see it.
+    """
+
+    directory = os.path.normpath(directory)
+    return os.path.join(os.path.dirname(directory), '{}_index.db'.format(os.path.basename(directory)))
+
+def get_token(filename: str) -> Tuple[str, Dict]:
+    """
+    Read the token name and properties from NFT metadata.
+    """
+
+    with open(filename, 'r') as file:
+        md = json.load(file)
+
+    erc721 = md['721']
+    policy = erc721[list(erc721.keys())[0]]
+    token_name = list(policy.keys())[0]
+    return (token_name, policy[token_name])
+
+def get_trait_values(value) -> List[str]:
+    """
+    List values are indexed as one row per element, anything that is not a
+    string is stored as JSON.
+    """
+
+    if type(value) is list:
+        values = []
+        for subvalue in value:
+            values.extend(get_trait_values(subvalue))
+        return values
+
+    if type(value) is str:
+        return [value]
+
+    return [json.dumps(value, sort_keys=True)]
+
+class TraitIndex:
+    def __init__(self, directory: str, index_file: str = None):
+        self.directory = directory
+        self.index_file = index_file
+        if self.index_file == None:
+            self.index_file = get_default_index_file(directory)
+
+        self.connection = sqlite3.connect(self.index_file)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def update(self) -> Tuple[int, int]:
+        """
+        Read metadata files that are new or changed since the last update and
+        forget files that no longer exist.
+
+        @return (files read, files removed)
+        """
+
+        indexed = {}
+        for (file_id, filename, mtime) in self.connection.execute('SELECT id, filename, mtime FROM files'):
+            indexed[filename] = (file_id, mtime)
+
+        current = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    current[entry.name] = entry.stat().st_mtime_ns
+
+        removed = [indexed[filename][0] for filename in indexed if not filename in current]
+        changed = [filename for filename in current if not filename in indexed or indexed[filename][1] != current[filename]]
+
+        with self.connection:
+            for file_id in removed:
+                self.connection.execute('DELETE FROM traits WHERE file_id = ?', (file_id,))
+                self.connection.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+            for filename in changed:
+                (token_name, token) = get_token(os.path.join(self.directory, filename))
+                if filename in indexed:
+                    file_id = indexed[filename][0]
+                    self.connection.execute('DELETE FROM traits WHERE file_id = ?', (file_id,))
+                    self.connection.execute('UPDATE files SET mtime = ?, token = ? WHERE id = ?', (current[filename], token_name, file_id))
+                else:
+                    cursor = self.connection.execute('INSERT INTO files (filename, mtime, token) VALUES (?, ?, ?)', (filename, current[filename], token_name))
+                    file_id = cursor.lastrowid
+
+                rows = []
+                for trait in token:
+                    for value in get_trait_values(token[trait]):
+                        rows.append((file_id, trait, value))
+                self.connection.executemany('INSERT INTO traits (file_id, trait, value) VALUES (?, ?, ?)', rows)
+
+        logger.info('TraitIndex, {}: {} read, {} removed'.format(self.index_file, len(changed), len(removed)))
+        return (len(changed), len(removed))
+
+    def get_total(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def get_traits(self) -> List[str]:
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT trait FROM traits ORDER BY trait')]
+
+    def search(self, properties: Dict[str, str]) -> List[str]:
+        """
+        Find the files that have every trait = value in properties.
+
+        @return Sorted list of metadata filenames
+        """
+
+        if len(properties) == 0:
+            return [row[0] for row in self.connection.execute('SELECT filename FROM files ORDER BY filename')]
+
+        conditions = ' OR '.join(['(trait = ? AND value = ?)'] * len(properties))
+        parameters = []
+        for trait in properties:
+            parameters.extend([trait, properties[trait]])
+        parameters.append(len(properties))
+
+        query = ('SELECT filename FROM files WHERE id IN '
+                 '(SELECT file_id FROM traits WHERE {} GROUP BY file_id HAVING COUNT(DISTINCT trait) = ?) '
+                 'ORDER BY filename').format(conditions)
+        return [row[0] for row in self.connection.execute(query, parameters)]
+
+    def get_counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        @return Dictionary of trait to dictionary of value to number of files
+        """
+
+        counts = {}
+        for (trait, value, count) in self.connection.execute('SELECT trait, value, COUNT(*) FROM traits GROUP BY trait, value'):
+            if not trait in counts:
+                counts[trait] = {}
+            counts[trait][value] = count
+        return counts
+
+    def get_filenames(self) -> List[str]:
+        """
+        @return Metadata filenames in the same order as get_properties
+        """
+
+        return [row[0] for row in self.connection.execute('SELECT filename FROM files ORDER BY filename')]
+
+    def get_properties(self) -> Tuple[List[str], List[Dict[str, List[str]]]]:
+        """
+        Read every token back out of the index.
+
+        @return (token names, list of dictionary of trait to list of values)
+        """
+
+        tokens = []
+        properties = []
+        file_ids = {}
+        for (file_id, token) in self.connection.execute('SELECT id, token FROM files ORDER BY filename'):
+            file_ids[file_id] = len(tokens)
+            tokens.append(token)
+            properties.append({})
+
+        for (file_id, trait, value) in self.connection.execute('SELECT file_id, trait, value FROM traits ORDER BY rowid'):
+            token = properties[file_ids[file_id]]
+            if not trait in token:
+                token[trait] = []
+            token[trait].append(value)
+
+        return (tokens, properties)
+
+    def get_combination_counts(self, traits: List[str]) -> Dict[str, int]:
+        """
+        Count the combined values of several traits, e.g. 'red+fangs' for
+        ['saliva', 'teeth'].  Files missing one of the traits are not counted.
+        """
+
+        joins = ''
+        conditions = []
+        for i in range(1, len(traits)):
+            joins += ' JOIN traits t{} ON t{}.file_id = t0.file_id'.format(i, i)
+        for i in range(0, len(traits)):
+            conditions.append('t{}.trait = ?'.format(i))
+        combined = " || '+' || ".join(['t{}.value'.format(i) for i in range(0, len(traits))])
+
+        query = 'SELECT {}, COUNT(*) FROM traits t0{} WHERE {} GROUP BY 1'.format(combined, joins, ' AND '.join(conditions))
+        return {value: count for (value, count) in self.connection.execute(query, traits)}
@@ -0,0 +1,76 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: utxo_lock.py
+Author: SuperKK
+"""
+
+from typing import Dict
+import logging
+import threading
+
+logger = logging.getLogger('utxo-lock')
+
+class UtxoLockManager:
+    """
+    Tracks the UTXOs claimed by transactions that are being built so a UTXO
+    is never spent by two transactions at the same time.
+    """
+
+    def __init__(self):
+        self.claimed = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(utxo: Dict) -> str:
+        return '{}#{}'.format(utxo['tx-hash'], utxo['tx-ix'])
+
+    def claim(self, utxo: Dict) -> bool:
+        """
+        @return True if the UTXO was claimed, False if it is already claimed
+        """
+
+        key = UtxoLockManager.get_key(utxo)
+        with self.lock:
+            if key in self.claimed:
+                return False
+            self.claimed.add(key)
+
+        logger.debug('Claim UTXO: {}'.format(key))
+        return True
+
+    def release(self, utxo: Dict) -> None:
+        key = UtxoLockManager.get_key(utxo)
+        with self.lock:
+            self.claimed.discard(key)
+
+        logger.debug('Release UTXO: {}'.format(key))
+
+    def is_claimed(self, utxo: Dict) -> bool:
+        with self.lock:
+            return UtxoLockManager.get_key(utxo) in self.claimed
+
+    def get_claimed(self) -> int:
+        with self.lock:
+            return len(self.claimed)
@@ -26,22 +26,44 @@ File: wallet.py
 Author: SuperKK
 """
 
-from typing import Tuple
+from typing import Dict, List, NamedTuple, Tuple
 import os
 import logging
 
 from tcr.command import Command
+from tcr.hdkey import ExtendedPrivateKey, ExtendedPublicKey, ROLE_EXTERNAL, ROLE_STAKE
+from tcr.address import base_address, delegate_address, enterprise_address, reward_address
 
 logger = logging.getLogger('wallet')
 
+class WalletAddress(NamedTuple):
+    """
+    The files of one address index as found on disk, None if missing.
+    """
+
+    payment_address: str
+    delegated_payment_address: str
+    signing_key_file: str
+    verification_key_file: str
+
+    def is_complete(self) -> bool:
+        return (self.payment_address != None and self.delegated_payment_address != None and
+                self.signing_key_file != None and self.verification_key_file != None)
+
 class Wallet:
     """
     The Wallet class is used to create a new wallet and all operations
     associated with creating wallets.
 
     Commands based on https://github.com/input-output-hk/cardano-addresses
+
+    Only the recovery phrase and root key use cardano-address.  Child keys,
+    addresses and key files are derived in process (tcr.hdkey) and match
+    what cardano-address and cardano-cli write.
     """
 
+    ACCOUNT_PATH = '1852H/1815H/0H'
+
     ADDRESS_INDEX_ROOT = 0
     ADDRESS_INDEX_MINT = 1
     ADDRESS_INDEX_PRESALE = 2
@@ -79,6 +101,60 @@ class Wallet:
         self.signing_key_file_base = 'wallet/{}/{}_{}_key.skey'.format(self.network, name, '{}')
         self.verification_key_file_base = 'wallet/{}/{}_{}_key.vkey'.format(self.network, name, '{}')
 
+        # index -> WalletAddress, loaded on first use
+        self.address_book = None
+
+    def load_address_book(self) -> Dict[int, WalletAddress]:
+        """
+        Read the addresses and key files of every index with one directory
+        listing.  The address book is replaced, never changed, so it can be
+        read from many threads.
+        """
+
+        suffixes = {'_payment.addr': 'payment_address',
+                    '_delegated_payment.addr': 'delegated_payment_address',
+                    '_key.skey': 'signing_key_file',
+                    '_key.vkey': 'verification_key_file'}
+        prefix = '{}_'.format(self.name)
+        directory = os.path.dirname(self.payment_address_file_base)
+
+        found = {}
+        filenames = os.listdir(directory) if os.path.isdir(directory) else []
+        for filename in filenames:
+            if not filename.startswith(prefix):
+                continue
+
+            for (suffix, field) in suffixes.items():
+                idx = filename[len(prefix):-len(suffix)]
+                if filename.endswith(suffix) and idx.isdigit():
+                    found.setdefault(int(idx), {})[field] = os.path.join(directory, filename)
+                    break
+
+        address_book = {}
+        for (idx, files) in found.items():
+            for field in ['payment_address', 'delegated_payment_address']:
+                if field in files:
+                    with open(files[field], 'r') as file:
+                        files[field] = file.read()
+            address_book[idx] = WalletAddress(files.get('payment_address'),
+                                              files.get('delegated_payment_address'),
+                                              files.get('signing_key_file'),
+                                              files.get('verification_key_file'))
+
+        self.address_book = address_book
+        logger.debug('Load address book: {}, {} addresses'.format(self.name, len(address_book)))
+        return address_book
+
+    def get_address(self, idx: int) -> WalletAddress:
+        """
+        @return The WalletAddress for an index or None if it has no files.
+        """
+
+        address_book = self.address_book
+        if address_book == None:
+            address_book = self.load_address_book()
+        return address_book.get(idx)
+
     def get_name(self) -> str:
         """
         Return the name of the wallet.
@@ -100,19 +176,8 @@ class Wallet:
         return keys
 
     def address_exists(self, idx: int):
-        if not os.path.isfile(self.signing_key_file_base.format(idx)):
-            return False
-
-        if not os.path.isfile(self.verification_key_file_base.format(idx)):
-            return False
-
-        if not os.path.isfile(self.payment_address_file_base.format(idx)):
-            return False
-
-        if not os.path.isfile(self.delegated_payment_address_file_base.format(idx)):
-            return False
-
-        return True
+        address = self.get_address(idx)
+        return address != None and address.is_complete()
 
     def exists(self) -> bool:
         """
@@ -173,8 +238,7 @@ class Wallet:
             stake_address = Wallet.generate_stake_address(self.network, stake_verification_key)
             Command.write_to_file(self.stake_address_file, stake_address)
 
-        self.setup_address(Wallet.ADDRESS_INDEX_ROOT)
-        self.setup_address(Wallet.ADDRESS_INDEX_MINT)
+        self.setup_addresses([Wallet.ADDRESS_INDEX_ROOT, Wallet.ADDRESS_INDEX_MINT])
         return self.exists()
 
     def setup_address(self,
@@ -185,29 +249,35 @@ class Wallet:
         @param idx Index for the address
         """
 
+        return self.setup_addresses([idx])
+
+    def setup_addresses(self,
+                        indexes: List[int]) -> bool:
+        """
+        Create the addresses and key files for many indexes at once.  The
+        account and stake keys are derived once for all of them.
+
+        @param indexes Indexes for the addresses
+        """
+
         with open(self.root_private_key_file, 'r') as file:
             root_private_key = file.read()
 
-            (payment_private_key, payment_verification_key) = Wallet.generate_payment_verification_key(root_private_key, idx)
-            fname = self.payment_private_key_file_base.format(idx)
-            Command.write_to_file(fname, payment_private_key)
-
-            (stake_private_key, stake_verification_key) = Wallet.generate_stake_verification_key(root_private_key)
+        for derived in Wallet.derive_addresses(root_private_key, self.network, indexes):
+            idx = derived['index']
+            Command.write_to_file(self.payment_private_key_file_base.format(idx), derived['private-key'])
 
-            payment_address = Wallet.generate_payment_address(self.network, payment_verification_key)
-            self.payment_address = payment_address
-            fname = self.payment_address_file_base.format(idx)
-            Command.write_to_file(fname, payment_address)
+            self.payment_address = derived['payment-address']
+            Command.write_to_file(self.payment_address_file_base.format(idx), derived['payment-address'])
 
-            delegated_payment_address = Wallet.generate_delegated_payment_address(stake_verification_key, payment_address)
-            self.delegated_payment_address = delegated_payment_address
-            fname = self.delegated_payment_address_file_base.format(idx)
-            Command.write_to_file(fname, delegated_payment_address)
+            self.delegated_payment_address = derived['delegated-payment-address']
+            Command.write_to_file(self.delegated_payment_address_file_base.format(idx), derived['delegated-payment-address'])
 
             self.create_signing_key_file(idx)
             self.create_verification_key_file(idx)
 
-        return self.address_exists(idx)
+        self.load_address_book()
+        return all([self.address_exists(idx) for idx in indexes])
 
     def get_payment_address(self,
                             idx: int,
@@ -219,17 +289,13 @@ class Wallet:
         @param delegated Default = True.  True = return a delegated address.
         """
 
-        if delegated and os.path.isfile(self.delegated_payment_address_file_base.format(idx)):
+        address = self.get_address(idx)
+        if delegated and address != None and address.delegated_payment_address != None:
             return self.get_delegated_payment_address(idx)
 
         self.payment_address = None
-        addr_file = self.payment_address_file_base.format(idx)
-
-        try:
-            with open(addr_file, 'r') as file:
-                self.payment_address = file.read()
-        except FileNotFoundError as e:
-            self.payment_address = None
+        if address != None:
+            self.payment_address = address.payment_address
 
         return self.payment_address
 
@@ -242,12 +308,9 @@ class Wallet:
         """
 
         self.delegated_payment_address = None
-        addr_file = self.delegated_payment_address_file_base.format(idx)
-        try:
-            with open(addr_file, 'r') as file:
-                self.delegated_payment_address = file.read()
-        except FileNotFoundError as e:
-            self.delegated_payment_address = None
+        address = self.get_address(idx)
+        if address != None:
+            self.delegated_payment_address = address.delegated_payment_address
 
         return self.delegated_payment_address
 
@@ -280,6 +343,29 @@ class Wallet:
         output = Command.run(command, input=mnemonic, network=None)
         return output
 
+    @staticmethod
+    def derive_addresses(root_private_key: str, network: str, indexes: List[int]) -> List[Dict]:
+        """
+        Derive the payment keys and addresses for many indexes of the
+        receiving role.  Used to pre-derive address ranges.
+
+        @return A list of {'index', 'private-key', 'payment-address', 'delegated-payment-address'}
+        """
+
+        account = ExtendedPrivateKey.from_bech32(root_private_key).derive_path(Wallet.ACCOUNT_PATH)
+        external = account.derive(ROLE_EXTERNAL)
+        stake_key_hash = account.derive(ROLE_STAKE).derive(0).get_public().get_key_hash()
+
+        addresses = []
+        for idx in indexes:
+            payment = external.derive(idx)
+            payment_key_hash = payment.get_public().get_key_hash()
+            addresses.append({'index': idx,
+                              'private-key': payment.to_bech32('addr_xsk'),
+                              'payment-address': enterprise_address(network, payment_key_hash),
+                              'delegated-payment-address': base_address(network, payment_key_hash, stake_key_hash)})
+        return addresses
+
     # Uses derivation path:
     #  - 1852H: purpose = not sure...
     #  - 1815H: coin-type = Cardano ADA
@@ -288,39 +374,28 @@ class Wallet:
     #  - 0:     address_index increment to create a new payment address
     @staticmethod
     def generate_payment_verification_key(root_private_key: str, idx: int = 0) -> Tuple[str, str]:
-        command = ['cardano-address', 'key', 'child', '1852H/1815H/0H/0/{}'.format(idx)]
-        payment_private_key = Command.run(command, input=root_private_key, network=None)
-
-        command = ['cardano-address', 'key', 'public', '--with-chain-code']
-        payment_verification_key = Command.run(command, input=payment_private_key, network=None)
-        return (payment_private_key, payment_verification_key)
+        payment_key = ExtendedPrivateKey.from_bech32(root_private_key).derive_path('{}/0/{}'.format(Wallet.ACCOUNT_PATH, idx))
+        return (payment_key.to_bech32('addr_xsk'), payment_key.get_public().to_bech32('addr_xvk'))
 
     @staticmethod
     def generate_stake_verification_key(root_private_key: str) -> Tuple[str, str]:
-        command = ['cardano-address', 'key', 'child', '1852H/1815H/0H/2/0']
-        stake_private_key = Command.run(command, input=root_private_key, network=None)
-
-        command = ['cardano-address', 'key', 'public', '--with-chain-code']
-        stake_verification_key = Command.run(command, input=stake_private_key, network=None)
-        return (stake_private_key, stake_verification_key)
+        stake_key = ExtendedPrivateKey.from_bech32(root_private_key).derive_path('{}/2/0'.format(Wallet.ACCOUNT_PATH))
+        return (stake_key.to_bech32('stake_xsk'), stake_key.get_public().to_bech32('stake_xvk'))
 
     @staticmethod
     def generate_payment_address(network: str, payment_verification_key: str) -> str:
-        command = ['cardano-address', 'address', 'payment', '--network-tag', network]
-        output = Command.run(command, input=payment_verification_key, network=None)
-        return output
+        payment_key_hash = ExtendedPublicKey.from_bech32(payment_verification_key).get_key_hash()
+        return enterprise_address(network, payment_key_hash)
 
     @staticmethod
     def generate_delegated_payment_address(stake_verification_key: str, payment_address: str) -> str:
-        command = ['cardano-address', 'address', 'delegation', stake_verification_key]
-        output = Command.run(command, input=payment_address, network=None)
-        return output
+        stake_key_hash = ExtendedPublicKey.from_bech32(stake_verification_key).get_key_hash()
+        return delegate_address(payment_address, stake_key_hash)
 
     @staticmethod
     def generate_stake_address(network: str, stake_verification_key: str) -> str:
-        command = ['cardano-address', 'address', 'stake', '--network-tag', network]
-        output = Command.run(command, input=stake_verification_key, network=None)
-        return output
+        stake_key_hash = ExtendedPublicKey.from_bech32(stake_verification_key).get_key_hash()
+        return reward_address(network, stake_key_hash)
 
     # Private Signing Key : Is used to sign / approve transactions for your wallet. As
     # you can imagine, it is very important to not expose this file to the public and
@@ -331,13 +406,16 @@ class Wallet:
     # 2. signing key (64 bytes) - b0bf46232c7f0f58ad333030e43ffbea7c2bb6f8135bd05fb0d343ade8453c5eacc7ac09f77e16b635832522107eaa9f56db88c615f537aa6025e6c23da98ae8
     # 3. verification key (32 bytes) - fbbbf6410e24532f35e9279febb085d2cc05b3b2ada1df77ea1951eb694f3834
     # 4. chain code (32 bytes) - b0be1868d1c36ef9089b3b094f5fe1d783e4d5fea14e2034c0397bee50e65a1a
+    #
+    # Written as cardano-cli key convert-cardano-address-key --shelley-payment-key
+    # would.
     def create_signing_key_file(self, idx: int):
-        command = ['cardano-cli', 'key', 'convert-cardano-address-key', '--shelley-payment-key',
-                   '--signing-key-file', self.payment_private_key_file_base.format(idx),
-                   '--out-file', self.signing_key_file_base.format(idx)]
-        output = Command.run(command, None)
+        with open(self.payment_private_key_file_base.format(idx), 'r') as file:
+            payment_key = ExtendedPrivateKey.from_bech32(file.read())
+
+        Command.write_to_file(self.signing_key_file_base.format(idx), payment_key.to_signing_key_file())
         logger.debug("Create Signing Key File: {}".format(self.signing_key_file_base.format(idx)))
-        return output
+        return ''
 
     # Public Verification Key : Is used to derive a Cardano wallet address, a wallet
     # address is basically the hash string value that you share to other users to provide
@@ -348,12 +426,13 @@ class Wallet:
     # 1. prefix 5840 - bytestring of 64 bytes
     # 2. verification key (32 bytes) - fbbbf6410e24532f35e9279febb085d2cc05b3b2ada1df77ea1951eb694f3834
     # 3. chain code (32 bytes) - b0be1868d1c36ef9089b3b094f5fe1d783e4d5fea14e2034c0397bee50e65a1a
+    #
+    # Written as cardano-cli key verification-key would.
     def create_verification_key_file(self, idx: int):
-        command = ['cardano-cli', 'key', 'verification-key', '--signing-key-file', self.signing_key_file_base.format(idx),
-                   '--verification-key-file', self.verification_key_file_base.format(idx)]
-        output = Command.run(command, None)
+        payment_key = ExtendedPrivateKey.from_signing_key_file(self.signing_key_file_base.format(idx))
+        Command.write_to_file(self.verification_key_file_base.format(idx), payment_key.get_public().to_verification_key_file())
         logger.debug('Create Verification Key File: {}'.format(self.verification_key_file_base.format(idx)))
-        return output
+        return ''
 
 class WalletExternal(Wallet):
     """
@@ -387,6 +466,7 @@ class WalletExternal(Wallet):
         self.stake_address_file = None
         self.signing_key_file = None
         self.verification_key_file = None
+        self.address_book = {}
 
     def exists(self):
         return len(self.payment_address) > 0
@@ -0,0 +1,109 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_address_pool.py
+Author: SuperKK
+"""
+
+import os
+import tempfile
+import unittest
+
+from tcr.address_pool import AddressPool
+from tcr.hdkey import ExtendedPrivateKey
+from tcr.wallet import Wallet
+
+class TestAddressPool(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        os.makedirs('wallet/testnet')
+        self.wallet = Wallet('test', 'testnet')
+        with open(self.wallet.root_private_key_file, 'w') as file:
+            file.write(ExtendedPrivateKey(bytes(31) + b'\x40', bytes(32), bytes(32)).to_bech32('root_xsk'))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_sessions(self):
+        pool = AddressPool(self.wallet, 'pool.json', block_size=2)
+        first = pool.open_session('a', 'addr_test1buyera')
+        second = pool.open_session('b', 'addr_test1buyerb')
+        third = pool.open_session('c', 'addr_test1buyerc')
+        self.assertEqual([first['index'], second['index'], third['index']], [1000, 1001, 1002])
+        self.assertEqual(pool.open_session('a', 'addr_test1other'), first)
+        self.assertEqual(len(set([first['address'], second['address'], third['address']])), 3)
+        self.assertEqual(first['address'], self.wallet.get_payment_address(1000))
+        self.assertTrue(os.path.isfile(self.wallet.get_signing_key_file(1003)))
+        self.assertFalse(os.path.isfile(self.wallet.get_signing_key_file(1004)))
+
+        self.assertEqual(pool.get_session(second['addresses'][1]), second)
+        self.assertEqual(pool.get_session('addr_test1unknown'), None)
+        self.assertEqual(len(pool.get_addresses()), 6)
+
+        pool.close_session('b')
+        self.assertTrue(pool.is_closed('b'))
+        self.assertFalse(pool.is_closed('a'))
+        # polled for the grace period
+        self.assertIn(second['address'], pool.get_addresses())
+        pool.grace = 0
+        self.assertNotIn(second['address'], pool.get_addresses())
+
+        # a closed session is still attributed
+        utxo = {'tx-hash': 'aa', 'tx-ix': 0, 'address': second['address']}
+        self.assertTrue(pool.attribute(utxo))
+        self.assertEqual(utxo['from-address'], 'addr_test1buyerb')
+        self.assertEqual(utxo['signing-index'], 1001)
+        self.assertFalse(pool.attribute({'tx-hash': 'bb', 'tx-ix': 0, 'address': 'addr_test1unknown'}))
+
+        # reloaded from the file
+        pool = AddressPool(self.wallet, 'pool.json', block_size=2, grace=0)
+        self.assertEqual(pool.get_session(third['address'])['session'], 'c')
+        self.assertEqual(len(pool.get_addresses()), 4)
+        self.assertEqual(pool.open_session('d', 'addr_test1buyerd')['index'], 1003)
+
+    def test_expiry(self):
+        pool = AddressPool(self.wallet, 'pool.json', block_size=2, expiry=3600, grace=0)
+        first = pool.open_session('a', 'addr_test1buyera')
+        second = pool.open_session('b', 'addr_test1buyerb')
+        self.assertEqual(pool.expire_sessions(), 0)
+
+        # opened more than an hour ago
+        pool.sessions['a']['opened'] -= 3600
+        self.assertEqual(pool.get_addresses(), second['addresses'])
+        self.assertTrue(pool.is_closed('a'))
+        self.assertTrue(pool.sessions['a']['expired'])
+
+        # a payment to it is still attributed
+        utxo = {'tx-hash': 'aa', 'tx-ix': 0, 'address': first['address']}
+        self.assertTrue(pool.attribute(utxo))
+
+        pool = AddressPool(self.wallet, 'pool.json', block_size=2, expiry=3600, grace=0)
+        self.assertTrue(pool.is_closed('a'))
+        self.assertFalse(pool.is_closed('b'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_benchmarks.py
+Author: SuperKK
+"""
+
+import unittest
+
+from benchmarks.run import bench_mint_nft, bench_node_client_query_utxos, bench_process_incoming_payments, format_comparison
+
+class TestBenchmarks(unittest.TestCase):
+    def test_mint_nft(self):
+        result = bench_mint_nft(2)
+        self.assertEqual(result['name'], 'mint_nft')
+        self.assertEqual(result['iterations'], 2)
+        self.assertGreater(result['mean-seconds'], 0)
+
+    def test_node_client_query_utxos(self):
+        result = bench_node_client_query_utxos(2)
+        self.assertEqual(result['operations'], 2)
+        self.assertGreater(result['mean-seconds'], 0)
+
+    def test_process_incoming_payments(self):
+        result = bench_process_incoming_payments(3, 2)
+        self.assertEqual(result['operations'], 3)
+
+        previous = {'results': [dict(result, **{'mean-seconds': result['mean-seconds'] * 2})]}
+        lines = format_comparison({'results': [result]}, previous)
+        self.assertTrue(lines[1].startswith(result['name']))
+        self.assertTrue(lines[1].endswith('-50.0%'))
+
+if __name__ == '__main__':
+    unittest.main()
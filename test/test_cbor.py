@@ -0,0 +1,97 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_cbor.py
+Author: SuperKK
+"""
+
+import os
+import unittest
+
+from tcr import cbor
+from tcr.cardano import Cardano
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures', 'cardano-cli')
+
+# RFC 8949 appendix A
+VECTORS = [(0, '00'),
+           (23, '17'),
+           (24, '1818'),
+           (1000000, '1a000f4240'),
+           (18446744073709551615, '1bffffffffffffffff'),
+           (18446744073709551616, 'c249010000000000000000'),
+           (-1, '20'),
+           (-1000, '3903e7'),
+           (-18446744073709551617, 'c349010000000000000000'),
+           (1.1, 'fb3ff199999999999a'),
+           (False, 'f4'),
+           (True, 'f5'),
+           (None, 'f6'),
+           (b'\x01\x02\x03\x04', '4401020304'),
+           ('IETF', '6449455446'),
+           ('ü', '62c3bc'),
+           ([1, [2, 3], [4, 5]], '8301820203820405'),
+           (list(range(1, 26)), '98190102030405060708090a0b0c0d0e0f101112131415161718181819'),
+           ({1: 2, 3: 4}, 'a201020304'),
+           ({'a': 1, 'b': [2, 3]}, 'a26161016162820203'),
+           (cbor.Tag(258, [1, 2]), 'd90102820102')]
+
+class TestCbor(unittest.TestCase):
+    def test_vectors(self):
+        for (value, encoded) in VECTORS:
+            self.assertEqual(cbor.dumps(value).hex(), encoded)
+            self.assertEqual(cbor.loads(bytes.fromhex(encoded)), value)
+
+    def test_decode(self):
+        # indefinite lengths and short floats
+        self.assertEqual(cbor.loads(bytes.fromhex('9f018202039f0405ffff')), [1, [2, 3], [4, 5]])
+        self.assertEqual(cbor.loads(bytes.fromhex('bf61610161629f0203ffff')), {'a': 1, 'b': [2, 3]})
+        self.assertEqual(cbor.loads(bytes.fromhex('5f42010243030405ff')), b'\x01\x02\x03\x04\x05')
+        self.assertEqual(cbor.loads(bytes.fromhex('7f657374726561646d696e67ff')), 'streaming')
+        self.assertEqual(cbor.loads(bytes.fromhex('f93c00')), 1.0)
+        self.assertEqual(cbor.loads(bytes.fromhex('a182010203')), {(1, 2): 3})
+
+        with self.assertRaises(Exception):
+            cbor.loads(bytes.fromhex('8301'))
+        with self.assertRaises(Exception):
+            cbor.loads(bytes.fromhex('0000'))
+
+    def test_split_array(self):
+        data = bytes.fromhex('83a1010282030480')
+        self.assertEqual(cbor.split_array(data), [bytes.fromhex('a10102'), bytes.fromhex('820304'), bytes.fromhex('80')])
+        self.assertEqual(cbor.dumps([cbor.Raw(bytes.fromhex('a10102')), 1]).hex(), '82a1010201')
+
+    def test_transaction_id(self):
+        # a Babbage era mainnet transaction from the blockfrost-python tests,
+        # the txid was computed with PyCardano rather than this package
+        cardano = Cardano('testnet', 'testnet_protocol_parameters.json')
+        with open(os.path.join(FIXTURES, 'transaction_txid.txt'), 'r') as file:
+            txid = file.read().strip()
+
+        # the witnesses are not part of the txid
+        self.assertEqual(cardano.get_transaction_id(os.path.join(FIXTURES, 'transaction_sign.json')), txid)
+        self.assertEqual(cardano.get_transaction_id(os.path.join(FIXTURES, 'transaction_build_raw.json')), txid)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_cid.py
+Author: SuperKK
+"""
+
+import unittest
+import os
+import tempfile
+
+from tcr.cid import CHUNK_SIZE, compute_bytes_cid, compute_file_cid, cid_version, verify_file_cid
+
+class TestCid(unittest.TestCase):
+    def test_v0(self):
+        self.assertEqual('QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH', compute_bytes_cid(b''))
+        self.assertEqual('QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o', compute_bytes_cid(b'hello world\n'))
+
+    def test_v1(self):
+        cid = compute_bytes_cid(b'hello world\n', 1)
+        self.assertEqual('bafkreifjjcie6lypi6ny7amxnfftagclbuxndqonfipmb64f2km2devei4', cid)
+        self.assertEqual(1, cid_version(cid))
+        self.assertEqual(0, cid_version('QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'))
+
+    def test_file(self):
+        data = os.urandom(CHUNK_SIZE * 2 + 100)
+        (handle, filename) = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+
+        try:
+            cid = compute_file_cid(filename)
+            self.assertEqual(compute_bytes_cid(data), cid)
+            self.assertNotEqual(compute_bytes_cid(data[:CHUNK_SIZE]), cid)
+            self.assertTrue(verify_file_cid(filename, cid))
+            self.assertTrue(verify_file_cid(filename, compute_file_cid(filename, 1)))
+        finally:
+            os.remove(filename)
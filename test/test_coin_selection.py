@@ -0,0 +1,182 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_coin_selection.py
+Author: SuperKK
+"""
+
+import random
+import unittest
+
+from tcr.coin_selection import CoinSelector, UtxoIndex, ValueSize, add_assets, estimate_output_size, estimate_tx_size, estimate_value_size
+from tcr.coin_selection import ADDRESS_SIZE, OUTPUT_OVERHEAD_SIZE
+from tcr.coin_selection import LARGEST_FIRST, MULTI_ASSET, RANDOM_IMPROVE
+
+POLICY = 'ab' * 28
+PROTOCOL_PARAMETERS = {'maxTxSize': 16384, 'txFeePerByte': 44, 'txFeeFixed': 155381, 'utxoCostPerByte': 4310}
+
+def get_utxo(i: int, amount: int, assets: dict = {}) -> dict:
+    return {'tx-hash': '{:064x}'.format(i), 'tx-ix': 0, 'amount': amount, 'assets': assets}
+
+def get_output(amount: int, assets: dict = {}) -> dict:
+    return {'address': 'addr_test1vdestination', 'amount': amount, 'assets': assets}
+
+class TestCoinSelection(unittest.TestCase):
+    def setUp(self):
+        self.utxos = [get_utxo(i, 1500000) for i in range(20)]
+        self.utxos.append(get_utxo(20, 50000000))
+        self.utxos.append(get_utxo(21, 2000000, {'{}.Token1'.format(POLICY): 1, '{}.Token2'.format(POLICY): 1}))
+        self.utxos.append(get_utxo(22, 1800000, {'{}.Token3'.format(POLICY): 1}))
+        self.utxos.append(get_utxo(23, 1800000, {'{}.Token3'.format(POLICY): 1, '{}.Token4'.format(POLICY): 1}))
+
+    def check(self, selected: list, outputs: list) -> None:
+        self.check_utxos(self.utxos, selected, outputs)
+
+    def check_utxos(self, utxos: list, selected: list, outputs: list) -> None:
+        selector = CoinSelector(utxos, PROTOCOL_PARAMETERS)
+        keys = [(utxo['tx-hash'], utxo['tx-ix']) for utxo in selected]
+        self.assertEqual(len(keys), len(set(keys)))
+
+        lovelace = sum([utxo['amount'] for utxo in selected])
+        assets = {}
+        for utxo in selected:
+            for (asset, quantity) in utxo['assets'].items():
+                assets[asset] = assets.get(asset, 0) + quantity
+        for output in outputs:
+            lovelace -= output['amount']
+            for (asset, quantity) in output['assets'].items():
+                assets[asset] = assets.get(asset, 0) - quantity
+                self.assertGreaterEqual(assets[asset], 0)
+
+        change = {asset: quantity for (asset, quantity) in assets.items() if quantity > 0}
+        size = estimate_tx_size(len(selected), outputs + [{'assets': change}], 2)
+        self.assertLessEqual(size, PROTOCOL_PARAMETERS['maxTxSize'])
+        self.assertGreaterEqual(lovelace - selector.get_fee(size), selector.get_min_ada(change))
+
+    def test_index(self):
+        index = UtxoIndex(self.utxos)
+        self.assertEqual(index.get_utxos()[0]['amount'], 50000000)
+        self.assertEqual(len(index.get_ada_only()), 21)
+        self.assertEqual([utxo['tx-hash'][-2:] for utxo in index.get_utxos('{}.Token3'.format(POLICY))], ['16', '17'])
+        self.assertEqual(index.get_utxos('{}.Missing'.format(POLICY)), [])
+
+    def test_ada(self):
+        outputs = [get_output(10000000)]
+        for algorithm in [LARGEST_FIRST, RANDOM_IMPROVE, MULTI_ASSET]:
+            selected = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).select(outputs, algorithm)
+            self.check(selected, outputs)
+            # no assets are picked up for an ADA payment
+            self.assertTrue(all([len(utxo['assets']) == 0 for utxo in selected]))
+
+        selected = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).select(outputs, MULTI_ASSET)
+        self.assertEqual(len(selected), 1)
+
+    def test_assets(self):
+        outputs = [get_output(1500000, {'{}.Token3'.format(POLICY): 1})]
+        for algorithm in [LARGEST_FIRST, RANDOM_IMPROVE, MULTI_ASSET]:
+            selected = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).select(outputs, algorithm)
+            self.check(selected, outputs)
+
+        # the UTXO without Token4 so the change stays small
+        selected = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).select(outputs, MULTI_ASSET)
+        self.assertIn(self.utxos[22], selected)
+        self.assertNotIn(self.utxos[23], selected)
+
+    def test_random_improve(self):
+        outputs = [get_output(3000000)]
+        first = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).random_improve(outputs, random.Random(1))
+        second = CoinSelector(self.utxos, PROTOCOL_PARAMETERS).random_improve(outputs, random.Random(1))
+        self.assertEqual(first, second)
+        self.check(first, outputs)
+
+    def test_errors(self):
+        selector = CoinSelector(self.utxos, PROTOCOL_PARAMETERS)
+        with self.assertRaisesRegex(Exception, 'not enough lovelace'):
+            selector.select([get_output(500000000)])
+        with self.assertRaisesRegex(Exception, 'not enough assets'):
+            selector.select([get_output(1500000, {'{}.Token5'.format(POLICY): 1})])
+        with self.assertRaisesRegex(Exception, 'unknown algorithm'):
+            selector.select([get_output(1500000)], 'smallest-first')
+
+        # many small UTXOs do not fit one transaction
+        utxos = [get_utxo(i, 1000000) for i in range(500)]
+        with self.assertRaisesRegex(Exception, 'maximum transaction size'):
+            CoinSelector(utxos, PROTOCOL_PARAMETERS).select([get_output(450000000)], LARGEST_FIRST)
+
+    def test_chunk(self):
+        utxos = [get_utxo(100, 20000000)]
+        for i in range(4):
+            utxos.append(get_utxo(i, 50000000, {'{}.Token{:04d}'.format(POLICY, i * 200 + j): 1 for j in range(200)}))
+        selector = CoinSelector(utxos, PROTOCOL_PARAMETERS)
+
+        # a few fit in one transaction
+        assets = {'{}.Token{:04d}'.format(POLICY, i): 1 for i in range(10)}
+        self.assertEqual(selector.get_chunk(assets), assets)
+
+        # all of them do not, each chunk fits the output value size
+        assets = {'{}.Token{:04d}'.format(POLICY, i): 1 for i in range(800)}
+        chunk = selector.get_chunk(assets)
+        self.assertLess(len(chunk), 800)
+        self.assertLessEqual(estimate_output_size(chunk), ADDRESS_SIZE + OUTPUT_OVERHEAD_SIZE + 5000)
+        self.check_utxos(utxos, selector.select([get_output(selector.get_min_ada(chunk), chunk)]), [get_output(selector.get_min_ada(chunk), chunk)])
+
+        with self.assertRaisesRegex(Exception, 'no UTXO holds the assets'):
+            selector.get_chunk({'{}.Missing'.format(POLICY): 1})
+
+    def test_chunk_change(self):
+        # two of each token, sending one leaves all of them in the change
+        utxos = [get_utxo(100, 20000000)]
+        for i in range(4):
+            utxos.append(get_utxo(i, 50000000, {'{}.Token{:04d}'.format(POLICY, i * 200 + j): 2 for j in range(200)}))
+        selector = CoinSelector(utxos, PROTOCOL_PARAMETERS)
+
+        assets = {'{}.Token{:04d}'.format(POLICY, i): 1 for i in range(800)}
+        chunk = selector.get_chunk(assets)
+        change = {}
+        for utxo in utxos:
+            if any([asset in chunk for asset in utxo['assets']]):
+                add_assets(change, utxo['assets'])
+        for (asset, quantity) in chunk.items():
+            change[asset] -= quantity
+        change = {asset: quantity for (asset, quantity) in change.items() if quantity > 0}
+        self.assertGreater(len(chunk), 0)
+        self.assertLessEqual(estimate_value_size(change), 5000)
+
+    def test_value_size(self):
+        assets = {'{}.Token{}'.format(POLICY, i): 1 for i in range(5)}
+        assets['{}.Other'.format('cd' * 28)] = 1
+        value = ValueSize()
+        for asset in assets:
+            value.add(asset)
+        self.assertEqual(value.size, estimate_value_size(assets))
+        value.discard('{}.Other'.format('cd' * 28))
+        del assets['{}.Other'.format('cd' * 28)]
+        self.assertEqual(value.size, estimate_value_size(assets))
+
+    def test_size(self):
+        self.assertGreater(estimate_output_size({'{}.Token1'.format(POLICY): 1}), estimate_output_size({}))
+        self.assertEqual(estimate_tx_size(2, [get_output(1)], 2) - estimate_tx_size(1, [get_output(1)], 2), 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_consolidation.py
+Author: SuperKK
+"""
+
+import unittest
+
+from tcr.consolidation import Consolidator
+
+PROTOCOL_PARAMETERS = {'maxTxSize': 16384, 'txFeePerByte': 44, 'txFeeFixed': 155381, 'utxoCostPerByte': 4310}
+
+def get_utxo(i: int, amount: int, assets: dict = {}) -> dict:
+    return {'tx-hash': '{:064x}'.format(i), 'tx-ix': 0, 'amount': amount, 'assets': assets}
+
+class TestConsolidator(unittest.TestCase):
+    def test_split(self):
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=2, reserve_count=2, reserve_amount=5000000, max_amount=100000000)
+        utxos = [get_utxo(0, 5000000),
+                 get_utxo(1, 2000000),
+                 get_utxo(2, 5000000),
+                 get_utxo(3, 5000000),
+                 get_utxo(4, 2000000, {'{}.Token'.format('ab' * 28): 1}),
+                 get_utxo(5, 500000000)]
+        (fragments, reserves) = consolidator.split(utxos)
+        self.assertEqual(reserves, [utxos[0], utxos[2]])
+        # the third 5 ADA UTXO is not needed for the reserve
+        self.assertEqual(fragments, [utxos[1], utxos[3]])
+
+    def test_is_needed(self):
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=2)
+        self.assertFalse(consolidator.is_needed([get_utxo(i, 2000000) for i in range(4)]))
+        self.assertTrue(consolidator.is_needed([get_utxo(i, 2000000) for i in range(5)]))
+
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=2, reserve_count=1)
+        self.assertTrue(consolidator.is_needed([get_utxo(0, 10000000)]))
+        self.assertFalse(consolidator.is_needed([get_utxo(0, 5000000)]))
+
+    def test_batches(self):
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=4)
+        fragments = [get_utxo(i, 2000000) for i in range(1000)]
+        batches = consolidator.get_batches(fragments, 4)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum([len(batch) for batch in batches]), 1000)
+        self.assertEqual(len(batches[0]), consolidator.get_max_inputs(1))
+        for batch in batches[1:-1]:
+            self.assertEqual(len(batch) + 1, consolidator.get_max_inputs(1))
+        self.assertLessEqual(len(batches[-1]) + 1, consolidator.get_max_inputs(4))
+
+        self.assertEqual(consolidator.get_batches(fragments[0:10], 4), [fragments[0:10]])
+
+    def test_amounts(self):
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=4, reserve_count=2, reserve_amount=5000000)
+        amounts = consolidator.get_amounts(100000003, 2)
+        self.assertEqual(sum(amounts), 100000003)
+        self.assertEqual(amounts[0:2], [5000000, 5000000])
+        self.assertEqual(amounts[2:], [22500003, 22500000, 22500000, 22500000])
+
+        # fewer outputs rather than UTXOs under the minimum
+        amounts = consolidator.get_amounts(1500000, 0)
+        self.assertEqual(amounts, [1500000])
+
+        # the reserve is only filled as far as the lovelace goes
+        amounts = consolidator.get_amounts(8000000, 2)
+        self.assertEqual(amounts, [5000000, 1000000, 1000000, 1000000])
+
+        with self.assertRaises(Exception):
+            consolidator.get_amounts(500000, 0)
+
+    def test_protocol_parameters(self):
+        consolidator = Consolidator(PROTOCOL_PARAMETERS, outputs=4)
+        max_inputs = consolidator.get_max_inputs(1)
+        consolidator.set_protocol_parameters(dict(PROTOCOL_PARAMETERS, maxTxSize=2 * PROTOCOL_PARAMETERS['maxTxSize']))
+        self.assertGreater(consolidator.get_max_inputs(1), max_inputs)
+
+if __name__ == '__main__':
+    unittest.main()
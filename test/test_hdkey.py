@@ -0,0 +1,210 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_hdkey.py
+Author: SuperKK
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from tcr import address, bech32, ed25519
+from tcr.hdkey import ExtendedPrivateKey, ExtendedPublicKey, parse_path, HARDENED
+from tcr.wallet import Wallet
+
+# CIP-19 test vectors
+PAYMENT_VK = 'addr_vk1w0l2sr2zgfm26ztc6nl9xy8ghsk5sh6ldwemlpmp9xylzy4dtf7st80zhd'
+STAKE_VK = 'stake_vk1px4j0r2fk7ux5p23shz8f3y5y2qam7s954rgf3lg5merqcj6aetsft99wu'
+
+# CIP-3 Icarus root key of the recovery phrase "eight country switch draw meat
+# scout mystery blade tip drift useless good keep usage title", as written by
+# cardano-address key from-recovery-phrase Shelley.  The child keys and the
+# address were derived with an independent CIP-1852 implementation.
+KNOWN_ROOT_XSK = ('root_xsk1cpj6l55r9nvtpp7ymx4hqy05s8hpupepu782thtqnuat8u2k6fzaza4a3l2wcc95wvwrjx9z5u4qyfkqe5geas6'
+                  'mgljd2kyyvel4223r7l7u6jsscmxjcuun43sasau88cjg7stkxj4rmqf27vnll6wkyqya0lre')
+KNOWN_ADDR_XSK = ('addr_xsk1qr0nancwq2temk0w26wsjsfvrums73mq2j42rmeu7ksgcp2h6fz6dtg0aqdt2h3kz784seku37pu74ernl0wudw'
+                  '8xlhcs7ty4t3q2qpt9hg2nwp3g8mx2rzq40kfa4fwe2n22euztjev0g2tj3ftegxqyqhyssj8')
+KNOWN_ADDR_XVK = 'addr_xvk1ejvqn9zp2rqq7wgne543q05mgtlxyslux6nkl84cqp5ju2768uhzktws4xurzs0kv5xyp2lvnm2jaj4x54ncyh9jc7s5h9zjhjsvqgqpuut0l'
+KNOWN_STAKE_XVK = 'stake_xvk1v938v5eqeyad8jpvc29e2797xxnerup6xlw2uptrg0xztw7t8vc333zjqf8wrtn5w7uz7shp5r0tcqw5d9sh0kf2tjvxjhdlg740d7syckr0e'
+KNOWN_ADDRESS = 'addr1qyv7qlaucathxkwkc503ujw0rv9lfj2rkj96feyst2rs9ey4tr5knj4fu4adelzqhxg8adu5xca4jra0gtllfrpcawyqzajfkn'
+
+def get_root_key() -> ExtendedPrivateKey:
+    kl = bytearray(bytes(range(32)))
+    kl[0] &= 0xf8
+    kl[31] = (kl[31] & 0x1f) | 0x40
+    return ExtendedPrivateKey(bytes(kl), bytes(range(32, 64)), bytes(range(64, 96)))
+
+class TestEd25519(unittest.TestCase):
+    def test_rfc8032(self):
+        seed = bytes.fromhex('9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60')
+        public = ed25519.public_key(seed)
+        self.assertEqual(public.hex(), 'd75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a')
+        signature = ed25519.sign(seed, b'')
+        self.assertEqual(signature.hex(), 'e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e06522490155'
+                                          '5fb8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b')
+        self.assertTrue(ed25519.verify(public, b'', signature))
+        self.assertFalse(ed25519.verify(public, b'x', signature))
+
+        seed = bytes.fromhex('4ccd089b28ff96da9db6c346ec114e0f5b8a319f35aba624da8cf6ed4fb8a6fb')
+        public = ed25519.public_key(seed)
+        self.assertEqual(public.hex(), '3d4017c3e843895a92b70aa74d1b7ebc9c982ccf2ec4968cc0cd55f12af4660c')
+        signature = ed25519.sign(seed, b'\x72')
+        self.assertEqual(signature.hex(), '92a009a9f0d4cab8720e820b5f642540a2b27b5416503f8fb3762223ebdb69da'
+                                          '085ac1e43e15996e458f3613d0f11d8c387b2eaeb4302aeeb00d291612bb0c00')
+
+class TestAddress(unittest.TestCase):
+    def test_bech32(self):
+        (hrp, data) = bech32.decode(PAYMENT_VK)
+        self.assertEqual(hrp, 'addr_vk')
+        self.assertEqual(len(data), 32)
+        self.assertEqual(bech32.encode(hrp, data), PAYMENT_VK)
+        with self.assertRaises(Exception):
+            bech32.decode(PAYMENT_VK[:-1] + 'q')
+
+    def test_cip19(self):
+        payment_key_hash = address.get_key_hash(bech32.decode(PAYMENT_VK)[1])
+        stake_key_hash = address.get_key_hash(bech32.decode(STAKE_VK)[1])
+
+        self.assertEqual(address.base_address('mainnet', payment_key_hash, stake_key_hash),
+                         'addr1qx2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzer3n0d3vllmyqwsx5wktcd8cc3sq835lu7drv2xwl2wywfgse35a3x')
+        self.assertEqual(address.base_address('testnet', payment_key_hash, stake_key_hash),
+                         'addr_test1qz2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzer3n0d3vllmyqwsx5wktcd8cc3sq835lu7drv2xwl2wywfgs68faae')
+        self.assertEqual(address.enterprise_address('mainnet', payment_key_hash),
+                         'addr1vx2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzers66hrl8')
+        self.assertEqual(address.enterprise_address('testnet', payment_key_hash),
+                         'addr_test1vz2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzerspjrlsz')
+        self.assertEqual(address.reward_address('mainnet', stake_key_hash),
+                         'stake1uyehkck0lajq8gr28t9uxnuvgcqrc6070x3k9r8048z8y5gh6ffgw')
+        self.assertEqual(address.reward_address('testnet', stake_key_hash),
+                         'stake_test1uqehkck0lajq8gr28t9uxnuvgcqrc6070x3k9r8048z8y5gssrtvn')
+
+        enterprise = address.enterprise_address('testnet', payment_key_hash)
+        self.assertEqual(address.delegate_address(enterprise, stake_key_hash),
+                         address.base_address('testnet', payment_key_hash, stake_key_hash))
+        self.assertEqual(address.get_payment_key_hash(enterprise), payment_key_hash)
+
+class TestHDKey(unittest.TestCase):
+    def test_parse_path(self):
+        self.assertEqual(parse_path('1852H/1815H/0H/0/5'), [1852 + HARDENED, 1815 + HARDENED, HARDENED, 0, 5])
+
+    def test_soft_derivation(self):
+        account = get_root_key().derive_path('1852H/1815H/0H')
+        external = account.derive(0)
+        for idx in range(3):
+            self.assertEqual(external.derive(idx).get_public_key(), external.get_public().derive(idx).public_key)
+
+        with self.assertRaises(Exception):
+            external.get_public().derive(HARDENED)
+
+    def test_known_answer(self):
+        root = ExtendedPrivateKey.from_bech32(KNOWN_ROOT_XSK)
+        payment = root.derive_path('1852H/1815H/0H/0/0')
+        stake = root.derive_path('1852H/1815H/0H/2/0')
+        self.assertEqual(payment.to_bech32(), KNOWN_ADDR_XSK)
+        self.assertEqual(payment.get_public().to_bech32(), KNOWN_ADDR_XVK)
+        self.assertEqual(stake.get_public().to_bech32('stake_xvk'), KNOWN_STAKE_XVK)
+        self.assertEqual(address.base_address('mainnet', payment.get_public().get_key_hash(), stake.get_public().get_key_hash()),
+                         KNOWN_ADDRESS)
+
+        # the same keys and address through the wallet
+        (payment_private_key, payment_verification_key) = Wallet.generate_payment_verification_key(KNOWN_ROOT_XSK, 0)
+        (stake_private_key, stake_verification_key) = Wallet.generate_stake_verification_key(KNOWN_ROOT_XSK)
+        self.assertEqual(payment_private_key, KNOWN_ADDR_XSK)
+        self.assertEqual(payment_verification_key, KNOWN_ADDR_XVK)
+        self.assertEqual(stake_verification_key, KNOWN_STAKE_XVK)
+        payment_address = Wallet.generate_payment_address('mainnet', payment_verification_key)
+        self.assertEqual(Wallet.generate_delegated_payment_address(stake_verification_key, payment_address), KNOWN_ADDRESS)
+
+    def test_bech32_round_trip(self):
+        key = get_root_key().derive_path('1852H/1815H/0H/0/0')
+        self.assertEqual(ExtendedPrivateKey.from_bech32(key.to_bech32()).to_bytes(), key.to_bytes())
+        public = key.get_public()
+        self.assertEqual(ExtendedPublicKey.from_bech32(public.to_bech32()).to_bytes(), public.to_bytes())
+
+    def test_sign(self):
+        key = get_root_key().derive_path('1852H/1815H/0H/0/0')
+        signature = key.sign(b'message')
+        self.assertTrue(ed25519.verify(key.get_public_key(), b'message', signature))
+
+class TestWallet(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        os.makedirs('wallet/testnet')
+        self.root_private_key = get_root_key().to_bech32('root_xsk')
+        with open('wallet/testnet/test_root.xprv', 'w') as file:
+            file.write(self.root_private_key)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_setup_addresses(self):
+        wallet = Wallet('test', 'testnet')
+        self.assertTrue(wallet.setup_addresses([0, 1, 2]))
+
+        (payment_private_key, payment_verification_key) = Wallet.generate_payment_verification_key(self.root_private_key, 2)
+        (stake_private_key, stake_verification_key) = Wallet.generate_stake_verification_key(self.root_private_key)
+        self.assertTrue(payment_private_key.startswith('addr_xsk1'))
+        self.assertTrue(stake_verification_key.startswith('stake_xvk1'))
+
+        payment_address = Wallet.generate_payment_address('testnet', payment_verification_key)
+        self.assertEqual(wallet.get_payment_address(2, delegated=False), payment_address)
+        self.assertEqual(wallet.get_delegated_payment_address(2),
+                         Wallet.generate_delegated_payment_address(stake_verification_key, payment_address))
+        self.assertTrue(Wallet.generate_stake_address('testnet', stake_verification_key).startswith('stake_test1u'))
+
+        with open(wallet.get_signing_key_file(2), 'r') as file:
+            signing_key = json.load(file)
+        self.assertEqual(signing_key['type'], 'PaymentExtendedSigningKeyShelley_ed25519_bip32')
+        self.assertEqual(len(bytes.fromhex(signing_key['cborHex'])), 130)
+
+        with open(wallet.get_verification_key_file(2), 'r') as file:
+            verification_key = json.load(file)
+        self.assertEqual(verification_key['type'], 'PaymentExtendedVerificationKeyShelley_ed25519_bip32')
+        self.assertEqual(verification_key['cborHex'], '5840' + ExtendedPublicKey.from_bech32(payment_verification_key).to_bytes().hex())
+
+    def test_address_book(self):
+        wallet = Wallet('test', 'testnet')
+        self.assertFalse(wallet.address_exists(1))
+        self.assertEqual(wallet.get_payment_address(1), None)
+
+        wallet.setup_addresses([1])
+        self.assertTrue(wallet.address_exists(1))
+        self.assertTrue(wallet.get_payment_address(1).startswith('addr_test1q'))
+        self.assertTrue(wallet.get_payment_address(1, delegated=False).startswith('addr_test1v'))
+        self.assertEqual(wallet.get_available_signing_keys(), [wallet.get_signing_key_file(1)])
+
+        # files are read once, not on every lookup
+        os.remove(wallet.payment_address_file_base.format(1))
+        self.assertTrue(wallet.get_payment_address(1, delegated=False).startswith('addr_test1v'))
+        self.assertFalse(Wallet('test', 'testnet').address_exists(1))
+        # another wallet's files are not mixed in
+        self.assertEqual(Wallet('tes', 'testnet').get_address(1), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_image_index.py
+Author: SuperKK
+"""
+
+import unittest
+import os
+import random
+import shutil
+import tempfile
+
+import numpy
+from PIL import Image
+
+from tcr.image_index import BKTree, ImageIndex, hamming_distance
+
+class TestImageIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = numpy.random.default_rng(1234)
+        self.pixels = []
+        for i in range(0, 3):
+            # smooth gradients with a few blocks compress well and survive jpeg
+            pixels = numpy.zeros((64, 64, 3), dtype=numpy.uint8)
+            pixels[:, :, 0] = numpy.linspace(0, 255, 64, dtype=numpy.uint8)[None, :]
+            pixels[:, :, 1] = numpy.linspace(255, 0, 64, dtype=numpy.uint8)[:, None]
+            for j in range(0, 4):
+                (x, y) = rng.integers(0, 48, size=2)
+                pixels[y:y+16, x:x+16, :] = rng.integers(0, 256, size=3, dtype=numpy.uint8)
+            self.pixels.append(pixels)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save(self, index: int, name: str, **kwargs) -> str:
+        path = os.path.join(self.directory, name)
+        Image.fromarray(self.pixels[index]).save(path, **kwargs)
+        return path
+
+    def test_unique_images(self):
+        index = ImageIndex()
+        for i in range(0, len(self.pixels)):
+            index.verify_unique(self.save(i, 'image{}.png'.format(i)))
+        self.assertEqual(len(self.pixels), len(index))
+
+    def test_verify_unique_hashes_once(self):
+        index = ImageIndex()
+        opened = []
+        open_image = Image.open
+        def counting_open(path, *args, **kwargs):
+            opened.append(path)
+            return open_image(path, *args, **kwargs)
+
+        Image.open = counting_open
+        try:
+            for i in range(0, len(self.pixels)):
+                index.verify_unique(self.save(i, 'image{}.png'.format(i)))
+        finally:
+            Image.open = open_image
+        self.assertEqual(len(opened), len(self.pixels))
+
+    def test_byte_identical(self):
+        index = ImageIndex()
+        index.verify_unique(self.save(0, 'image0.png'))
+        copy = os.path.join(self.directory, 'copy.png')
+        shutil.copyfile(os.path.join(self.directory, 'image0.png'), copy)
+        (existing, reason) = index.find_duplicate(copy)
+        self.assertTrue(existing.endswith('image0.png'))
+        self.assertTrue(reason.startswith('sha256'))
+        self.assertRaises(Exception, index.verify_unique, copy)
+
+    def test_visually_identical(self):
+        for method in ['dhash', 'phash']:
+            index = ImageIndex(method=method)
+            index.verify_unique(self.save(0, 'image0.png'))
+            index.verify_unique(self.save(1, 'image1.png'))
+            jpeg = self.save(0, 'image0.jpg', quality=95)
+            (existing, reason) = index.find_duplicate(jpeg)
+            self.assertTrue(existing.endswith('image0.png'))
+            self.assertTrue(reason.startswith(method))
+
+    def test_bktree_matches_linear_scan(self):
+        rng = random.Random(42)
+        tree = BKTree()
+        hashes = [rng.getrandbits(64) for i in range(0, 2000)]
+        for (i, h) in enumerate(hashes):
+            tree.add(h, i)
+        self.assertEqual(len(hashes), len(tree))
+
+        for i in range(0, 50):
+            query = hashes[rng.randrange(len(hashes))] ^ (1 << rng.randrange(64))
+            expected = sorted([j for (j, h) in enumerate(hashes) if hamming_distance(query, h) <= 3])
+            found = sorted([value for (distance, value) in tree.find(query, 3)])
+            self.assertEqual(expected, found)
@@ -0,0 +1,193 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_ipfs.py
+Author: SuperKK
+"""
+
+import unittest
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import urllib.parse
+
+from tcr.cid import compute_bytes_cid
+from tcr.ipfs import IpfsClient, UploadJournal, upload_files, upload_metadata_images
+
+class StubInfuraHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Minimal stand in for the infura add and pin/add endpoints.  The hash
+    returned for an upload is the CID of the file content unless the server
+    is told to return a bad one.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        url = urllib.parse.urlparse(self.path)
+
+        with server.lock:
+            server.requests.append(url.path)
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                self.send_json(503, {})
+                return
+
+        if url.path == '/api/v0/add':
+            # hash the file content, not the multipart boundary
+            content = body.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n--', 1)[0]
+            ipfs_hash = compute_bytes_cid(content, server.cid_version)
+            if server.bad_hash:
+                ipfs_hash = compute_bytes_cid(content + b'x')
+            with server.lock:
+                server.uploads.append(ipfs_hash)
+            self.send_json(200, {'Hash': ipfs_hash})
+        elif url.path == '/api/v0/pin/add':
+            pins = [value for (key, value) in urllib.parse.parse_qsl(url.query) if key == 'arg']
+            with server.lock:
+                server.pins.append(pins)
+            self.send_json(200, {'Pins': pins})
+        else:
+            self.send_json(404, {})
+
+class TestIpfs(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubInfuraHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.uploads = []
+        self.server.pins = []
+        self.server.fail_next = 0
+        self.server.bad_hash = False
+        self.server.cid_version = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        api_url = 'http://127.0.0.1:{}/api/v0'.format(self.server.server_address[1])
+        self.client = IpfsClient('id', 'secret', api_url=api_url, backoff=0.01)
+        self.journal_file = os.path.join(self.directory, 'journal.jsonl')
+
+        self.images = []
+        self.metadata_files = []
+        for i in range(0, 12):
+            image = os.path.join(self.directory, 'image{:02}.jpg'.format(i))
+            with open(image, 'wb') as file:
+                file.write('image data {}'.format(i).encode() * 100)
+            self.images.append(image)
+
+            metadata_file = os.path.join(self.directory, 'TNx001x{:04}x1.json'.format(i))
+            with open(metadata_file, 'w') as file:
+                file.write(json.dumps({'721': {'policy': {'TNx001x{:04}x1'.format(i): {'image': image}}}}))
+            self.metadata_files.append(metadata_file)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_upload_and_pin_batches(self):
+        journal = UploadJournal(self.journal_file)
+        hashes = upload_files(self.client, journal, self.images, workers=4, pin_batch=5)
+        self.assertEqual(len(self.images), len(hashes))
+        self.assertEqual(len(self.images), len(self.server.uploads))
+        self.assertEqual([5, 5, 2], [len(pins) for pins in self.server.pins])
+        self.assertEqual(sorted(hashes.values()), sorted(sum(self.server.pins, [])))
+
+    def test_retry(self):
+        self.server.fail_next = 2
+        journal = UploadJournal(None)
+        hashes = upload_files(self.client, journal, self.images[0:1], workers=1)
+        self.assertEqual(1, len(hashes))
+        self.assertEqual(4, len(self.server.requests))
+
+    def test_resume_from_journal(self):
+        journal = UploadJournal(self.journal_file)
+        upload_files(self.client, journal, self.images[0:5], workers=2)
+        self.assertEqual(5, len(self.server.uploads))
+
+        # a new run only uploads and pins what is missing
+        journal = UploadJournal(self.journal_file)
+        hashes = upload_files(self.client, journal, self.images, workers=2, pin_batch=50)
+        self.assertEqual(len(self.images), len(hashes))
+        self.assertEqual(len(self.images), len(self.server.uploads))
+        self.assertEqual(len(self.images) - 5, len(self.server.pins[-1]))
+
+    def test_resume_other_cid_version(self):
+        self.server.cid_version = 1
+        journal = UploadJournal(self.journal_file)
+        hashes = upload_files(self.client, journal, self.images[0:5], workers=2)
+        self.assertTrue(all([ipfs_hash.startswith('bafk') for ipfs_hash in hashes.values()]))
+
+        # the journal is keyed by the local CIDv0, the remote CIDv1 is returned
+        journal = UploadJournal(self.journal_file)
+        self.assertEqual(hashes, upload_files(self.client, journal, self.images[0:5], workers=2))
+        self.assertEqual(5, len(self.server.uploads))
+
+    def test_skip_known_cids(self):
+        journal = UploadJournal(self.journal_file)
+        upload_files(self.client, journal, self.images[0:3], workers=2)
+
+        # identical content under a different name is not uploaded again
+        copy = os.path.join(self.directory, 'copy.jpg')
+        shutil.copyfile(self.images[0], copy)
+        hashes = upload_files(self.client, journal, [copy], workers=1)
+        self.assertEqual(3, len(self.server.uploads))
+        self.assertEqual(compute_bytes_cid(open(copy, 'rb').read()), hashes[copy])
+
+    def test_cid_mismatch(self):
+        self.server.bad_hash = True
+        journal = UploadJournal(None)
+        with self.assertRaises(Exception):
+            upload_files(self.client, journal, self.images[0:1], workers=1)
+        self.assertFalse(journal.is_uploaded(self.server.uploads[0]))
+
+    def test_update_metadata(self):
+        journal = UploadJournal(self.journal_file)
+        updated = upload_metadata_images(self.client, journal, self.metadata_files, workers=3, pin_batch=4)
+        self.assertEqual(len(self.metadata_files), updated)
+        for metadata_file in self.metadata_files:
+            with open(metadata_file, 'r') as file:
+                md = json.load(file)
+            token = list(md['721']['policy'].values())[0]
+            self.assertTrue(token['image'].startswith('ipfs://Qm'))
+
+        # everything points at ipfs now so nothing is uploaded again
+        self.assertEqual(0, upload_metadata_images(self.client, journal, self.metadata_files))
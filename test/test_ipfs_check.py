@@ -0,0 +1,130 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_ipfs_check.py
+Author: SuperKK
+"""
+
+import unittest
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from tcr.cid import compute_bytes_cid
+from tcr.ipfs_check import CheckJournal, GatewayChecker, check_files, check_offline
+
+class StubGatewayHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves /ipfs/<cid> from the server's dictionary of content.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        cid = self.path.split('/')[-1]
+        with self.server.lock:
+            self.server.requests.append(cid)
+        if cid not in self.server.content:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = self.server.content[cid]
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class TestIpfsCheck(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubGatewayHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.content = {}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.gateway = 'http://127.0.0.1:{}/ipfs'.format(self.server.server_address[1])
+
+        self.pairs = []
+        for i in range(0, 6):
+            data = 'image data {}'.format(i).encode() * 100
+            cid = compute_bytes_cid(data)
+            self.server.content[cid] = data
+
+            image = os.path.join(self.directory, 'image{:02}.png'.format(i))
+            with open(image, 'wb') as file:
+                file.write(data)
+
+            metadata_file = os.path.join(self.directory, 'TNx001x{:04}x1.json'.format(i))
+            with open(metadata_file, 'w') as file:
+                file.write(json.dumps({'721': {'policy': {'TNx001x{:04}x1'.format(i): {'image': 'ipfs://{}'.format(cid)}}}}))
+            self.pairs.append((metadata_file, image))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_offline(self):
+        self.assertEqual([], check_files(self.pairs, check_offline, CheckJournal(None), workers=3))
+
+        # swapped images no longer match the metadata
+        pairs = [(self.pairs[0][0], self.pairs[1][1])] + self.pairs[1:]
+        self.assertEqual([self.pairs[0][0]], check_files(pairs, check_offline, CheckJournal(None), workers=3))
+        self.assertEqual(0, len(self.server.requests))
+
+    def test_gateway_resume(self):
+        journal_file = os.path.join(self.directory, 'journal.jsonl')
+        checker = GatewayChecker(self.gateway)
+        try:
+            self.assertEqual([], check_files(self.pairs[0:3], checker.check, CheckJournal(journal_file), workers=2))
+            self.assertEqual(3, len(self.server.requests))
+
+            # a new run only downloads what has not been verified
+            self.assertEqual([], check_files(self.pairs, checker.check, CheckJournal(journal_file), workers=2))
+            self.assertEqual(6, len(self.server.requests))
+
+            with open(self.pairs[5][1], 'ab') as file:
+                file.write(b'changed')
+            self.assertEqual([self.pairs[5][0]], check_files(self.pairs, checker.check, CheckJournal(None), workers=2))
+        finally:
+            checker.close()
+
+    def test_errors(self):
+        # missing from the gateway and metadata without an IPFS image
+        del self.server.content[list(self.server.content.keys())[1]]
+        with open(self.pairs[3][0], 'w') as file:
+            file.write(json.dumps({'721': {'policy': {'TNx001x0003x1': {'image': 'image03.png'}}}}))
+
+        checker = GatewayChecker(self.gateway)
+        try:
+            failed = check_files(self.pairs, checker.check, CheckJournal(None), workers=2)
+        finally:
+            checker.close()
+        self.assertEqual([self.pairs[1][0], self.pairs[3][0]], failed)
@@ -29,8 +29,9 @@ Author: SuperKK
 import unittest
 import os
 import json
+import threading
 
-from metadata_list import MetadataList
+from metadata_list import MetadataList, MetadataAllocator
 
 class TestMetadataList(unittest.TestCase):
     def __init__(self, methodName='runTest'):
@@ -89,3 +90,57 @@ class TestMetadataList(unittest.TestCase):
             self.metadata_list.commit()
             self.assertEqual('file{:04}.json'.format(i), fname)
             self.metadata_list = MetadataList(self.filename)
+
+    def test_allocate_out_of_order(self):
+        allocator = MetadataAllocator(self.metadata_list)
+        first = allocator.allocate(2)
+        second = allocator.allocate(3)
+        self.assertEqual(['file0000.json', 'file0001.json'], first)
+        self.assertEqual(['file0002.json', 'file0003.json', 'file0004.json'], second)
+        self.assertEqual(self.count - 5, allocator.get_remaining())
+
+        # the second mint completes first, the first one fails
+        allocator.commit(second)
+        allocator.release(first)
+        self.assertEqual(0, allocator.get_reserved())
+        self.assertEqual(self.count - 3, allocator.get_remaining())
+        self.assertEqual(['file0000.json', 'file0001.json', 'file0005.json'], allocator.allocate(3))
+
+        list2 = MetadataList(self.filename)
+        self.assertEqual(self.count - 3, list2.get_remaining())
+        self.assertEqual('file0005.json', list2.get_next_files(3)[2])
+
+        with self.assertRaises(Exception):
+            allocator.allocate(self.count)
+
+    def test_reserve(self):
+        allocator = MetadataAllocator(self.metadata_list)
+        # reserved by a mint before a restart, one already committed
+        allocator.reserve(['file0001.json', 'file0002.json', 'removed.json'])
+        allocator.reserve(['file0001.json'])
+        self.assertEqual(2, allocator.get_reserved())
+        self.assertEqual(['file0000.json', 'file0003.json'], allocator.allocate(2))
+
+    def test_allocate_threads(self):
+        allocator = MetadataAllocator(self.metadata_list)
+        allocated = []
+        lock = threading.Lock()
+
+        def worker():
+            for i in range(0, 20):
+                files = allocator.allocate(2)
+                with lock:
+                    allocated.extend(files)
+                if i % 2:
+                    allocator.commit(files)
+                else:
+                    allocator.release(files)
+
+        threads = [threading.Thread(target=worker) for i in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.count - 80, MetadataList(self.filename).get_remaining())
+        self.assertEqual(0, allocator.get_reserved())
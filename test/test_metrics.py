@@ -0,0 +1,117 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_metrics.py
+Author: SuperKK
+"""
+
+import datetime
+import os
+import tempfile
+import unittest
+import urllib.request
+
+from tcr.metrics import Counter, Gauge, Histogram, Registry, get_command_label, time_query
+from tcr.metrics import DB_QUERY_SECONDS, PAYMENT_TO_SUBMIT_SECONDS, observe_payment_to_submit
+from tcr.mint_control import ControlServer, MintController
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        registry = Registry()
+        payments = registry.register(Counter('payments_total', 'Payments', ['event']))
+        depth = registry.register(Gauge('queue_depth', 'Queue depth'))
+        latency = registry.register(Histogram('latency_seconds', 'Latency', ['query'], buckets=[0.1, 1]))
+
+        payments.inc(event='seen')
+        payments.inc(2, event='seen')
+        payments.inc(event='minted')
+        depth.set(4)
+        latency.observe(0.05, query='a')
+        latency.observe(0.5, query='a')
+        latency.observe(5, query='a')
+
+        text = registry.render()
+        self.assertIn('# TYPE payments_total counter\n', text)
+        self.assertIn('payments_total{event="seen"} 3\n', text)
+        self.assertIn('payments_total{event="minted"} 1\n', text)
+        self.assertIn('queue_depth 4\n', text)
+        self.assertIn('latency_seconds_bucket{query="a",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{query="a",le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{query="a",le="+Inf"} 3\n', text)
+        self.assertIn('latency_seconds_sum{query="a"} 5.55\n', text)
+        self.assertIn('latency_seconds_count{query="a"} 3\n', text)
+
+    def test_labels(self):
+        counter = Counter('test_total', 'Test', ['event'])
+        with self.assertRaises(Exception):
+            counter.inc(result='seen')
+
+        counter.inc(event='a "quoted"\nvalue')
+        self.assertIn('test_total{event="a \\"quoted\\"\\nvalue"} 1', counter.render())
+
+    def test_command_label(self):
+        self.assertEqual(get_command_label(['cardano-cli', 'query', 'utxo', '--address', 'addr1']), 'cardano-cli query utxo')
+        self.assertEqual(get_command_label(['/usr/bin/cardano-cli', 'transaction', 'build-raw', 'extra']), 'cardano-cli transaction build-raw')
+        self.assertEqual(get_command_label(['ipfs', '--version']), 'ipfs')
+
+    def test_time_query(self):
+        @time_query
+        def query_example(value):
+            return value
+
+        self.assertEqual(query_example(5), 5)
+        self.assertEqual(DB_QUERY_SECONDS.get_count(query='query_example'), 1)
+
+    def test_payment_to_submit(self):
+        count = PAYMENT_TO_SUBMIT_SECONDS.get_count()
+        observe_payment_to_submit(0)
+        self.assertEqual(PAYMENT_TO_SUBMIT_SECONDS.get_count(), count)
+
+        block_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=30)
+        observe_payment_to_submit(block_time)
+        self.assertEqual(PAYMENT_TO_SUBMIT_SECONDS.get_count(), count + 1)
+
+    def test_textfile(self):
+        registry = Registry()
+        registry.register(Gauge('queue_depth', 'Queue depth')).set(2)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'tcr.prom')
+            registry.write_textfile(filename)
+            with open(filename, 'r') as file:
+                self.assertIn('queue_depth 2\n', file.read())
+            self.assertEqual(os.listdir(directory), ['tcr.prom'])
+
+    def test_endpoint(self):
+        server = ControlServer(MintController(), port=0)
+        server.start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.get_port())
+            with urllib.request.urlopen(url, timeout=10) as response:
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+                self.assertIn('# TYPE tcr_payments_total counter', response.read().decode())
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
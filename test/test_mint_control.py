@@ -0,0 +1,66 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_mint_control.py
+Author: SuperKK
+"""
+
+import unittest
+
+from tcr.mint_control import ControlServer, MintController, send_command
+
+class TestMintControl(unittest.TestCase):
+    def setUp(self):
+        self.controller = MintController(recent=3)
+        self.server = ControlServer(self.controller, port=0)
+        self.server.start()
+        self.port = self.server.get_port()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_states(self):
+        self.assertTrue(self.controller.is_accepting())
+        self.assertEqual('paused', send_command('pause', self.port)['state'])
+        self.assertFalse(self.controller.is_accepting())
+        self.assertEqual('running', send_command('resume', self.port)['state'])
+        self.assertEqual('draining', send_command('drain', self.port)['state'])
+        self.assertTrue(self.controller.is_draining())
+
+        # draining can not be undone
+        self.assertTrue('error' in send_command('resume', self.port))
+        self.controller.stop()
+        self.assertEqual('stopped', send_command('status', self.port)['state'])
+
+    def test_status(self):
+        self.controller.set_progress(2, 100)
+        for i in range(0, 5):
+            self.controller.add_result({'tx-hash': 'abcd', 'tx-ix': i}, 'minted', ['TNx001x{:04}x1.json'.format(i)], 'tx{}'.format(i))
+
+        status = send_command('status', self.port)
+        self.assertEqual(2, status['queue-depth'])
+        self.assertEqual(100, status['nfts-remaining'])
+        self.assertEqual(['abcd#4', 'abcd#3', 'abcd#2'], [mint['utxo'] for mint in status['recent']])
+        self.assertEqual('tx4', status['recent'][0]['txid'])
+        self.assertTrue('error' in send_command('unknown', self.port))
@@ -0,0 +1,246 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_node_client.py
+Author: SuperKK
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tcr import cbor
+from tcr.cardano import Cardano
+from tcr.node_client import NodeClient, encode_message, get_item_end, convert_protocol_parameters, MAX_SEGMENT_SIZE
+
+from benchmarks.node_socket import ReplayServer
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+SESSION_FILE = os.path.join(FIXTURES_DIRECTORY, 'node', 'session.json')
+CARDANO_CLI_DIRECTORY = os.path.join(FIXTURES_DIRECTORY, 'cardano-cli')
+ADDRESS = 'addr_test1vzsm9s75uhmqwxpf8f94cmt737g2rvkr6njlvpcc9yaykhqec8tru'
+TX_HASH = '4e3f8fd0b6a1e5c06fba2b8e0d71ac2a3ba6e2d6a5c8f3a1b7d3e6c2f1a9b8c7'
+
+class TestMessages(unittest.TestCase):
+    def test_item_end(self):
+        data = cbor.dumps([1, {2: b'abc'}, 'text', cbor.Tag(24, bytes(300))])
+        self.assertEqual(get_item_end(data), len(data))
+        self.assertEqual(get_item_end(data + b'\x01'), len(data))
+        for size in range(0, len(data)):
+            self.assertEqual(get_item_end(data[:size]), None)
+
+        # indefinite length
+        self.assertEqual(get_item_end(bytes.fromhex('9f0102ff')), 4)
+        self.assertEqual(get_item_end(bytes.fromhex('9f0102')), None)
+
+    def test_segments(self):
+        message = encode_message(7, bytes(2 * MAX_SEGMENT_SIZE + 1))
+        self.assertEqual(len(message), 3 * 8 + 2 * MAX_SEGMENT_SIZE + 1)
+        self.assertEqual(message[4:8], bytes.fromhex('0007') + MAX_SEGMENT_SIZE.to_bytes(2, 'big'))
+
+        message = encode_message(7, b'\x80', responder=True)
+        self.assertEqual(message[4:], bytes.fromhex('8007000180'))
+
+    def test_protocol_parameters(self):
+        with open(os.path.join(CARDANO_CLI_DIRECTORY, 'protocol_parameters.json'), 'r') as file:
+            expected = json.load(file)
+        with open(SESSION_FILE, 'r') as file:
+            exchanges = json.load(file)['exchanges']
+
+        # the query result in the fixture, [4, [parameters]]
+        result = cbor.loads(bytes.fromhex(exchanges[8]['response']))
+        parameters = convert_protocol_parameters(result[1][0])
+        self.assertEqual(parameters['costModels'], {'PlutusV1': [205665, 812, 1], 'PlutusV2': [205665, 812, 1, 1]})
+        del parameters['costModels']
+        del expected['costModels']
+        self.assertEqual(parameters, expected)
+
+    def test_conway_protocol_parameters(self):
+        with open(SESSION_FILE, 'r') as file:
+            exchanges = json.load(file)['exchanges']
+        values = cbor.loads(bytes.fromhex(exchanges[8]['response']))[1][0]
+        values += [[cbor.Tag(30, [51, 100])] * 5, [cbor.Tag(30, [67, 100])] * 10, 7, 146, 6,
+                   100000000000, 500000000, 20, cbor.Tag(30, [15, 1])]
+
+        parameters = convert_protocol_parameters(values)
+        self.assertEqual(parameters['poolVotingThresholds']['ppSecurityGroup'], 0.51)
+        self.assertEqual(parameters['dRepVotingThresholds']['treasuryWithdrawal'], 0.67)
+        self.assertEqual(parameters['govActionDeposit'], 100000000000)
+        self.assertEqual(parameters['minFeeRefScriptCostPerByte'], 15)
+
+class TestNodeClient(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = self.get_path('node.socket')
+        self.server = ReplayServer(self.socket_path, SESSION_FILE)
+        self.server.start()
+        self.client = NodeClient('testnet', self.socket_path, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.directory.cleanup()
+
+    def get_path(self, filename: str) -> str:
+        return os.path.join(self.directory.name, filename)
+
+    def test_query_tip(self):
+        with open(os.path.join(CARDANO_CLI_DIRECTORY, 'query_tip.json'), 'r') as file:
+            expected = json.load(file)
+        del expected['syncProgress']
+
+        self.assertEqual(self.client.query_tip(), expected)
+        self.assertEqual(self.client.version, 32784)
+
+    def test_one_connection(self):
+        self.client.query_tip()
+        self.client.query_tip()
+        self.client.query_utxos([ADDRESS])
+
+        handshakes = [request for request in self.server.get_requests() if request[0] == 0]
+        self.assertEqual(len(handshakes), 1)
+
+    def test_reconnect(self):
+        self.client.query_tip()
+        self.client.socket.close()
+        self.assertEqual(self.client.query_tip()['epoch'], 214)
+
+    def test_query_utxos(self):
+        utxos = self.client.query_utxos([ADDRESS])
+        self.assertEqual(utxos, [{'tx-hash': TX_HASH,
+                                  'tx-ix': 0,
+                                  'amount': 10000000,
+                                  'assets': {},
+                                  'tx-out-datum-hash': 'TxOutDatumNone',
+                                  'address': ADDRESS},
+                                 {'tx-hash': '9c0a7b6e5d4c3b2a19080f0e0d0c0b0a99887766554433221100ffeeddccbbaa',
+                                  'tx-ix': 1,
+                                  'amount': 2000000,
+                                  'assets': {'fd7d25b40ebb8896ad97fd700ef222a5ac43f10358968687e4db25b0': 1,
+                                             'fd7d25b40ebb8896ad97fd700ef222a5ac43f10358968687e4db25b0.TCR001': 1},
+                                  'tx-out-datum-hash': bytes(range(32)).hex(),
+                                  'address': ADDRESS}])
+
+    def test_query_utxos_by_tx_in(self):
+        utxos = self.client.query_utxos_by_tx_in([(TX_HASH, 0)])
+        self.assertEqual(utxos, [{'tx-hash': TX_HASH,
+                                  'tx-ix': 0,
+                                  'amount': 10000000,
+                                  'assets': {},
+                                  'tx-out-datum-hash': 'TxOutDatumNone',
+                                  'address': ADDRESS}])
+
+    def test_not_in_fixture(self):
+        with self.assertRaises(Exception):
+            self.client.query_utxos(['addr_test1vqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqd9tg5t'])
+
+class TestCardanoNodeClient(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = self.get_path('node.socket')
+        self.server = ReplayServer(self.socket_path, SESSION_FILE)
+        self.server.start()
+        self.client = NodeClient('testnet', self.socket_path, timeout=5)
+        self.cardano = Cardano('testnet', self.get_path('protocol_parameters.json'))
+        self.cardano.set_node_client(self.client)
+
+        self.signed_file = self.get_path('signed.json')
+        shutil.copyfile(os.path.join(CARDANO_CLI_DIRECTORY, 'transaction_sign.json'), self.signed_file)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.directory.cleanup()
+
+    def get_path(self, filename: str) -> str:
+        return os.path.join(self.directory.name, filename)
+
+    def test_query_protocol_parameters(self):
+        parameters = self.cardano.query_protocol_parameters()
+        self.assertEqual(parameters['txFeePerByte'], 44)
+        self.assertEqual(self.cardano.protocol_parameters_epoch, 214)
+        with open(self.cardano.get_protocol_parameters_file(), 'r') as file:
+            self.assertEqual(json.load(file), parameters)
+
+    def test_query_utxos(self):
+        (utxos, lovelace) = self.cardano.query_utxos(None, [ADDRESS])
+        self.assertEqual(len(utxos), 2)
+        self.assertEqual(lovelace, 12000000)
+        self.assertFalse('address' in utxos[0])
+
+        self.assertEqual(len(self.cardano.query_utxos_batch([ADDRESS])), 2)
+
+    def test_submit_transaction(self):
+        with open(os.path.join(CARDANO_CLI_DIRECTORY, 'transaction_txid.txt'), 'r') as file:
+            expected = file.read().strip()
+        self.assertEqual(self.cardano.submit_transaction(self.signed_file), expected)
+
+    def set_fee(self, increase: int) -> str:
+        """
+        Make the signed file the same transaction with a higher fee.
+
+        @return The txid
+        """
+
+        with open(self.signed_file, 'r') as file:
+            envelope = json.load(file)
+
+        items = cbor.split_array(bytes.fromhex(envelope['cborHex']))
+        body = cbor.loads(items[0])
+        body[2] += increase
+        envelope['cborHex'] = (bytes.fromhex('84') + cbor.dumps(body) + b''.join(items[1:])).hex()
+        with open(self.signed_file, 'w') as file:
+            json.dump(envelope, file)
+        return self.cardano.get_transaction_id(self.signed_file)
+
+    def get_submits(self) -> int:
+        return len([request for request in self.server.get_requests() if request[0] == 6 and cbor.loads(request[1])[0] == 0])
+
+    def test_submit_transaction_rejected(self):
+        # the rejection in the fixture is of the same transaction with a higher fee
+        self.set_fee(1)
+        self.assertEqual(self.cardano.submit_transaction(self.signed_file), None)
+
+    def test_submit_transaction_unknown(self):
+        # not in the fixture, the node closes the connection after the
+        # submit and the transaction is found in the mempool
+        tx_id = self.set_fee(2)
+        self.assertEqual(self.cardano.submit_transaction(self.signed_file), tx_id)
+        self.assertEqual(self.get_submits(), 1)
+
+    def test_submit_transaction_lost(self):
+        # not in the mempool and no outputs on chain
+        tx_id = self.set_fee(3)
+        with self.assertRaisesRegex(Exception, 'outcome unknown, {}'.format(tx_id)):
+            self.cardano.submit_transaction(self.signed_file)
+        self.assertEqual(self.get_submits(), 1)
+
+    def test_query_utxo_unspent(self):
+        self.assertTrue(self.cardano.query_utxo_unspent(TX_HASH, 0))
+        self.assertFalse(self.cardano.query_mempool_contains(self.set_fee(3)))
+
+if __name__ == '__main__':
+    unittest.main()
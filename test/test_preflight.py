@@ -0,0 +1,92 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_preflight.py
+Author: SuperKK
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from tcr.cardano import Cardano
+import tcr.preflight
+
+class CountingCardano(Cardano):
+    """
+    Stands in for the node, counts protocol parameter queries.
+    """
+
+    def __init__(self, protocol_parameters_file: str, epoch: int):
+        super().__init__('testnet', protocol_parameters_file)
+        self.epoch = epoch
+        self.queries = 0
+
+    def query_tip(self):
+        return {'epoch': self.epoch, 'slot': 1000 + self.epoch}
+
+    def query_protocol_parameters_node(self):
+        self.queries += 1
+        self.protocol_parameters = {'minUTxOValue': None, 'txFeePerByte': self.epoch}
+        with open(self.protocol_parameters_file, 'w') as file:
+            file.write(json.dumps(self.protocol_parameters))
+        return self.protocol_parameters
+
+class TestPreflight(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.protocol_parameters_file = os.path.join(self.directory, 'testnet_protocol_parameters.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_protocol_parameters_cache(self):
+        cardano = CountingCardano(self.protocol_parameters_file, 200)
+        self.assertEqual(1000 + 200, tcr.preflight.query_node(cardano)['slot'])
+        self.assertEqual(1, cardano.queries)
+
+        # a new process in the same epoch reads the file
+        cardano = CountingCardano(self.protocol_parameters_file, 200)
+        tcr.preflight.query_node(cardano)
+        self.assertEqual(0, cardano.queries)
+        self.assertEqual(200, cardano.get_protocol_parameters()['txFeePerByte'])
+
+        cardano = CountingCardano(self.protocol_parameters_file, 201)
+        tcr.preflight.query_node(cardano)
+        self.assertEqual(1, cardano.queries)
+        self.assertEqual(201, cardano.get_protocol_parameters()['txFeePerByte'])
+
+    def test_refresh_on_epoch_change(self):
+        cardano = CountingCardano(self.protocol_parameters_file, 300)
+        tcr.preflight.query_node(cardano)
+        self.assertFalse(cardano.refresh_protocol_parameters())
+        self.assertEqual(1, cardano.queries)
+
+        cardano.epoch = 301
+        self.assertTrue(cardano.refresh_protocol_parameters())
+        self.assertEqual(2, cardano.queries)
+        self.assertEqual(301, cardano.get_protocol_parameters()['txFeePerByte'])
+        self.assertFalse(cardano.refresh_protocol_parameters(301))
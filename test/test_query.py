@@ -0,0 +1,87 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_query.py
+Author: SuperKK
+"""
+
+import unittest
+
+from tcr.query import BitmapIndex, Query
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        colors = ['red', 'green', 'blue']
+        filenames = []
+        properties = []
+        for i in range(0, 30):
+            filenames.append('TNx001x{:04}x1.json'.format(i))
+            token = {'id': [str(i)], 'color': [colors[i % 3]], 'tags': ['odd' if i % 2 else 'even']}
+            if i % 10 == 0:
+                token['tags'].append('round')
+                token['hat'] = ['top hat']
+            properties.append(token)
+        self.bitmaps = BitmapIndex(filenames, properties)
+
+    def count(self, query: str) -> int:
+        return len(self.bitmaps.search(query))
+
+    def test_parse(self):
+        self.assertEqual(('and', [('compare', 'color', '=', 'red'), ('compare', 'hat', '=', 'cap')]), Query('color=red,hat=cap').root)
+        self.assertEqual(('or', [('compare', 'a', '=', 'b'), ('and', [('not', ('compare', 'c', '=', 'd')), ('in', 'e', ['f', 'g h'])])]),
+                         Query("a=b OR NOT c=d and e in (f, 'g h')").root)
+        self.assertEqual(('compare', 'id', '>=', 10.0), Query('(id >= 10)').root)
+        self.assertEqual(('and', [('compare', 'name', '=', 'King  Charles'), ('compare', 'hat', '=', 'top hat')]),
+                         Query('name=King  Charles,hat=top hat').root)
+        self.assertEqual(('and', [('compare', 'hat', '=', 'top hat'), ('compare', 'id', '<', 3.0)]), Query('hat = top hat AND id < 3').root)
+
+        for query in ['', 'color', 'color=', 'color=red AND', '(color=red', 'id < ten', 'color=red)', 'color IN red']:
+            with self.assertRaises(Exception):
+                Query(query)
+
+    def test_search(self):
+        self.assertEqual(10, self.count('color=red'))
+        self.assertEqual(20, self.count('color!=red'))
+        self.assertEqual(20, self.count('color=red OR color=blue'))
+        self.assertEqual(20, self.count('color IN (red, blue)'))
+        self.assertEqual(5, self.count('color=red,tags=even'))
+        self.assertEqual(3, self.count('tags=round'))
+        self.assertEqual(['TNx001x0010x1.json'], self.bitmaps.search('tags=round AND tags=even AND color=green'))
+        self.assertEqual(3, self.count('hat="top hat"'))
+        self.assertEqual(27, self.count('NOT hat="top hat"'))
+        self.assertEqual(0, self.count('color=purple'))
+        self.assertEqual(0, self.count('shoes=red'))
+
+    def test_equalities(self):
+        self.assertEqual({'color': 'red', 'hat': 'top hat'}, Query('color=red,hat=top hat').get_equalities())
+        self.assertEqual({'color': 'red'}, Query('color=red').get_equalities())
+        for query in ['color=red OR hat=cap', 'color=red AND color=blue', 'NOT color=red', 'id < 3', 'color IN (red)']:
+            self.assertEqual(None, Query(query).get_equalities())
+
+    def test_ranges(self):
+        self.assertEqual(10, self.count('id < 10'))
+        self.assertEqual(11, self.count('id <= 10'))
+        self.assertEqual(5, self.count('id >= 10 AND id < 20 AND tags=odd'))
+        self.assertEqual(11, self.count('id > 25 OR (color=red AND NOT id > 20)'))
+        self.assertEqual(0, self.count('color > 1'))
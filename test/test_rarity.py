@@ -0,0 +1,92 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_rarity.py
+Author: SuperKK
+"""
+
+import unittest
+import csv
+import json
+import math
+import os
+import tempfile
+
+from tcr.rarity import MISSING, RarityEngine, write_csv, write_json
+
+class TestRarity(unittest.TestCase):
+    def setUp(self):
+        self.tokens = ['T0', 'T1', 'T2', 'T3']
+        self.properties = [
+            {'name': 'T0', 'color': 'red',   'hat': 'cap'},
+            {'name': 'T1', 'color': 'red',   'hat': 'cap'},
+            {'name': 'T2', 'color': 'red',   'hat': 'crown'},
+            {'name': 'T3', 'color': 'green'}
+        ]
+
+    def test_counts(self):
+        engine = RarityEngine(self.tokens, self.properties, [['color', 'hat']])
+        counts = engine.get_counts()
+        self.assertFalse('name' in counts)
+        self.assertEqual({'red': 3, 'green': 1}, counts['color'])
+        self.assertEqual({'cap': 2, 'crown': 1, MISSING: 1}, counts['hat'])
+        self.assertEqual({'2': 3, '1': 1}, counts['trait_count'])
+        self.assertEqual({'red+cap': 2, 'red+crown': 1, 'green+{}'.format(MISSING): 1}, counts['color+hat'])
+
+    def test_scores(self):
+        engine = RarityEngine(self.tokens, self.properties)
+        scores = engine.score()
+
+        # T0: color 3/4, hat 2/4, trait count 3/4
+        self.assertAlmostEqual(4/3 + 2 + 4/3, scores['rarity_score'][0])
+        self.assertAlmostEqual(-math.log2(0.75) + 1 - math.log2(0.75), scores['information'][0])
+        self.assertAlmostEqual(0.75 * 0.5 * 0.75, scores['statistical'][0])
+
+        self.assertEqual(['T3', 'T2', 'T0', 'T1'], [entry['token'] for entry in engine.rank()])
+        self.assertEqual(['T3', 'T2', 'T0', 'T1'], [entry['token'] for entry in engine.rank('statistical')])
+        with self.assertRaises(Exception):
+            engine.rank('unknown')
+
+    def test_unknown_combination(self):
+        with self.assertRaises(Exception):
+            RarityEngine(self.tokens, self.properties, [['color', 'shoes']])
+
+    def test_output(self):
+        ranking = RarityEngine(self.tokens, self.properties).rank()
+        directory = tempfile.mkdtemp()
+        json_file = os.path.join(directory, 'rarity.json')
+        csv_file = os.path.join(directory, 'rarity.csv')
+
+        write_json(ranking, json_file)
+        write_csv(ranking, csv_file)
+        with open(json_file, 'r') as file:
+            self.assertEqual(ranking, json.load(file))
+        with open(csv_file, 'r') as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(['rank', 'token', 'rarity_score', 'information', 'statistical', 'color', 'hat', 'trait_count'], rows[0])
+        self.assertEqual(['1', 'T3'], rows[1][0:2])
+
+        os.remove(json_file)
+        os.remove(csv_file)
+        os.rmdir(directory)
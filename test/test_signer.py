@@ -0,0 +1,117 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_signer.py
+Author: SuperKK
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from tcr import cbor, ed25519
+from tcr.hdkey import ExtendedPrivateKey, format_text_envelope
+from tcr.signer import Signer, SigningKey, get_signed_type
+
+SEED = bytes.fromhex('9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60')
+BODY = {0: [[bytes(32), 0]], 1: [[bytes(57), 5000000]], 2: 170000, 3: 1000}
+# a native script, with a longer than needed length so re-encoding would change it
+SCRIPT_WITNESSES = bytes.fromhex('01') + bytes.fromhex('9801') + bytes.fromhex('8200581c') + bytes(28)
+
+class TestSigner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.policy_key_file = self.get_path('policy.skey')
+        with open(self.policy_key_file, 'w') as file:
+            file.write(format_text_envelope('PaymentSigningKeyShelley_ed25519', '5820' + SEED.hex()))
+
+        self.payment_key = ExtendedPrivateKey(bytes(31) + b'\x40', bytes(range(32)), bytes(32))
+        self.payment_key_file = self.get_path('payment.skey')
+        with open(self.payment_key_file, 'w') as file:
+            file.write(self.payment_key.to_signing_key_file())
+
+        witness_set = bytes.fromhex('a1') + SCRIPT_WITNESSES
+        self.body = cbor.dumps(BODY)
+        self.unsigned_file = self.get_path('unsigned.json')
+        with open(self.unsigned_file, 'w') as file:
+            file.write(format_text_envelope('Unwitnessed Tx BabbageEra',
+                                            (bytes.fromhex('84') + self.body + witness_set + cbor.dumps(True) + cbor.dumps(None)).hex()))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, filename: str) -> str:
+        return os.path.join(self.directory.name, filename)
+
+    def test_signing_key(self):
+        key = SigningKey(SEED)
+        self.assertEqual(key.get_public_key(), ed25519.public_key(SEED))
+        self.assertEqual(key.sign(b''), ed25519.sign(SEED, b''))
+
+    def test_sign_transaction(self):
+        signer = Signer()
+        self.assertTrue(signer.can_sign(self.unsigned_file))
+        signed_file = self.get_path('signed.json')
+        tx_id = signer.sign_transaction(self.unsigned_file,
+                                        [self.policy_key_file, self.payment_key_file, self.policy_key_file],
+                                        signed_file)
+        self.assertEqual(tx_id, hashlib.blake2b(self.body, digest_size=32).hexdigest())
+
+        with open(signed_file, 'r') as file:
+            envelope = json.load(file)
+        self.assertEqual(envelope['type'], 'Tx BabbageEra')
+        data = bytes.fromhex(envelope['cborHex'])
+        (body, witness_set, valid, auxiliary_data) = cbor.split_array(data)
+        self.assertEqual(body, self.body)
+        self.assertEqual((cbor.loads(valid), cbor.loads(auxiliary_data)), (True, None))
+
+        # the script witnesses are untouched, one vkey witness per key
+        entries = dict(cbor.split_map(witness_set))
+        self.assertEqual(cbor.dumps(1) + entries[cbor.dumps(1)], SCRIPT_WITNESSES)
+        witnesses = cbor.loads(entries[cbor.dumps(0)])
+        self.assertEqual([witness[0] for witness in witnesses],
+                         [ed25519.public_key(SEED), self.payment_key.get_public_key()])
+        for (public_key, signature) in witnesses:
+            self.assertTrue(ed25519.verify(public_key, bytes.fromhex(tx_id), signature))
+
+        # keys are read once
+        self.assertEqual(len(signer.keys), 2)
+
+    def test_body_file(self):
+        body_file = self.get_path('body.json')
+        with open(body_file, 'w') as file:
+            file.write(format_text_envelope('TxBodyBabbage', self.body.hex()))
+        signer = Signer()
+        self.assertFalse(signer.can_sign(body_file))
+        with self.assertRaises(Exception):
+            signer.sign_transaction(body_file, [self.policy_key_file], self.get_path('signed.json'))
+
+    def test_signed_type(self):
+        self.assertEqual(get_signed_type('Unwitnessed Tx BabbageEra'), 'Tx BabbageEra')
+        self.assertEqual(get_signed_type('TxBodyBabbage'), 'Tx BabbageEra')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,408 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_simulator.py
+Author: SuperKK
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict
+
+from tcr.address_pool import AddressPool
+from tcr.database import Database
+from tcr.metadata_list import MetadataList
+from tcr.metrics import PAYMENTS
+from tcr.mint_control import MintController
+from tcr.sales import Sales
+
+from benchmarks.cardano_cli import main, parse_options
+from benchmarks.chain import Chain, SqliteConnection, get_slot
+from benchmarks.run import DrainingController
+from benchmarks.simulator import Simulator, run_load_test
+from benchmarks.workspace import DROP_NAME, MINT_ADDRESS as WALLET_ADDRESS, NETWORK, PAYMENT_AMOUNT, POLICY_ID, POLICY_NAME
+import tcr.consolidation
+import tcr.tcr
+
+POLICY = 'ab' * 28
+MINT_ADDRESS = 'addr_test1vmint'
+BUYER_ADDRESS = 'addr_test1qbuyer'
+
+class TestChain(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.chain = Chain(os.path.join(self.directory.name, 'chain.db'))
+
+    def tearDown(self):
+        self.chain.close()
+        self.directory.cleanup()
+
+    def get_mint_body(self, payment: str) -> dict:
+        return {'inputs': ['{}#0'.format(payment)],
+                'outputs': [{'address': MINT_ADDRESS, 'amount': 7800000, 'assets': {}},
+                            {'address': BUYER_ADDRESS, 'amount': 2000000, 'assets': {'{}.{}'.format(POLICY, b'T1'.hex()): 1}}],
+                'fee': 200000,
+                'mint': {'{}.{}'.format(POLICY, b'T1'.hex()): 1},
+                'invalid-hereafter': get_slot() + 100}
+
+    def test_payment(self):
+        payment = self.chain.add_payment(BUYER_ADDRESS, MINT_ADDRESS, 10000000)
+        utxos = self.chain.get_utxos(MINT_ADDRESS)
+        self.assertEqual(utxos, [{'tx-hash': payment, 'tx-ix': 0, 'amount': 10000000, 'assets': {}}])
+        self.assertEqual(self.chain.get_utxos(BUYER_ADDRESS), [])
+
+        # Database queries run unchanged on the chain
+        database = Database.__new__(Database)
+        database.connection = SqliteConnection(self.chain)
+        inputs = database.query_utxo_inputs(payment)
+        self.assertEqual(inputs, [{'address': BUYER_ADDRESS, 'value': 10200000}])
+        (block_time, slot) = database.query_txhash_time(payment)
+        self.assertLessEqual(abs(slot - get_slot()), 1)
+        self.assertEqual(block_time.year >= 2022, True)
+
+    def test_submit(self):
+        payment = self.chain.add_payment(BUYER_ADDRESS, MINT_ADDRESS, 10000000)
+        self.chain.submit(self.get_mint_body(payment), 2)
+
+        utxos = self.chain.get_utxos(BUYER_ADDRESS)
+        self.assertEqual(utxos[0]['assets'], {'{}.{}'.format(POLICY, b'T1'.hex()): 1})
+        self.assertEqual(len(self.chain.get_utxos(MINT_ADDRESS)), 1)
+
+        database = Database.__new__(Database)
+        database.connection = SqliteConnection(self.chain)
+        self.assertEqual(database.query_mint_transactions(POLICY)['T1']['quantity'], 1)
+
+        # the payment is spent
+        with self.assertRaises(Exception):
+            body = self.get_mint_body(payment)
+            body['fee'] = 199999
+            body['outputs'][0]['amount'] += 1
+            self.chain.submit(body, 2)
+
+    def test_invalid(self):
+        payment = self.chain.add_payment(BUYER_ADDRESS, MINT_ADDRESS, 10000000)
+
+        body = self.get_mint_body(payment)
+        body['fee'] = 100000
+        body['outputs'][0]['amount'] += 100000
+        with self.assertRaisesRegex(Exception, 'FeeTooSmall'):
+            self.chain.submit(body, 2)
+
+        body = self.get_mint_body(payment)
+        body['fee'] = 200001
+        with self.assertRaisesRegex(Exception, 'ValueNotConserved'):
+            self.chain.submit(body, 2)
+
+        body = self.get_mint_body(payment)
+        body['mint'] = {}
+        with self.assertRaisesRegex(Exception, 'ValueNotConserved'):
+            self.chain.submit(body, 2)
+
+        body = self.get_mint_body(payment)
+        body['invalid-hereafter'] = get_slot() - 1
+        with self.assertRaisesRegex(Exception, 'OutsideValidityInterval'):
+            self.chain.submit(body, 2)
+
+        # nothing was added
+        self.assertEqual(len(self.chain.get_utxos(MINT_ADDRESS)), 1)
+
+class TestCardanoCli(unittest.TestCase):
+    def test_parse_options(self):
+        options = parse_options(['--tx-in', 'a#0', '--tx-in', 'b#1', '--fee', '0', '--mint=1 p.n', '--mainnet'])
+        self.assertEqual(options, {'--tx-in': ['a#0', 'b#1'], '--fee': '0', '--mint': '1 p.n', '--mainnet': True})
+
+    def test_submit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            chain_file = os.path.join(directory, 'chain.db')
+            chain = Chain(chain_file)
+            payment = chain.add_payment(BUYER_ADDRESS, MINT_ADDRESS, 10000000)
+            os.environ['SIMULATOR_CHAIN'] = chain_file
+
+            def run(*args) -> str:
+                output = io.StringIO()
+                with redirect_stdout(output):
+                    self.assertEqual(main(list(args)), 0)
+                return output.getvalue().strip()
+
+            try:
+                body_file = os.path.join(directory, 'tx.raw')
+                signed_file = os.path.join(directory, 'tx.signed')
+                run('transaction', 'build-raw', '--fee', '200000',
+                    '--tx-in', '{}#0'.format(payment),
+                    '--tx-out', '{}+9800000'.format(BUYER_ADDRESS),
+                    '--out-file', body_file)
+                run('transaction', 'sign', '--tx-body-file', body_file, '--signing-key-file', 'a.skey', '--out-file', signed_file)
+                txid = run('transaction', 'txid', '--tx-file', signed_file)
+                self.assertEqual(run('transaction', 'submit', '--tx-file', signed_file), 'Transaction successfully submitted.')
+
+                table = run('query', 'utxo', '--address', BUYER_ADDRESS, '--testnet-magic', '1097911063')
+                self.assertIn('{}     0        9800000 lovelace + TxOutDatumNone'.format(txid), table)
+                self.assertEqual(json.loads(run('query', 'tip'))['block'], 2)
+
+                utxo_file = os.path.join(directory, 'utxo.json')
+                run('query', 'utxo', '--tx-in', '{}#0'.format(txid), '--tx-in', '{}#0'.format(payment), '--out-file', utxo_file)
+                with open(utxo_file, 'r') as file:
+                    self.assertEqual(list(json.load(file).keys()), ['{}#0'.format(txid)])
+                self.assertFalse(json.loads(run('query', 'tx-mempool', 'tx-exists', txid))['exists'])
+
+                # spent
+                errors = io.StringIO()
+                with redirect_stderr(errors):
+                    self.assertEqual(main(['transaction', 'submit', '--tx-file', signed_file]), 1)
+                self.assertIn('BadInputsUTxO', errors.getvalue())
+            finally:
+                del os.environ['SIMULATOR_CHAIN']
+                chain.close()
+
+class TestSimulator(unittest.TestCase):
+    def test_load(self):
+        result = run_load_test(payments=3, rate=0, workers=2, seed=1)
+        self.assertEqual(result['minted'], 3)
+        self.assertEqual(result['delivered'], 3)
+
+    def test_load_address_pool(self):
+        result = run_load_test(payments=3, rate=0, workers=2, seed=1, use_address_pool=True)
+        self.assertEqual(result['minted'], 3)
+        self.assertEqual(result['delivered'], 3)
+
+    def test_address_pool_second_payment(self):
+        with Simulator(payments=0, nfts=2) as simulator:
+            chain = simulator.chain
+            wallet = simulator.get_wallet()
+            address_pool = AddressPool(wallet, simulator.get_path('address_pool.json'))
+            session = address_pool.open_session('checkout', BUYER_ADDRESS)
+            chain.add_payment(BUYER_ADDRESS, session['address'], PAYMENT_AMOUNT)
+
+            class Controller(MintController):
+                def add_result(self, utxo, result, tokens=[], txid=None):
+                    super().add_result(utxo, result, tokens, txid)
+                    if result == 'minted':
+                        # paid again after the session was closed
+                        chain.add_payment(BUYER_ADDRESS, session['address'], PAYMENT_AMOUNT)
+                    else:
+                        self.drain()
+
+            controller = Controller()
+            tcr.tcr.process_incoming_payments(simulator.get_cardano(), simulator.get_database(), wallet,
+                                              POLICY_NAME,
+                                              DROP_NAME,
+                                              simulator.get_metadata_set_file(),
+                                              {PAYMENT_AMOUNT: 1},
+                                              1,
+                                              controller,
+                                              address_pool)
+
+            self.assertEqual([result['result'] for result in controller.get_status()['recent']], ['refunded', 'minted'])
+            self.assertTrue(address_pool.is_closed('checkout'))
+            self.assertEqual(chain.get_utxos(session['address']), [])
+
+    def test_session_refund(self):
+        with Simulator(payments=0, nfts=0) as simulator:
+            chain = simulator.chain
+            wallet = simulator.get_wallet()
+            address_pool = AddressPool(wallet, simulator.get_path('address_pool.json'))
+            session = address_pool.open_session('checkout', BUYER_ADDRESS)
+            chain.add_payment(BUYER_ADDRESS, session['address'], PAYMENT_AMOUNT)
+
+            utxo = dict(chain.get_utxos(session['address'])[0], address=session['address'])
+            self.assertTrue(address_pool.attribute(utxo))
+            sales = Sales(NETWORK, DROP_NAME)
+            # signed by the session key only, the fee is checked on submit
+            self.assertTrue(tcr.tcr.refund_payment(simulator.get_cardano(), simulator.get_database(), wallet, utxo, sales))
+
+            self.assertEqual(chain.get_utxos(session['address']), [])
+            refund = chain.get_utxos(BUYER_ADDRESS)
+            self.assertEqual(len(refund), 1)
+            self.assertEqual(refund[0]['amount'], sales.sales['transactions'][0]['out-ada'])
+            self.assertGreater(refund[0]['amount'], PAYMENT_AMOUNT - 200000)
+
+    def test_db_sync_lag(self):
+        with Simulator(payments=0, nfts=2) as simulator:
+            simulator.chain.add_payment(BUYER_ADDRESS, WALLET_ADDRESS, PAYMENT_AMOUNT)
+            database = simulator.get_database()
+            query_utxo_inputs = database.query_utxo_inputs
+            lookups = []
+
+            def query_lagging(tx_hash: str) -> list:
+                lookups.append(tx_hash)
+                if len(lookups) <= 2:
+                    return []
+                return query_utxo_inputs(tx_hash)
+
+            database.query_utxo_inputs = query_lagging
+            seen = PAYMENTS.get(event='seen')
+            failed = PAYMENTS.get(event='failed')
+            # DrainingController raises on any result other than minted
+            controller = DrainingController(1)
+            tcr.tcr.process_incoming_payments(simulator.get_cardano(), database, simulator.get_wallet(),
+                                              POLICY_NAME,
+                                              DROP_NAME,
+                                              simulator.get_metadata_set_file(),
+                                              {PAYMENT_AMOUNT: 1},
+                                              1,
+                                              controller)
+
+            self.assertEqual(len(lookups), 3)
+            self.assertEqual([result['result'] for result in controller.get_status()['recent']], ['minted'])
+            self.assertEqual(PAYMENTS.get(event='seen') - seen, 1)
+            self.assertEqual(PAYMENTS.get(event='failed') - failed, 0)
+            self.assertEqual(MetadataList(simulator.get_metadata_set_file()).get_remaining(), 1)
+
+    def mint_with_failed_submit(self, accepted: bool) -> Dict:
+        """
+        Mint one payment where the first submit raises after the transaction
+        was, or was not, accepted.
+        """
+
+        with Simulator(payments=0, nfts=2) as simulator:
+            simulator.chain.add_payment(BUYER_ADDRESS, WALLET_ADDRESS, PAYMENT_AMOUNT)
+            cardano = simulator.get_cardano()
+            submit_transaction = cardano.submit_transaction
+            submitted = []
+
+            def submit(transaction_file: str) -> str:
+                submitted.append(cardano.get_transaction_id(transaction_file))
+                if len(submitted) == 1:
+                    if accepted:
+                        submit_transaction(transaction_file)
+                    raise Exception('Connection reset')
+                return submit_transaction(transaction_file)
+
+            cardano.submit_transaction = submit
+            tcr.tcr.process_incoming_payments(cardano, simulator.get_database(), simulator.get_wallet(),
+                                              POLICY_NAME,
+                                              DROP_NAME,
+                                              simulator.get_metadata_set_file(),
+                                              {PAYMENT_AMOUNT: 1},
+                                              1,
+                                              DrainingController(1))
+
+            return {'submitted': submitted,
+                    'sales': Sales(NETWORK, DROP_NAME).sales['transactions'],
+                    'remaining': MetadataList(simulator.get_metadata_set_file()).get_remaining(),
+                    'tokens': len(simulator.chain.get_utxos(BUYER_ADDRESS))}
+
+    def test_submit_accepted_unknown(self):
+        result = self.mint_with_failed_submit(True)
+        # found spent on chain, not submitted again
+        self.assertEqual(len(result['submitted']), 1)
+        self.assertEqual(len(result['sales']), 1)
+        self.assertEqual(result['sales'][0]['out-txid'], result['submitted'][0])
+        self.assertEqual(len(result['sales'][0]['metadata-files']), 1)
+        self.assertEqual(result['remaining'], 1)
+        self.assertEqual(result['tokens'], 1)
+
+    def test_submit_lost(self):
+        result = self.mint_with_failed_submit(False)
+        # not found, the sale is removed and the payment minted again
+        self.assertEqual(len(result['submitted']), 2)
+        self.assertEqual(len(result['sales']), 1)
+        self.assertEqual(result['sales'][0]['out-txid'], result['submitted'][1])
+        self.assertEqual(result['remaining'], 1)
+        self.assertEqual(result['tokens'], 1)
+
+class TestTransferNfts(unittest.TestCase):
+    def test_chained(self):
+        with Simulator(payments=0, nfts=0) as simulator:
+            chain = simulator.chain
+            # three UTXOs of 250 NFTs each
+            for i in range(3):
+                payment = chain.add_payment(BUYER_ADDRESS, WALLET_ADDRESS, 100000000)
+                assets = {'{}.{}'.format(POLICY, 'Token{:04d}'.format(i * 250 + j).encode().hex()): 1 for j in range(250)}
+                chain.submit({'inputs': ['{}#0'.format(payment)],
+                              'outputs': [{'address': WALLET_ADDRESS, 'amount': 98000000, 'assets': assets}],
+                              'fee': 2000000,
+                              'mint': assets,
+                              'invalid-hereafter': get_slot() + 100}, 2)
+
+            cardano = simulator.get_cardano()
+            wallet = simulator.get_wallet()
+            nfts = {'{}.Token{:04d}'.format(POLICY, i): 1 for i in range(700)}
+            tx_ids = tcr.tcr.transfer_nfts(cardano, wallet, nfts, tcr.tcr.WalletExternal('buyer', 'testnet', 'addr_test1qdestination'))
+
+            self.assertGreater(len(tx_ids), 1)
+            received = {}
+            for utxo in chain.get_utxos('addr_test1qdestination'):
+                received.update(utxo['assets'])
+            self.assertEqual(len(received), 700)
+            kept = {}
+            for utxo in chain.get_utxos(WALLET_ADDRESS):
+                kept.update(utxo['assets'])
+            self.assertEqual(len(kept), 50)
+
+class TestBurnNfts(unittest.TestCase):
+    def test_chained(self):
+        with Simulator(payments=0, nfts=0) as simulator:
+            chain = simulator.chain
+            # two UTXOs of 300 tokens each, one with the royalty token
+            for i in range(2):
+                payment = chain.add_payment(BUYER_ADDRESS, WALLET_ADDRESS, 100000000)
+                assets = {'{}.{}'.format(POLICY_ID, 'Token{:04d}'.format(i * 300 + j).encode().hex()): 1 for j in range(300)}
+                if i == 0:
+                    assets[POLICY_ID] = 1
+                chain.submit({'inputs': ['{}#0'.format(payment)],
+                              'outputs': [{'address': WALLET_ADDRESS, 'amount': 98000000, 'assets': assets}],
+                              'fee': 2000000,
+                              'mint': assets,
+                              'invalid-hereafter': get_slot() + 100}, 2)
+
+            cardano = simulator.get_cardano()
+            wallet = simulator.get_wallet()
+            token_names = [''] + ['Token{:04d}'.format(i) for i in range(600)]
+            tx_ids = tcr.tcr.burn_nfts(cardano, wallet, POLICY_NAME, token_names)
+
+            self.assertGreater(len(tx_ids), 1)
+            for utxo in chain.get_utxos(WALLET_ADDRESS):
+                self.assertEqual(utxo['assets'], {})
+
+class TestConsolidation(unittest.TestCase):
+    def test_chained(self):
+        with Simulator(payments=0, nfts=0) as simulator:
+            chain = simulator.chain
+            for i in range(600):
+                chain.add_payment(BUYER_ADDRESS, WALLET_ADDRESS, 2000000 + i)
+            total = sum([utxo['amount'] for utxo in chain.get_utxos(WALLET_ADDRESS)])
+
+            cardano = simulator.get_cardano()
+            # planned with the parameters current when it runs, not these
+            stale = dict(cardano.get_protocol_parameters(), maxTxSize=500)
+            consolidator = tcr.consolidation.Consolidator(stale, outputs=4, reserve_count=2)
+            tx_ids = tcr.consolidation.consolidate_utxos(cardano, simulator.get_wallet(), consolidator)
+
+            self.assertGreater(len(tx_ids), 1)
+            amounts = sorted([utxo['amount'] for utxo in chain.get_utxos(WALLET_ADDRESS)])
+            self.assertEqual(len(amounts), 6)
+            self.assertEqual(amounts[0:2], [5000000, 5000000])
+            self.assertLessEqual(amounts[-1] - amounts[2], 3)
+            self.assertLess(sum(amounts), total)
+
+            # nothing left to merge
+            self.assertEqual(tcr.consolidation.consolidate_utxos(cardano, simulator.get_wallet(), consolidator), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_tracing.py
+Author: SuperKK
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from tcr import tracing
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.directory.name, 'traces.jsonl')
+
+    def tearDown(self):
+        tracing.shutdown()
+        self.directory.cleanup()
+
+    def test_disabled(self):
+        self.assertFalse(tracing.is_enabled())
+        with tracing.span('stage', **{'tcr.utxo': 'a#0'}) as span:
+            span.set_attribute('tcr.txid', 'b')
+        self.assertIs(span, tracing.NOOP_SPAN)
+
+    def test_nested(self):
+        tracing.configure(self.trace_file)
+        with tracing.span('mint_payment', **{'tcr.utxo': 'a#0'}):
+            with tracing.span('fee', **{'tcr.utxo': 'a#0', 'tcr.tokens': 'T1,T2'}):
+                pass
+            with tracing.span('submit') as span:
+                span.set_attribute('tcr.txid', 'b')
+        tracing.shutdown()
+
+        spans = {s['name']: s for s in tracing.read_spans(self.trace_file)}
+        self.assertEqual(set(spans.keys()), set(['mint_payment', 'fee', 'submit']))
+        root = spans['mint_payment']
+        self.assertEqual(root['parent-span-id'], '')
+        for name in ['fee', 'submit']:
+            self.assertEqual(spans[name]['trace-id'], root['trace-id'])
+            self.assertEqual(spans[name]['parent-span-id'], root['span-id'])
+            self.assertGreaterEqual(spans[name]['start'], root['start'])
+            self.assertLessEqual(spans[name]['end'], root['end'])
+        self.assertEqual(spans['fee']['attributes'], {'tcr.utxo': 'a#0', 'tcr.tokens': 'T1,T2'})
+        self.assertEqual(spans['submit']['attributes'], {'tcr.txid': 'b'})
+        self.assertEqual(root['status'], tracing.STATUS_OK)
+
+        lines = tracing.format_waterfall(list(spans.values()))
+        self.assertTrue(lines[0].startswith('Trace {}'.format(root['trace-id'])))
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['mint_payment', 'fee', 'submit'])
+
+    def test_error(self):
+        tracing.configure(self.trace_file)
+        with self.assertRaises(Exception):
+            with tracing.span('submit'):
+                raise Exception('submit failed')
+        tracing.shutdown()
+
+        spans = tracing.read_spans(self.trace_file)
+        self.assertEqual(spans[0]['status'], tracing.STATUS_ERROR)
+        self.assertIn('ERROR', tracing.format_waterfall(spans)[1])
+
+    def test_threads(self):
+        tracing.configure(self.trace_file)
+
+        def mint():
+            with tracing.span('mint_payment'):
+                with tracing.span('sign'):
+                    pass
+
+        threads = [threading.Thread(target=mint) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tracing.shutdown()
+
+        spans = tracing.read_spans(self.trace_file)
+        roots = {s['span-id']: s for s in spans if s['name'] == 'mint_payment'}
+        self.assertEqual(len(roots), 4)
+        self.assertEqual(len(set([s['trace-id'] for s in roots.values()])), 4)
+        for s in spans:
+            if s['name'] == 'sign':
+                self.assertEqual(roots[s['parent-span-id']]['trace-id'], s['trace-id'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_trait_index.py
+Author: SuperKK
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from tcr.query import search_index
+from tcr.trait_index import TraitIndex, get_default_index_file
+
+class TestTraitIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.metadata_dir = os.path.join(self.directory, 'nft_metadata')
+        os.mkdir(self.metadata_dir)
+
+        colors = ['red', 'green', 'blue']
+        for i in range(0, 30):
+            self.write_token(i, {'name': 'Token {}'.format(i),
+                                 'color': colors[i % 3],
+                                 'size': 'large' if i % 5 == 0 else 'small',
+                                 'tags': ['odd' if i % 2 else 'even', 'all']})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_token(self, i: int, token) -> None:
+        token_name = 'TNx001x{:04}x1'.format(i)
+        with open(os.path.join(self.metadata_dir, '{}.json'.format(token_name)), 'w') as file:
+            file.write(json.dumps({'721': {'policy': {token_name: token}}}))
+
+    def test_index_location(self):
+        self.assertEqual(os.path.join(self.directory, 'nft_metadata_index.db'), get_default_index_file(self.metadata_dir + '/'))
+
+    def test_search(self):
+        index = TraitIndex(self.metadata_dir)
+        self.assertEqual((30, 0), index.update())
+        self.assertEqual(30, index.get_total())
+
+        self.assertEqual(10, len(index.search({'color': 'red'})))
+        self.assertEqual(['TNx001x0000x1.json', 'TNx001x0015x1.json'], index.search({'color': 'red', 'size': 'large'}))
+        self.assertEqual(15, len(index.search({'tags': 'odd'})))
+        self.assertEqual(5, len(index.search({'tags': 'odd', 'color': 'blue'})))
+        self.assertEqual([], index.search({'color': 'purple'}))
+        index.close()
+
+    def test_search_index(self):
+        index = TraitIndex(self.metadata_dir)
+        index.update()
+
+        # plain equality queries are answered in SQL, the rest with bitmaps
+        self.assertEqual(['TNx001x0000x1.json', 'TNx001x0015x1.json'], search_index(index, 'color=red,size=large'))
+        self.assertEqual(['TNx001x0012x1.json'], search_index(index, 'name=Token 12'))
+        self.assertEqual(search_index(index, 'color=red AND size=large'), search_index(index, 'color=red AND NOT size=small'))
+        self.assertEqual(20, len(search_index(index, 'tags=odd OR tags=even AND color=red')))
+        index.close()
+
+    def test_counts(self):
+        index = TraitIndex(self.metadata_dir)
+        index.update()
+
+        counts = index.get_counts()
+        self.assertEqual({'red': 10, 'green': 10, 'blue': 10}, counts['color'])
+        self.assertEqual({'odd': 15, 'even': 15, 'all': 30}, counts['tags'])
+
+        combination = index.get_combination_counts(['color', 'size'])
+        self.assertEqual(2, combination['red+large'])
+        self.assertEqual(8, combination['green+small'])
+        self.assertEqual(30, sum(combination.values()))
+        index.close()
+
+    def test_incremental_update(self):
+        index = TraitIndex(self.metadata_dir)
+        index.update()
+        index.close()
+
+        # only changed and removed files are looked at
+        time.sleep(0.01)
+        self.write_token(1, {'name': 'Token 1', 'color': 'purple', 'size': 'small', 'tags': ['odd']})
+        os.remove(os.path.join(self.metadata_dir, 'TNx001x0002x1.json'))
+
+        index = TraitIndex(self.metadata_dir)
+        self.assertEqual((1, 1), index.update())
+        self.assertEqual((0, 0), index.update())
+        self.assertEqual(29, index.get_total())
+        self.assertEqual(['TNx001x0001x1.json'], index.search({'color': 'purple'}))
+        self.assertEqual(9, len(index.search({'color': 'green'})))
+        index.close()
@@ -0,0 +1,64 @@
+#
+# Copyright 2021-2022 The Card Room
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_utxo_lock.py
+Author: SuperKK
+"""
+
+import unittest
+import concurrent.futures
+
+from tcr.utxo_lock import UtxoLockManager
+from tcr.tcr import get_transaction_file, set_transaction_namespace
+
+class TestUtxoLock(unittest.TestCase):
+    def test_claim(self):
+        locks = UtxoLockManager()
+        utxo = {'tx-hash': 'abcd', 'tx-ix': 0}
+        self.assertTrue(locks.claim(utxo))
+        self.assertFalse(locks.claim(dict(utxo)))
+        self.assertTrue(locks.claim({'tx-hash': 'abcd', 'tx-ix': 1}))
+        self.assertEqual(2, locks.get_claimed())
+
+        locks.release(utxo)
+        self.assertFalse(locks.is_claimed(utxo))
+        self.assertTrue(locks.claim(utxo))
+
+    def test_claim_once(self):
+        locks = UtxoLockManager()
+        utxos = [{'tx-hash': 'abcd', 'tx-ix': i % 10} for i in range(0, 1000)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            claimed = list(executor.map(locks.claim, utxos))
+        self.assertEqual(10, claimed.count(True))
+
+    def test_transaction_namespace(self):
+        def worker(i):
+            set_transaction_namespace('worker{}'.format(i))
+            return get_transaction_file('mint_nft_draft')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            files = list(executor.map(worker, range(0, 4)))
+        self.assertEqual(4, len(set(files)))
+        self.assertEqual('transaction/mint_nft_draft_tx_worker0', files[0])
+        self.assertTrue(get_transaction_file('mint_nft_draft').startswith('transaction/mint_nft_draft_tx_'))